@@ -1,82 +1,321 @@
+import json
+import logging
 import os
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from typing import Iterator, List, Optional, Tuple
 
 import pandas as pd
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain.agents import AgentExecutor, create_tool_calling_agent
+from langchain.agents.agent import RunnableMultiActionAgent
+from langchain_core.language_models import BaseChatModel
+from langchain_core.prompts import ChatPromptTemplate
 from langchain_experimental.agents import create_pandas_dataframe_agent
 
 from app.core.config import settings
-from app.services.storage import find_file_by_id
-from app.services.preprocess import read_and_preprocess_sheet
+from app.services.storage import find_file_by_id, file_content_hash, file_id_from_path
 from app.services.callbacks import TranscriptCallbackHandler
+from app.services.answer_cache import get_answer_cache, make_cache_key
+from app.services.sheet_profile import get_sheet_profile
+from app.services.prompt_builder import PromptBuilder, build_agent_prefix
+from app.services.key_pool import create_chat_model
+from app.services.rate_limiter import BATCH, QuotaExceededError, request_priority, run_with_quota_retry
+from app.services.sheet_cache import get_sheet_cache, private_copy
+from app.services.workbook import LazyWorkbook, render_workbook_prompt
+from app.services.plan_cache import build_plan, format_result, get_plan_cache, make_plan_key, replay_plan
+from app.services.id_index import SheetIndex, build_lookup_tool, get_sheet_index, index_functions, render_index_prompt
+from app.services.rollups import RollupCube, build_rollup_tool, get_rollup_cube, render_rollup_prompt, rollup_functions
+from app.services.text_index import TextIndex, build_text_search_tool, get_text_index, render_text_index_prompt, text_index_functions
+from app.services.sql_engine import (
+    SQL_HINT, SheetTooLargeError, SqlEngine, build_sql_tool, get_sql_engine, is_large_file, render_sql_prompt,
+)
 
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(tags=["analyze"])
 
+MODEL_NAME = "gemini-2.5-flash"
+# Bump whenever the agent prompt changes so answers produced by an older prompt are not served from cache
+PROMPT_VERSION = "6"
+# Optional sheet describing the columns of the other sheets; injected into the prompt when present
+DESCRIPTION_SHEET = "Mô tả trường thông tin"
+
 
 class AnalyzeRequest(BaseModel):
     fileId: str
     sheetName: str
     question: str
+    useCache: bool = True
 
 
 class AnalyzeResponse(BaseModel):
     output: str
     trace: Optional[str] = None
+    cached: bool = False
+    replayed: bool = False
+
+
+def answer_cache_key(file_path: str, sheet_name: str, question: str, workbook: bool = False,
+                     workspace: Optional[str] = None) -> Optional[str]:
+    """Cache key for a question on the current content of a sheet, or None if caching is disabled.
+
+    ``workspace`` is the signature of the session workspace the question runs against, if any.
+    """
+    if not settings.answer_cache_enabled:
+        return None
+    # Workbook-mode answers may draw on other sheets, so they are cached separately
+    scope = f"{sheet_name}#workbook" if workbook else sheet_name
+    if workspace is not None:
+        # Follow-up questions depend on the intermediate results of the session
+        scope += f"#workspace:{workspace}"
+    try:
+        return make_cache_key(file_content_hash(file_path), scope, question, MODEL_NAME, PROMPT_VERSION)
+    except OSError:
+        return None
 
 
-def build_agent_for_file(file_path: str, sheet_name: str):
-    load_dotenv()  # load GOOGLE_API_KEY if present
-    google_api_key = settings.google_api_key or os.getenv("GOOGLE_API_KEY")
-    if not google_api_key:
+def get_chat_model() -> BaseChatModel:
+    if not settings.google_api_keys:
         raise HTTPException(status_code=500, detail="GOOGLE_API_KEY is not configured. Please contact administrator.")
+    # Draws from the shared API key pool and Gemini rate limiter
+    return create_chat_model(MODEL_NAME)
 
-    # Read target sheet
+
+@lru_cache(maxsize=32)
+def _read_description_sheet(file_path: str, mtime: float, size: int) -> Optional[pd.DataFrame]:
+    # Keyed by mtime and size so a replaced file is read again
     try:
-        df = read_and_preprocess_sheet(file_path, sheet_name)
+        with pd.ExcelFile(file_path) as xls:
+            if DESCRIPTION_SHEET not in xls.sheet_names:
+                return None
+            return pd.read_excel(xls, sheet_name=DESCRIPTION_SHEET)
+    except Exception:
+        return None
+
+
+def description_sheet(file_path: str) -> Optional[pd.DataFrame]:
+    """The workbook's column description sheet, if it has one (only for Excel files)"""
+    if file_path.lower().endswith(".csv"):
+        return None
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return _read_description_sheet(file_path, stat.st_mtime, stat.st_size)
+
+
+# What copy-on-write changes for the agent's own code
+COPY_ON_WRITE_HINT = (
+    "pandas runs in copy-on-write mode: change cells with df.loc[rows, column] = value (chained assignment such as "
+    "df[column][row] = value has no effect), and copy arrays from .values, .array or .to_numpy() before writing "
+    "to them.\n"
+)
+
+
+def build_prefix(file_path: str, sheet_name: str, df: pd.DataFrame, question: str, workbook: bool = False) -> str:
+    """Agent prompt prefix for one question, kept within PROMPT_MAX_TOKENS.
+
+    Column descriptions are compressed, the profile details and the sample
+    rows favour the columns that share words with the question.
+    """
+    base = "You are a data analyst. Analyze the dataframe named df and provide concise answers. \n"
+    if pd.get_option("mode.copy_on_write"):
+        base += COPY_ON_WRITE_HINT
+    profile = get_sheet_profile(file_path, sheet_name, df) if settings.sheet_profile_enabled else None
+    builder = build_agent_prefix(
+        df,
+        question,
+        base=base,
+        max_tokens=settings.prompt_max_tokens,
+        profile=profile,
+        profile_max_tokens=settings.sheet_profile_max_tokens,
+        desc_df=description_sheet(file_path),
+        description_max_tokens=settings.prompt_description_max_tokens,
+        head_max_tokens=settings.prompt_head_max_tokens,
+        head_max_columns=settings.prompt_head_max_columns,
+        extra=render_workbook_prompt(file_path, sheet_name) if workbook else "",
+        all_fields=workbook,
+        tools="\n".join(filter(None, [
+            render_index_prompt(get_sheet_index(file_path, sheet_name, df)),
+            render_rollup_prompt(get_rollup_cube(file_path, sheet_name, df)),
+            render_text_index_prompt(get_text_index(file_path, sheet_name, df)),
+        ])),
+    )
+    logger.info(f"Agent prompt prefix ~{builder.used} tokens for {os.path.basename(file_path)}/{sheet_name}: {builder.sections}")
+    return builder.build()
+
+
+def load_sheet_for_agent(file_path: str, sheet_name: str, workbook: bool = False, question: str = "") -> Tuple[pd.DataFrame, str]:
+    """Read and preprocess a sheet and build the agent prompt prefix for a question about it"""
+    # Read target sheet through the shared cache (filled ahead of time by warm-up when possible); the frame it
+    # returns is a private copy, so edits made while answering one question never reach the next
+    try:
+        df = get_sheet_cache().get(file_path, sheet_name)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to read sheet '{sheet_name}': {e}")
 
-    # Optional: read description sheet and inject into prefix (only for Excel files)
-    col_desc_str = None
-    if not file_path.lower().endswith(".csv"):
-        try:
-            with pd.ExcelFile(file_path) as xls:
-                if "Mô tả trường thông tin" in xls.sheet_names:
-                    col_desc_df = pd.read_excel(file_path, sheet_name="Mô tả trường thông tin")
-                    col_desc_str = col_desc_df.to_string(index=False)
-        except Exception:
-            col_desc_str = None
-
-    model = ChatGoogleGenerativeAI(model="gemini-2.5-flash", google_api_key=google_api_key)
-
-    base_prefix = "You are a data analyst. Analyze the dataframe named df and provide concise answers. \n"
-    if col_desc_str:
-        prefix_text = base_prefix + "Here is the column description:\n" + col_desc_str
-    else:
-        prefix_text = base_prefix
-
     # Note: Column-specific handling is no longer hard-coded; preprocessing handles mixed types and dates.
+    return df, build_prefix(file_path, sheet_name, df, question, workbook)
+
 
+def create_agent(model: BaseChatModel, df: pd.DataFrame, prefix_text: str, index: Optional[SheetIndex] = None,
+                 cube: Optional[RollupCube] = None, text_index: Optional[TextIndex] = None):
+    """Create a pandas agent over its own private copy of ``df``.
+
+    With an ``index`` of ``df``, the agent also gets the id_lookup tool and
+    ``lookup`` / ``index_join`` in its Python namespace; with a rollup ``cube``,
+    the rollup_query tool and ``rollup``; with a ``text_index``, the
+    text_search tool and ``search_rows``. Lookups read the frame passed here,
+    so the agent's own changes to its ``df`` do not affect them.
+    """
+    tools, functions = [], {}
+    if index is not None and index.columns:
+        tools.append(build_lookup_tool(df, index))
+        functions.update(index_functions(df, index))
+    if cube is not None and not cube.empty:
+        tools.append(build_rollup_tool(cube))
+        functions.update(rollup_functions(cube))
+    if text_index is not None:
+        tools.append(build_text_search_tool(df, text_index))
+        functions.update(text_index_functions(df, text_index))
     agent = create_pandas_dataframe_agent(
         model,
-        df,
+        # The agent's code may modify its frame, even in place; the loaded one stays intact for plan replays and lookups
+        private_copy(df),
         agent_type="tool-calling",
         allow_dangerous_code=True,
         verbose=False,
         prefix=prefix_text,
         suffix="Provide the final answer in a clear and structured format.",
+        # The prefix already shows sample rows of the relevant columns; a full df.head() of a wide sheet is too large
+        include_df_in_prompt=False,
+        extra_tools=tools,
     )
+    repl_locals(agent).update(functions)
+    return agent
 
+
+def repl_locals(agent) -> dict:
+    """The namespace of the agent's Python REPL tool"""
+    for tool in getattr(agent, "tools", []):
+        if hasattr(tool, "locals") and isinstance(tool.locals, dict):
+            return tool.locals
+    raise RuntimeError("Agent has no Python REPL tool")
+
+
+def build_agent_for_file(file_path: str, sheet_name: str, workbook: bool = False, extra_prompt: str = "",
+                         loaded: Optional[Tuple[pd.DataFrame, str]] = None):
+    """Create the agent for a sheet; ``loaded`` reuses a result of :func:`load_sheet_for_agent`"""
+    model = get_chat_model()
+    df, prefix_text = loaded or load_sheet_for_agent(file_path, sheet_name, workbook)
+    agent = create_agent(model, df, prefix_text + extra_prompt, index=get_sheet_index(file_path, sheet_name, df),
+                         cube=get_rollup_cube(file_path, sheet_name, df),
+                         text_index=get_text_index(file_path, sheet_name, df))
+    if workbook:
+        # Every sheet is reachable as sheets['<name>'] and only loaded when the agent touches it
+        repl_locals(agent)["sheets"] = LazyWorkbook(file_path)
     return agent
 
 
+def create_sql_agent(model: BaseChatModel, engine: SqlEngine, prefix_text: str) -> AgentExecutor:
+    """Create a tool-calling agent whose only tool runs SQL through the out-of-core engine"""
+    tool = build_sql_tool(engine)
+    # The prefix is literal text, not a template
+    system = (prefix_text + "\nProvide the final answer in a clear and structured format.").replace("{", "{{").replace("}", "}}")
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", system),
+        ("human", "{input}"),
+        ("placeholder", "{agent_scratchpad}"),
+    ])
+    # Same agent setup as create_pandas_dataframe_agent with agent_type="tool-calling"
+    agent = RunnableMultiActionAgent(
+        runnable=create_tool_calling_agent(model, [tool], prompt),
+        input_keys_arg=["input"],
+        return_keys_arg=["output"],
+    )
+    return AgentExecutor(agent=agent, tools=[tool], verbose=False, max_iterations=15, early_stopping_method="force")
+
+
+def build_sql_agent_for_file(file_path: str, sheet_name: str, extra_prompt: str = "") -> AgentExecutor:
+    """Create the agent for a sheet too large for pandas; it only brings query results into memory"""
+    model = get_chat_model()
+    try:
+        engine = get_sql_engine(file_path, sheet_name)
+    except SheetTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to read sheet '{sheet_name}': {e}")
+    builder = PromptBuilder(settings.prompt_max_tokens)
+    builder.add("base", "You are a data analyst. Analyze the sheet with SQL and provide concise answers.")
+    builder.add("schema", render_sql_prompt(engine, builder.budget(settings.sheet_profile_max_tokens)))
+    builder.add("tools", SQL_HINT)
+    logger.info(f"SQL agent prompt prefix ~{builder.used} tokens for {os.path.basename(file_path)}/{sheet_name}: {builder.sections}")
+    return create_sql_agent(model, engine, builder.build() + extra_prompt)
+
+
+def answer_from_plan(df: pd.DataFrame, question: str) -> Optional[Tuple[str, str]]:
+    """Answer by replaying pandas code cached for the same schema and question, without the LLM.
+
+    Returns (output, transcript), or None when there is no plan or the replay
+    fails or produces a result of a different shape. The output is the
+    formatted value of the plan's last step, not a sentence worded like the
+    agent's final answer; the transcript says so.
+    """
+    if not settings.plan_cache_enabled:
+        return None
+    cache = get_plan_cache()
+    key = make_plan_key(df, question)
+    plan = cache.get(key)
+    if plan is None:
+        return None
+    try:
+        ok, value, checked = replay_plan(df, plan)
+    except Exception:
+        ok, value, checked = False, None, plan
+    cache.record_replay(ok)
+    if checked is None:
+        cache.discard(key)
+    elif checked is not plan:
+        # Validated by this first replay
+        cache.put(key, checked)
+    if not ok:
+        return None
+
+    tracer = TranscriptCallbackHandler()
+    tracer.note("> Replayed cached plan (no LLM call)")
+    for code in plan["steps"]:
+        tracer.on_tool_start({"name": "python_repl_ast"}, code)
+    tracer.on_tool_end(value)
+    tracer.note("> Answer is the raw result of the last step, not the agent's worded answer")
+    return format_result(value), tracer.get_transcript()
+
+
+def run_agent(agent, question: str, plan_df: Optional[pd.DataFrame] = None) -> Tuple[str, str]:
+    """Invoke the agent and return (output, transcript).
+
+    With ``plan_df``, the code the agent ran is kept in the plan cache under
+    that frame's schema; it is validated by its first replay.
+    """
+    tracer = TranscriptCallbackHandler()
+    response = agent.invoke(question, config={"callbacks": [tracer]})
+    output = response.get("output") if isinstance(response, dict) else str(response)
+    if (plan_df is not None and settings.plan_cache_enabled and tracer.last_code_output is not None
+            and not tracer.used_other_tools):
+        try:
+            plan = build_plan(tracer.code_steps, tracer.last_code_output)
+            if plan:
+                get_plan_cache().put(make_plan_key(plan_df, question), plan)
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"Could not record plan: {e}")
+    return output, tracer.get_transcript()
+
+
 @router.post("/analyze", response_model=AnalyzeResponse)
 def analyze(req: AnalyzeRequest):
-    import time
     import logging
     
     logger = logging.getLogger(__name__)
@@ -85,35 +324,137 @@ def analyze(req: AnalyzeRequest):
     if not file_path:
         raise HTTPException(status_code=404, detail="File not found")
 
-    agent = build_agent_for_file(file_path, req.sheetName)
-    tracer = TranscriptCallbackHandler()
-    
-    # Retry logic for quota exceeded errors
-    max_retries = 3
-    for attempt in range(max_retries):
+    # useCache=false skips the lookup but still refreshes the entry with the new answer
+    cache_key = answer_cache_key(file_path, req.sheetName, req.question)
+    if cache_key and req.useCache:
+        hit = get_answer_cache().get(cache_key)
+        if hit:
+            logger.info(f"Answer cache hit for question: {req.question}")
+            return AnalyzeResponse(output=hit["output"], trace=hit.get("trace"), cached=True)
+
+    if is_large_file(file_path):
+        # Too large for pandas: the agent queries the sheet through the out-of-core SQL engine
+        agent, df = build_sql_agent_for_file(file_path, req.sheetName), None
+    else:
+        loaded = load_sheet_for_agent(file_path, req.sheetName, question=req.question)
+        df = loaded[0]
+        if req.useCache:
+            replayed = answer_from_plan(df, req.question)
+            if replayed:
+                logger.info(f"Answered from cached plan: {req.question}")
+                return AnalyzeResponse(output=replayed[0], trace=replayed[1], replayed=True)
+        agent = build_agent_for_file(file_path, req.sheetName, loaded=loaded)
+
+    try:
+        output, trace = run_with_quota_retry(lambda: run_agent(agent, req.question, plan_df=df))
+    except QuotaExceededError:
+        raise HTTPException(
+            status_code=429,
+            detail="Google API quota exceeded. Please wait a minute and try again, or upgrade your API plan."
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {e}. Please try again.")
+
+    if cache_key:
+        get_answer_cache().put(cache_key, output, trace, file_id=req.fileId)
+    return AnalyzeResponse(output=output, trace=trace)
+
+
+class BatchAnalyzeRequest(BaseModel):
+    fileId: str
+    sheetName: str
+    questions: List[str]
+    useCache: bool = True
+
+
+def _batch_answer(model: BaseChatModel, df: Optional[pd.DataFrame], file_path: str,
+                  sheet_name: str, index: int, question: str, use_cache: bool) -> dict:
+    """Answer one batch question; errors are reported in the result instead of raised.
+
+    ``df`` is None for sheets answered through the out-of-core SQL engine.
+    """
+    result = {"index": index, "question": question, "output": None, "trace": None, "cached": False,
+              "replayed": False, "error": None, "status": 200}
+    try:
+        cache_key = answer_cache_key(file_path, sheet_name, question)
+        if cache_key and use_cache:
+            hit = get_answer_cache().get(cache_key)
+            if hit:
+                result.update(output=hit["output"], trace=hit.get("trace"), cached=True)
+                return result
+        if use_cache and df is not None:
+            replayed = answer_from_plan(df, question)
+            if replayed:
+                result.update(output=replayed[0], trace=replayed[1], replayed=True)
+                return result
+
+        # Each question gets its own agent (and REPL namespace) over its own private copy of the sheet,
+        # so columns the agent adds or cells it edits for one question do not leak into another
+        # The prompt is built per question so its sample rows and details cover the columns asked about
+        if df is None:
+            agent = build_sql_agent_for_file(file_path, sheet_name)
+        else:
+            agent = create_agent(model, df, build_prefix(file_path, sheet_name, df, question),
+                                 index=get_sheet_index(file_path, sheet_name, df),
+                                 cube=get_rollup_cube(file_path, sheet_name, df),
+                                 text_index=get_text_index(file_path, sheet_name, df))
+        # Batch work queues behind interactive questions in the shared Gemini rate limiter
+        with request_priority(BATCH):
+            output, trace = run_with_quota_retry(lambda: run_agent(agent, question, plan_df=df))
+        if cache_key:
+            get_answer_cache().put(cache_key, output, trace, file_id=file_id_from_path(file_path))
+        result.update(output=output, trace=trace)
+    except QuotaExceededError:
+        result.update(error="Google API quota exceeded. Please wait a minute and try again.", status=429)
+    except Exception as e:
+        result.update(error=f"Analysis failed: {e}", status=500)
+    return result
+
+
+def _stream_batch(model: BaseChatModel, df: Optional[pd.DataFrame], file_path: str, sheet_name: str,
+                  questions: List[str], use_cache: bool) -> Iterator[str]:
+    """NDJSON lines of the batch results, in the order the questions finish.
+
+    Closing the generator (the client disconnected) cancels the questions not
+    started yet; those already running finish in the background.
+    """
+    executor = ThreadPoolExecutor(max_workers=max(1, settings.batch_max_concurrency))
+    try:
+        futures = [
+            # Each question gets its own private copy: no question sees another's edits
+            executor.submit(_batch_answer, model, None if df is None else private_copy(df), file_path,
+                            sheet_name, i, q, use_cache)
+            for i, q in enumerate(questions)
+        ]
+        for future in as_completed(futures):
+            yield json.dumps(future.result(), ensure_ascii=False) + "\n"
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+@router.post("/analyze/batch")
+def analyze_batch(req: BatchAnalyzeRequest):
+    """Answer several questions about one sheet, streaming NDJSON results as each finishes"""
+    logger = logging.getLogger(__name__)
+
+    if not req.questions:
+        raise HTTPException(status_code=400, detail="No questions provided")
+    if len(req.questions) > settings.batch_max_questions:
+        raise HTTPException(status_code=400, detail=f"At most {settings.batch_max_questions} questions per batch")
+
+    file_path = find_file_by_id(req.fileId)
+    if not file_path:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    # Load the sheet once for the whole batch
+    model = get_chat_model()
+    df = None
+    if not is_large_file(file_path):
         try:
-            response = agent.invoke(req.question, config={"callbacks": [tracer]})
-            output = response.get("output") if isinstance(response, dict) else str(response)
-            return AnalyzeResponse(output=output, trace=tracer.get_transcript())
+            df = get_sheet_cache().get(file_path, req.sheetName)
         except Exception as e:
-            error_msg = str(e).lower()
-            
-            # Check if it's a quota/rate limit error
-            if "quota" in error_msg or "429" in error_msg or "resourceexhausted" in error_msg:
-                if attempt < max_retries - 1:
-                    wait_time = 10 * (attempt + 1)  # 10s, 20s, 30s
-                    logger.warning(f"Quota exceeded, retrying in {wait_time}s (attempt {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    raise HTTPException(
-                        status_code=429, 
-                        detail="Google API quota exceeded. Please wait a minute and try again, or upgrade your API plan."
-                    )
-            else:
-                # Other errors, don't retry
-                raise HTTPException(status_code=500, detail=f"Analysis failed: {e}. Please try again.")
-    
-    raise HTTPException(status_code=500, detail="Analysis failed after retries. Please try again later.")
-
+            raise HTTPException(status_code=400, detail=f"Failed to read sheet '{req.sheetName}': {e}")
+    logger.info(f"Batch of {len(req.questions)} questions on {req.fileId}/{req.sheetName}, concurrency {settings.batch_max_concurrency}")
 
+    return StreamingResponse(_stream_batch(model, df, file_path, req.sheetName, req.questions, req.useCache),
+                             media_type="application/x-ndjson")
@@ -0,0 +1,15 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from app.services.artifacts import load_artifact
+
+router = APIRouter(tags=["artifacts"])
+
+
+@router.get("/artifacts/{artifact_id}", response_class=PlainTextResponse)
+def get_artifact(artifact_id: str):
+    """Full output of a tool call that was truncated in an agent trace"""
+    text = load_artifact(artifact_id)
+    if text is None:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    return PlainTextResponse(text)
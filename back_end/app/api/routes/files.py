@@ -121,8 +121,12 @@ def delete_file(file_id: str):
         
         if success:
             logger.info(f"   ✅ File deleted successfully on attempt {attempt + 1}")
+            # Sessions, derived data and cached sheets of the file go with it
+            from app.services.file_cleanup import purge_file_data
+            purged = purge_file_data(file_id, file_path)
+            logger.info(f"   🗑️ Deleted {purged['deletedSessions']} related sessions")
             logger.info("="*60)
-            return {"message": "File deleted successfully"}
+            return {"message": "File deleted successfully", "deletedSessions": purged["deletedSessions"]}
         
         last_error_msg = error_msg
         
@@ -0,0 +1,23 @@
+from fastapi import APIRouter
+
+from app.services.key_pool import get_key_pool
+from app.services.plan_cache import get_plan_cache
+from app.services.rate_limiter import get_rate_limiter
+from app.services.session_store import get_session_metrics
+from app.services.sheet_cache import get_sheet_cache
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics")
+def get_metrics():
+    """Runtime metrics: Gemini rate limiter queue depth and wait times, per-key API usage, sheet and plan caches,
+    session store"""
+    pool = get_key_pool()
+    return {
+        "rateLimiter": get_rate_limiter().get_metrics(),
+        "apiKeys": pool.get_usage() if pool else [],
+        "sheetCache": get_sheet_cache().get_metrics(),
+        "planCache": get_plan_cache().get_metrics(),
+        "sessions": get_session_metrics(),
+    }
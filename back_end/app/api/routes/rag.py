@@ -5,11 +5,11 @@ from typing import List
 
 from fastapi import APIRouter, UploadFile, File, HTTPException
 from pydantic import BaseModel
-from dotenv import load_dotenv
 
 from app.core.config import settings
 from app.services.storage import find_file_by_id
 from app.services.rag_service import get_rag_service
+from app.services.rate_limiter import INGESTION, QuotaExceededError, request_priority, run_with_quota_retry
 
 logger = logging.getLogger("app.api.routes.rag")
 
@@ -78,17 +78,17 @@ async def upload_document(file: UploadFile = File(...)) -> RAGUploadResponse:
 
     # Process document with RAG service
     try:
-        load_dotenv()
-        google_api_key = settings.google_api_key or os.getenv("GOOGLE_API_KEY")
-        if not google_api_key:
+        if not settings.google_api_keys:
             raise HTTPException(
                 status_code=500, 
                 detail="GOOGLE_API_KEY is not configured"
             )
 
         logger.info(f"   🔄 Processing document for RAG...")
-        rag_service = get_rag_service(google_api_key)
-        rag_service.process_document(saved_path, file_id)
+        rag_service = get_rag_service()
+        # Embedding a whole document queues behind interactive questions
+        with request_priority(INGESTION):
+            rag_service.process_document(saved_path, file_id)
         logger.info(f"   ✅ Document processed and indexed")
         
     except Exception as e:
@@ -114,8 +114,9 @@ async def upload_document(file: UploadFile = File(...)) -> RAGUploadResponse:
 @router.post("/rag/query", response_model=RAGQueryResponse)
 async def query_document(req: RAGQueryRequest):
     """Query a processed document using RAG"""
-    import time
-    
+    import asyncio
+    import concurrent.futures
+
     logger.info(f"🔍 RAG QUERY REQUEST")
     logger.info(f"   File ID: {req.fileId}")
     logger.info(f"   Question: {req.question}")
@@ -136,59 +137,33 @@ async def query_document(req: RAGQueryRequest):
     
     # Get RAG service and query
     try:
-        load_dotenv()
-        google_api_key = settings.google_api_key or os.getenv("GOOGLE_API_KEY")
-        if not google_api_key:
+        if not settings.google_api_keys:
             raise HTTPException(
                 status_code=500, 
                 detail="GOOGLE_API_KEY is not configured"
             )
         
-        rag_service = get_rag_service(google_api_key)
-        
-        # Retry logic for quota exceeded errors
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                logger.info(f"   🤖 Querying document (attempt {attempt + 1})...")
-                
-                # Run RAG query in thread pool to avoid event loop issues
-                import asyncio
-                import concurrent.futures
-                import functools
-                
-                def _sync_query():
-                    return rag_service.query_document(req.fileId, req.question)
-                
-                # Run in thread pool executor
-                loop = asyncio.get_event_loop()
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    answer = await loop.run_in_executor(executor, _sync_query)
-                
-                logger.info(f"   ✅ Query completed successfully")
-                return RAGQueryResponse(answer=answer)
-                
-            except Exception as e:
-                error_msg = str(e).lower()
-                
-                # Check if it's a quota/rate limit error
-                if "quota" in error_msg or "429" in error_msg or "resourceexhausted" in error_msg:
-                    if attempt < max_retries - 1:
-                        wait_time = 10 * (attempt + 1)  # 10s, 20s, 30s
-                        logger.warning(f"   ⏳ Quota exceeded, retrying in {wait_time}s")
-                        time.sleep(wait_time)
-                        continue
-                    else:
-                        logger.error(f"   ❌ Quota exceeded after {max_retries} attempts")
-                        raise HTTPException(
-                            status_code=429, 
-                            detail="Google API quota exceeded. Please wait and try again."
-                        )
-                else:
-                    # Other errors, don't retry
-                    logger.error(f"   ❌ Query failed: {e}")
-                    raise HTTPException(status_code=500, detail=f"Query failed: {e}")
-    
+        rag_service = get_rag_service()
+        logger.info(f"   🤖 Querying document...")
+
+        def _sync_query():
+            # Quota backoff is shared through the Gemini rate limiter instead of sleeping per request
+            return run_with_quota_retry(lambda: rag_service.query_document(req.fileId, req.question))
+
+        # Run in thread pool executor to avoid event loop issues
+        loop = asyncio.get_event_loop()
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            answer = await loop.run_in_executor(executor, _sync_query)
+
+        logger.info(f"   ✅ Query completed successfully")
+        return RAGQueryResponse(answer=answer)
+
+    except QuotaExceededError:
+        logger.error(f"   ❌ Quota exceeded after retries")
+        raise HTTPException(
+            status_code=429,
+            detail="Google API quota exceeded. Please wait and try again."
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -242,8 +217,7 @@ def list_rag_files():
 @router.delete("/rag/file/{file_id}")
 def delete_rag_file(file_id: str):
     """Delete a RAG file, its vector data, and associated sessions"""
-    import shutil
-    from app.services.session_store import list_sessions, delete_session
+    from app.services.file_cleanup import purge_file_data
     
     logger.info(f"🗑️ RAG DELETE REQUEST: {file_id}")
     
@@ -259,20 +233,6 @@ def delete_rag_file(file_id: str):
         raise HTTPException(status_code=400, detail="Not a RAG file")
     
     try:
-        # First, find and delete all related RAG sessions
-        related_sessions = list_sessions(file_id=file_id, session_type="rag")
-        deleted_sessions = 0
-        for session in related_sessions:
-            try:
-                if delete_session(session["sessionId"]):
-                    deleted_sessions += 1
-                    logger.info(f"   🗑️ Deleted related session: {session['sessionId']}")
-            except Exception as e:
-                logger.warning(f"   ⚠️ Failed to delete session {session['sessionId']}: {e}")
-        
-        if deleted_sessions > 0:
-            logger.info(f"   📊 Deleted {deleted_sessions} related sessions")
-        
         # Delete the physical file
         if os.path.exists(file_path):
             os.remove(file_path)
@@ -280,18 +240,19 @@ def delete_rag_file(file_id: str):
         else:
             logger.info(f"   ℹ️  File already deleted: {file_path}")
         
-        # Delete vector data directory
-        vector_data_dir = os.path.join(settings.storage_dir, "rag_data", file_id)
-        if os.path.exists(vector_data_dir):
-            shutil.rmtree(vector_data_dir)
-            logger.info(f"   ✅ Vector data deleted: {vector_data_dir}")
+        # Then its sessions, found through the session store's fileId index, and its vector data
+        purged = purge_file_data(file_id, file_path)
+        if purged["deletedSessions"] > 0:
+            logger.info(f"   📊 Deleted {purged['deletedSessions']} related sessions")
+        if "rag_data" in purged["removedData"]:
+            logger.info(f"   ✅ Vector data deleted")
         else:
-            logger.info(f"   ℹ️  Vector data already deleted: {vector_data_dir}")
+            logger.info(f"   ℹ️  Vector data already deleted")
         
         logger.info(f"   🎉 RAG file deletion completed")
         return {
             "message": "File and vector data deleted successfully",
-            "deletedSessions": deleted_sessions
+            "deletedSessions": purged["deletedSessions"]
         }
         
     except PermissionError as e:
@@ -3,15 +3,16 @@ import logging
 from datetime import datetime, timezone
 from typing import List
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
 from pydantic import BaseModel
-from dotenv import load_dotenv
 
 from app.services.storage import find_file_by_id
 from app.services.rag_service import get_rag_service
+from app.services.rate_limiter import QuotaExceededError, run_with_quota_retry
 from app.services.session_store import (
-    create_session, get_session_record, delete_session_record,
-    get_all_sessions, append_message, get_session_messages
+    create_session, get_session_record, get_session_header, delete_session_record,
+    get_all_sessions, append_message, get_messages_page, list_sessions_page,
+    NEXT_CURSOR_HEADER, page_size,
 )
 from app.core.config import settings
 
@@ -96,14 +97,14 @@ def create_rag_session(req: RAGSessionRequest):
 
 
 @router.get("/rag/sessions")
-def list_rag_sessions():
-    """List all RAG chat sessions"""
+def list_rag_sessions(response: Response, cursor: str | None = None, limit: int | None = None):
+    """List RAG chat sessions, most recently active first; the X-Next-Cursor header points to the next page"""
     try:
-        from app.services.session_store import list_sessions
-        
         # Get only RAG sessions using the session_type filter
-        rag_sessions = list_sessions(session_type="rag")
-        
+        rag_sessions, next_cursor = list_sessions_page(None, "rag", cursor, page_size(limit))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
         # Add filename info for each session
         for session in rag_sessions:
             file_path = find_file_by_id(session["fileId"])
@@ -113,6 +114,8 @@ def list_rag_sessions():
                 session["filename"] = "File not found"
         
         logger.info(f"📋 Listed {len(rag_sessions)} RAG sessions")
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         return rag_sessions
         
     except Exception as e:
@@ -144,9 +147,10 @@ def get_rag_session(session_id: str):
 
 
 @router.get("/rag/session/{session_id}/messages")
-def get_rag_session_messages(session_id: str) -> List[Message]:
-    """Get all messages in a RAG session"""
-    rec = get_session_record(session_id)
+def get_rag_session_messages(session_id: str, response: Response, cursor: str | None = None,
+                             limit: int | None = None) -> List[Message]:
+    """The latest page of messages in a RAG session; the X-Next-Cursor header pages back to earlier ones"""
+    rec = get_session_header(session_id)
     if not rec:
         raise HTTPException(status_code=404, detail="Session not found")
     
@@ -155,14 +159,19 @@ def get_rag_session_messages(session_id: str) -> List[Message]:
     if session_type != "rag":
         raise HTTPException(status_code=400, detail="Not a RAG session")
     
-    messages = get_session_messages(session_id)
+    try:
+        messages, next_cursor = get_messages_page(session_id, cursor, page_size(limit))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return [Message(**msg) for msg in messages]
 
 
 @router.delete("/rag/session/{session_id}")
 def delete_rag_session(session_id: str):
     """Delete a RAG session"""
-    rec = get_session_record(session_id)
+    rec = get_session_header(session_id)
     if not rec:
         raise HTTPException(status_code=404, detail="Session not found")
     
@@ -182,14 +191,15 @@ def delete_rag_session(session_id: str):
 @router.post("/rag/session/{session_id}/ask", response_model=Message)
 async def ask_rag_document(session_id: str, req: RAGAskRequest):
     """Ask a question to a RAG document in a session"""
-    import time
-    
+    import asyncio
+    import concurrent.futures
+
     logger.info(f"🤖 RAG ASK REQUEST")
     logger.info(f"   Session ID: {session_id}")
     logger.info(f"   Question: {req.question}")
     
     # Get session record
-    rec = get_session_record(session_id)
+    rec = get_session_header(session_id)
     if not rec:
         raise HTTPException(status_code=404, detail="Session not found")
 
@@ -212,56 +222,35 @@ async def ask_rag_document(session_id: str, req: RAGAskRequest):
 
     # Query the document using RAG
     try:
-        load_dotenv()
-        google_api_key = settings.google_api_key or os.getenv("GOOGLE_API_KEY")
-        if not google_api_key:
+        if not settings.google_api_keys:
             raise HTTPException(
                 status_code=500, 
                 detail="GOOGLE_API_KEY is not configured"
             )
         
-        rag_service = get_rag_service(google_api_key)
-        
-        # Retry logic for quota exceeded errors
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                # Run RAG query in thread pool to avoid event loop issues
-                import asyncio
-                import concurrent.futures
-                
-                def _sync_query():
-                    return rag_service.query_document(file_id, req.question)
-                
-                # Run in thread pool executor
-                loop = asyncio.get_event_loop()
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    answer = await loop.run_in_executor(executor, _sync_query)
-                break
-            except Exception as e:
-                error_msg = str(e).lower()
-                
-                if "quota" in error_msg or "429" in error_msg or "resourceexhausted" in error_msg:
-                    if attempt < max_retries - 1:
-                        wait_time = 10 * (attempt + 1)
-                        logger.warning(f"   ⏳ Quota exceeded, retrying in {wait_time}s")
-                        time.sleep(wait_time)
-                        continue
-                    else:
-                        raise HTTPException(
-                            status_code=429, 
-                            detail="Google API quota exceeded. Please wait and try again."
-                        )
-                else:
-                    raise HTTPException(status_code=500, detail=f"Query failed: {e}")
-        
+        rag_service = get_rag_service()
+
+        def _sync_query():
+            # Quota backoff is shared through the Gemini rate limiter instead of sleeping per request
+            return run_with_quota_retry(lambda: rag_service.query_document(file_id, req.question))
+
+        # Run RAG query in thread pool to avoid event loop issues
+        loop = asyncio.get_event_loop()
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            answer = await loop.run_in_executor(executor, _sync_query)
+
         # Store assistant response
         now2 = datetime.now(timezone.utc).isoformat()
         append_message(session_id, role="assistant", content=answer, timestamp=now2)
         
         logger.info(f"   ✅ RAG query completed successfully")
         return Message(role="assistant", content=answer, timestamp=now2)
-        
+
+    except QuotaExceededError:
+        raise HTTPException(
+            status_code=429,
+            detail="Google API quota exceeded. Please wait and try again."
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -1,20 +1,41 @@
 import os
 import uuid
 from datetime import datetime, timezone
-from typing import List
+from typing import List, Literal
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
 from app.services.storage import find_file_by_id
-from app.api.routes.analyze import build_agent_for_file
-from app.services.callbacks import TranscriptCallbackHandler
+from app.core.config import settings
+from app.api.routes.analyze import (
+    MODEL_NAME,
+    answer_cache_key,
+    answer_from_plan,
+    build_agent_for_file,
+    build_sql_agent_for_file,
+    load_sheet_for_agent,
+    repl_locals,
+    run_agent,
+)
+from app.services.answer_cache import get_answer_cache
+from app.services.session_export import SessionImporter, iter_export
+from app.services.sql_engine import is_large_file
+from app.services.rate_limiter import QuotaExceededError, run_with_quota_retry
+from app.services.traces import load_trace
+from app.services.workspace import WORKSPACE_HINT, SessionWorkspace
+from app.services.warmup import get_warmup_manager
 from app.services.session_store import (
+    NEXT_CURSOR_HEADER,
     create_session_record,
-    get_session_record,
+    get_session_header,
+    get_messages_page,
     append_message,
-    list_sessions,
+    list_sessions_page,
     delete_session,
+    page_size,
 )
 
 
@@ -24,6 +45,8 @@ router = APIRouter(tags=["session"])
 class CreateSessionRequest(BaseModel):
     fileId: str
     sheetName: str
+    # "sheet" gives the agent one sheet; "workbook" also exposes every sheet of the file, loaded lazily
+    mode: Literal["sheet", "workbook"] = "sheet"
 
 
 class CreateSessionResponse(BaseModel):
@@ -31,10 +54,12 @@ class CreateSessionResponse(BaseModel):
     fileId: str
     sheetName: str
     createdAt: str
+    mode: str = "sheet"
 
 
 class AskRequest(BaseModel):
     question: str
+    useCache: bool = True
 
 
 class Message(BaseModel):
@@ -42,6 +67,10 @@ class Message(BaseModel):
     content: str
     timestamp: str
     trace: str | None = None
+    # Reference of the stored trace, loaded on demand from /session/{id}/trace/{traceId}
+    traceId: str | None = None
+    cached: bool = False
+    replayed: bool = False
 
 
 class HistoryResponse(BaseModel):
@@ -49,6 +78,7 @@ class HistoryResponse(BaseModel):
     fileId: str
     sheetName: str
     messages: List[Message]
+    mode: str = "sheet"
 
 
 @router.post("/session", response_model=CreateSessionResponse)
@@ -59,13 +89,19 @@ def create_session(req: CreateSessionRequest):
 
     session_id = str(uuid.uuid4())
     now = datetime.now(timezone.utc).isoformat()
-    create_session_record(session_id=session_id, file_id=req.fileId, sheet_name=req.sheetName, created_at=now, session_type="pandas")
-    return CreateSessionResponse(sessionId=session_id, fileId=req.fileId, sheetName=req.sheetName, createdAt=now)
+    create_session_record(session_id=session_id, file_id=req.fileId, sheet_name=req.sheetName, created_at=now, session_type="pandas", mode=req.mode)
+    if settings.warmup_enabled:
+        # Load the sheet (and build its profile) before the first question arrives
+        get_warmup_manager().schedule(file_path, req.sheetName, workbook=req.mode == "workbook", model_name=MODEL_NAME)
+    return CreateSessionResponse(sessionId=session_id, fileId=req.fileId, sheetName=req.sheetName, createdAt=now, mode=req.mode)
 
 
 @router.get("/session/{session_id}", response_model=HistoryResponse)
-def get_history(session_id: str):
-    rec = get_session_record(session_id)
+def get_history(session_id: str, response: Response, cursor: str | None = None, limit: int | None = None,
+                includeTrace: bool = False):
+    """The latest page of messages, oldest first; the X-Next-Cursor header pages back to earlier ones.
+    Traces are left out (only their ``traceId`` is returned) unless ``includeTrace`` is set."""
+    rec = get_session_header(session_id)
     if not rec:
         raise HTTPException(status_code=404, detail="Session not found")
     
@@ -73,8 +109,57 @@ def get_history(session_id: str):
     session_type = rec.get("sessionType", "pandas")
     if session_type != "pandas":
         raise HTTPException(status_code=400, detail="Not a pandas session")
-    
-    return HistoryResponse(sessionId=session_id, fileId=rec["fileId"], sheetName=rec["sheetName"], messages=rec["messages"])
+
+    try:
+        messages, next_cursor = get_messages_page(session_id, cursor, page_size(limit), include_trace=includeTrace)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return HistoryResponse(sessionId=session_id, fileId=rec["fileId"], sheetName=rec["sheetName"], messages=messages, mode=rec.get("mode", "sheet"))
+
+
+@router.get("/session/{session_id}/trace/{trace_id}", response_class=PlainTextResponse)
+def get_trace(session_id: str, trace_id: str):
+    """The agent steps behind one answer of a session"""
+    rec = get_session_header(session_id)
+    if not rec:
+        raise HTTPException(status_code=404, detail="Session not found")
+    trace = load_trace(session_id, trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return PlainTextResponse(trace)
+
+
+class WarmupStatusResponse(BaseModel):
+    sessionId: str
+    fileId: str
+    sheetName: str
+    status: str
+    durationSeconds: float | None = None
+    error: str | None = None
+
+
+@router.get("/session/{session_id}/warmup", response_model=WarmupStatusResponse)
+def get_warmup_status(session_id: str):
+    """Whether the session's sheet has been loaded ahead of the first question"""
+    rec = get_session_header(session_id)
+    if not rec:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if rec.get("sessionType", "pandas") != "pandas":
+        raise HTTPException(status_code=400, detail="Not a pandas session")
+    file_path = find_file_by_id(rec["fileId"])
+    if not file_path:
+        raise HTTPException(status_code=404, detail="File not found")
+    status = get_warmup_manager().status(file_path, rec["sheetName"])
+    return WarmupStatusResponse(
+        sessionId=session_id,
+        fileId=rec["fileId"],
+        sheetName=rec["sheetName"],
+        status=status["status"],
+        durationSeconds=status["durationSeconds"],
+        error=status["error"],
+    )
 
 
 class SessionSummary(BaseModel):
@@ -85,18 +170,65 @@ class SessionSummary(BaseModel):
     messagesCount: int
     lastMessageAt: str
     sessionType: str
+    # Idle session moved to the archive; it is restored when opened
+    archived: bool = False
 
 
 @router.get("/sessions", response_model=list[SessionSummary])
-def list_all_sessions(fileId: str | None = None):
+def list_all_sessions(response: Response, fileId: str | None = None, cursor: str | None = None, limit: int | None = None):
+    """Most recently active sessions first; the X-Next-Cursor header points to the next page"""
     # Only return pandas sessions for regular /sessions endpoint
-    return list_sessions(file_id=fileId, session_type="pandas")
+    try:
+        sessions, next_cursor = list_sessions_page(fileId, "pandas", cursor, page_size(limit))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return sessions
+
+
+def _date_bound(name: str, value: str | None) -> str | None:
+    if value is None:
+        return None
+    try:
+        datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}: expected an ISO date or timestamp")
+    return value
+
+
+@router.get("/sessions/export")
+def export_sessions(fileId: str | None = None, type: Literal["pandas", "rag"] | None = None,
+                    since: str | None = None, until: str | None = None):
+    """Sessions of every type (or of ``type``) with their messages and traces, as gzip-compressed NDJSON streamed
+    while it is produced; ``since`` and ``until`` bound the sessions' last activity"""
+    since, until = _date_bound("since", since), _date_bound("until", until)
+    filename = f"sessions-{datetime.now(timezone.utc).strftime('%Y%m%d')}.ndjson.gz"
+    return StreamingResponse(iter_export(fileId, type, since, until), media_type="application/gzip",
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+@router.post("/sessions/import")
+async def import_sessions(request: Request, overwrite: bool = False):
+    """Read back an export from the request body, compressed or not; existing sessions are kept unless
+    ``overwrite`` is set"""
+    importer = SessionImporter(overwrite)
+    try:
+        async for chunk in request.stream():
+            for record in importer.feed(chunk):
+                await run_in_threadpool(importer.store, record)
+        for record in importer.finish():
+            await run_in_threadpool(importer.store, record)
+    except ValueError as e:
+        # Sessions before the error are already imported
+        raise HTTPException(status_code=400, detail={"error": str(e), **importer.report()})
+    return importer.report()
 
 
 @router.delete("/session/{session_id}")
 def delete_session_endpoint(session_id: str):
     # Verify it's a pandas session before deleting
-    rec = get_session_record(session_id)
+    rec = get_session_header(session_id)
     if not rec:
         raise HTTPException(status_code=404, detail="Session not found")
     
@@ -113,7 +245,7 @@ def delete_session_endpoint(session_id: str):
 
 @router.post("/session/{session_id}/ask", response_model=Message)
 def ask(session_id: str, req: AskRequest):
-    rec = get_session_record(session_id)
+    rec = get_session_header(session_id)
     if not rec:
         raise HTTPException(status_code=404, detail="Session not found")
 
@@ -124,6 +256,7 @@ def ask(session_id: str, req: AskRequest):
 
     file_id = rec["fileId"]
     sheet_name = rec["sheetName"]
+    workbook = rec.get("mode", "sheet") == "workbook"
     file_path = find_file_by_id(file_id)
     if not file_path:
         raise HTTPException(status_code=404, detail="File not found")
@@ -132,21 +265,53 @@ def ask(session_id: str, req: AskRequest):
     now = datetime.now(timezone.utc).isoformat()
     append_message(session_id, role="user", content=req.question, timestamp=now)
 
+    # Sheets above the out-of-core threshold are queried with SQL; there is no pandas namespace to keep frames in
+    large = is_large_file(file_path)
+    workspace = SessionWorkspace(session_id) if settings.workspace_enabled and not large else None
+    cache_key = answer_cache_key(file_path, sheet_name, req.question, workbook,
+                                 workspace=workspace.signature() if workspace else None)
+    if cache_key and req.useCache:
+        hit = get_answer_cache().get(cache_key)
+        if hit:
+            now2 = datetime.now(timezone.utc).isoformat()
+            stored = append_message(session_id, role="assistant", content=hit["output"], timestamp=now2, trace=hit.get("trace"), cached=True)
+            return Message(**stored, trace=hit.get("trace"))
+
+    # Plans are only replayed for self-contained questions: not across sheets, not on top of earlier results
+    sheet = None if large else load_sheet_for_agent(file_path, sheet_name, workbook, question=req.question)
+    plan_df = sheet[0] if sheet and not workbook and not (workspace and workspace.signature()) else None
+    if plan_df is not None and req.useCache:
+        replayed = answer_from_plan(plan_df, req.question)
+        if replayed:
+            now2 = datetime.now(timezone.utc).isoformat()
+            stored = append_message(session_id, role="assistant", content=replayed[0], timestamp=now2, trace=replayed[1], replayed=True)
+            return Message(**stored, trace=replayed[1])
+
     # Run analysis
-    agent = build_agent_for_file(file_path, sheet_name)
-    tracer = TranscriptCallbackHandler()
+    if large:
+        agent = build_sql_agent_for_file(file_path, sheet_name)
+    elif workspace:
+        # Intermediate results of earlier questions are reloaded into the REPL namespace
+        agent = build_agent_for_file(file_path, sheet_name, workbook, extra_prompt=workspace.render_prompt() + WORKSPACE_HINT, loaded=sheet)
+        namespace = repl_locals(agent)
+        loaded = workspace.load_into(namespace)
+    else:
+        agent = build_agent_for_file(file_path, sheet_name, workbook, loaded=sheet)
     try:
-        response = agent.invoke(req.question, config={"callbacks": [tracer]})
-        output = response.get("output") if isinstance(response, dict) else str(response)
+        output, trace = run_with_quota_retry(lambda: run_agent(agent, req.question, plan_df=plan_df))
+    except QuotaExceededError:
+        raise HTTPException(status_code=429, detail="Google API quota exceeded. Please wait a minute and try again.")
     except Exception as e:
-        error_msg = str(e).lower()
-        if "quota" in error_msg or "429" in error_msg or "resourceexhausted" in error_msg:
-            raise HTTPException(status_code=429, detail="Google API quota exceeded. Please wait a minute and try again.")
-        else:
-            raise HTTPException(status_code=500, detail=f"Analysis failed: {e}. Please try again.")
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {e}. Please try again.")
+
+    if workspace:
+        workspace.save_from(namespace, loaded, req.question)
+
+    if cache_key:
+        get_answer_cache().put(cache_key, output, trace, file_id=file_id)
 
     now2 = datetime.now(timezone.utc).isoformat()
-    append_message(session_id, role="assistant", content=output, timestamp=now2, trace=tracer.get_transcript())
-    return Message(role="assistant", content=output, timestamp=now2, trace=tracer.get_transcript())
+    stored = append_message(session_id, role="assistant", content=output, timestamp=now2, trace=trace)
+    return Message(**stored, trace=trace)
 
 
@@ -7,6 +7,8 @@ import pandas as pd
 from fastapi import APIRouter, UploadFile, File, HTTPException
 
 from app.core.config import settings
+from app.api.routes.analyze import DESCRIPTION_SHEET, MODEL_NAME
+from app.services.warmup import get_warmup_manager
 
 logger = logging.getLogger("app.api.routes.upload")
 
@@ -77,6 +79,12 @@ async def upload_excel(file: UploadFile = File(...)) -> dict:
             logger.error(f"   ❌ Error cleaning up file: {cleanup_e}")
         raise HTTPException(status_code=400, detail=f"Failed to read file: {e}")
 
+    if settings.warmup_enabled:
+        # No sheet is selected yet: warm the first data sheet, the usual first pick
+        data_sheets = [name for name in sheet_names if name != DESCRIPTION_SHEET] or sheet_names
+        get_warmup_manager().schedule(saved_path, data_sheets[0], model_name=MODEL_NAME)
+        logger.info(f"   🔥 Warm-up scheduled for sheet: {data_sheets[0]}")
+
     logger.info(f"   🎉 Upload completed successfully")
     logger.info("="*60)
     return {"fileId": file_id, "filename": filename, "sheetNames": sheet_names}
@@ -1,5 +1,6 @@
 import os
 from typing import List, Optional
+import pandas as pd
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
@@ -20,10 +21,111 @@ class Settings(BaseModel):
     
     google_api_key: Optional[str] = os.environ.get("GOOGLE_API_KEY")
 
+    # Pool of Gemini API keys: GOOGLE_API_KEYS (comma separated) plus GOOGLE_API_KEY, duplicates removed
+    _api_keys = [k.strip() for k in os.environ.get("GOOGLE_API_KEYS", "").split(",")] + [os.environ.get("GOOGLE_API_KEY") or ""]
+    google_api_keys: List[str] = list(dict.fromkeys(k for k in _api_keys if k))
+    gemini_key_cooldown_seconds: float = float(os.environ.get("GEMINI_KEY_COOLDOWN_SECONDS", "60"))
+
+    # Answer cache for repeated questions on the same sheet version
+    answer_cache_enabled: bool = os.environ.get("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    answer_cache_ttl_seconds: int = int(os.environ.get("ANSWER_CACHE_TTL_SECONDS", "86400"))
+    answer_cache_max_entries: int = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+    # Precomputed sheet profile injected into the agent prompt
+    sheet_profile_enabled: bool = os.environ.get("SHEET_PROFILE_ENABLED", "true").lower() in ("1", "true", "yes")
+    sheet_profile_max_tokens: int = int(os.environ.get("SHEET_PROFILE_MAX_TOKENS", "1500"))
+
+    # Token budgets of the agent prompt prefix (profile, column descriptions and sample rows together)
+    prompt_max_tokens: int = int(os.environ.get("PROMPT_MAX_TOKENS", "4000"))
+    prompt_description_max_tokens: int = int(os.environ.get("PROMPT_DESCRIPTION_MAX_TOKENS", "800"))
+    prompt_head_max_tokens: int = int(os.environ.get("PROMPT_HEAD_MAX_TOKENS", "400"))
+    prompt_head_max_columns: int = int(os.environ.get("PROMPT_HEAD_MAX_COLUMNS", "8"))
+
+    # Exact-match indexes on identifier columns, used by the agent's id_lookup tool
+    id_index_enabled: bool = os.environ.get("ID_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+    id_index_max_columns: int = int(os.environ.get("ID_INDEX_MAX_COLUMNS", "6"))
+
+    # Precomputed day/week/month rollups of numeric columns, used by the agent's rollup_query tool
+    rollups_enabled: bool = os.environ.get("ROLLUPS_ENABLED", "true").lower() in ("1", "true", "yes")
+    rollup_max_dimensions: int = int(os.environ.get("ROLLUP_MAX_DIMENSIONS", "6"))
+    rollup_max_cardinality: int = int(os.environ.get("ROLLUP_MAX_CARDINALITY", "50"))
+
+    # Inverted index (and optional embeddings) over free-text columns, used by the agent's text_search tool
+    text_index_enabled: bool = os.environ.get("TEXT_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+    text_index_max_columns: int = int(os.environ.get("TEXT_INDEX_MAX_COLUMNS", "4"))
+    text_index_columns: List[str] = [c.strip() for c in os.environ.get("TEXT_INDEX_COLUMNS", "").split(",") if c.strip()]
+    text_index_embeddings_enabled: bool = os.environ.get("TEXT_INDEX_EMBEDDINGS_ENABLED", "false").lower() in ("1", "true", "yes")
+    text_index_embedding_max_rows: int = int(os.environ.get("TEXT_INDEX_EMBEDDING_MAX_ROWS", "5000"))
+
+    # Files at least this large are queried with DuckDB over Parquet instead of being loaded into pandas
+    out_of_core_enabled: bool = os.environ.get("OUT_OF_CORE_ENABLED", "true").lower() in ("1", "true", "yes")
+    out_of_core_threshold_mb: float = float(os.environ.get("OUT_OF_CORE_THRESHOLD_MB", "200"))
+    out_of_core_memory_limit_mb: int = int(os.environ.get("OUT_OF_CORE_MEMORY_LIMIT_MB", "1024"))
+    out_of_core_threads: int = int(os.environ.get("OUT_OF_CORE_THREADS", "2"))
+
+    # Batch question endpoint
+    batch_max_concurrency: int = int(os.environ.get("BATCH_MAX_CONCURRENCY", "4"))
+    batch_max_questions: int = int(os.environ.get("BATCH_MAX_QUESTIONS", "100"))
+
+    # Agent traces: tool outputs longer than the inline limit are stored as compressed artifacts
+    trace_inline_max_chars: int = int(os.environ.get("TRACE_INLINE_MAX_CHARS", "2000"))
+    trace_max_chars: int = int(os.environ.get("TRACE_MAX_CHARS", "20000"))
+
+    # Replay of cached pandas code for questions on sheets with the same schema
+    plan_cache_enabled: bool = os.environ.get("PLAN_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    plan_cache_max_entries: int = int(os.environ.get("PLAN_CACHE_MAX_ENTRIES", "1000"))
+
+    # Where sessions are stored: "file" (one log per session in storage_dir) or "sqlite" (storage_dir/sessions.sqlite3)
+    session_backend: str = os.environ.get("SESSION_BACKEND", "file").lower()
+    # Page sizes of session listings and message histories (limit query parameter)
+    session_page_size: int = int(os.environ.get("SESSION_PAGE_SIZE", "50"))
+    session_page_max_size: int = int(os.environ.get("SESSION_PAGE_MAX_SIZE", "200"))
+    # Durability of session message appends: "always" fsyncs every message, "never" leaves flushing to the OS
+    session_fsync: str = os.environ.get("SESSION_FSYNC", "never").lower()
+    # Queue appended messages and write them in groups from a background thread (0: write in the request)
+    session_write_behind_ms: int = int(os.environ.get("SESSION_WRITE_BEHIND_MS", "0"))
+    # Parsed session records kept in memory, revalidated against the stored session on every read (0: off)
+    session_cache_max_entries: int = int(os.environ.get("SESSION_CACHE_MAX_ENTRIES", "256"))
+    # Move sessions idle for this many days into compressed archive segments (0: never), checked every interval
+    session_archive_after_days: float = float(os.environ.get("SESSION_ARCHIVE_AFTER_DAYS", "0"))
+    session_archive_interval_minutes: int = int(os.environ.get("SESSION_ARCHIVE_INTERVAL_MINUTES", "60"))
+
+    # Per-session workspace of intermediate DataFrames kept across follow-up questions
+    workspace_enabled: bool = os.environ.get("WORKSPACE_ENABLED", "true").lower() in ("1", "true", "yes")
+    workspace_max_frames: int = int(os.environ.get("WORKSPACE_MAX_FRAMES", "10"))
+    workspace_max_frame_mb: int = int(os.environ.get("WORKSPACE_MAX_FRAME_MB", "100"))
+    workspace_cache_max_mb: int = int(os.environ.get("WORKSPACE_CACHE_MAX_MB", "256"))
+
+    # Memory budget for preprocessed sheets kept in memory between questions
+    sheet_cache_max_mb: int = int(os.environ.get("SHEET_CACHE_MAX_MB", "512"))
+    # pandas copy-on-write for the whole process, so sheets handed out by the cache are isolated by shallow copies;
+    # when off, every question gets a full copy of its sheet instead
+    pandas_copy_on_write: bool = os.environ.get("PANDAS_COPY_ON_WRITE", "true").lower() in ("1", "true", "yes")
+    # Parquet snapshots of preprocessed sheets, so a sheet is parsed from Excel only once
+    sheet_snapshot_enabled: bool = os.environ.get("SHEET_SNAPSHOT_ENABLED", "true").lower() in ("1", "true", "yes")
+
+    # Background warm-up of sheets after upload and session creation
+    warmup_enabled: bool = os.environ.get("WARMUP_ENABLED", "true").lower() in ("1", "true", "yes")
+    warmup_max_concurrency: int = int(os.environ.get("WARMUP_MAX_CONCURRENCY", "1"))
+
+    # Client-side Gemini rate limiting shared by the pandas agent, RAG generation and embeddings.
+    # Budgets are per API key; the shared limiter allows the sum over all pooled keys.
+    gemini_requests_per_minute: int = int(os.environ.get("GEMINI_REQUESTS_PER_MINUTE", "60"))
+    gemini_tokens_per_minute: int = int(os.environ.get("GEMINI_TOKENS_PER_MINUTE", "1000000"))
+    gemini_default_request_tokens: int = int(os.environ.get("GEMINI_DEFAULT_REQUEST_TOKENS", "2000"))
+    gemini_default_output_tokens: int = int(os.environ.get("GEMINI_DEFAULT_OUTPUT_TOKENS", "500"))
+    gemini_quota_backoff_seconds: float = float(os.environ.get("GEMINI_QUOTA_BACKOFF_SECONDS", "10"))
+
 
 settings = Settings()
 
 # Ensure storage directory exists
 os.makedirs(settings.storage_dir, exist_ok=True)
 
+# Process-wide, for every module that uses pandas (agents, plan replays, preprocessing, RAG): writes through a
+# shallow copy (df.loc[...] = ..., fillna(inplace=True), ...) copy the touched columns instead of changing the
+# frame it was copied from, chained assignment (df["a"][0] = ...) never writes to df, and NumPy arrays handed
+# out by .values / .to_numpy() are read-only. See PANDAS_COPY_ON_WRITE in the README.
+pd.set_option("mode.copy_on_write", settings.pandas_copy_on_write)
+
 
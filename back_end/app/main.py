@@ -11,6 +11,10 @@ from app.api.routes.session import router as session_router
 from app.api.routes.files import router as files_router
 from app.api.routes.rag import router as rag_router
 from app.api.routes.rag_session import router as rag_session_router
+from app.api.routes.metrics import router as metrics_router
+from app.api.routes.artifacts import router as artifacts_router
+from app.services.session_archive import get_session_archiver
+from app.services.session_store import NEXT_CURSOR_HEADER
 
 # Setup logging first
 setup_logging()
@@ -46,6 +50,8 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        # Paginated endpoints return the cursor of the next page in a header the browser must be allowed to read
+        expose_headers=[NEXT_CURSOR_HEADER],
     )
     
     # Add request logging middleware
@@ -57,6 +63,11 @@ def create_app() -> FastAPI:
     app.include_router(files_router, prefix="/api")
     app.include_router(rag_router, prefix="/api")
     app.include_router(rag_session_router, prefix="/api")
+    app.include_router(metrics_router, prefix="/api")
+    app.include_router(artifacts_router, prefix="/api")
+
+    if settings.session_archive_after_days > 0:
+        get_session_archiver().start()
 
     @app.get("/health")
     def health_check():
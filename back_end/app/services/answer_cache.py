@@ -0,0 +1,215 @@
+import json
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.services.jsonl import append_line, exclusive_lock
+
+logger = logging.getLogger("app.services.answer_cache")
+
+# The log is compacted once it holds this many lines more than twice the live entries
+_COMPACT_SLACK = 256
+
+
+def normalize_question(question: str) -> str:
+    """Normalise a question so trivially different phrasings share a cache entry"""
+    text = unicodedata.normalize("NFC", question or "").lower()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip(" ?.!")
+
+
+def make_cache_key(content_hash: str, sheet_name: str, question: str, model: str, prompt_version: str) -> str:
+    """Build the cache key for (file content, sheet, question, model, prompt version)"""
+    raw = "\x1f".join([content_hash, sheet_name, normalize_question(question), model, prompt_version])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _line(key: str, entry: Optional[Dict[str, Any]] = None, drop: bool = False) -> bytes:
+    """A stored entry, a dropped key, or with neither a read of the key (which makes it the most recently used)"""
+    if drop:
+        item: Dict[str, Any] = {"key": key, "drop": True}
+    else:
+        item = {"key": key} if entry is None else {"key": key, "entry": entry}
+    return (json.dumps(item, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class AnswerCache:
+    """LRU cache of agent answers with TTL, persisted as an append-only JSONL log.
+
+    Entries are ordered oldest-first; reads move an entry to the end so the
+    least recently used ones are evicted when ``max_entries`` is exceeded.
+    Each put appends one line, so storing an answer costs its own size rather
+    than a rewrite of every cached trace; a hit appends just its key and a
+    dropped entry a drop line. Expired and evicted entries are not written:
+    loading replays the log, skips what has expired and keeps the
+    ``max_entries`` most recently used. The log is rewritten with just the
+    live entries once it has grown well past them. A cache file of the former single-JSON
+    format next to the log is converted on load.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int, max_entries: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lines = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _keep(self, key: str, entry: Dict[str, Any], now: float, trim: bool = True) -> None:
+        if now - entry.get("storedAt", 0) > self.ttl_seconds:
+            self._entries.pop(key, None)
+            return
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        if trim:
+            self._trim()
+
+    def _trim(self) -> None:
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load(self) -> None:
+        legacy_path = f"{os.path.splitext(self.path)[0]}.json"
+        if not os.path.exists(self.path) and legacy_path != self.path and os.path.exists(legacy_path):
+            self._load_legacy(legacy_path)
+            return
+        if not os.path.exists(self.path):
+            return
+        try:
+            self._replay()
+            logger.info(f"Loaded {len(self._entries)} cached answers from {self.path}")
+        except Exception as e:
+            logger.warning(f"Could not load answer cache {self.path}: {e}")
+            self._entries.clear()
+
+    def _replay(self) -> None:
+        """Read the entries of the log, as appended by every process"""
+        now = time.time()
+        self._entries.clear()
+        self._lines = 0
+        with open(self.path, "rb") as f:
+            for raw in f:
+                self._lines += 1
+                try:
+                    item = json.loads(raw)
+                except ValueError:
+                    continue  # a write cut short by a crash
+                if "entry" in item:
+                    self._keep(item["key"], item["entry"], now, trim=False)
+                elif item.get("drop"):
+                    self._entries.pop(item.get("key"), None)
+                elif item.get("key") in self._entries:
+                    self._entries.move_to_end(item["key"])
+        # Trimmed once the whole log is read: a later line may drop an entry that would have evicted another
+        self._trim()
+
+    def _load_legacy(self, legacy_path: str) -> None:
+        try:
+            with open(legacy_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            now = time.time()
+            for key, entry in data.get("entries", []):
+                self._keep(key, entry, now)
+        except Exception as e:
+            logger.warning(f"Could not load answer cache {legacy_path}: {e}")
+            self._entries.clear()
+        if self._rewrite(merge=False):
+            os.remove(legacy_path)
+            logger.info(f"Converted {len(self._entries)} cached answers from {legacy_path} to {self.path}")
+
+    def _rewrite(self, merge: bool = True) -> bool:
+        """Replace the log with one line per live entry.
+
+        With ``merge``, the log is read again under its exclusive lock first,
+        so answers other processes appended since this one loaded are kept.
+        """
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with exclusive_lock(self.path):
+                if merge and os.path.exists(self.path):
+                    self._replay()
+                with open(tmp_path, "wb") as f:
+                    f.writelines(_line(key, entry) for key, entry in self._entries.items())
+                os.replace(tmp_path, self.path)
+            self._lines = len(self._entries)
+            return True
+        except Exception as e:
+            logger.warning(f"Could not persist answer cache {self.path}: {e}")
+            return False
+
+    def _append(self, line: bytes) -> None:
+        try:
+            if not append_line(self.path, line, shared_lock=True):
+                self._rewrite(merge=False)  # no log yet, or it was removed
+                return
+        except OSError as e:
+            logger.warning(f"Could not persist answer cache {self.path}: {e}")
+            return
+        self._lines += 1
+        if self._lines > 2 * len(self._entries) + _COMPACT_SLACK:
+            self._rewrite()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry.get("storedAt", 0) > self.ttl_seconds:
+                # Not written: loading skips expired entries anyway
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self._append(_line(key))
+            return entry
+
+    def put(self, key: str, output: str, trace: Optional[str] = None, file_id: Optional[str] = None) -> None:
+        """Store an answer; ``file_id`` is the upload it was asked about, so it can be dropped with that file"""
+        with self._lock:
+            entry = {"output": output, "trace": trace, "storedAt": time.time()}
+            if file_id is not None:
+                entry["fileId"] = file_id
+            self._keep(key, entry, entry["storedAt"])
+            self._append(_line(key, entry))
+
+    def drop_file(self, file_id: str) -> int:
+        """Drop the answers stored for a file; returns how many were dropped.
+
+        Keys follow the file's content, so an answer also shared by an identical
+        upload is dropped when the one that stored it last is deleted.
+        """
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if entry.get("fileId") == file_id]
+            for key in keys:
+                del self._entries[key]
+                self._append(_line(key, drop=True))
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._rewrite(merge=False)
+
+
+_answer_cache: Optional[AnswerCache] = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    """Get the process-wide answer cache instance"""
+    global _answer_cache
+    with _answer_cache_lock:
+        if _answer_cache is None or os.path.dirname(_answer_cache.path) != settings.storage_dir:
+            _answer_cache = AnswerCache(
+                path=os.path.join(settings.storage_dir, "answer_cache.jsonl"),
+                ttl_seconds=settings.answer_cache_ttl_seconds,
+                max_entries=settings.answer_cache_max_entries,
+            )
+        return _answer_cache
@@ -0,0 +1,50 @@
+import gzip
+import hashlib
+import logging
+import os
+import re
+from typing import Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger("app.services.artifacts")
+
+_ARTIFACT_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _artifacts_dir() -> str:
+    path = os.path.join(settings.storage_dir, "artifacts")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _artifact_path(artifact_id: str) -> str:
+    return os.path.join(_artifacts_dir(), f"{artifact_id}.txt.gz")
+
+
+def save_artifact(text: str) -> str:
+    """Store a large text blob gzip-compressed and return its ID.
+
+    IDs are derived from the content, so the same output produced twice is stored once.
+    """
+    data = text.encode("utf-8")
+    artifact_id = hashlib.sha256(data).hexdigest()[:32]
+    path = _artifact_path(artifact_id)
+    if not os.path.exists(path):
+        tmp_path = path + ".tmp"
+        with gzip.open(tmp_path, "wb", compresslevel=6) as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        logger.debug(f"Stored artifact {artifact_id} ({len(data)} bytes, {os.path.getsize(path)} compressed)")
+    return artifact_id
+
+
+def load_artifact(artifact_id: str) -> Optional[str]:
+    """Return the text of an artifact, or None if the ID is unknown or malformed"""
+    if not _ARTIFACT_ID.match(artifact_id):
+        return None
+    path = _artifact_path(artifact_id)
+    if not os.path.exists(path):
+        return None
+    with gzip.open(path, "rb") as f:
+        return f.read().decode("utf-8")
@@ -1,6 +1,11 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.prompt_values import PromptValue
+
+from app.core.config import settings
+from app.services.artifacts import save_artifact
+from app.services.plan_cache import is_tool_error
 
 
 class TranscriptCallbackHandler(BaseCallbackHandler):
@@ -8,10 +13,25 @@ class TranscriptCallbackHandler(BaseCallbackHandler):
 
     Captures tool invocations and outputs similar to verbose=True console logs,
     so we can return them to clients alongside the final answer.
+
+    Tool outputs longer than ``max_inline_chars`` are stored as compressed
+    artifacts and only a preview plus a reference is kept; once the inline
+    output reaches ``max_chars``, further outputs are kept as references only.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, max_inline_chars: Optional[int] = None, max_chars: Optional[int] = None) -> None:
         self._lines: List[str] = []
+        self.tool_calls = 0
+        self.max_inline_chars = settings.trace_inline_max_chars if max_inline_chars is None else max_inline_chars
+        self.max_chars = settings.trace_max_chars if max_chars is None else max_chars
+        self._inline_chars = 0
+        self.artifacts: List[str] = []
+        # Python code that ran without error, in order, and the raw output of the last step
+        self.code_steps: List[str] = []
+        self.last_code_output: Optional[str] = None
+        self._pending_code: Dict[Any, str] = {}
+        # Answers that relied on other tools (e.g. id_lookup) cannot be replayed from the code steps alone
+        self.used_other_tools = False
 
     # Chains / Agents
     def on_chain_start(self, serialized: Dict[str, Any], inputs: Dict[str, Any], **kwargs: Any) -> None:  # type: ignore[override]
@@ -25,8 +45,10 @@ class TranscriptCallbackHandler(BaseCallbackHandler):
                 out_text = outputs.get("output") or outputs.get("answer")
                 if out_text:
                     self._lines.append(str(out_text))
-            else:
-                self._lines.append(str(outputs))
+            elif not isinstance(outputs, PromptValue):
+                # Intermediate runnables echo message lists that repeat the tool outputs;
+                # formatted prompts repeat the whole system prompt and are left out
+                self._lines.append(self._bounded(str(outputs)))
         except Exception:
             pass
 
@@ -36,11 +58,44 @@ class TranscriptCallbackHandler(BaseCallbackHandler):
             name = serialized.get("name") or "tool"
         except Exception:
             name = "tool"
+        self.tool_calls += 1
         self._lines.append(f"Invoking: `{name}` with `{input_str}`")
+        if name == "python_repl_ast":
+            inputs = kwargs.get("inputs")
+            code = inputs.get("query") if isinstance(inputs, dict) else input_str
+            if code:
+                self._pending_code[kwargs.get("run_id")] = code
+        else:
+            self.used_other_tools = True
 
     def on_tool_end(self, output: str, **kwargs: Any) -> None:  # type: ignore[override]
+        code = self._pending_code.pop(kwargs.get("run_id"), None)
+        text = str(getattr(output, "content", output))
+        if code is not None and not is_tool_error(text):
+            self.code_steps.append(code)
+            self.last_code_output = text
         if output:
-            self._lines.append(str(output))
+            self._lines.append(self._bounded(str(output)))
+
+    def _bounded(self, text: str) -> str:
+        budget = min(self.max_inline_chars, max(0, self.max_chars - self._inline_chars))
+        if len(text) <= budget:
+            self._inline_chars += len(text)
+            return text
+        try:
+            artifact_id = save_artifact(text)
+        except Exception as e:
+            return text[:budget] + f"\n… [output truncated: {len(text)} chars, full output could not be stored: {e}]"
+        self.artifacts.append(artifact_id)
+        self._inline_chars += budget
+        return (
+            text[:budget]
+            + f"\n… [output truncated: showing {budget} of {len(text)} chars, full output: /api/artifacts/{artifact_id}]"
+        )
+
+    def note(self, text: str) -> None:
+        """Add a free-form line to the transcript"""
+        self._lines.append(text)
 
     # LLMs (optional - keep minimal to avoid overly verbose traces)
     def on_llm_error(self, error: Exception, **kwargs: Any) -> None:  # type: ignore[override]
@@ -0,0 +1,47 @@
+import logging
+import os
+import shutil
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.services.answer_cache import get_answer_cache
+from app.services.id_index import drop_cached_indexes
+from app.services.rollups import drop_cached_cubes
+from app.services.session_store import delete_file_sessions
+from app.services.sheet_cache import get_sheet_cache
+from app.services.storage import forget_content_hash
+from app.services.text_index import drop_cached_text_indexes
+
+logger = logging.getLogger("app.services.file_cleanup")
+
+
+def purge_file_data(file_id: str, file_path: Optional[str] = None) -> Dict[str, Any]:
+    """Remove everything attached to an uploaded file once the file itself is deleted.
+
+    That is its sessions (with their traces and workspaces), the data derived
+    from it in ``storage/derived/{fileId}``, its RAG vector data, its cached
+    answers and the in-memory caches of its sheets. Nothing else in storage is
+    scanned, so the cost follows what the file actually has attached.
+
+    Cached plans are kept: they are keyed by schema, not by file, and exist to
+    answer the next upload of the same report. Trace artifacts are kept too;
+    they are shared by content across traces and are not tied to one file.
+    """
+    deleted_sessions = delete_file_sessions(file_id)
+    dropped_answers = get_answer_cache().drop_file(file_id)
+    if file_path:
+        get_sheet_cache().drop_file(file_path)
+        drop_cached_indexes(file_path)
+        drop_cached_cubes(file_path)
+        drop_cached_text_indexes(file_path)
+        forget_content_hash(file_path)
+
+    removed = []
+    for name in ("derived", "rag_data"):
+        path = os.path.join(settings.storage_dir, name, file_id)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(name)
+    logger.info(f"Purged file {file_id}: {deleted_sessions} sessions, {dropped_answers} cached answers, "
+                f"{removed or 'no'} data directories")
+    return {"deletedSessions": deleted_sessions, "droppedAnswers": dropped_answers, "removedData": removed}
@@ -0,0 +1,289 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from langchain_core.tools import StructuredTool
+from pydantic import BaseModel, Field
+
+from app.core.config import settings
+from app.services.plan_cache import format_result
+from app.services.prompt_builder import tokenize
+from app.services.storage import derived_dir, file_content_hash, file_id_from_path, safe_sheet_name
+
+logger = logging.getLogger("app.services.id_index")
+
+# Bump when key normalisation or detection changes so stored indexes are rebuilt
+INDEX_VERSION = 2
+# Identifier columns of the trip reports (see back_end_test/data_process.py)
+KNOWN_ID_COLUMNS = ("Mã chuyến", "Mã đơn hàng", "Mã điểm lấy", "Mã điểm giao", "Mã nhóm hàng", "Mã hàng hóa")
+# Words that mark a column as an identifier when its name starts or ends with them
+_ID_WORDS = {"ma", "id", "code", "key", "sku"}
+# Rows shown in the id_lookup tool output; larger results are summarised
+LOOKUP_MAX_ROWS = 50
+
+
+def looks_like_id_name(column: str) -> bool:
+    tokens = tokenize(column)
+    return bool(tokens) and (tokens[0] in _ID_WORDS or tokens[-1] in _ID_WORDS)
+
+
+def detect_id_columns(df: pd.DataFrame, max_columns: int) -> List[str]:
+    """Columns worth indexing for exact-match lookups, known identifier columns first.
+
+    Besides the known and ID-named columns, any text column whose values are
+    all distinct is taken as an identifier.
+    """
+    candidates = [c for c in KNOWN_ID_COLUMNS if c in df.columns]
+    candidates += [c for c in df.columns if c not in candidates and isinstance(c, str) and looks_like_id_name(c)]
+    for c in df.columns:
+        if len(candidates) >= max_columns:
+            break
+        if c in candidates or not isinstance(c, str):
+            continue
+        series = df[c]
+        if (series.dtype == object or str(series.dtype) == "string") and series.notna().sum() > 1 and series.is_unique:
+            candidates.append(c)
+    # Dates and booleans are filtered with comparisons, not looked up by key
+    usable = [c for c in candidates if df[c].dtype.kind not in "Mmb" and str(df[c].dtype) != "boolean"]
+    return usable[:max_columns]
+
+
+def normalize_key(value: Any) -> str:
+    """Key form shared by indexed values and lookup values: 'A1 ' -> 'A1', 123.0 -> '123'"""
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _normalize_series(series: pd.Series) -> pd.Series:
+    if series.dtype.kind == "f":
+        non_null = series.dropna()
+        if len(non_null) and (non_null == non_null.round()).all():
+            series = series.astype("Int64")
+    return series.astype("object").where(series.notna(), None).map(lambda v: None if v is None else str(v).strip())
+
+
+class ColumnIndex:
+    """Exact-match index of one column: row positions grouped by key.
+
+    Keys and row positions are kept as two arrays sorted by key, so a lookup
+    is a binary search followed by a slice of the matching positions, and the
+    index is stored and reloaded as plain Parquet columns.
+    """
+
+    def __init__(self, keys: np.ndarray, rows: np.ndarray):
+        self.keys = keys
+        self.rows = rows
+
+    @classmethod
+    def build(cls, series: pd.Series) -> "ColumnIndex":
+        keys = _normalize_series(series.reset_index(drop=True))
+        keys = keys[keys.notna()]
+        order = np.argsort(keys.to_numpy(dtype=object), kind="stable")
+        return cls(keys.to_numpy(dtype=object)[order], keys.index.to_numpy(dtype=np.int64)[order])
+
+    def positions(self, values: Iterable[Any]) -> np.ndarray:
+        """Row positions whose key equals any of ``values``, in row order"""
+        found = []
+        for key in dict.fromkeys(normalize_key(v) for v in values if not pd.isna(v)):
+            start = np.searchsorted(self.keys, key, side="left")
+            end = np.searchsorted(self.keys, key, side="right")
+            if end > start:
+                found.append(self.rows[start:end])
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(found))
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.rows.nbytes + sum(len(k) for k in self.keys) + self.keys.nbytes)
+
+
+class SheetIndex:
+    """The column indexes of one preprocessed sheet"""
+
+    def __init__(self, columns: Dict[str, ColumnIndex]):
+        self.columns = columns
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, max_columns: int) -> "SheetIndex":
+        return cls({c: ColumnIndex.build(df[c]) for c in detect_id_columns(df, max_columns)})
+
+    def lookup(self, df: pd.DataFrame, column: str, values: Iterable[Any]) -> pd.DataFrame:
+        """Rows of ``df`` whose ``column`` equals any of ``values``"""
+        if column not in self.columns:
+            raise KeyError(f"Column '{column}' is not indexed; indexed columns: {list(self.columns)}")
+        if isinstance(values, (str, bytes)) or not isinstance(values, Iterable):
+            values = [values]
+        return df.iloc[self.columns[column].positions(values)]
+
+    def join(self, df: pd.DataFrame, column: str, other: pd.DataFrame, other_column: Optional[str] = None) -> pd.DataFrame:
+        """Inner join of ``other`` with the rows of ``df`` matching its keys, without scanning ``df``"""
+        other_column = other_column or column
+        matches = self.lookup(df, column, other[other_column].dropna().unique())
+        left = other.assign(_key=other[other_column].map(normalize_key))
+        right = matches.assign(_key=_normalize_series(matches[column]).to_numpy())
+        return left.merge(right, on="_key", suffixes=("", "_sheet")).drop(columns="_key")
+
+    def to_frame(self) -> pd.DataFrame:
+        parts = [pd.DataFrame({"column": c, "key": idx.keys, "row": idx.rows}) for c, idx in self.columns.items()]
+        if not parts:
+            return pd.DataFrame({"column": pd.Series(dtype=object), "key": pd.Series(dtype=object), "row": pd.Series(dtype=np.int64)})
+        return pd.concat(parts, ignore_index=True)
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, columns: List[str]) -> "SheetIndex":
+        result: Dict[str, ColumnIndex] = {}
+        for c in columns:
+            part = frame[frame["column"] == c]
+            result[c] = ColumnIndex(part["key"].to_numpy(dtype=object), part["row"].to_numpy(dtype=np.int64))
+        return cls(result)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(idx.nbytes for idx in self.columns.values())
+
+
+def index_path(file_path: str, sheet_name: str) -> str:
+    return os.path.join(derived_dir(file_id_from_path(file_path)), f"index_{safe_sheet_name(sheet_name)}.parquet")
+
+
+def _meta_path(file_path: str, sheet_name: str) -> str:
+    return os.path.join(derived_dir(file_id_from_path(file_path)), f"index_{safe_sheet_name(sheet_name)}.json")
+
+
+def load_index(file_path: str, sheet_name: str, rows: int) -> Optional[SheetIndex]:
+    """Return the stored index of a sheet if it was built from the current file content"""
+    meta_path = _meta_path(file_path, sheet_name)
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if (meta.get("sourceHash") != file_content_hash(file_path) or meta.get("version") != INDEX_VERSION
+                or meta.get("sheetName") != sheet_name or meta.get("rows") != rows):
+            return None
+        return SheetIndex.from_frame(pd.read_parquet(index_path(file_path, sheet_name)), meta["columns"])
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable index of '{sheet_name}' in {os.path.basename(file_path)}: {e}")
+        return None
+
+
+def write_index(file_path: str, sheet_name: str, index: SheetIndex, rows: int) -> bool:
+    """Store a sheet index next to the sheet's snapshot"""
+    path = index_path(file_path, sheet_name)
+    meta_path = _meta_path(file_path, sheet_name)
+    try:
+        tmp_path = f"{path}.tmp"
+        index.to_frame().to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+        tmp_meta = f"{meta_path}.tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({"sourceHash": file_content_hash(file_path), "version": INDEX_VERSION, "sheetName": sheet_name,
+                       "rows": rows, "columns": list(index.columns)}, f, ensure_ascii=False)
+        os.replace(tmp_meta, meta_path)
+        return True
+    except Exception as e:
+        logger.info(f"Could not store index of '{sheet_name}' of {os.path.basename(file_path)}: {e}")
+        return False
+
+
+_indexes: "OrderedDict[Tuple, SheetIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+_MAX_CACHED_INDEXES = 16
+
+
+def get_sheet_index(file_path: str, sheet_name: str, df: pd.DataFrame) -> Optional[SheetIndex]:
+    """Index of a preprocessed sheet: from memory, from its stored copy, or built and stored.
+
+    ``df`` must be the preprocessed sheet as returned by the sheet cache, since
+    the index refers to its row positions.
+    """
+    if not settings.id_index_enabled:
+        return None
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    key = (file_path, sheet_name, stat.st_mtime, stat.st_size, len(df))
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+
+    index = load_index(file_path, sheet_name, len(df))
+    if index is None:
+        index = SheetIndex.build(df, settings.id_index_max_columns)
+        write_index(file_path, sheet_name, index, len(df))
+        logger.info(f"Indexed {list(index.columns)} of '{sheet_name}' ({index.nbytes // 1024} KiB)")
+
+    with _indexes_lock:
+        _indexes[key] = index
+        while len(_indexes) > _MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def drop_cached_indexes(file_path: str) -> None:
+    """Forget every cached index of a file"""
+    with _indexes_lock:
+        for key in [k for k in _indexes if k[0] == file_path]:
+            del _indexes[key]
+
+
+def render_index_prompt(index: Optional[SheetIndex]) -> str:
+    if index is None or not index.columns:
+        return ""
+    columns = ", ".join(f"'{c}'" for c in index.columns)
+    return (
+        f"Indexed identifier columns: {columns}. For exact-value lookups on them use the id_lookup tool, or "
+        "lookup(column, values) / index_join(column, other_df, other_column) in Python, instead of boolean masks over df."
+    )
+
+
+class _LookupInput(BaseModel):
+    column: str = Field(description="Indexed identifier column to search")
+    values: List[str] = Field(description="One or more exact key values to find")
+
+
+def build_lookup_tool(df: pd.DataFrame, index: SheetIndex) -> StructuredTool:
+    """Agent tool returning the rows of ``df`` whose indexed column equals one of the given values"""
+
+    def _lookup(column: str, values: List[str]) -> str:
+        try:
+            rows = index.lookup(df, column, values)
+        except KeyError as e:
+            return f"KeyError: {e}"
+        if rows.empty:
+            return f"No rows with {column} in {values}"
+        return f"{len(rows)} matching rows:\n" + format_result(rows, max_rows=LOOKUP_MAX_ROWS)
+
+    return StructuredTool.from_function(
+        func=_lookup,
+        name="id_lookup",
+        description=(
+            "Exact-match lookup of rows by identifier using a prebuilt index, much faster than filtering df. "
+            f"Indexed columns: {list(index.columns)}."
+        ),
+        args_schema=_LookupInput,
+    )
+
+
+def index_functions(df: pd.DataFrame, index: SheetIndex) -> Dict[str, Any]:
+    """Lookup helpers bound to ``df``, for the agent's Python namespace"""
+
+    def lookup(column: str, values: Any) -> pd.DataFrame:
+        """Rows of df whose ``column`` equals any of ``values`` (one value or a list)"""
+        return index.lookup(df, column, values)
+
+    def index_join(column: str, other: pd.DataFrame, other_column: Optional[str] = None) -> pd.DataFrame:
+        """Inner join of ``other`` with the rows of df matching its ``other_column`` keys"""
+        return index.join(df, column, other, other_column)
+
+    return {"lookup": lookup, "index_join": index_join}
@@ -0,0 +1,68 @@
+import os
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: rewrites and appends are then only ordered within one process
+    fcntl = None
+
+
+def append_line(path: str, data: bytes, fsync: bool = False, shared_lock: bool = False,
+                on_written: Optional[Callable[[], None]] = None) -> bool:
+    """Append ``data`` (whole lines) to an existing file; False if the file does not exist.
+
+    With O_APPEND each write lands at the current end of the file, even with
+    concurrent writers. If a crashed write left a partial last line, the new
+    lines start on a fresh one instead of being glued to it. With
+    ``shared_lock``, the write holds a shared lock on the file so it cannot
+    interleave with a rewrite holding the exclusive lock (see
+    :func:`exclusive_lock`), and it is retried on the new file if a rewrite
+    replaced the old one in the meantime. ``on_written`` runs after the write,
+    while the lock is still held.
+    """
+    while True:
+        try:
+            # No O_CREAT: a file deleted in the meantime must not come back without its header
+            fd = os.open(path, os.O_RDWR | os.O_APPEND)
+        except FileNotFoundError:
+            return False
+        try:
+            if shared_lock and fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_SH)
+                try:
+                    replaced = os.stat(path).st_ino != os.fstat(fd).st_ino
+                except FileNotFoundError:
+                    return False
+                if replaced:
+                    continue
+            size = os.fstat(fd).st_size
+            if size and os.pread(fd, 1, size - 1) != b"\n":
+                data = b"\n" + data
+            written = 0
+            while written < len(data):
+                written += os.write(fd, data[written:])
+            if fsync:
+                os.fsync(fd)
+            if on_written is not None:
+                on_written()
+            return True
+        finally:
+            # Closing the descriptor also releases the lock
+            os.close(fd)
+
+
+@contextmanager
+def exclusive_lock(path: str):
+    """Hold the exclusive lock of an existing file (if any) while it is rewritten and replaced"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        yield
+        return
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
@@ -0,0 +1,288 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+
+from app.core.config import settings
+from app.services.rate_limiter import (
+    RateLimitCallbackHandler,
+    RateLimitedEmbeddings,
+    TokenBucket,
+    get_rate_limiter,
+    is_quota_error,
+)
+
+logger = logging.getLogger("app.services.key_pool")
+
+
+def mask_key(key: str) -> str:
+    return f"…{key[-4:]}" if len(key) > 4 else "…"
+
+
+class _KeyState:
+    def __init__(self, key: str, requests_per_minute: int):
+        self.key = key
+        self.bucket = TokenBucket(requests_per_minute)
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.tokens = 0
+        self.quota_errors = 0
+        self.errors = 0
+
+
+class ApiKeyPool:
+    """Round-robin pool of Gemini API keys with per-key accounting and 429 cooldown.
+
+    Chat models and embeddings are created once per key through the given
+    factories and reused, so rotating keys does not rebuild clients.
+    """
+
+    def __init__(
+        self,
+        keys: Sequence[str],
+        chat_model_factory: Callable[[str, str], BaseChatModel],
+        embeddings_factory: Callable[[str, str], Embeddings],
+        requests_per_minute: int,
+        cooldown_seconds: float,
+    ):
+        if not keys:
+            raise ValueError("ApiKeyPool needs at least one API key")
+        self._states = [_KeyState(k, requests_per_minute) for k in keys]
+        self._chat_model_factory = chat_model_factory
+        self._embeddings_factory = embeddings_factory
+        self.cooldown_seconds = cooldown_seconds
+        self._cursor = 0
+        self._lock = threading.Lock()
+        self._chat_models: Dict[tuple, BaseChatModel] = {}
+        self._embeddings: Dict[tuple, Embeddings] = {}
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    @property
+    def keys(self) -> List[str]:
+        return [s.key for s in self._states]
+
+    def acquire_key(self) -> str:
+        """Pick the next key in round-robin order that is not cooling down and has request budget.
+
+        If every key is cooling down, waits for the one that recovers first.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                best, best_wait = None, None
+                for offset in range(len(self._states)):
+                    state = self._states[(self._cursor + offset) % len(self._states)]
+                    wait = max(state.cooldown_until - now, state.bucket.wait_time(1, now))
+                    if wait <= 0:
+                        best, best_wait = state, 0.0
+                        break
+                    if best_wait is None or wait < best_wait:
+                        best, best_wait = state, wait
+                if best_wait == 0.0:
+                    best.bucket.consume(1)
+                    best.requests += 1
+                    self._cursor = (self._states.index(best) + 1) % len(self._states)
+                    return best.key
+            time.sleep(min(best_wait, 1.0))
+
+    def _state(self, key: str) -> _KeyState:
+        for state in self._states:
+            if state.key == key:
+                return state
+        raise KeyError(mask_key(key))
+
+    def report_success(self, key: str, tokens: int = 0) -> None:
+        with self._lock:
+            self._state(key).tokens += tokens
+
+    def report_error(self, key: str, error: BaseException) -> None:
+        with self._lock:
+            state = self._state(key)
+            if is_quota_error(error):
+                state.quota_errors += 1
+                state.cooldown_until = time.monotonic() + self.cooldown_seconds
+                logger.warning(f"API key {mask_key(key)} hit its quota, cooling down for {self.cooldown_seconds}s")
+            else:
+                state.errors += 1
+
+    def chat_model(self, key: str, model_name: str) -> BaseChatModel:
+        with self._lock:
+            model = self._chat_models.get((key, model_name))
+            if model is None:
+                model = self._chat_model_factory(key, model_name)
+                self._chat_models[(key, model_name)] = model
+            return model
+
+    def embeddings(self, key: str, model_name: str) -> Embeddings:
+        with self._lock:
+            embeddings = self._embeddings.get((key, model_name))
+            if embeddings is None:
+                embeddings = self._embeddings_factory(key, model_name)
+                self._embeddings[(key, model_name)] = embeddings
+            return embeddings
+
+    def get_usage(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            now = time.monotonic()
+            return [
+                {
+                    "key": mask_key(s.key),
+                    "requests": s.requests,
+                    "tokens": s.tokens,
+                    "quotaErrors": s.quota_errors,
+                    "errors": s.errors,
+                    "coolingDownForSeconds": round(max(0.0, s.cooldown_until - now), 1),
+                }
+                for s in self._states
+            ]
+
+
+def _total_tokens(result: ChatResult) -> int:
+    total = 0
+    for generation in result.generations:
+        usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+        total += int(usage.get("total_tokens", 0))
+    return total
+
+
+class PooledChatModel(BaseChatModel):
+    """Chat model that sends each call through the next healthy key of an :class:`ApiKeyPool`.
+
+    A quota error on one key puts that key on cooldown and retries the call on
+    another key; only when every key has failed is the error raised.
+    """
+
+    pool: Any
+    model_name: str
+
+    @property
+    def _llm_type(self) -> str:
+        return "pooled-chat-model"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if len(self.pool) > 1:
+            # Surface 429s immediately so the next key is tried instead of the client's own backoff
+            kwargs.setdefault("max_retries", 1)
+        last_error: Optional[BaseException] = None
+        for _ in range(len(self.pool)):
+            key = self.pool.acquire_key()
+            model = self.pool.chat_model(key, self.model_name)
+            try:
+                result = model._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception as e:
+                self.pool.report_error(key, e)
+                if not is_quota_error(e):
+                    raise
+                last_error = e
+                continue
+            self.pool.report_success(key, _total_tokens(result))
+            return result
+        raise last_error  # type: ignore[misc]
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        # Let the provider model format the tool schemas, then bind them to the pooled model
+        template = self.pool.chat_model(self.pool.keys[0], self.model_name)
+        return self.bind(**template.bind_tools(tools, **kwargs).kwargs)
+
+
+class PooledEmbeddings(Embeddings):
+    """Embeddings that rotate across the keys of an :class:`ApiKeyPool`"""
+
+    def __init__(self, pool: ApiKeyPool, model_name: str):
+        self.pool = pool
+        self.model_name = model_name
+
+    def _call(self, method: str, arg: Any) -> Any:
+        last_error: Optional[BaseException] = None
+        for _ in range(len(self.pool)):
+            key = self.pool.acquire_key()
+            try:
+                result = getattr(self.pool.embeddings(key, self.model_name), method)(arg)
+            except Exception as e:
+                self.pool.report_error(key, e)
+                if not is_quota_error(e):
+                    raise
+                last_error = e
+                continue
+            self.pool.report_success(key)
+            return result
+        raise last_error  # type: ignore[misc]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._call("embed_documents", texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._call("embed_query", text)
+
+
+def _google_chat_model(key: str, model_name: str) -> BaseChatModel:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model=model_name, google_api_key=key)
+
+
+def _google_embeddings(key: str, model_name: str) -> Embeddings:
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    return GoogleGenerativeAIEmbeddings(model=model_name, google_api_key=key)
+
+
+_key_pool: Optional[ApiKeyPool] = None
+_key_pool_lock = threading.Lock()
+
+
+def get_key_pool() -> Optional[ApiKeyPool]:
+    """Get the process-wide key pool, or None when no API key is configured"""
+    global _key_pool
+    with _key_pool_lock:
+        if _key_pool is None and settings.google_api_keys:
+            _key_pool = ApiKeyPool(
+                settings.google_api_keys,
+                chat_model_factory=_google_chat_model,
+                embeddings_factory=_google_embeddings,
+                requests_per_minute=settings.gemini_requests_per_minute,
+                cooldown_seconds=settings.gemini_key_cooldown_seconds,
+            )
+            logger.info(f"Gemini key pool initialised with {len(_key_pool)} key(s)")
+        return _key_pool
+
+
+def set_key_pool(pool: Optional[ApiKeyPool]) -> None:
+    """Replace the process-wide key pool (used by tests with stub models)"""
+    global _key_pool
+    with _key_pool_lock:
+        _key_pool = pool
+
+
+def create_chat_model(model_name: str) -> BaseChatModel:
+    """Rate-limited chat model drawing from the shared key pool"""
+    pool = get_key_pool()
+    if pool is None:
+        raise RuntimeError("GOOGLE_API_KEY is not configured")
+    limiter = get_rate_limiter()
+    return PooledChatModel(
+        pool=pool,
+        model_name=model_name,
+        rate_limiter=limiter,
+        callbacks=[RateLimitCallbackHandler(limiter)],
+    )
+
+
+def create_embeddings(model_name: str) -> Embeddings:
+    """Rate-limited embeddings drawing from the shared key pool"""
+    pool = get_key_pool()
+    if pool is None:
+        raise RuntimeError("GOOGLE_API_KEY is not configured")
+    return RateLimitedEmbeddings(PooledEmbeddings(pool, model_name), get_rate_limiter())
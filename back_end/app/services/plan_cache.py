@@ -0,0 +1,288 @@
+import hashlib
+import json
+import logging
+import numbers
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from langchain_experimental.tools.python.tool import PythonAstREPLTool
+
+from app.core.config import settings
+from app.services.answer_cache import normalize_question
+from app.services.jsonl import append_line, exclusive_lock
+from app.services.sheet_cache import private_copy
+
+logger = logging.getLogger("app.services.plan_cache")
+
+PLAN_VERSION = 1
+# PythonAstREPLTool reports failures as "<ExceptionType>: <message>" instead of raising
+_TOOL_ERROR = re.compile(r"^[A-Za-z_][A-Za-z0-9_.]*(Error|Exception|Exit|Interrupt): ")
+# The log is compacted once it holds this many lines more than twice the live plans
+_COMPACT_SLACK = 256
+
+
+def schema_fingerprint(df: pd.DataFrame) -> str:
+    """Hash of the column names and dtypes of a preprocessed sheet"""
+    raw = json.dumps([[str(c), str(t)] for c, t in df.dtypes.items()], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def make_plan_key(df: pd.DataFrame, question: str) -> str:
+    raw = "\x1f".join([schema_fingerprint(df), normalize_question(question), str(PLAN_VERSION)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def is_tool_error(output: Any) -> bool:
+    return isinstance(output, str) and bool(_TOOL_ERROR.match(output))
+
+
+def describe_shape(value: Any) -> Dict[str, Any]:
+    """Shape of a result that must stay the same when the plan runs on new data"""
+    if isinstance(value, pd.DataFrame):
+        return {"type": "DataFrame", "columns": [str(c) for c in value.columns]}
+    if isinstance(value, pd.Series):
+        return {"type": "Series", "name": None if value.name is None else str(value.name)}
+    if isinstance(value, (bool, np.bool_)):
+        return {"type": "bool"}
+    if isinstance(value, (numbers.Number, np.number)):
+        return {"type": "number"}
+    if isinstance(value, str):
+        return {"type": "text"}
+    return {"type": type(value).__name__}
+
+
+def run_steps(df: pd.DataFrame, steps: List[str]) -> Tuple[bool, Any]:
+    """Run the code steps against a fresh namespace; returns (ok, value of the last step).
+
+    ``df`` is shared: the steps get a private copy, so they cannot write back to it.
+    """
+    tool = PythonAstREPLTool(locals={"df": private_copy(df)})
+    value: Any = None
+    for code in steps:
+        value = tool._run(code)
+        if is_tool_error(value):
+            return False, value
+    return True, value
+
+
+def format_result(value: Any, max_rows: int = 50) -> str:
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        head = value.head(max_rows)
+        # tabulate cannot format pd.NA from nullable dtypes
+        text = head.astype(object).where(head.notna(), None).to_markdown()
+        if len(value) > max_rows:
+            text += f"\n\n… {len(value) - max_rows} more rows"
+        return text
+    return str(value).strip()
+
+
+def build_plan(steps: List[str], final_output: str) -> Optional[Dict[str, Any]]:
+    """Turn the successful code steps of an agent run into a replayable plan.
+
+    Nothing runs here: the plan is stored pending, with the output the agent
+    saw, and checked by its first replay (see :func:`replay_plan`), so an
+    answer never pays for a second execution of its code.
+    """
+    if not steps:
+        return None
+    return {"steps": steps, "expected": final_output}
+
+
+def replay_plan(df: pd.DataFrame, plan: Dict[str, Any]) -> Tuple[bool, Any, Optional[Dict[str, Any]]]:
+    """Run a cached plan on new data; fails if it errors or the result shape differs.
+
+    Returns (ok, value, validated plan). A pending plan is validated on this
+    first replay: its result must match what the agent saw or, on other data,
+    come out the same from a second run, so code relying on state outside
+    ``df`` or on randomness is never replayed. The validated plan (with the
+    shape later replays must keep) is returned for the caller to store; a
+    pending plan failing validation comes back as None and should be dropped.
+    """
+    ok, value = run_steps(df, plan["steps"])
+    if "shape" not in plan:
+        if ok and str(value) != plan["expected"]:
+            # Not the data the agent saw: the code must at least give the same result twice
+            again_ok, again = run_steps(df, plan["steps"])
+            ok = again_ok and str(again) == str(value)
+        if not ok:
+            logger.info(f"Plan failed validation on its first replay: {value}")
+            return False, value, None
+        return True, value, {"steps": plan["steps"], "shape": describe_shape(value)}
+    if not ok:
+        logger.info(f"Plan replay failed: {value}")
+        return False, value, plan
+    if describe_shape(value) != plan["shape"]:
+        logger.info(f"Plan replay shape mismatch: expected {plan['shape']}, got {describe_shape(value)}")
+        return False, value, plan
+    return True, value, plan
+
+
+def _line(key: str, entry: Optional[Dict[str, Any]] = None, drop: bool = False) -> bytes:
+    """A stored plan, a dropped key, or with neither a read of the key (which makes it the most recently used)"""
+    if drop:
+        item: Dict[str, Any] = {"key": key, "drop": True}
+    else:
+        item = {"key": key} if entry is None else {"key": key, "entry": entry}
+    return (json.dumps(item, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class PlanCache:
+    """LRU cache of replayable pandas programs, persisted as an append-only JSONL log.
+
+    Works like the answer cache's log: a put or a validation appends the plan,
+    a hit appends its key and a discarded plan a drop line, so no change
+    rewrites every cached plan. Loading replays the log and keeps the
+    ``max_entries`` most recently used; the log is rewritten with just the
+    live plans once it has grown well past them. A cache file of the former
+    single-JSON format next to the log is converted on load.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lines = 0
+        self._lock = threading.Lock()
+        self.replays = 0
+        self.replay_failures = 0
+        self._load()
+
+    def _keep(self, key: str, entry: Dict[str, Any]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        self._trim()
+
+    def _trim(self) -> None:
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load(self) -> None:
+        legacy_path = f"{os.path.splitext(self.path)[0]}.json"
+        if not os.path.exists(self.path) and legacy_path != self.path and os.path.exists(legacy_path):
+            self._load_legacy(legacy_path)
+            return
+        if not os.path.exists(self.path):
+            return
+        try:
+            self._replay()
+            logger.info(f"Loaded {len(self._entries)} cached plans from {self.path}")
+        except Exception as e:
+            logger.warning(f"Could not load plan cache {self.path}: {e}")
+            self._entries.clear()
+
+    def _replay(self) -> None:
+        """Read the plans of the log, as appended by every process"""
+        self._entries.clear()
+        self._lines = 0
+        with open(self.path, "rb") as f:
+            for raw in f:
+                self._lines += 1
+                try:
+                    item = json.loads(raw)
+                except ValueError:
+                    continue  # a write cut short by a crash
+                if "entry" in item:
+                    self._entries[item["key"]] = item["entry"]
+                    self._entries.move_to_end(item["key"])
+                elif item.get("drop"):
+                    self._entries.pop(item.get("key"), None)
+                elif item.get("key") in self._entries:
+                    self._entries.move_to_end(item["key"])
+        # Trimmed once the whole log is read: a later line may drop a plan that would have evicted another
+        self._trim()
+
+    def _load_legacy(self, legacy_path: str) -> None:
+        try:
+            with open(legacy_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            for key, entry in data.get("entries", []):
+                self._keep(key, entry)
+        except Exception as e:
+            logger.warning(f"Could not load plan cache {legacy_path}: {e}")
+            self._entries.clear()
+        if self._rewrite(merge=False):
+            os.remove(legacy_path)
+            logger.info(f"Converted {len(self._entries)} cached plans from {legacy_path} to {self.path}")
+
+    def _rewrite(self, merge: bool = True) -> bool:
+        """Replace the log with one line per live plan.
+
+        With ``merge``, the log is read again under its exclusive lock first,
+        so plans other processes appended since this one loaded are kept.
+        """
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with exclusive_lock(self.path):
+                if merge and os.path.exists(self.path):
+                    self._replay()
+                with open(tmp_path, "wb") as f:
+                    f.writelines(_line(key, entry) for key, entry in self._entries.items())
+                os.replace(tmp_path, self.path)
+            self._lines = len(self._entries)
+            return True
+        except Exception as e:
+            logger.warning(f"Could not persist plan cache {self.path}: {e}")
+            return False
+
+    def _append(self, line: bytes) -> None:
+        try:
+            if not append_line(self.path, line, shared_lock=True):
+                self._rewrite(merge=False)  # no log yet, or it was removed
+                return
+        except OSError as e:
+            logger.warning(f"Could not persist plan cache {self.path}: {e}")
+            return
+        self._lines += 1
+        if self._lines > 2 * len(self._entries) + _COMPACT_SLACK:
+            self._rewrite()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._append(_line(key))
+            return entry
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._append(_line(key, drop=True))
+
+    def put(self, key: str, plan: Dict[str, Any]) -> None:
+        with self._lock:
+            entry = {**plan, "storedAt": time.time()}
+            self._keep(key, entry)
+            self._append(_line(key, entry))
+
+    def record_replay(self, ok: bool) -> None:
+        with self._lock:
+            self.replays += 1
+            if not ok:
+                self.replay_failures += 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"plans": len(self._entries), "replays": self.replays, "replayFailures": self.replay_failures}
+
+
+_plan_cache: Optional[PlanCache] = None
+_plan_cache_lock = threading.Lock()
+
+
+def get_plan_cache() -> PlanCache:
+    """Get the process-wide plan cache instance"""
+    global _plan_cache
+    with _plan_cache_lock:
+        if _plan_cache is None or os.path.dirname(_plan_cache.path) != settings.storage_dir:
+            _plan_cache = PlanCache(
+                path=os.path.join(settings.storage_dir, "plan_cache.jsonl"),
+                max_entries=settings.plan_cache_max_entries,
+            )
+        return _plan_cache
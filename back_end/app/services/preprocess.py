@@ -1,13 +1,16 @@
 from __future__ import annotations
 
 import re
-from typing import Iterable, Optional
+import warnings
+from typing import Iterable, Iterator, List, Optional
 
 import numpy as np
 import pandas as pd
 
 
 NA_STRINGS = {"", "na", "n/a", "nan", "null", "none", "-", "--"}
+# Rows of a worksheet parsed at a time when it is streamed instead of read whole
+SHEET_CHUNK_ROWS = 50_000
 
 
 def _is_numeric_like(value: str) -> bool:
@@ -93,6 +96,9 @@ def _maybe_convert_to_boolean(series: pd.Series) -> pd.Series:
 def _maybe_convert_to_datetime(series: pd.Series) -> pd.Series:
     if pd.api.types.is_datetime64_any_dtype(series):
         return series
+    # Numbers parse as nanosecond offsets from 1970; numeric and boolean columns are never dates
+    if series.dtype.kind in {"i", "u", "f", "b"} or series.dtype == "boolean":
+        return series
     # Heuristics: attempt to parse; accept if sufficient non-null after conversion
     s = series.astype("object")
     try:
@@ -160,3 +166,79 @@ def read_and_preprocess_sheet(file_path: str, sheet_name: str) -> pd.DataFrame:
     return infer_and_clean_dataframe(df)
 
 
+
+
+def _header_names(row: tuple) -> List[str]:
+    # The names pandas gives the same header row: blanks become "Unnamed: i", repeats get a ".n" suffix
+    names: List[str] = []
+    seen: dict = {}
+    for i, value in enumerate(row):
+        name = f"Unnamed: {i}" if value is None or str(value).strip() == "" else str(value)
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        names.append(name if count == 0 else f"{name}.{count}")
+    return names
+
+
+def _coerce_like(series: pd.Series, dtype) -> pd.Series:
+    """Clean a raw column into the dtype inferred for the same column in earlier rows; values that do not fit become NA"""
+    s = _normalize_na(_strip_whitespace(series))
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            s = pd.to_datetime(s.astype("object"), errors="coerce", dayfirst=True)
+    elif dtype == "boolean":
+        truthy, falsy = {"true", "yes", "y", "1"}, {"false", "no", "n", "0"}
+        s = s.map(lambda v: True if str(v).strip().lower() in truthy
+                  else False if str(v).strip().lower() in falsy else np.nan)
+    elif pd.api.types.is_numeric_dtype(dtype):
+        s = _to_numeric_series(s.astype("object"))
+    try:
+        return s.astype(dtype)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Column '{series.name}' does not fit the type {dtype} inferred from its first rows: {e}") from e
+
+
+def iter_preprocessed_sheet_chunks(file_path: str, sheet_name: str,
+                                   chunk_rows: int = SHEET_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Preprocess an .xlsx sheet a chunk of rows at a time, without reading it whole.
+
+    Rows are streamed with openpyxl in read-only mode. Column types are
+    inferred on the first chunk as :func:`infer_and_clean_dataframe` does; every
+    later chunk is cleaned into those same types, so the chunks can be written
+    to one Parquet file. Mixed-type columns become strings.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            raise ValueError(f"Sheet '{sheet_name}' is empty")
+        columns = _header_names(header)
+        dtypes = None
+        chunk: List[tuple] = []
+        for row in rows:
+            if all(v is None for v in row):
+                continue
+            chunk.append(tuple(row[:len(columns)]) + (None,) * (len(columns) - len(row)))
+            if len(chunk) >= chunk_rows:
+                df, dtypes = _clean_chunk(chunk, columns, dtypes)
+                chunk = []
+                yield df
+        if chunk or dtypes is None:
+            yield _clean_chunk(chunk, columns, dtypes)[0]
+    finally:
+        workbook.close()
+
+
+def _clean_chunk(rows: List[tuple], columns: List[str], dtypes: Optional[pd.Series]):
+    raw = pd.DataFrame.from_records(rows, columns=columns)
+    if dtypes is None:
+        cleaned = infer_and_clean_dataframe(raw)
+        for col in cleaned.columns[cleaned.dtypes == object]:
+            cleaned[col] = cleaned[col].astype("string")
+        return cleaned, cleaned.dtypes
+    raw.columns = list(dtypes.index)
+    return pd.DataFrame({col: _coerce_like(raw[col], dtype) for col, dtype in dtypes.items()}), dtypes
@@ -0,0 +1,186 @@
+import logging
+import math
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional, Sequence
+
+import pandas as pd
+
+from app.services.sheet_profile import estimate_tokens, render_sheet_profile
+
+logger = logging.getLogger("app.services.prompt_builder")
+
+DESCRIPTION_MAX_CHARS = 100
+HEAD_ROWS = 3
+HEAD_CELL_MAX_CHARS = 30
+
+
+def _fold(text: str) -> str:
+    """Lowercase and strip diacritics so 'Mã chuyến' and 'ma chuyen' match"""
+    text = unicodedata.normalize("NFD", str(text)).replace("đ", "d").replace("Đ", "D")
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in re.split(r"[^0-9a-z]+", _fold(text)) if len(t) > 1]
+
+
+def rank_columns(columns: Sequence[str], question: str, descriptions: Optional[Dict[str, str]] = None) -> List[str]:
+    """Columns sharing words with the question, most relevant first.
+
+    Words are weighted by how rare they are across column names, so a word
+    like "mã" that starts half of the columns counts for little.
+    """
+    terms = set(tokenize(question))
+    if not terms:
+        return []
+    descriptions = descriptions or {}
+    column_tokens = {c: set(tokenize(c)) | set(tokenize(descriptions.get(c, ""))) for c in columns}
+    doc_freq: Dict[str, int] = {}
+    for tokens in column_tokens.values():
+        for t in tokens:
+            doc_freq[t] = doc_freq.get(t, 0) + 1
+    n = len(columns)
+    scores = {}
+    for c, tokens in column_tokens.items():
+        # Matches in the column name count double compared to matches in its description
+        name_tokens = set(tokenize(c))
+        score = sum(math.log(1 + n / doc_freq[t]) * (2 if t in name_tokens else 1) for t in tokens & terms)
+        if score > 0:
+            scores[c] = score
+    return sorted(scores, key=lambda c: -scores[c])
+
+
+def _compress(text: Any, limit: int = DESCRIPTION_MAX_CHARS) -> str:
+    text = re.sub(r"\s+", " ", str(text)).strip()
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def description_map(desc_df: pd.DataFrame) -> Dict[str, str]:
+    """Field name -> description from the description sheet (first column is the field name)"""
+    if desc_df is None or desc_df.empty or len(desc_df.columns) < 2:
+        return {}
+    result: Dict[str, str] = {}
+    for _, row in desc_df.iterrows():
+        name = row.iloc[0]
+        if pd.isna(name):
+            continue
+        parts = [_compress(v) for v in row.iloc[1:] if not pd.isna(v) and str(v).strip()]
+        result[str(name).strip()] = " – ".join(parts)
+    return result
+
+
+def render_descriptions(descriptions: Dict[str, str], columns: Sequence[str], relevant: Sequence[str],
+                        max_tokens: int, all_fields: bool = False) -> str:
+    """Compact field descriptions within ``max_tokens``: relevant fields first, then sheet order.
+
+    Fields that are not columns of the sheet are skipped unless ``all_fields``
+    is set (workbook mode, where they may describe other sheets).
+    """
+    if not descriptions or max_tokens <= 0:
+        return ""
+    folded = {_fold(c): c for c in columns}
+    in_sheet = [name for name in descriptions if _fold(name) in folded]
+    names = list(descriptions) if all_fields or not in_sheet else in_sheet
+    relevant_folded = [_fold(c) for c in relevant]
+    names.sort(key=lambda n: relevant_folded.index(_fold(n)) if _fold(n) in relevant_folded else len(relevant_folded))
+
+    header = "Column descriptions:"
+    lines: List[str] = []
+    used = estimate_tokens(header)
+    for name in names:
+        line = f"- {name}: {descriptions[name]}" if descriptions[name] else f"- {name}"
+        cost = estimate_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        lines.append(line)
+        used += cost
+    if not lines:
+        return ""
+    omitted = len(names) - len(lines)
+    if omitted:
+        lines.append(f"- … {omitted} more fields not shown")
+    return header + "\n" + "\n".join(lines)
+
+
+def render_head(df: pd.DataFrame, columns: Sequence[str], max_tokens: int) -> str:
+    """First rows of the given columns as markdown, dropping columns until it fits ``max_tokens``"""
+    columns = [c for c in columns if c in df.columns]
+    while columns:
+        sample = df[columns].head(HEAD_ROWS).copy()
+        for c in sample.columns:
+            if sample[c].dtype == object or str(sample[c].dtype) == "string":
+                sample[c] = sample[c].map(lambda v: v if pd.isna(v) else _compress(v, HEAD_CELL_MAX_CHARS))
+        header = f"First {HEAD_ROWS} rows of selected columns (df[cols].head() for others):"
+        # tabulate cannot format pd.NA from nullable dtypes
+        sample = sample.astype(object).where(sample.notna(), None)
+        text = header + "\n" + sample.to_markdown(index=False)
+        if estimate_tokens(text) <= max_tokens:
+            return text
+        columns = columns[:-1]
+    return ""
+
+
+class PromptBuilder:
+    """Assembles the agent prefix section by section within a total token budget.
+
+    Each section gets at most its own cap and whatever budget is still left,
+    so space not used by earlier sections rolls over to later ones.
+    """
+
+    def __init__(self, max_tokens: int):
+        self.max_tokens = max_tokens
+        self._parts: List[str] = []
+        self.sections: Dict[str, int] = {}
+
+    @property
+    def used(self) -> int:
+        return sum(self.sections.values())
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.max_tokens - self.used)
+
+    def add(self, name: str, text: str) -> None:
+        if not text:
+            return
+        self._parts.append(text)
+        self.sections[name] = self.sections.get(name, 0) + estimate_tokens(text)
+
+    def budget(self, cap: int) -> int:
+        return min(cap, self.remaining)
+
+    def build(self) -> str:
+        return "\n".join(p.rstrip("\n") for p in self._parts) + "\n"
+
+
+def build_agent_prefix(df: pd.DataFrame, question: str, base: str, max_tokens: int,
+                       profile: Optional[Dict[str, Any]] = None, profile_max_tokens: int = 0,
+                       desc_df: Optional[pd.DataFrame] = None, description_max_tokens: int = 0,
+                       head_max_tokens: int = 0, head_max_columns: int = 8,
+                       extra: str = "", all_fields: bool = False, tools: str = "") -> PromptBuilder:
+    """Build the agent prefix for one question within ``max_tokens``"""
+    builder = PromptBuilder(max_tokens)
+    builder.add("base", base)
+    # Sections that must be complete for the agent to work (e.g. the workbook's sheet list) come first
+    builder.add("extra", extra)
+    # How to use the lookup and rollup tools of this sheet
+    builder.add("tools", tools)
+
+    columns = [str(c) for c in df.columns]
+    descriptions = description_map(desc_df) if desc_df is not None else {}
+    relevant = rank_columns(columns, question, descriptions)
+
+    if profile:
+        budget = builder.budget(profile_max_tokens)
+        if budget > 0:
+            builder.add("profile", render_sheet_profile(profile, budget, priority=relevant) + "\n"
+                        "Use this profile instead of inspecting columns, dtypes or summary statistics with tool calls.")
+
+    if descriptions:
+        builder.add("descriptions", render_descriptions(descriptions, columns, relevant,
+                                                        builder.budget(description_max_tokens), all_fields))
+
+    head_columns = relevant[:head_max_columns] or columns[:min(head_max_columns, 5)]
+    builder.add("head", render_head(df, head_columns, builder.budget(head_max_tokens)))
+    return builder
@@ -5,15 +5,14 @@ from pathlib import Path
 
 import PyPDF2
 from docx import Document as DocxDocument
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.prompts import ChatPromptTemplate
 from typing import List as ListType
-from langchain_google_genai import ChatGoogleGenerativeAI
 
 from app.core.config import settings
+from app.services.key_pool import create_chat_model, create_embeddings
 
 logger = logging.getLogger(__name__)
 
@@ -22,16 +21,10 @@ logger = logging.getLogger(__name__)
 
 
 class RAGService:
-    def __init__(self, google_api_key: str):
-        self.google_api_key = google_api_key
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/gemini-embedding-001",
-            google_api_key=google_api_key
-        )
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            google_api_key=google_api_key
-        )
+    def __init__(self):
+        # Embeddings and generation draw from the shared API key pool and Gemini rate limiter
+        self.embeddings = create_embeddings("models/gemini-embedding-001")
+        self.llm = create_chat_model("gemini-2.5-flash")
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000, 
             chunk_overlap=200
@@ -190,6 +183,6 @@ class RAGService:
             raise
 
 
-def get_rag_service(google_api_key: str) -> RAGService:
+def get_rag_service() -> RAGService:
     """Get RAG service instance"""
-    return RAGService(google_api_key)
+    return RAGService()
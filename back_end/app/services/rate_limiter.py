@@ -0,0 +1,300 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.embeddings import Embeddings
+from langchain_core.rate_limiters import BaseRateLimiter
+
+from app.core.config import settings
+
+logger = logging.getLogger("app.services.rate_limiter")
+
+T = TypeVar("T")
+
+# Lower value = served first. Interactive questions jump ahead of batch jobs and document ingestion.
+INTERACTIVE = 0
+BATCH = 1
+INGESTION = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch", INGESTION: "ingestion"}
+
+_current_priority: ContextVar[int] = ContextVar("gemini_request_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def request_priority(priority: int):
+    """Run the enclosed Gemini calls at the given scheduling priority"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+class QuotaExceededError(Exception):
+    """Raised when Gemini keeps returning quota errors after all retries"""
+
+
+def is_quota_error(error: BaseException) -> bool:
+    error_msg = str(error).lower()
+    return "quota" in error_msg or "429" in error_msg or "resourceexhausted" in error_msg
+
+
+def estimate_text_tokens(text: str) -> int:
+    """Rough token estimate (about 4 characters per token)"""
+    return (len(text) + 3) // 4
+
+
+class TokenBucket:
+    """Continuously refilling bucket; not thread-safe on its own (guarded by the limiter lock)"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(max(1, per_minute))
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` tokens are available (0 if available now)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        # May go negative when actual usage exceeds the estimate; later requests then wait longer
+        self.tokens -= min(amount, self.capacity)
+
+
+class GeminiRateLimiter(BaseRateLimiter):
+    """Client-side requests-per-minute and tokens-per-minute limiter for all Gemini calls.
+
+    Callers wait in a single priority queue (FIFO within a priority), so bursts of
+    concurrent requests are spread over the quota instead of hitting the API
+    together. Chat models use it through LangChain's ``rate_limiter`` hook; token
+    estimates for those calls come from :class:`RateLimitCallbackHandler`.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._cond = threading.Condition()
+        self._queue: List[tuple] = []
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._pending = threading.local()
+        self._stats: Dict[int, Dict[str, float]] = {
+            p: {"acquired": 0, "totalWait": 0.0, "maxWait": 0.0} for p in PRIORITY_NAMES
+        }
+        self._quota_pauses = 0
+        self._tokens_reported = 0
+
+    def set_pending_tokens(self, tokens: int) -> None:
+        """Token estimate for the next acquire() on this thread"""
+        self._pending.tokens = tokens
+
+    def acquire(self, *, blocking: bool = True, tokens: Optional[int] = None, priority: Optional[int] = None) -> bool:
+        if tokens is None:
+            tokens = getattr(self._pending, "tokens", None) or settings.gemini_default_request_tokens
+            self._pending.tokens = None
+        if priority is None:
+            priority = _current_priority.get()
+
+        start = time.monotonic()
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._queue, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self._queue[0] == ticket:
+                        wait = max(
+                            self._paused_until - now,
+                            self._requests.wait_time(1, now),
+                            self._tokens.wait_time(tokens, now),
+                        )
+                        if wait <= 0:
+                            self._requests.consume(1)
+                            self._tokens.consume(tokens)
+                            break
+                    else:
+                        wait = 0.5  # re-check when woken up or periodically
+                    if not blocking:
+                        return False
+                    self._cond.wait(timeout=wait)
+            finally:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+
+            waited = time.monotonic() - start
+            stats = self._stats.setdefault(priority, {"acquired": 0, "totalWait": 0.0, "maxWait": 0.0})
+            stats["acquired"] += 1
+            stats["totalWait"] += waited
+            stats["maxWait"] = max(stats["maxWait"], waited)
+        if waited > 1:
+            logger.info(f"Waited {waited:.1f}s for Gemini quota ({PRIORITY_NAMES.get(priority, priority)})")
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        priority = _current_priority.get()
+        return await asyncio.to_thread(self.acquire, blocking=blocking, priority=priority)
+
+    def record_usage(self, actual_tokens: int, estimated_tokens: int) -> None:
+        """Charge the difference between actual and estimated tokens of a finished call"""
+        with self._cond:
+            self._tokens_reported += actual_tokens
+            if actual_tokens > estimated_tokens:
+                self._tokens.consume(actual_tokens - estimated_tokens)
+
+    def penalize(self, seconds: float) -> None:
+        """Pause all callers after the API reported a quota error"""
+        with self._cond:
+            self._quota_pauses += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def wait_until_resumed(self) -> None:
+        """Block while a quota pause is in effect"""
+        with self._cond:
+            while True:
+                remaining = self._paused_until - time.monotonic()
+                if remaining <= 0:
+                    return
+                self._cond.wait(timeout=remaining)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._cond:
+            now = time.monotonic()
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _ in self._queue:
+                name = PRIORITY_NAMES.get(priority, str(priority))
+                depth[name] = depth.get(name, 0) + 1
+            waits = {}
+            for priority, stats in self._stats.items():
+                acquired = stats["acquired"]
+                waits[PRIORITY_NAMES.get(priority, str(priority))] = {
+                    "acquired": int(acquired),
+                    "avgWaitSeconds": round(stats["totalWait"] / acquired, 3) if acquired else 0.0,
+                    "maxWaitSeconds": round(stats["maxWait"], 3),
+                }
+            self._requests._refill(now)
+            self._tokens._refill(now)
+            return {
+                "queueDepth": len(self._queue),
+                "queueDepthByPriority": depth,
+                "waits": waits,
+                "availableRequests": round(self._requests.tokens, 2),
+                "availableTokens": round(self._tokens.tokens),
+                "pausedForSeconds": round(max(0.0, self._paused_until - now), 2),
+                "quotaPauses": self._quota_pauses,
+                "tokensReported": self._tokens_reported,
+            }
+
+
+class RateLimitCallbackHandler(BaseCallbackHandler):
+    """Feeds prompt-size estimates and actual token usage of chat calls to the limiter"""
+
+    # Must run on the calling thread: the estimate is picked up by the acquire() that follows
+    run_inline = True
+
+    def __init__(self, limiter: GeminiRateLimiter):
+        self.limiter = limiter
+        self._estimates: Dict[Any, int] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: Any = None, **kwargs: Any) -> None:  # type: ignore[override]
+        text = "".join(str(getattr(m, "content", m)) for batch in messages for m in batch)
+        estimate = estimate_text_tokens(text) + settings.gemini_default_output_tokens
+        self._estimates[run_id] = estimate
+        self.limiter.set_pending_tokens(estimate)
+
+    def on_llm_end(self, response: Any, *, run_id: Any = None, **kwargs: Any) -> None:  # type: ignore[override]
+        estimate = self._estimates.pop(run_id, settings.gemini_default_request_tokens)
+        actual = 0
+        try:
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    actual += int(usage.get("total_tokens", 0))
+        except Exception:
+            return
+        if actual:
+            self.limiter.record_usage(actual, estimate)
+
+    def on_llm_error(self, error: BaseException, *, run_id: Any = None, **kwargs: Any) -> None:  # type: ignore[override]
+        self._estimates.pop(run_id, None)
+        if is_quota_error(error):
+            self.limiter.penalize(settings.gemini_quota_backoff_seconds)
+
+
+class RateLimitedEmbeddings(Embeddings):
+    """Embeddings wrapper that takes every API batch through the shared limiter"""
+
+    def __init__(self, inner: Embeddings, limiter: GeminiRateLimiter, batch_size: int = 100):
+        self.inner = inner
+        self.limiter = limiter
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors: List[List[float]] = []
+        for i in range(0, len(texts), self.batch_size):
+            batch = texts[i:i + self.batch_size]
+            self.limiter.acquire(tokens=sum(estimate_text_tokens(t) for t in batch))
+            vectors.extend(self.inner.embed_documents(batch))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        self.limiter.acquire(tokens=estimate_text_tokens(text))
+        return self.inner.embed_query(text)
+
+
+def run_with_quota_retry(fn: Callable[[], T], max_retries: int = 3) -> T:
+    """Run a Gemini-backed call, backing off through the shared limiter on quota errors.
+
+    Unlike a per-request sleep, the backoff pauses every caller of the limiter, so
+    concurrent requests stop hammering the API together. Raises
+    :class:`QuotaExceededError` once the retries are exhausted.
+    """
+    limiter = get_rate_limiter()
+    for attempt in range(max_retries):
+        try:
+            return fn()
+        except Exception as e:
+            if not is_quota_error(e):
+                raise
+            if attempt == max_retries - 1:
+                raise QuotaExceededError(str(e)) from e
+            wait_time = settings.gemini_quota_backoff_seconds * (attempt + 1)
+            logger.warning(f"Quota exceeded, backing off {wait_time}s (attempt {attempt + 1}/{max_retries})")
+            limiter.penalize(wait_time)
+            limiter.wait_until_resumed()
+    raise QuotaExceededError("Quota exceeded")
+
+
+_rate_limiter: Optional[GeminiRateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> GeminiRateLimiter:
+    """Get the process-wide Gemini rate limiter"""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            # Per-key budgets add up across the key pool
+            key_count = max(1, len(settings.google_api_keys))
+            _rate_limiter = GeminiRateLimiter(
+                requests_per_minute=settings.gemini_requests_per_minute * key_count,
+                tokens_per_minute=settings.gemini_tokens_per_minute * key_count,
+            )
+        return _rate_limiter
@@ -0,0 +1,293 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+from langchain_core.tools import StructuredTool
+from pydantic import BaseModel, Field
+
+from app.core.config import settings
+from app.services.id_index import looks_like_id_name
+from app.services.plan_cache import format_result
+from app.services.storage import derived_dir, file_content_hash, file_id_from_path, safe_sheet_name
+
+logger = logging.getLogger("app.services.rollups")
+
+# Bump when the cube layout changes so stored rollups are rebuilt
+ROLLUP_VERSION = 1
+GRAINS = ("day", "week", "month")
+AGGREGATIONS = ("sum", "mean", "count")
+MAX_TIME_COLUMNS = 2
+MAX_MEASURES = 12
+# Rows shown in the rollup_query tool output
+QUERY_MAX_ROWS = 100
+# Value of the dimension columns in the rollups that are not split by a dimension
+_NO_DIMENSION = ""
+
+
+def detect_cube_columns(df: pd.DataFrame, max_dimensions: int, max_cardinality: int) -> Dict[str, List[str]]:
+    """Time columns, numeric measures and low-cardinality dimensions of a sheet"""
+    time_columns = [c for c in df.columns if isinstance(c, str) and pd.api.types.is_datetime64_any_dtype(df[c])
+                    and df[c].notna().any()][:MAX_TIME_COLUMNS]
+    measures = [c for c in df.columns if isinstance(c, str) and pd.api.types.is_numeric_dtype(df[c])
+                and not pd.api.types.is_bool_dtype(df[c]) and not looks_like_id_name(c)][:MAX_MEASURES]
+    dimensions = []
+    for c in df.columns:
+        if len(dimensions) >= max_dimensions:
+            break
+        if not isinstance(c, str) or c in time_columns or c in measures:
+            continue
+        s = df[c]
+        if pd.api.types.is_numeric_dtype(s) or pd.api.types.is_datetime64_any_dtype(s):
+            continue
+        distinct = s.nunique(dropna=True)
+        if 2 <= distinct <= max_cardinality:
+            dimensions.append(c)
+    return {"timeColumns": time_columns, "measures": measures, "dimensions": dimensions}
+
+
+def _period(series: pd.Series, grain: str) -> pd.Series:
+    if grain == "day":
+        return series.dt.normalize()
+    # Weeks start on Monday
+    return series.dt.to_period("W-SUN" if grain == "week" else "M").dt.start_time
+
+
+class RollupCube:
+    """Sums and counts of the measures of a sheet by day, week and month, alone
+    and crossed with each low-cardinality dimension.
+
+    All rollups share one long table with the columns time_column, grain,
+    dimension, member, period, rows and ``<measure>`` / ``<measure>__n`` (sum
+    and non-null count), which is a few thousand rows even for a sheet with
+    millions. Sums and counts are additive, so means and totals over all
+    periods are derived exactly from it.
+    """
+
+    def __init__(self, table: pd.DataFrame, columns: Dict[str, List[str]]):
+        self.table = table
+        self.time_columns = columns["timeColumns"]
+        self.measures = columns["measures"]
+        self.dimensions = columns["dimensions"]
+
+    @property
+    def columns(self) -> Dict[str, List[str]]:
+        return {"timeColumns": self.time_columns, "measures": self.measures, "dimensions": self.dimensions}
+
+    @property
+    def empty(self) -> bool:
+        return not self.time_columns or not self.measures
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, max_dimensions: int, max_cardinality: int) -> "RollupCube":
+        columns = detect_cube_columns(df, max_dimensions, max_cardinality)
+        parts = []
+        if columns["timeColumns"] and columns["measures"]:
+            measures = columns["measures"]
+            members = {d: df[d].astype("object").map(lambda v: None if pd.isna(v) else str(v)) for d in columns["dimensions"]}
+            for time_column in columns["timeColumns"]:
+                for grain in GRAINS:
+                    frame = df[measures].assign(_period=_period(df[time_column], grain))
+                    for dimension in [None] + columns["dimensions"]:
+                        keys = ["_period"]
+                        if dimension:
+                            frame = frame.assign(_member=members[dimension])
+                            keys.append("_member")
+                        grouped = frame.groupby(keys, dropna=False)
+                        part = grouped[measures].sum(min_count=1)
+                        counts = grouped[measures].count().add_suffix("__n")
+                        part = part.join(counts).assign(rows=grouped.size()).reset_index()
+                        if not dimension:
+                            part["_member"] = _NO_DIMENSION
+                        part = part.rename(columns={"_period": "period", "_member": "member"})
+                        part.insert(0, "dimension", dimension or _NO_DIMENSION)
+                        part.insert(0, "grain", grain)
+                        part.insert(0, "time_column", time_column)
+                        parts.append(part)
+        table = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+        return cls(table, columns)
+
+    def query(self, measures: List[str], grain: str = "month", by: Optional[str] = None,
+              time_column: Optional[str] = None, agg: str = "sum") -> pd.DataFrame:
+        """Aggregate ``measures`` per period (``grain`` day/week/month, or "all" for one total) and per ``by``"""
+        if self.empty:
+            raise ValueError("This sheet has no rollups (no date column or no numeric column)")
+        if isinstance(measures, str):
+            measures = [measures]
+        unknown = [m for m in measures if m not in self.measures]
+        if unknown:
+            raise KeyError(f"Not rolled up: {unknown}; measures: {self.measures}")
+        if grain not in GRAINS + ("all",):
+            raise ValueError(f"grain must be one of {GRAINS + ('all',)}")
+        if agg not in AGGREGATIONS:
+            raise ValueError(f"agg must be one of {AGGREGATIONS}")
+        if by is not None and by not in self.dimensions:
+            raise KeyError(f"'{by}' is not a rollup dimension; dimensions: {self.dimensions}")
+        time_column = time_column or self.time_columns[0]
+        if time_column not in self.time_columns:
+            raise KeyError(f"'{time_column}' is not a rollup time column; time columns: {self.time_columns}")
+
+        t = self.table
+        # Totals are summed from the monthly rollup, which also keeps rows without a date
+        rows = t[(t["time_column"] == time_column) & (t["grain"] == ("month" if grain == "all" else grain))
+                 & (t["dimension"] == (by or _NO_DIMENSION))]
+        if grain != "all":
+            rows = rows[rows["period"].notna()]
+        keys = ([] if grain == "all" else ["period"]) + (["member"] if by else [])
+        value_columns = measures + [f"{m}__n" for m in measures] + ["rows"]
+        if keys:
+            grouped = rows.groupby(keys, dropna=False)[value_columns].sum(min_count=1).reset_index()
+        else:
+            grouped = rows[value_columns].sum(min_count=1).to_frame().T
+
+        if agg == "mean":
+            for m in measures:
+                grouped[m] = grouped[m] / grouped[f"{m}__n"]
+        elif agg == "count":
+            for m in measures:
+                grouped[m] = grouped[f"{m}__n"]
+        result = grouped[keys + measures].rename(columns={"member": by, "period": grain})
+        return result.reset_index(drop=True)
+
+
+def rollup_path(file_path: str, sheet_name: str) -> str:
+    return os.path.join(derived_dir(file_id_from_path(file_path)), f"rollup_{safe_sheet_name(sheet_name)}.parquet")
+
+
+def _meta_path(file_path: str, sheet_name: str) -> str:
+    return os.path.join(derived_dir(file_id_from_path(file_path)), f"rollup_{safe_sheet_name(sheet_name)}.json")
+
+
+def load_rollups(file_path: str, sheet_name: str) -> Optional[RollupCube]:
+    """Return the stored rollups of a sheet if they were built from the current file content"""
+    meta_path = _meta_path(file_path, sheet_name)
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if (meta.get("sourceHash") != file_content_hash(file_path) or meta.get("version") != ROLLUP_VERSION
+                or meta.get("sheetName") != sheet_name):
+            return None
+        path = rollup_path(file_path, sheet_name)
+        table = pd.read_parquet(path) if os.path.exists(path) else pd.DataFrame()
+        return RollupCube(table, meta["columns"])
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable rollups of '{sheet_name}' in {os.path.basename(file_path)}: {e}")
+        return None
+
+
+def write_rollups(file_path: str, sheet_name: str, cube: RollupCube) -> bool:
+    """Store the rollups of a sheet next to its snapshot"""
+    path = rollup_path(file_path, sheet_name)
+    meta_path = _meta_path(file_path, sheet_name)
+    try:
+        if not cube.table.empty:
+            tmp_path = f"{path}.tmp"
+            cube.table.to_parquet(tmp_path)
+            os.replace(tmp_path, path)
+        tmp_meta = f"{meta_path}.tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({"sourceHash": file_content_hash(file_path), "version": ROLLUP_VERSION, "sheetName": sheet_name,
+                       "columns": cube.columns, "rows": len(cube.table)}, f, ensure_ascii=False)
+        os.replace(tmp_meta, meta_path)
+        return True
+    except Exception as e:
+        logger.info(f"Could not store rollups of '{sheet_name}' of {os.path.basename(file_path)}: {e}")
+        return False
+
+
+_cubes: "OrderedDict[Tuple, RollupCube]" = OrderedDict()
+_cubes_lock = threading.Lock()
+_MAX_CACHED_CUBES = 16
+
+
+def get_rollup_cube(file_path: str, sheet_name: str, df: pd.DataFrame) -> Optional[RollupCube]:
+    """Rollups of a preprocessed sheet: from memory, from storage, or built and stored"""
+    if not settings.rollups_enabled:
+        return None
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    key = (file_path, sheet_name, stat.st_mtime, stat.st_size)
+    with _cubes_lock:
+        cube = _cubes.get(key)
+        if cube is not None:
+            _cubes.move_to_end(key)
+            return cube
+
+    cube = load_rollups(file_path, sheet_name)
+    if cube is None:
+        cube = RollupCube.build(df, settings.rollup_max_dimensions, settings.rollup_max_cardinality)
+        write_rollups(file_path, sheet_name, cube)
+        logger.info(f"Built {len(cube.table)} rollup rows for '{sheet_name}': {cube.columns}")
+
+    with _cubes_lock:
+        _cubes[key] = cube
+        while len(_cubes) > _MAX_CACHED_CUBES:
+            _cubes.popitem(last=False)
+    return cube
+
+
+def drop_cached_cubes(file_path: str) -> None:
+    """Forget every cached rollup cube of a file"""
+    with _cubes_lock:
+        for key in [k for k in _cubes if k[0] == file_path]:
+            del _cubes[key]
+
+
+def render_rollup_prompt(cube: Optional[RollupCube]) -> str:
+    if cube is None or cube.empty:
+        return ""
+    return (
+        f"Precomputed rollups: measures {cube.measures} by {cube.time_columns} per day/week/month, optionally split by "
+        f"one of {cube.dimensions}. For sums, means or counts of these measures by period and/or one of those "
+        "dimensions (or overall totals with grain 'all') use the rollup_query tool, or rollup(measures, grain, by) "
+        "in Python, instead of grouping df."
+    )
+
+
+class _RollupInput(BaseModel):
+    measures: List[str] = Field(description="Numeric columns to aggregate")
+    grain: str = Field(default="month", description="day, week, month, or all for one total")
+    by: Optional[str] = Field(default=None, description="Optional dimension column to split by")
+    time_column: Optional[str] = Field(default=None, description="Date column defining the periods (default: the first one)")
+    agg: str = Field(default="sum", description="sum, mean or count")
+
+
+def build_rollup_tool(cube: RollupCube) -> StructuredTool:
+    """Agent tool answering aggregate questions from the rollups"""
+
+    def _query(measures: List[str], grain: str = "month", by: Optional[str] = None,
+               time_column: Optional[str] = None, agg: str = "sum") -> str:
+        try:
+            result = cube.query(measures, grain, by, time_column, agg)
+        except (KeyError, ValueError) as e:
+            return f"{type(e).__name__}: {e}"
+        return format_result(result, max_rows=QUERY_MAX_ROWS)
+
+    return StructuredTool.from_function(
+        func=_query,
+        name="rollup_query",
+        description=(
+            "Aggregates numeric columns per day/week/month (or overall) and per one dimension from precomputed rollups, "
+            f"without scanning the sheet. Measures: {cube.measures}. Dimensions: {cube.dimensions}. "
+            f"Time columns: {cube.time_columns}."
+        ),
+        args_schema=_RollupInput,
+    )
+
+
+def rollup_functions(cube: RollupCube) -> Dict[str, Any]:
+    """The rollup query as a function for the agent's Python namespace"""
+
+    def rollup(measures: Any, grain: str = "month", by: Optional[str] = None,
+               time_column: Optional[str] = None, agg: str = "sum") -> pd.DataFrame:
+        """Aggregate measures per period and optional dimension from the precomputed rollups"""
+        return cube.query(measures, grain, by, time_column, agg)
+
+    return {"rollup": rollup}
@@ -0,0 +1,285 @@
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: archiver runs and catalog updates are then only serialised within one process
+    fcntl = None
+
+logger = logging.getLogger("app.services.session_archive")
+
+ARCHIVE_DIR = "archive"
+
+_thread_locks: Dict[str, threading.Lock] = {}
+_thread_locks_guard = threading.Lock()
+
+
+def archive_dir(storage_dir: str) -> str:
+    return os.path.join(storage_dir, ARCHIVE_DIR)
+
+
+def _catalog_path(storage_dir: str, segment: str) -> str:
+    return os.path.join(archive_dir(storage_dir), f"{segment}.json")
+
+
+def _segment_path(storage_dir: str, segment: str) -> str:
+    return os.path.join(archive_dir(storage_dir), f"{segment}.gz")
+
+
+@contextmanager
+def _file_lock(path: str, blocking: bool = True):
+    """Exclusive lock shared by the threads and processes using ``path``; yields False if not blocking and busy"""
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(path, threading.Lock())
+    if not thread_lock.acquire(blocking):
+        yield False
+        return
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    yield False
+                    return
+            yield True
+        finally:
+            os.close(fd)
+    finally:
+        thread_lock.release()
+
+
+def catalog_lock(storage_dir: str):
+    """Held while a segment catalog is read and rewritten"""
+    return _file_lock(os.path.join(archive_dir(storage_dir), ".catalog.lock"))
+
+
+def _load_catalog(storage_dir: str, segment: str) -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(_catalog_path(storage_dir, segment), "r", encoding="utf-8") as f:
+            return json.load(f)["sessions"]
+    except FileNotFoundError:
+        return {}
+
+
+def _write_catalog(storage_dir: str, segment: str, sessions: Dict[str, Dict[str, Any]]) -> None:
+    path = _catalog_path(storage_dir, segment)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"segment": segment, "sessions": sessions}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def segments(storage_dir: str) -> List[str]:
+    try:
+        names = os.listdir(archive_dir(storage_dir))
+    except FileNotFoundError:
+        return []
+    return sorted(name[:-len(".json")] for name in names if name.startswith("segment_") and name.endswith(".json"))
+
+
+def read_archived(storage_dir: str, location: Dict[str, Any]) -> bytes:
+    """The session log stored at ``location`` (segment, offset, length) of an archive segment"""
+    with open(_segment_path(storage_dir, location["segment"]), "rb") as f:
+        f.seek(location["offset"])
+        return gzip.decompress(f.read(location["length"]))
+
+
+def drop_from_catalog(storage_dir: str, segment: str, session_id: str) -> None:
+    """Forget an archived session that was restored or deleted, so it never comes back from the segment"""
+    with catalog_lock(storage_dir):
+        sessions = _load_catalog(storage_dir, segment)
+        if sessions.pop(session_id, None) is not None:
+            _write_catalog(storage_dir, segment, sessions)
+
+
+def archived_summaries(storage_dir: str) -> List[Dict[str, Any]]:
+    """Summaries of every archived session as recorded by the catalogs, to rebuild the listing index"""
+    summaries = []
+    for segment in segments(storage_dir):
+        for session_id, entry in _load_catalog(storage_dir, segment).items():
+            summaries.append({**entry["summary"], "archived": {"segment": segment, "offset": entry["offset"],
+                                                               "length": entry["length"]}})
+    return summaries
+
+
+def _timestamp(value: Optional[str]) -> Optional[float]:
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def archive_idle_sessions(backend, max_idle_seconds: float, now: Optional[float] = None) -> Dict[str, Any]:
+    """Move the sessions of a :class:`FileSessionBackend` idle for ``max_idle_seconds`` into a new archive segment.
+
+    Each session log becomes one gzip member of the segment, so a single
+    session can be decompressed on its own; the segment's catalog records
+    where. Sessions stay listed: their index summary points to the segment.
+    A session written to while it is being archived keeps its file. Segments
+    none of whose sessions are still archived are deleted. Returns what was
+    archived and the bytes reclaimed.
+    """
+    report = {"sessionsArchived": 0, "bytesBefore": 0, "bytesAfter": 0, "segmentsRemoved": 0, "bytesReclaimed": 0}
+    storage_dir = backend.storage_dir
+    with _file_lock(os.path.join(archive_dir(storage_dir), ".run.lock"), blocking=False) as acquired:
+        if not acquired:
+            logger.info("Another archiver is running; skipping")
+            return report
+        cutoff = (now if now is not None else time.time()) - max_idle_seconds
+        idle = []
+        for summary in backend.index.list():
+            last = _timestamp(summary.get("lastMessageAt"))
+            if not summary.get("archived") and last is not None and last < cutoff:
+                idle.append(summary)
+
+        if idle:
+            segment = f"segment_{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}_{uuid.uuid4().hex[:8]}"
+            entries: Dict[str, Dict[str, Any]] = {}
+            versions: Dict[str, Any] = {}
+            # Compress outside of any lock: sessions stay usable while the segment is written
+            with open(_segment_path(storage_dir, segment), "wb") as out:
+                for summary in idle:
+                    session_id = summary["sessionId"]
+                    version = backend.version(session_id)
+                    data = backend.log_bytes(session_id)
+                    if version is None or data is None:
+                        continue
+                    member = gzip.compress(data, compresslevel=6)
+                    entries[session_id] = {"offset": out.tell(), "length": len(member), "size": len(data),
+                                           "summary": summary}
+                    versions[session_id] = version
+                    out.write(member)
+                out.flush()
+                os.fsync(out.fileno())
+            # The catalog is durable before any session file is removed
+            with catalog_lock(storage_dir):
+                _write_catalog(storage_dir, segment, entries)
+            retired = []
+            for session_id, entry in entries.items():
+                location = {"segment": segment, "offset": entry["offset"], "length": entry["length"]}
+                if backend.retire(session_id, versions[session_id], location):
+                    retired.append(session_id)
+                    report["bytesBefore"] += entry["size"]
+                    report["bytesAfter"] += entry["length"]
+            if not retired:
+                # Every session changed meanwhile: the segment was never used
+                with catalog_lock(storage_dir):
+                    os.remove(_catalog_path(storage_dir, segment))
+                    os.remove(_segment_path(storage_dir, segment))
+            elif len(retired) < len(entries):
+                with catalog_lock(storage_dir):
+                    _write_catalog(storage_dir, segment, {s: entries[s] for s in retired})
+            report["sessionsArchived"] = len(retired)
+
+        # Drop catalog entries of sessions restored or deleted since, and segments left without sessions
+        referenced: Dict[str, set] = {}
+        for summary in backend.index.list():
+            location = summary.get("archived")
+            if location:
+                referenced.setdefault(location["segment"], set()).add(summary["sessionId"])
+        for segment in segments(storage_dir):
+            with catalog_lock(storage_dir):
+                sessions = _load_catalog(storage_dir, segment)
+                live = {s: e for s, e in sessions.items() if s in referenced.get(segment, ())}
+                if not live:
+                    segment_path = _segment_path(storage_dir, segment)
+                    if os.path.exists(segment_path):
+                        report["bytesReclaimed"] += os.path.getsize(segment_path)
+                        os.remove(segment_path)
+                    os.remove(_catalog_path(storage_dir, segment))
+                    report["segmentsRemoved"] += 1
+                elif len(live) < len(sessions):
+                    _write_catalog(storage_dir, segment, live)
+
+    report["bytesReclaimed"] += report["bytesBefore"] - report["bytesAfter"]
+    if report["sessionsArchived"] or report["segmentsRemoved"]:
+        logger.info(f"Archived {report['sessionsArchived']} idle sessions, removed {report['segmentsRemoved']} "
+                    f"empty segments, reclaimed {report['bytesReclaimed']} bytes")
+    return report
+
+
+class SessionArchiver:
+    """Runs :func:`archive_idle_sessions` periodically on a background thread and keeps totals of its runs"""
+
+    def __init__(self, max_idle_seconds: float, interval_seconds: float):
+        self.max_idle_seconds = max_idle_seconds
+        self.interval_seconds = interval_seconds
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.runs = 0
+        self.sessions_archived = 0
+        self.bytes_reclaimed = 0
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    def run_once(self) -> Dict[str, Any]:
+        from app.services.session_store import FileSessionBackend, get_session_backend
+
+        backend = get_session_backend()
+        backend = getattr(backend, "inner", backend)
+        if not isinstance(backend, FileSessionBackend):
+            # The SQLite backend keeps every session in one database file: there is no directory to thin out
+            return {"skipped": f"{settings.session_backend} backend"}
+        report = archive_idle_sessions(backend, self.max_idle_seconds)
+        with self._lock:
+            self.runs += 1
+            self.sessions_archived += report["sessionsArchived"]
+            self.bytes_reclaimed += report["bytesReclaimed"]
+            self.last_run = {**report, "finishedAt": datetime.now(timezone.utc).isoformat()}
+        return report
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Session archiving failed: {e}")
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="session-archiver", daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "archiveAfterDays": self.max_idle_seconds / 86400,
+                "runs": self.runs,
+                "sessionsArchived": self.sessions_archived,
+                "bytesReclaimed": self.bytes_reclaimed,
+                "lastRun": self.last_run,
+            }
+
+
+_archiver: Optional[SessionArchiver] = None
+_archiver_lock = threading.Lock()
+
+
+def get_session_archiver() -> SessionArchiver:
+    """Get the process-wide session archiver"""
+    global _archiver
+    with _archiver_lock:
+        if _archiver is None:
+            _archiver = SessionArchiver(max_idle_seconds=settings.session_archive_after_days * 86400,
+                                        interval_seconds=settings.session_archive_interval_minutes * 60)
+        return _archiver
@@ -0,0 +1,237 @@
+import json
+import logging
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from app.services.session_store import (
+    FileSessionBackend, SessionBackend, delete_session, get_session_backend, get_session_cache,
+)
+from app.services.storage import is_session_id
+from app.services.traces import externalize_traces, load_trace
+
+logger = logging.getLogger("app.services.session_export")
+
+EXPORT_VERSION = 1
+# Summaries fetched per listing page while exporting
+_LIST_PAGE = 200
+# Upper bound of the bytes decompressed at once while importing, whatever one compressed chunk expands to
+_INFLATE_CHUNK = 1 << 16
+
+
+def _file_backend(backend: SessionBackend) -> Optional[FileSessionBackend]:
+    backend = getattr(backend, "inner", backend)
+    return backend if isinstance(backend, FileSessionBackend) else None
+
+
+def _in_range(value: Optional[str], since: Optional[str], until: Optional[str]) -> bool:
+    """Whether a timestamp falls within [since, until]; bounds may be dates or any prefix of an ISO timestamp"""
+    if not value:
+        return since is None and until is None
+    if since is not None and value[:len(since)] < since:
+        return False
+    return until is None or value[:len(until)] <= until
+
+
+def _export_record(backend: SessionBackend, session_id: str) -> Optional[Dict[str, Any]]:
+    # Archived sessions are read from their segment: exporting them does not restore them
+    file_backend = _file_backend(backend)
+    if file_backend is not None:
+        record = file_backend.archived_record(session_id)
+        if record is not None:
+            return record
+    return backend.get(session_id)
+
+
+def _export_message(session_id: str, message: Dict[str, Any]) -> Dict[str, Any]:
+    # Trace blobs are local to this storage directory: their text travels inline and gets a new blob on import
+    trace_id = message.get("traceId")
+    if not trace_id:
+        return message
+    message = {k: v for k, v in message.items() if k != "traceId"}
+    trace = load_trace(session_id, trace_id)
+    if trace is not None:
+        message["trace"] = trace
+    return message
+
+
+def export_lines(file_id: Optional[str] = None, session_type: Optional[str] = None, since: Optional[str] = None,
+                 until: Optional[str] = None) -> Iterator[bytes]:
+    """The sessions matching the filters as NDJSON lines, most recently active first.
+
+    The first line describes the export; each session is one ``session`` line
+    holding its fields followed by one ``message`` line per message. The date
+    range applies to the session's last activity. Sessions are listed a page
+    at a time and read one at a time, so memory stays bounded by the largest
+    session rather than by how many are exported.
+    """
+    backend = get_session_backend()
+    yield _line({"kind": "export", "version": EXPORT_VERSION, "exportedAt": datetime.now(timezone.utc).isoformat(),
+                 "filters": {"fileId": file_id, "type": session_type, "since": since, "until": until}})
+    after = None
+    while True:
+        page, after = backend.list_page(file_id, session_type, after, _LIST_PAGE)
+        for summary in page:
+            last = summary.get("lastMessageAt")
+            if since is not None and (last or "")[:len(since)] < since:
+                # Listings are ordered by last activity, newest first: every following session is older
+                return
+            if not _in_range(last, since, until):
+                continue
+            session_id = summary["sessionId"]
+            record = _export_record(backend, session_id)
+            if record is None:
+                continue  # deleted since it was listed
+            messages = record.pop("messages", [])
+            yield _line({"kind": "session", "session": record})
+            for message in messages:
+                yield _line({"kind": "message", "sessionId": session_id,
+                             "message": _export_message(session_id, message)})
+        if after is None:
+            return
+
+
+def _line(value: Dict[str, Any]) -> bytes:
+    return (json.dumps(value, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def iter_export(file_id: Optional[str] = None, session_type: Optional[str] = None, since: Optional[str] = None,
+                until: Optional[str] = None, compresslevel: int = 6) -> Iterator[bytes]:
+    """:func:`export_lines` gzip-compressed as they are produced"""
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, 31)
+    for line in export_lines(file_id, session_type, since, until):
+        chunk = compressor.compress(line)
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+
+class SessionImporter:
+    """Reads an export back into the current session backend, chunk by chunk.
+
+    Input may be gzip-compressed or plain NDJSON. Chunks are decompressed and
+    split into lines incrementally and only the session being read is held in
+    memory; :meth:`feed` and :meth:`finish` return the sessions completed so
+    far, which :meth:`store` writes. A session that already exists is
+    skipped unless ``overwrite`` is set, in which case it is replaced.
+    """
+
+    def __init__(self, overwrite: bool = False):
+        self.overwrite = overwrite
+        self.imported = 0
+        self.skipped = 0
+        self._decompressor = None
+        self._started = False
+        self._pending = b""
+        self._line_no = 0
+        self._current: Optional[Dict[str, Any]] = None
+
+    def _inflate(self, data: bytes) -> Iterator[bytes]:
+        if not self._started:
+            # Wait for the two bytes of the gzip magic before choosing how to read
+            self._pending += data
+            if len(self._pending) < 2:
+                return
+            data, self._pending = self._pending, b""
+            self._started = True
+            if data[:2] == b"\x1f\x8b":
+                self._decompressor = zlib.decompressobj(31)
+        if self._decompressor is None:
+            yield data
+            return
+        while data:
+            yield self._decompressor.decompress(data, _INFLATE_CHUNK)
+            data = self._decompressor.unconsumed_tail
+
+    def feed(self, chunk: bytes) -> List[Dict[str, Any]]:
+        completed = []
+        for data in self._inflate(chunk):
+            self._pending += data
+            *lines, self._pending = self._pending.split(b"\n")
+            for line in lines:
+                completed.extend(self._read_line(line))
+        return completed
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """The sessions still held once the input is exhausted"""
+        completed = []
+        if self._decompressor is not None:
+            self._pending += self._decompressor.flush()
+            if not self._decompressor.eof:
+                raise ValueError("Truncated export: the compressed stream ends early")
+        # The last line may lack its newline
+        for line in self._pending.split(b"\n"):
+            completed.extend(self._read_line(line))
+        self._pending = b""
+        if self._current is not None:
+            completed.append(self._current)
+            self._current = None
+        return completed
+
+    def _read_line(self, line: bytes) -> List[Dict[str, Any]]:
+        self._line_no += 1
+        if not line.strip():
+            return []
+        try:
+            entry = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Line {self._line_no}: not valid JSON") from e
+        kind = entry.get("kind") if isinstance(entry, dict) else None
+        if kind == "export":
+            if entry.get("version", EXPORT_VERSION) > EXPORT_VERSION:
+                raise ValueError(f"Unsupported export version {entry.get('version')}")
+            return []
+        if kind == "session":
+            record = entry.get("session")
+            session_id = record.get("sessionId") if isinstance(record, dict) else None
+            if not is_session_id(session_id):
+                raise ValueError(f"Line {self._line_no}: missing or invalid sessionId")
+            completed = [self._current] if self._current is not None else []
+            self._current = {**record, "messages": []}
+            return completed
+        if kind == "message":
+            if self._current is None or entry.get("sessionId") != self._current["sessionId"]:
+                raise ValueError(f"Line {self._line_no}: message outside of its session")
+            if not isinstance(entry.get("message"), dict):
+                raise ValueError(f"Line {self._line_no}: invalid message")
+            self._current["messages"].append(entry.get("message"))
+            return []
+        raise ValueError(f"Line {self._line_no}: unknown kind {kind!r}")
+
+    def _exists(self, backend: SessionBackend, session_id: str) -> bool:
+        file_backend = _file_backend(backend)
+        if file_backend is not None:
+            # Ask the index: reading the header would restore an archived session
+            return file_backend.index.get(session_id) is not None
+        return backend.header(session_id) is not None
+
+    def store(self, record: Dict[str, Any]) -> bool:
+        """Write one imported session; False if it was skipped because it already exists"""
+        backend = get_session_backend()
+        session_id = record["sessionId"]
+        if self._exists(backend, session_id):
+            if not self.overwrite:
+                self.skipped += 1
+                return False
+            # Drops the old session's traces, workspace and archived copy along with it
+            delete_session(session_id)
+        externalize_traces(session_id, record["messages"])
+        backend.put(record)
+        get_session_cache().invalidate(session_id)
+        self.imported += 1
+        return True
+
+    def report(self) -> Dict[str, int]:
+        return {"imported": self.imported, "skipped": self.skipped}
+
+
+def import_chunks(chunks: Iterable[bytes], overwrite: bool = False) -> Dict[str, int]:
+    """Import an export read as a sequence of byte chunks; returns how many sessions were imported and skipped"""
+    importer = SessionImporter(overwrite)
+    for chunk in chunks:
+        for record in importer.feed(chunk):
+            importer.store(record)
+    for record in importer.finish():
+        importer.store(record)
+    logger.info(f"Imported {importer.imported} sessions, skipped {importer.skipped} existing ones")
+    return importer.report()
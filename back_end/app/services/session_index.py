@@ -0,0 +1,263 @@
+import bisect
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.services.jsonl import append_line, exclusive_lock
+
+logger = logging.getLogger("app.services.session_index")
+
+INDEX_FILE = "sessions_index.jsonl"
+# Bump when the entry layout changes so stored indexes are rebuilt from the session files
+INDEX_VERSION = 1
+# The journal is rewritten with one entry per session once it holds this many more entries than sessions
+_COMPACT_SLACK = 1000
+
+
+def _line(entry: Dict[str, Any]) -> bytes:
+    return (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _order_key(summary: Dict[str, Any]) -> Tuple[str, str]:
+    """Listings are ordered by this key, descending: most recently active first"""
+    return summary.get("lastMessageAt") or "", summary.get("sessionId") or ""
+
+
+def _remove_key(order: List[Tuple[str, str]], key: Tuple[str, str]) -> None:
+    i = bisect.bisect_left(order, key)
+    if i < len(order) and order[i] == key:
+        del order[i]
+
+
+class SessionSummaryIndex:
+    """Listing summaries of all sessions, kept in a journal next to the session files.
+
+    Every change is one appended entry: ``put`` (a whole summary), ``msg``
+    (one more message at a timestamp) or ``del``. Each process replays the
+    journal into memory and later only reads what other processes appended
+    since, so listing opens no session file. The listing keys are kept sorted
+    for all sessions and per fileId, per sessionType and per pair of both, so
+    a listing page, filtered or not, only visits the sessions it returns.
+    When the journal is missing or outdated it is rebuilt from ``source``,
+    which yields the summaries of the stored sessions.
+
+    Entries are appended under a shared lock on the journal, and the journal
+    is only replaced (compacted or rebuilt) under its exclusive lock, so no
+    process's entry can fall between another's last read and its replace.
+    """
+
+    def __init__(self, storage_dir: str, source: Callable[[], Iterable[Dict[str, Any]]]):
+        self.path = os.path.join(storage_dir, INDEX_FILE)
+        self._source = source
+        self._lock = threading.RLock()
+        self._exclusive_held = False
+        self._reset()
+
+    def _reset(self) -> None:
+        self._summaries: Dict[str, Dict[str, Any]] = {}
+        # Listing keys in ascending order, kept sorted as entries are applied
+        self._order: List[Tuple[str, str]] = []
+        self._by_file: Dict[str, List[Tuple[str, str]]] = {}
+        self._by_type: Dict[str, List[Tuple[str, str]]] = {}
+        self._by_file_type: Dict[Tuple[str, str], List[Tuple[str, str]]] = {}
+        self._inode: Optional[int] = None
+        self._offset = 0
+        self._entries = 0
+
+    def _orders(self, summary: Dict[str, Any]) -> List[Tuple[Dict[Any, List[Tuple[str, str]]], Any]]:
+        """The per-group key lists a session belongs to, as (lists by group, its group)"""
+        file_id, session_type = summary.get("fileId"), summary.get("sessionType")
+        return [(self._by_file, file_id), (self._by_type, session_type), (self._by_file_type, (file_id, session_type))]
+
+    def _link_key(self, summary: Dict[str, Any]) -> None:
+        key = _order_key(summary)
+        bisect.insort(self._order, key)
+        for orders, group in self._orders(summary):
+            bisect.insort(orders.setdefault(group, []), key)
+
+    def _unlink_key(self, summary: Dict[str, Any]) -> None:
+        key = _order_key(summary)
+        _remove_key(self._order, key)
+        for orders, group in self._orders(summary):
+            order = orders.get(group)
+            if order is not None:
+                _remove_key(order, key)
+                if not order:
+                    del orders[group]
+
+    def _unlink(self, session_id: str) -> None:
+        old = self._summaries.pop(session_id, None)
+        if old is not None:
+            self._unlink_key(old)
+
+    def _apply(self, entry: Dict[str, Any]) -> None:
+        op, session_id = entry.get("op"), entry.get("sessionId")
+        if op == "put":
+            self._unlink(session_id)
+            summary = entry["summary"]
+            self._summaries[session_id] = summary
+            self._link_key(summary)
+        elif op == "msg" and session_id in self._summaries:
+            summary = self._summaries[session_id]
+            # The listing key moves with the last activity
+            self._unlink_key(summary)
+            summary["messagesCount"] = summary.get("messagesCount", 0) + 1
+            summary["lastMessageAt"] = entry.get("at")
+            self._link_key(summary)
+        elif op == "del":
+            self._unlink(session_id)
+        self._entries += 1
+
+    def _refresh(self) -> None:
+        """Apply the entries appended since the last read, reloading if the journal was replaced"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self.rebuild()
+            return
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            self._reset()
+            self._inode = stat.st_ino
+        if stat.st_size == self._offset:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        if self._offset == 0:
+            header, _, rest = data.partition(b"\n")
+            try:
+                version = json.loads(header).get("version")
+            except ValueError:
+                version = None
+            if version != INDEX_VERSION:
+                self.rebuild()
+                return
+            self._offset = len(header) + 1
+            data = rest
+        # Only complete lines; a line still being written is read on the next refresh
+        complete = data[:data.rfind(b"\n") + 1]
+        for raw in complete.splitlines():
+            try:
+                self._apply(json.loads(raw))
+            except (ValueError, KeyError):
+                logger.warning(f"Skipping unreadable entry in {INDEX_FILE}")
+        self._offset += len(complete)
+
+    @contextmanager
+    def _exclusive(self):
+        """Hold the journal's exclusive lock; taken once per process, as the flocks of two descriptors conflict"""
+        if self._exclusive_held:
+            yield
+            return
+        with exclusive_lock(self.path):
+            self._exclusive_held = True
+            try:
+                yield
+            finally:
+                self._exclusive_held = False
+
+    def _write(self, summaries: Iterable[Dict[str, Any]]) -> None:
+        # One temporary file per writer: two processes rebuilding at once must not write into the same one
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_line({"version": INDEX_VERSION}))
+            for summary in summaries:
+                f.write(_line({"op": "put", "sessionId": summary["sessionId"], "summary": summary}))
+        os.replace(tmp_path, self.path)
+        self._reset()
+
+    def rebuild(self) -> None:
+        """Recreate the journal from the stored sessions"""
+        with self._lock:
+            with self._exclusive():
+                self._write(list(self._source()))
+                logger.info(f"Rebuilt {INDEX_FILE}")
+            self._refresh()
+
+    def _needs_compaction(self) -> bool:
+        return self._entries > 2 * len(self._summaries) + _COMPACT_SLACK
+
+    def _record(self, *entries: Dict[str, Any]) -> None:
+        with self._lock:
+            self._refresh()
+            if not append_line(self.path, b"".join(_line(e) for e in entries), shared_lock=True):
+                self.rebuild()
+                return
+            self._refresh()
+            if self._needs_compaction():
+                with self._exclusive():
+                    # Appends wait for the lock: what is read now is the whole journal, and stays so until replaced
+                    self._refresh()
+                    if self._needs_compaction():
+                        self._write(list(self._summaries.values()))
+                self._refresh()
+
+    def put(self, summary: Dict[str, Any]) -> None:
+        self._record({"op": "put", "sessionId": summary["sessionId"], "summary": summary})
+
+    def messages(self, session_id: str, timestamps: List[str]) -> None:
+        """Count messages appended to a session, in one journal write"""
+        self._record(*({"op": "msg", "sessionId": session_id, "at": t} for t in timestamps))
+
+    def remove(self, session_id: str) -> None:
+        self._record({"op": "del", "sessionId": session_id})
+
+    def session_ids(self, file_id: str) -> List[str]:
+        """IDs of the sessions of a file, from the per-fileId keys: no summary is copied and no file is read"""
+        with self._lock:
+            self._refresh()
+            return sorted(key[1] for key in self._by_file.get(file_id, ()))
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            summary = self._summaries.get(session_id)
+            return dict(summary) if summary else None
+
+    def _matching(self, file_id: Optional[str], session_type: Optional[str]) -> List[Tuple[str, str]]:
+        """Sorted listing keys of the sessions matching the filters"""
+        if file_id and session_type:
+            return self._by_file_type.get((file_id, session_type), [])
+        if file_id:
+            return self._by_file.get(file_id, [])
+        if session_type:
+            return self._by_type.get(session_type, [])
+        return self._order
+
+    def list(self, file_id: Optional[str] = None, session_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Summaries of the matching sessions, most recently active first"""
+        with self._lock:
+            self._refresh()
+            return [dict(self._summaries[key[1]]) for key in reversed(self._matching(file_id, session_type))]
+
+    def page(self, file_id: Optional[str], session_type: Optional[str], after: Optional[Tuple[str, str]],
+             limit: int) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, str]]]:
+        """Up to ``limit`` matching summaries following the listing key ``after``, and the key of the last one
+        if more follow.
+
+        The page is cut from the sorted keys of the matching sessions, so it
+        costs a binary search plus the summaries returned.
+        """
+        with self._lock:
+            self._refresh()
+            order = self._matching(file_id, session_type)
+            end = len(order) if after is None else bisect.bisect_left(order, tuple(after))
+            start = max(0, end - limit)
+            page = [dict(self._summaries[key[1]]) for key in reversed(order[start:end])]
+            return page, (order[start] if start > 0 and page else None)
+
+
+_indexes: Dict[str, SessionSummaryIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_summary_index(storage_dir: str, source: Callable[[], Iterable[Dict[str, Any]]]) -> SessionSummaryIndex:
+    """The process-wide summary index of a storage directory"""
+    with _indexes_lock:
+        index = _indexes.get(storage_dir)
+        if index is None:
+            index = _indexes[storage_dir] = SessionSummaryIndex(storage_dir, source)
+        return index
@@ -0,0 +1,193 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.session_store import FileSessionBackend, SessionBackend
+
+logger = logging.getLogger("app.services.session_sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    file_id TEXT,
+    session_type TEXT NOT NULL,
+    sheet_name TEXT,
+    created_at TEXT,
+    last_message_at TEXT,
+    messages_count INTEGER NOT NULL DEFAULT 0,
+    header TEXT NOT NULL,
+    version TEXT
+);
+CREATE INDEX IF NOT EXISTS sessions_by_file ON sessions (file_id, last_message_at);
+CREATE INDEX IF NOT EXISTS sessions_by_type ON sessions (session_type, last_message_at);
+CREATE INDEX IF NOT EXISTS sessions_by_activity ON sessions (last_message_at);
+CREATE TABLE IF NOT EXISTS messages (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    message TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+"""
+
+
+def session_db_path() -> str:
+    return os.path.join(settings.storage_dir, "sessions.sqlite3")
+
+
+class SqliteSessionBackend(SessionBackend):
+    """Sessions in one SQLite database in WAL mode.
+
+    The listing fields (fileId, sessionType, lastMessageAt, message count) are
+    columns of the ``sessions`` table with indexes for the listing filters,
+    so listing never reads messages. Messages are rows keyed by (session, seq);
+    an append is one insert plus one update in a single transaction. Each
+    thread keeps its own connection; WAL lets readers run during writes.
+    Every write stores a new random ``version``, which record caches compare.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as con:
+            con.executescript(_SCHEMA)
+            # Databases created before the version column get it on first open
+            if "version" not in [row[1] for row in con.execute("PRAGMA table_info(sessions)")]:
+                con.execute("ALTER TABLE sessions ADD COLUMN version TEXT")
+
+    def _connect(self) -> sqlite3.Connection:
+        con = getattr(self._local, "connection", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            con.execute("PRAGMA journal_mode=WAL")
+            # FULL syncs the WAL on every commit; NORMAL only at checkpoints, which is still crash-safe
+            con.execute(f"PRAGMA synchronous={'FULL' if settings.session_fsync == 'always' else 'NORMAL'}")
+            self._local.connection = con
+        return con
+
+    def put(self, record: Dict[str, Any]) -> None:
+        header = {k: v for k, v in record.items() if k != "messages"}
+        messages = record.get("messages", [])
+        session_id = record["sessionId"]
+        with self._connect() as con:
+            con.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            con.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, file_id, session_type, sheet_name, created_at, "
+                "last_message_at, messages_count, header, version) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (session_id, record.get("fileId"), record.get("sessionType", "pandas"), record.get("sheetName"),
+                 record.get("createdAt"), messages[-1]["timestamp"] if messages else record.get("createdAt"),
+                 len(messages), json.dumps(header, ensure_ascii=False), uuid.uuid4().hex),
+            )
+            con.executemany(
+                "INSERT INTO messages (session_id, seq, message) VALUES (?, ?, ?)",
+                [(session_id, i, json.dumps(m, ensure_ascii=False)) for i, m in enumerate(messages)],
+            )
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        con = self._connect()
+        row = con.execute("SELECT header FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        record = json.loads(row[0])
+        record["messages"] = [
+            json.loads(m) for (m,) in con.execute("SELECT message FROM messages WHERE session_id = ? ORDER BY seq", (session_id,))
+        ]
+        return record
+
+    def append(self, session_id: str, message: Dict[str, Any]) -> bool:
+        return self.append_batch(session_id, [message])
+
+    def append_batch(self, session_id: str, messages: List[Dict[str, Any]]) -> bool:
+        """Append messages in one transaction"""
+        with self._connect() as con:
+            # The update takes the write lock first, so concurrent appends get distinct sequence numbers
+            updated = con.execute(
+                "UPDATE sessions SET messages_count = messages_count + ?, last_message_at = ?, version = ? "
+                "WHERE session_id = ? RETURNING messages_count - ?",
+                (len(messages), messages[-1].get("timestamp"), uuid.uuid4().hex, session_id, len(messages)),
+            ).fetchone()
+            if updated is None:
+                return False
+            con.executemany("INSERT INTO messages (session_id, seq, message) VALUES (?, ?, ?)",
+                            [(session_id, updated[0] + i, json.dumps(m, ensure_ascii=False)) for i, m in enumerate(messages)])
+        return True
+
+    def version(self, session_id: str) -> Optional[Any]:
+        row = self._connect().execute("SELECT version FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row else None
+
+    def session_ids(self, file_id: str) -> List[str]:
+        return [row[0] for row in self._connect().execute("SELECT session_id FROM sessions WHERE file_id = ?", (file_id,))]
+
+    def header(self, session_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute("SELECT header FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def messages_page(self, session_id: str, before: Optional[int], limit: int) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        rows = self._connect().execute(
+            "SELECT seq, message FROM messages WHERE session_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+            (session_id, before if before is not None else 2 ** 62, limit),
+        ).fetchall()
+        rows.reverse()
+        return [json.loads(m) for _, m in rows], (rows[0][0] or None) if rows else None
+
+    def list(self, file_id: Optional[str] = None, session_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        return self._select(file_id, session_type, None, None)
+
+    def list_page(self, file_id: Optional[str], session_type: Optional[str], after: Optional[Tuple[str, str]],
+                  limit: int) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, str]]]:
+        rows = self._select(file_id, session_type, after, limit + 1)
+        page = rows[:limit]
+        return page, (page[-1]["lastMessageAt"] or "", page[-1]["sessionId"]) if len(rows) > limit else None
+
+    def _select(self, file_id: Optional[str], session_type: Optional[str], after: Optional[Tuple[str, str]],
+                limit: Optional[int]) -> List[Dict[str, Any]]:
+        query = ("SELECT session_id, file_id, sheet_name, created_at, session_type, messages_count, last_message_at "
+                 "FROM sessions")
+        conditions, params = [], []
+        if file_id:
+            conditions.append("file_id = ?")
+            params.append(file_id)
+        if session_type:
+            conditions.append("session_type = ?")
+            params.append(session_type)
+        if after is not None:
+            conditions.append("(last_message_at, session_id) < (?, ?)")
+            params.extend(after)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY last_message_at DESC, session_id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        keys = ["sessionId", "fileId", "sheetName", "createdAt", "sessionType", "messagesCount", "lastMessageAt"]
+        return [dict(zip(keys, row)) for row in self._connect().execute(query, params)]
+
+    def delete(self, session_id: str) -> bool:
+        with self._connect() as con:
+            con.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            return con.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,)).rowcount > 0
+
+
+def import_file_sessions(backend: SessionBackend, storage_dir: Optional[str] = None) -> int:
+    """Copy every session file of the storage directory into ``backend``; returns the number imported.
+
+    The files are left in place, so running the import again overwrites the
+    imported copies with the same content.
+    """
+    files = FileSessionBackend(storage_dir or settings.storage_dir)
+    imported = 0
+    for session_id, path in files.session_files():
+        try:
+            record = files.read_file(path)
+        except Exception as e:
+            logger.warning(f"Skipping unreadable session file {os.path.basename(path)}: {e}")
+            continue
+        record.setdefault("sessionId", session_id)
+        backend.put(record)
+        imported += 1
+    return imported
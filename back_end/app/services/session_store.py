@@ -1,15 +1,610 @@
+import atexit
+import base64
 import json
+import logging
 import os
-from typing import Any, Dict, Optional, List
+import threading
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, List, Tuple
 
 from app.core.config import settings
+from app.services.jsonl import append_line, exclusive_lock
+from app.services.session_archive import archived_summaries, drop_from_catalog, read_archived
+from app.services.session_index import SessionSummaryIndex, get_summary_index
+from app.services.traces import delete_trace, delete_traces, externalize_traces, load_trace, save_trace
+from app.services.workspace import delete_workspace
 
+logger = logging.getLogger("app.services.session_store")
 
-def _session_path(session_id: str) -> str:
-    return os.path.join(settings.storage_dir, f"session_{session_id}.json")
 
+class SessionBackend(ABC):
+    """Storage of session records: the session's fields plus its list of messages"""
 
-def create_session_record(session_id: str, file_id: str, sheet_name: str, created_at: str, session_type: str = "pandas") -> None:
+    @abstractmethod
+    def put(self, record: Dict[str, Any]) -> None:
+        """Store a whole record, replacing the session if it exists"""
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """The record with its messages, or None"""
+
+    @abstractmethod
+    def append(self, session_id: str, message: Dict[str, Any]) -> bool:
+        """Add a message at the end of a session; False if the session does not exist"""
+
+    @abstractmethod
+    def list(self, file_id: Optional[str] = None, session_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Summaries of the matching sessions, most recently active first"""
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """Remove a session; False if it did not exist"""
+
+    def append_batch(self, session_id: str, messages: List[Dict[str, Any]]) -> bool:
+        """Add several messages at the end of a session, in order"""
+        return all([self.append(session_id, m) for m in messages])
+
+    def version(self, session_id: str) -> Optional[Any]:
+        """A cheap token that changes whenever the stored session changes, in any process; None if unknown.
+
+        Records are only cached by backends that provide one.
+        """
+        return None
+
+    def session_ids(self, file_id: str) -> List[str]:
+        """IDs of the sessions attached to a file"""
+        return [s["sessionId"] for s in self.list(file_id)]
+
+    def header(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """The session's fields without its messages, or None"""
+        rec = self.get(session_id)
+        if rec is None:
+            return None
+        return {k: v for k, v in rec.items() if k != "messages"}
+
+    def messages_page(self, session_id: str, before: Optional[int], limit: int) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Up to ``limit`` messages preceding position ``before`` (default: the end), oldest first.
+
+        Returns the messages and the position to pass as ``before`` for the
+        previous page, or None when the page starts at the first message.
+        """
+        rec = self.get(session_id)
+        return _page_of(rec.get("messages", []) if rec else [], before, limit)
+
+    def list_page(self, file_id: Optional[str], session_type: Optional[str], after: Optional[Tuple[str, str]],
+                  limit: int) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, str]]]:
+        """Up to ``limit`` summaries following the (lastMessageAt, sessionId) key ``after``, and the key of the last one
+        if more follow"""
+        sessions = self.list(file_id, session_type)
+        if after is not None:
+            sessions = [s for s in sessions if _listing_key(s) < after]
+        page = sessions[:limit]
+        return page, _listing_key(page[-1]) if len(sessions) > limit else None
+
+
+def _page_of(messages: List[Dict[str, Any]], before: Optional[int], limit: int) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    end = len(messages) if before is None else min(before, len(messages))
+    start = max(0, end - limit)
+    return messages[start:end], start or None
+
+
+def _listing_key(summary: Dict[str, Any]) -> Tuple[str, str]:
+    """Sort key of the listings, most recently active first: compared descending"""
+    return summary.get("lastMessageAt") or "", summary.get("sessionId") or ""
+
+
+def session_summary(rec: Dict[str, Any]) -> Dict[str, Any]:
+    """The listing entry of a session record"""
+    messages = rec.get("messages", [])
+    return {
+        "sessionId": rec.get("sessionId"),
+        "fileId": rec.get("fileId"),
+        "sheetName": rec.get("sheetName"),
+        "createdAt": rec.get("createdAt"),
+        "sessionType": rec.get("sessionType", "pandas"),  # default to pandas for backward compatibility
+        "messagesCount": len(messages),
+        "lastMessageAt": messages[-1]["timestamp"] if messages else rec.get("createdAt"),
+    }
+
+
+def _dumps_line(value: Dict[str, Any]) -> bytes:
+    return (json.dumps(value, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+# Writes to one session are serialised within the process by one of a fixed set of locks
+_SESSION_LOCK_STRIPES = 64
+_session_locks = [threading.RLock() for _ in range(_SESSION_LOCK_STRIPES)]
+
+
+def _session_lock(session_id: str) -> threading.RLock:
+    return _session_locks[hash(session_id) % _SESSION_LOCK_STRIPES]
+
+
+class _LineOffsets:
+    """Where the message lines of one session log start, extended as the log grows.
+
+    ``starts`` holds the offset of every non-blank line after the header, and
+    ``scanned`` the offset following the last complete line read so far.
+    """
+
+    def __init__(self, inode: int):
+        self.inode = inode
+        self.starts = array("q")
+        self.scanned = 0
+        self.lock = threading.Lock()
+        self._header_read = False
+
+    def extend(self, f, size: int) -> None:
+        """Index the complete lines between ``scanned`` and ``size``"""
+        f.seek(self.scanned)
+        base, pending = self.scanned, b""
+        while base + len(pending) < size:
+            block = f.read(min(_SCAN_BLOCK, size - base - len(pending)))
+            if not block:
+                break
+            data, start = pending + block, 0
+            while True:
+                end = data.find(b"\n", start)
+                if end < 0:
+                    break
+                if not self._header_read:
+                    self._header_read = True
+                elif data[start:end].strip():
+                    self.starts.append(base + start)
+                start = end + 1
+            base, pending = base + start, data[start:]
+        self.scanned = base
+
+
+# Session logs whose line offsets are kept, least recently paged are dropped first
+_MAX_LINE_OFFSETS = 256
+_SCAN_BLOCK = 1 << 20
+_line_offsets: "OrderedDict[str, _LineOffsets]" = OrderedDict()
+_line_offsets_lock = threading.Lock()
+
+
+def _offsets_of(path: str, f) -> _LineOffsets:
+    """The line offsets of an open session log, reading only what was appended since they were last used"""
+    stat = os.fstat(f.fileno())
+    with _line_offsets_lock:
+        offsets = _line_offsets.get(path)
+        # A rewrite replaces the file: its offsets start over
+        if offsets is None or offsets.inode != stat.st_ino or stat.st_size < offsets.scanned:
+            offsets = _line_offsets[path] = _LineOffsets(stat.st_ino)
+        _line_offsets.move_to_end(path)
+        while len(_line_offsets) > _MAX_LINE_OFFSETS:
+            _line_offsets.popitem(last=False)
+    with offsets.lock:
+        offsets.extend(f, stat.st_size)
+    return offsets
+
+
+class FileSessionBackend(SessionBackend):
+    """One file per session in the storage directory.
+
+    A session is stored as a log: the first line holds the session's fields,
+    every further line one message, so appending costs the size of the
+    message. Sessions written before the log format are single JSON documents;
+    they are read as they are and turned into a log by their next write.
+    Listings come from a :class:`SessionSummaryIndex` updated on every write.
+    Idle sessions may be moved into compressed archive segments (see
+    :mod:`app.services.session_archive`); their summary stays in the index
+    and the first read or write restores the log file.
+    """
+
+    def __init__(self, storage_dir: str):
+        self.storage_dir = storage_dir
+
+    @property
+    def index(self) -> SessionSummaryIndex:
+        return get_summary_index(self.storage_dir, self.scan_summaries)
+
+    def log_path(self, session_id: str) -> str:
+        return os.path.join(self.storage_dir, f"session_{session_id}.jsonl")
+
+    def legacy_path(self, session_id: str) -> str:
+        return os.path.join(self.storage_dir, f"session_{session_id}.json")
+
+    def path(self, session_id: str) -> Optional[str]:
+        """File holding a session, in either format, or None if there is none"""
+        for path in (self.log_path(session_id), self.legacy_path(session_id)):
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _open_path(self, session_id: str) -> Optional[str]:
+        """Like :meth:`path`, restoring the session from the archive first if it was archived"""
+        path = self.path(session_id)
+        if path is None and self.rehydrate(session_id):
+            path = self.path(session_id)
+        return path
+
+    @staticmethod
+    def read_file(path: str) -> Dict[str, Any]:
+        if not path.endswith(".jsonl"):
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        with open(path, "r", encoding="utf-8") as f:
+            return FileSessionBackend.parse_log(f, os.path.basename(path))
+
+    @staticmethod
+    def parse_log(lines: Iterable[str], name: str) -> Dict[str, Any]:
+        """The record of a session log given as lines: the header, then one message per line"""
+        lines = iter(lines)
+        record = json.loads(next(lines))
+        messages = []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                messages.append(json.loads(line))
+            except ValueError:
+                # A write cut short by a crash leaves a partial last line; the messages before it are intact
+                logger.warning(f"Skipping unreadable message line in {name}")
+        record["messages"] = messages
+        return record
+
+    def session_files(self) -> Iterator[Tuple[str, str]]:
+        """(session id, path) of every stored session"""
+        try:
+            names = os.listdir(self.storage_dir)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if not name.startswith("session_") or not name.endswith((".json", ".jsonl")):
+                continue
+            path = os.path.join(self.storage_dir, name)
+            if name.endswith(".json") and os.path.exists(f"{path}l"):
+                continue  # Being converted to a log; the log is the current copy
+            yield name[len("session_"):].rsplit(".", 1)[0], path
+
+    def _rewrite(self, session_id: str, make_record: Callable[[], Optional[Dict[str, Any]]]) -> bool:
+        """Write a whole session log at once, replacing the previous file atomically.
+
+        The record is built while holding the session's lock and the exclusive
+        lock of its current file, so no append lands in the old file after it
+        was read: appenders wait and then write to the new file.
+        """
+        path = self.log_path(session_id)
+        with _session_lock(session_id), exclusive_lock(path):
+            record = make_record()
+            if record is None:
+                return False
+            tmp_path = f"{path}.tmp"
+            header = {k: v for k, v in record.items() if k != "messages"}
+            with open(tmp_path, "wb") as f:
+                f.write(_dumps_line(header))
+                for message in record.get("messages", []):
+                    f.write(_dumps_line(message))
+                f.flush()
+                if settings.session_fsync == "always":
+                    os.fsync(f.fileno())
+            # Appenders that open the new log wait for its lock until the summary below is in the index,
+            # so every message they count comes after it
+            with exclusive_lock(tmp_path):
+                os.replace(tmp_path, path)
+                legacy = self.legacy_path(session_id)
+                if os.path.exists(legacy):
+                    os.remove(legacy)
+                self.index.put(session_summary(record))
+        return True
+
+    def put(self, record: Dict[str, Any]) -> None:
+        self._rewrite(record["sessionId"], lambda: record)
+
+    def log_bytes(self, session_id: str) -> Optional[bytes]:
+        """The session as log lines, converting the old JSON format; None if there is no file"""
+        path = self.path(session_id)
+        try:
+            if path and path.endswith(".jsonl"):
+                with open(path, "rb") as f:
+                    return f.read()
+            if path:
+                record = self.read_file(path)
+                header = {k: v for k, v in record.items() if k != "messages"}
+                return b"".join([_dumps_line(header)] + [_dumps_line(m) for m in record.get("messages", [])])
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def retire(self, session_id: str, version: Any, location: Dict[str, Any]) -> bool:
+        """Remove the file of a session stored at ``location`` of an archive segment, unless it changed since
+        ``version`` was taken"""
+        path = self.log_path(session_id)
+        with _session_lock(session_id), exclusive_lock(path):
+            if self.version(session_id) != version:
+                return False
+            summary = self.index.get(session_id)
+            if summary is None:
+                return False
+            for stale in (path, self.legacy_path(session_id)):
+                if os.path.exists(stale):
+                    os.remove(stale)
+            self.index.put({**summary, "archived": location})
+        return True
+
+    def archived_record(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """The record of an archived session read from its segment, without restoring it; None if not archived"""
+        summary = self.index.get(session_id)
+        location = summary.get("archived") if summary else None
+        if not location:
+            return None
+        data = read_archived(self.storage_dir, location).decode("utf-8")
+        return self.parse_log(data.splitlines(), location["segment"])
+
+    def rehydrate(self, session_id: str) -> bool:
+        """Restore the log file of an archived session; False if the session is not archived"""
+        with _session_lock(session_id):
+            if self.path(session_id) is not None:
+                return True
+            summary = self.index.get(session_id)
+            location = summary.get("archived") if summary else None
+            if not location:
+                return False
+            path = self.log_path(session_id)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(read_archived(self.storage_dir, location))
+            os.replace(tmp_path, path)
+            drop_from_catalog(self.storage_dir, location["segment"], session_id)
+            self.index.put(session_summary(self.read_file(path)))
+        logger.info(f"Restored archived session {session_id}")
+        return True
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        path = self._open_path(session_id)
+        if path is None:
+            return None
+        try:
+            return self.read_file(path)
+        except Exception:
+            return None
+
+    def header(self, session_id: str) -> Optional[Dict[str, Any]]:
+        path = self._open_path(session_id)
+        if path is None or not path.endswith(".jsonl"):
+            return super().header(session_id)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.loads(f.readline())
+        except Exception:
+            return None
+
+    def messages_page(self, session_id: str, before: Optional[int], limit: int) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        path = self._open_path(session_id)
+        if path is None or not path.endswith(".jsonl"):
+            return super().messages_page(session_id, before, limit)
+        # The cursor maps to a byte offset through the log's line offsets: only the lines of the page are read
+        with open(path, "rb") as f:
+            offsets = _offsets_of(path, f)
+            starts = offsets.starts
+            end = len(starts) if before is None else min(before, len(starts))
+            start = max(0, end - limit)
+            data = b""
+            if start < end:
+                f.seek(starts[start])
+                data = f.read((starts[end] if end < len(starts) else offsets.scanned) - starts[start])
+        messages = []
+        for line in (line for line in data.split(b"\n") if line.strip()):
+            try:
+                messages.append(json.loads(line))
+            except ValueError:
+                logger.warning(f"Skipping unreadable message line in {os.path.basename(path)}")
+        return messages, start or None
+
+    def version(self, session_id: str) -> Optional[Any]:
+        # Appends grow the file, rewrites replace it with a new inode
+        path = self.path(session_id)
+        try:
+            stat = os.stat(path) if path else None
+        except FileNotFoundError:
+            return None
+        return (path, stat.st_ino, stat.st_size, stat.st_mtime_ns) if stat else None
+
+    def compact(self, session_id: str) -> bool:
+        """Rewrite a session as a clean log: converts the old JSON format, moves inline traces to trace blobs
+        and drops partial lines"""
+        def clean() -> Optional[Dict[str, Any]]:
+            record = self.get(session_id)
+            if record is not None:
+                externalize_traces(session_id, record.get("messages", []))
+            return record
+
+        return self._rewrite(session_id, clean)
+
+    def append(self, session_id: str, message: Dict[str, Any]) -> bool:
+        return self.append_batch(session_id, [message])
+
+    def append_batch(self, session_id: str, messages: List[Dict[str, Any]]) -> bool:
+        """Append messages with one write (and at most one fsync) to the session's log"""
+        data = b"".join(_dumps_line(m) for m in messages)
+        timestamps = [m.get("timestamp") for m in messages]
+        with _session_lock(session_id):
+            # A second attempt covers a log archived by another process between the check and the write
+            for _ in range(2):
+                if not os.path.exists(self.log_path(session_id)) and not self.compact(session_id):
+                    return False
+                # Counted while the log's lock is held, so a rewrite's summary is either before or after it
+                if append_line(self.log_path(session_id), data, fsync=settings.session_fsync == "always",
+                               shared_lock=True, on_written=lambda: self.index.messages(session_id, timestamps)):
+                    return True
+            return False
+
+    def scan_summaries(self) -> Iterator[Dict[str, Any]]:
+        """Summaries read from the session files themselves and the archive catalogs, to (re)build the index"""
+        stored = set()
+        for session_id, path in self.session_files():
+            try:
+                yield session_summary(self.read_file(path))
+                stored.add(session_id)
+            except Exception:
+                continue
+        for summary in archived_summaries(self.storage_dir):
+            if summary["sessionId"] not in stored:
+                yield summary
+
+    def session_ids(self, file_id: str) -> List[str]:
+        return self.index.session_ids(file_id)
+
+    def list(self, file_id: Optional[str] = None, session_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        # Where an archived session is stored is internal: listings only say that it is archived
+        return [{**s, "archived": True} if s.get("archived") else s for s in self.index.list(file_id, session_type)]
+
+    def list_page(self, file_id: Optional[str], session_type: Optional[str], after: Optional[Tuple[str, str]],
+                  limit: int) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, str]]]:
+        page, last = self.index.page(file_id, session_type, after, limit)
+        return [{**s, "archived": True} if s.get("archived") else s for s in page], last
+
+    def delete(self, session_id: str) -> bool:
+        deleted = False
+        with _session_lock(session_id):
+            for path in (self.log_path(session_id), self.legacy_path(session_id)):
+                if os.path.exists(path):
+                    os.remove(path)
+                    deleted = True
+            if not deleted:
+                summary = self.index.get(session_id)
+                location = summary.get("archived") if summary else None
+                if location:
+                    drop_from_catalog(self.storage_dir, location["segment"], session_id)
+                    deleted = True
+        if deleted:
+            self.index.remove(session_id)
+        return deleted
+
+
+class SessionRecordCache:
+    """Process-wide LRU of parsed session records.
+
+    Every hit is validated against the backend's :meth:`SessionBackend.version`
+    (a ``stat`` of the log, or a version column), so a write from any worker
+    is seen on the next read and the record is parsed again. Callers get a
+    copy of the record and its message list.
+    """
+
+    def __init__(self, backend: SessionBackend, max_entries: int):
+        self.backend = backend
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Any, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _cached(self, session_id: str, version: Any) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(session_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        # Read the version first: a write racing with the read below makes the entry stale, never wrong
+        version = self.backend.version(session_id) if self.max_entries > 0 else None
+        if version is None:
+            return self.backend.get(session_id)
+        record = self._cached(session_id, version)
+        if record is None:
+            record = self.backend.get(session_id)
+            if record is None:
+                return None
+            with self._lock:
+                self._entries[session_id] = (version, record)
+                self._entries.move_to_end(session_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return {**record, "messages": list(record.get("messages", []))}
+
+    def peek(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """The cached record if it is current, without loading it otherwise"""
+        with self._lock:
+            if session_id not in self._entries:
+                return None
+        version = self.backend.version(session_id)
+        return self._cached(session_id, version) if version is not None else None
+
+    def invalidate(self, session_id: str) -> None:
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "records": len(self._entries),
+                "maxRecords": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+_backend: Optional[SessionBackend] = None
+_record_cache: Optional[SessionRecordCache] = None
+_backend_key: Optional[Tuple[str, str, int]] = None
+_backend_lock = threading.Lock()
+
+
+def get_session_backend() -> SessionBackend:
+    """The backend selected by SESSION_BACKEND, for the current storage directory"""
+    global _backend, _backend_key, _record_cache
+    key = (settings.session_backend, settings.storage_dir, settings.session_write_behind_ms)
+    with _backend_lock:
+        if _backend is None or _backend_key != key:
+            if _backend is not None and hasattr(_backend, "close"):
+                _backend.close()
+            if settings.session_backend == "sqlite":
+                from app.services.session_sqlite import SqliteSessionBackend, session_db_path
+
+                backend: SessionBackend = SqliteSessionBackend(session_db_path())
+            else:
+                backend = FileSessionBackend(settings.storage_dir)
+            if settings.session_write_behind_ms > 0:
+                from app.services.session_writer import WriteBehindSessionBackend
+
+                backend = WriteBehindSessionBackend(backend, settings.session_write_behind_ms / 1000)
+                # Queued messages are written before the process exits
+                atexit.register(backend.close)
+            _backend, _backend_key = backend, key
+            _record_cache = SessionRecordCache(backend, settings.session_cache_max_entries)
+        return _backend
+
+
+def get_session_cache() -> SessionRecordCache:
+    """The record cache of the current session backend"""
+    get_session_backend()
+    return _record_cache
+
+
+def get_session_metrics() -> Dict[str, Any]:
+    """Runtime metrics of the session store"""
+    backend = get_session_backend()
+    from app.services.session_archive import get_session_archiver
+
+    metrics: Dict[str, Any] = {"backend": settings.session_backend, "cache": get_session_cache().get_metrics()}
+    if settings.session_archive_after_days > 0:
+        metrics["archive"] = get_session_archiver().get_metrics()
+    if hasattr(backend, "get_metrics"):
+        metrics["writer"] = backend.get_metrics()
+    return metrics
+
+
+def session_path(session_id: str) -> Optional[str]:
+    """File holding a session in the file backend, or None if there is none"""
+    return FileSessionBackend(settings.storage_dir).path(session_id)
+
+
+def compact_session(session_id: str) -> bool:
+    """Rewrite a session of the file backend as a clean log"""
+    return FileSessionBackend(settings.storage_dir).compact(session_id)
+
+
+def create_session_record(session_id: str, file_id: str, sheet_name: str, created_at: str, session_type: str = "pandas", mode: str = "sheet") -> None:
     record = {
         "sessionId": session_id,
         "fileId": file_id,
@@ -18,96 +613,148 @@ def create_session_record(session_id: str, file_id: str, sheet_name: str, create
         "sessionType": session_type,  # "pandas" or "rag"
         "messages": [],
     }
-    with open(_session_path(session_id), "w", encoding="utf-8") as f:
-        json.dump(record, f, ensure_ascii=False, indent=2)
+    if mode != "sheet":
+        record["mode"] = mode  # "workbook": the agent sees every sheet of the file
+    get_session_backend().put(record)
 
 
 def get_session_record(session_id: str) -> Optional[Dict[str, Any]]:
-    path = _session_path(session_id)
-    if not os.path.exists(path):
-        return None
+    return get_session_cache().get(session_id)
+
+
+def get_session_header(session_id: str) -> Optional[Dict[str, Any]]:
+    """The session's fields without reading its messages"""
+    cached = get_session_cache().peek(session_id)
+    if cached is not None:
+        return {k: v for k, v in cached.items() if k != "messages"}
+    return get_session_backend().header(session_id)
+
+
+# Response header carrying the cursor of the next page of a paginated endpoint
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def page_size(limit: Optional[int]) -> int:
+    """Requested page size, defaulting to SESSION_PAGE_SIZE and capped at SESSION_PAGE_MAX_SIZE"""
+    return max(1, min(limit or settings.session_page_size, settings.session_page_max_size))
+
+
+def encode_cursor(value: Any) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Any:
+    """Position encoded by :func:`encode_cursor`; ValueError if the cursor is malformed"""
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return None
+        return json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
 
 
-def append_message(session_id: str, role: str, content: str, timestamp: str, trace: str | None = None) -> None:
-    path = _session_path(session_id)
-    rec = get_session_record(session_id)
-    if rec is None:
-        return
+def project_message(message: Dict[str, Any], include_trace: bool, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """A message as returned by the API: with ``include_trace`` its trace is loaded from its blob, otherwise only
+    the ``traceId`` reference is kept"""
+    if include_trace:
+        if session_id and message.get("traceId") and "trace" not in message:
+            return {**message, "trace": load_trace(session_id, message["traceId"])}
+        return message
+    if "trace" not in message:
+        return message
+    return {k: v for k, v in message.items() if k != "trace"}
+
+
+def get_messages_page(session_id: str, cursor: Optional[str], limit: int,
+                      include_trace: bool = False) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """The latest ``limit`` messages before ``cursor``, oldest first, and the cursor of the page before them"""
+    before = None
+    if cursor:
+        before = decode_cursor(cursor)
+        if not isinstance(before, int):
+            raise ValueError(f"Invalid cursor: {cursor}")
+    cached = get_session_cache().peek(session_id)
+    if cached is not None:
+        # Already parsed: slice the cached messages instead of reading the log again
+        messages, previous = _page_of(cached.get("messages", []), before, limit)
+    else:
+        messages, previous = get_session_backend().messages_page(session_id, before, limit)
+    return [project_message(m, include_trace, session_id) for m in messages], encode_cursor(previous) if previous else None
+
+
+def append_message(session_id: str, role: str, content: str, timestamp: str, trace: str | None = None,
+                   cached: bool = False, replayed: bool = False) -> Dict[str, Any]:
+    """Append a message to a session and return it as stored"""
     message = {
         "role": role,
         "content": content,
         "timestamp": timestamp,
     }
     if trace:
-        message["trace"] = trace
-    rec.setdefault("messages", []).append(message)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(rec, f, ensure_ascii=False, indent=2)
+        # Traces are often far larger than the answer: the session only keeps a reference to a compressed blob
+        message["traceId"] = save_trace(session_id, trace)
+    if cached:
+        message["cached"] = True
+    if replayed:
+        message["replayed"] = True
+    if not get_session_backend().append(session_id, message) and trace:
+        delete_trace(session_id, message["traceId"])
+    return message
 
 
 def list_sessions(file_id: Optional[str] = None, session_type: Optional[str] = None) -> List[Dict[str, Any]]:
-    sessions: List[Dict[str, Any]] = []
     try:
-        for name in os.listdir(settings.storage_dir):
-            if not name.startswith("session_") or not name.endswith(".json"):
-                continue
-            path = os.path.join(settings.storage_dir, name)
-            try:
-                with open(path, "r", encoding="utf-8") as f:
-                    rec = json.load(f)
-                    
-                    # Filter by file_id if provided
-                    if file_id and rec.get("fileId") != file_id:
-                        continue
-                    
-                    # Filter by session_type if provided
-                    rec_session_type = rec.get("sessionType", "pandas")  # default to pandas for backward compatibility
-                    if session_type and rec_session_type != session_type:
-                        continue
-                    
-                    sessions.append({
-                        "sessionId": rec.get("sessionId"),
-                        "fileId": rec.get("fileId"),
-                        "sheetName": rec.get("sheetName"),
-                        "createdAt": rec.get("createdAt"),
-                        "sessionType": rec_session_type,
-                        "messagesCount": len(rec.get("messages", [])),
-                        "lastMessageAt": rec.get("messages", [])[-1]["timestamp"] if rec.get("messages") else rec.get("createdAt"),
-                    })
-            except Exception:
-                continue
-        # Sort by lastMessageAt desc
-        sessions.sort(key=lambda r: r.get("lastMessageAt") or "", reverse=True)
-    except FileNotFoundError:
-        pass
-    return sessions
+        return get_session_backend().list(file_id, session_type)
+    except Exception as e:
+        logger.warning(f"Could not list sessions: {e}")
+        return []
+
+
+def list_sessions_page(file_id: Optional[str], session_type: Optional[str], cursor: Optional[str],
+                       limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page of :func:`list_sessions` and the cursor of the next page"""
+    after = None
+    if cursor:
+        after = decode_cursor(cursor)
+        if not (isinstance(after, list) and len(after) == 2 and all(isinstance(v, str) for v in after)):
+            raise ValueError(f"Invalid cursor: {cursor}")
+        after = tuple(after)
+    page, last = get_session_backend().list_page(file_id, session_type, after, limit)
+    return page, encode_cursor(list(last)) if last else None
 
 
 def delete_session(session_id: str) -> bool:
-    path = _session_path(session_id)
     try:
-        if os.path.exists(path):
-            os.remove(path)
+        get_session_cache().invalidate(session_id)
+        if get_session_backend().delete(session_id):
+            delete_workspace(session_id)
+            delete_traces(session_id)
             return True
         return False
     except Exception:
         return False
 
 
+def delete_file_sessions(file_id: str) -> int:
+    """Delete every session of a file, with its traces and workspace; returns how many were deleted.
+
+    The sessions are found through the backend's fileId index, so the cost
+    depends only on how many sessions the file has.
+    """
+    deleted = 0
+    for session_id in get_session_backend().session_ids(file_id):
+        if delete_session(session_id):
+            deleted += 1
+    return deleted
+
+
 # Helper functions for the new session system
 def create_session(file_id: str, session_name: str, created_at: str, session_type: str = "pandas") -> str:
     """Create a new session and return session ID"""
     import uuid
     session_id = str(uuid.uuid4())
-    
+
     # For RAG sessions, we don't use sheet_name
     sheet_name = session_name if session_type == "rag" else session_name
-    
+
     create_session_record(session_id, file_id, sheet_name, created_at, session_type)
     return session_id
 
@@ -128,5 +775,3 @@ def get_session_messages(session_id: str) -> List[Dict[str, Any]]:
     if rec is None:
         return []
     return rec.get("messages", [])
-
-
@@ -0,0 +1,156 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.session_store import SessionBackend
+from app.services.traces import delete_trace
+
+logger = logging.getLogger("app.services.session_writer")
+
+
+class WriteBehindSessionBackend(SessionBackend):
+    """Buffers appended messages and writes them from one background thread.
+
+    ``append`` only queues the message, so request handlers do not wait for
+    the disk. The writer waits up to ``window_seconds`` after the first queued
+    message, then commits everything queued by then with one
+    ``append_batch`` per session: under load many messages share one write
+    (and one fsync). Messages of a session are written in the order they
+    were appended. Every other operation first waits until the queue is
+    written, so reads always see earlier appends. A queued message that
+    cannot be written, because its session is gone by then or the write
+    fails, is dropped along with its trace blob.
+    """
+
+    def __init__(self, inner: SessionBackend, window_seconds: float):
+        self.inner = inner
+        self.window_seconds = window_seconds
+        self._pending: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self._writing = False
+        self._flush_requested = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self.batches = 0
+        self.messages = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="session-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                # Let more messages join the group unless someone is waiting for them
+                deadline = time.monotonic() + self.window_seconds
+                while not (self._flush_requested or self._closed) and time.monotonic() < deadline:
+                    self._cond.wait(deadline - time.monotonic())
+                batch, self._pending = self._pending, OrderedDict()
+                self._writing = True
+                self._flush_requested = False
+            try:
+                for session_id, messages in batch.items():
+                    try:
+                        if not self.inner.append_batch(session_id, messages):
+                            logger.warning(f"Dropped {len(messages)} messages of missing session {session_id}")
+                            self._drop(session_id, messages)
+                    except Exception as e:
+                        logger.error(f"Could not write {len(messages)} messages of session {session_id}: {e}")
+                        self._drop(session_id, messages)
+            finally:
+                with self._cond:
+                    self._writing = False
+                    self.batches += 1
+                    self.messages += sum(len(m) for m in batch.values())
+                    self._cond.notify_all()
+
+    def _drop(self, session_id: str, messages: List[Dict[str, Any]]) -> None:
+        # The caller was told the append succeeded: at least no trace blob is left without its message
+        for message in messages:
+            if message.get("traceId"):
+                try:
+                    delete_trace(session_id, message["traceId"])
+                except Exception as e:
+                    logger.warning(f"Could not delete the trace of a dropped message of {session_id}: {e}")
+        with self._cond:
+            self.dropped += len(messages)
+
+    def flush(self) -> None:
+        """Wait until every message appended so far is written"""
+        with self._cond:
+            while self._pending or self._writing:
+                self._flush_requested = True
+                self._cond.notify_all()
+                self._cond.wait()
+
+    def close(self) -> None:
+        """Write what is queued and stop the writer thread"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "pendingMessages": sum(len(m) for m in self._pending.values()),
+                "batches": self.batches,
+                "messagesWritten": self.messages - self.dropped,
+                "messagesDropped": self.dropped,
+                "windowMs": round(self.window_seconds * 1000),
+            }
+
+    def append(self, session_id: str, message: Dict[str, Any]) -> bool:
+        """Queue a message; True means queued, not written (see the class docstring for dropped messages)"""
+        with self._cond:
+            if self._closed:
+                return self.inner.append(session_id, message)
+            self._pending.setdefault(session_id, []).append(message)
+            self._cond.notify_all()
+        return True
+
+    def append_batch(self, session_id: str, messages: List[Dict[str, Any]]) -> bool:
+        for message in messages:
+            self.append(session_id, message)
+        return True
+
+    def put(self, record: Dict[str, Any]) -> None:
+        self.flush()
+        self.inner.put(record)
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        self.flush()
+        return self.inner.get(session_id)
+
+    def version(self, session_id: str) -> Optional[Any]:
+        self.flush()
+        return self.inner.version(session_id)
+
+    def header(self, session_id: str) -> Optional[Dict[str, Any]]:
+        # Appends do not change the session's fields, so there is nothing to wait for
+        return self.inner.header(session_id)
+
+    def messages_page(self, session_id: str, before: Optional[int], limit: int) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        self.flush()
+        return self.inner.messages_page(session_id, before, limit)
+
+    def session_ids(self, file_id: str) -> List[str]:
+        self.flush()
+        return self.inner.session_ids(file_id)
+
+    def list(self, file_id: Optional[str] = None, session_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        self.flush()
+        return self.inner.list(file_id, session_type)
+
+    def list_page(self, file_id: Optional[str], session_type: Optional[str], after: Optional[Tuple[str, str]],
+                  limit: int) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, str]]]:
+        self.flush()
+        return self.inner.list_page(file_id, session_type, after, limit)
+
+    def delete(self, session_id: str) -> bool:
+        self.flush()
+        return self.inner.delete(session_id)
@@ -0,0 +1,128 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+
+from app.core.config import settings
+from app.services.snapshot import load_preprocessed_sheet
+
+logger = logging.getLogger("app.services.sheet_cache")
+
+
+def private_copy(df: pd.DataFrame) -> pd.DataFrame:
+    """A copy of a shared frame that the caller may change, even in place, without changing ``df``.
+
+    Under pandas copy-on-write (PANDAS_COPY_ON_WRITE) this is a shallow copy
+    sharing memory until it is written to; otherwise the data is copied.
+    """
+    return df.copy(deep=not pd.get_option("mode.copy_on_write"))
+
+
+class SheetCache:
+    """Process-wide LRU of preprocessed sheets, bounded by DataFrame memory usage.
+
+    Entries are keyed by (path, sheet, mtime, size), so a replaced file is
+    never served from a stale entry. Misses are served from the sheet's Parquet
+    snapshot when there is one. Concurrent loads of the same sheet wait for the
+    first one instead of parsing the workbook twice.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple, Tuple[pd.DataFrame, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loading: Dict[Tuple, threading.Event] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(file_path: str, sheet_name: str) -> Tuple:
+        stat = os.stat(file_path)
+        return (file_path, sheet_name, stat.st_mtime, stat.st_size)
+
+    def get(self, file_path: str, sheet_name: str) -> pd.DataFrame:
+        """Return the preprocessed sheet, loading it on first access.
+
+        The caller gets a :func:`private_copy` of the cached frame, so any
+        change it makes, in place or not, stays out of the cache.
+        """
+        key = self._key(file_path, sheet_name)
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return private_copy(entry[0])
+                loading = self._loading.get(key)
+                if loading is None:
+                    self.misses += 1
+                    self._loading[key] = threading.Event()
+                    break
+            loading.wait()
+
+        try:
+            df = load_preprocessed_sheet(file_path, sheet_name)
+            self.put(key, df)
+            return private_copy(df)
+        finally:
+            with self._lock:
+                self._loading.pop(key).set()
+
+    def put(self, key: Tuple, df: pd.DataFrame) -> None:
+        size = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (df, size)
+            self._bytes += size
+            # Evict least recently used sheets, but always keep the one just loaded
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                evicted_key, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+                logger.info(f"Evicted sheet '{evicted_key[1]}' of {os.path.basename(evicted_key[0])} ({evicted_size} bytes)")
+
+    def contains(self, file_path: str, sheet_name: str) -> bool:
+        try:
+            key = self._key(file_path, sheet_name)
+        except OSError:
+            return False
+        with self._lock:
+            return key in self._entries
+
+    def drop_file(self, file_path: str) -> None:
+        """Forget every cached sheet of a file"""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == file_path]:
+                self._bytes -= self._entries.pop(key)[1]
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sheets": len(self._entries),
+                "bytes": self._bytes,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+_sheet_cache: Optional[SheetCache] = None
+_sheet_cache_lock = threading.Lock()
+
+
+def get_sheet_cache() -> SheetCache:
+    """Get the process-wide sheet cache"""
+    global _sheet_cache
+    with _sheet_cache_lock:
+        if _sheet_cache is None:
+            _sheet_cache = SheetCache(max_bytes=settings.sheet_cache_max_mb * 1024 * 1024)
+        return _sheet_cache
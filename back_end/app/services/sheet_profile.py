@@ -0,0 +1,162 @@
+import json
+import os
+import logging
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from app.services.storage import derived_dir, file_content_hash, file_id_from_path, safe_sheet_name
+
+logger = logging.getLogger("app.services.sheet_profile")
+
+# Bump when the profile layout changes so stale cached profiles are recomputed
+PROFILE_VERSION = 2
+
+TOP_CATEGORIES = 5
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate for Gemini prompts (about 4 characters per token)"""
+    return (len(text) + 3) // 4
+
+
+def _short(value: Any, limit: int = 40) -> str:
+    text = str(value)
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def compute_sheet_profile(df: pd.DataFrame) -> Dict[str, Any]:
+    """Summarise a preprocessed sheet: schema, null rates, ranges and top categories"""
+    rows = len(df)
+    columns: List[Dict[str, Any]] = []
+
+    for col in df.columns:
+        s = df[col]
+        non_null = s.dropna()
+        info: Dict[str, Any] = {
+            "name": str(col),
+            "dtype": str(s.dtype),
+            "nullRate": round(1 - len(non_null) / rows, 4) if rows else 0.0,
+        }
+        try:
+            if pd.api.types.is_bool_dtype(s):
+                info["kind"] = "boolean"
+                info["trueRate"] = round(float(non_null.astype(bool).mean()), 4) if len(non_null) else None
+            elif pd.api.types.is_numeric_dtype(s):
+                info["kind"] = "numeric"
+                if len(non_null):
+                    info["min"] = float(non_null.min())
+                    info["max"] = float(non_null.max())
+                    info["mean"] = round(float(non_null.mean()), 4)
+            elif pd.api.types.is_datetime64_any_dtype(s):
+                info["kind"] = "datetime"
+                if len(non_null):
+                    info["min"] = non_null.min().isoformat()
+                    info["max"] = non_null.max().isoformat()
+            else:
+                info["kind"] = "categorical"
+                counts = non_null.astype(str).value_counts()
+                info["distinct"] = int(counts.shape[0])
+                info["top"] = [[str(k), int(v)] for k, v in counts.head(TOP_CATEGORIES).items()]
+        except Exception as e:
+            logger.debug(f"Could not profile column {col}: {e}")
+        columns.append(info)
+
+    return {"version": PROFILE_VERSION, "rows": rows, "columns": columns}
+
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else f"{value:.4g}"
+
+
+def _render_column(info: Dict[str, Any], detailed: bool) -> str:
+    line = f"- {info['name']} ({info['dtype']}"
+    if info.get("nullRate"):
+        line += f", {info['nullRate']:.1%} null"
+    line += ")"
+    if not detailed:
+        return line
+
+    kind = info.get("kind")
+    if kind == "numeric" and "min" in info:
+        line += f": min {_format_number(info['min'])}, max {_format_number(info['max'])}, mean {_format_number(info['mean'])}"
+    elif kind == "datetime" and "min" in info:
+        line += f": {info['min'][:10]} → {info['max'][:10]}"
+    elif kind == "boolean" and info.get("trueRate") is not None:
+        line += f": {info['trueRate']:.0%} true"
+    elif kind == "categorical" and info.get("top"):
+        top = ", ".join(f"{_short(k)} ({v})" for k, v in info["top"])
+        line += f": {info['distinct']} distinct; top: {top}"
+    return line
+
+
+def render_sheet_profile(profile: Dict[str, Any], max_tokens: int, priority: Optional[List[str]] = None) -> str:
+    """Render a profile as compact prompt text that fits in ``max_tokens``.
+
+    Every column keeps at least its name and dtype; details (ranges, top
+    categories) are added column by column while the budget allows, starting
+    with the columns named in ``priority``.
+    """
+    header = f"The dataframe df has {profile['rows']} rows and {len(profile['columns'])} columns (profile computed over all rows):"
+    columns = profile.get("columns", [])
+    lines = [_render_column(c, detailed=False) for c in columns]
+    used = estimate_tokens(header + "\n" + "\n".join(lines))
+
+    order = list(range(len(columns)))
+    if priority:
+        rank = {name: i for i, name in enumerate(priority)}
+        order.sort(key=lambda i: rank.get(columns[i]["name"], len(rank)))
+    for i in order:
+        info = columns[i]
+        detailed = _render_column(info, detailed=True)
+        extra = estimate_tokens(detailed) - estimate_tokens(lines[i])
+        if used + extra > max_tokens:
+            continue
+        lines[i] = detailed
+        used += extra
+
+    text = header + "\n" + "\n".join(lines)
+    if estimate_tokens(text) > max_tokens:
+        # Even the bare schema is too large: cut the column list
+        budget_chars = max_tokens * 4
+        text = text[:budget_chars].rsplit("\n", 1)[0] + "\n- …"
+    return text
+
+
+def _profile_path(file_path: str, sheet_name: str) -> str:
+    return os.path.join(derived_dir(file_id_from_path(file_path)), f"profile_{safe_sheet_name(sheet_name)}.json")
+
+
+def get_sheet_profile(file_path: str, sheet_name: str, df: Optional[pd.DataFrame] = None) -> Optional[Dict[str, Any]]:
+    """Load the cached profile for a sheet, computing and storing it if missing or stale"""
+    path = _profile_path(file_path, sheet_name)
+    try:
+        content_hash = file_content_hash(file_path)
+    except OSError:
+        return None
+
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if (cached.get("sourceHash") == content_hash and cached.get("version") == PROFILE_VERSION
+                    and cached.get("sheetName") == sheet_name):
+                return cached
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable profile {path}: {e}")
+
+    if df is None:
+        return None
+
+    profile = compute_sheet_profile(df)
+    profile["sheetName"] = sheet_name
+    profile["sourceHash"] = content_hash
+    try:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(profile, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        logger.info(f"Stored sheet profile: {path}")
+    except Exception as e:
+        logger.warning(f"Could not store sheet profile {path}: {e}")
+    return profile
@@ -0,0 +1,121 @@
+import json
+import logging
+import os
+from typing import Iterable, Optional
+
+import pandas as pd
+
+from app.core.config import settings
+from app.services.preprocess import read_and_preprocess_sheet
+from app.services.storage import derived_dir, file_content_hash, file_id_from_path, safe_sheet_name
+
+logger = logging.getLogger("app.services.snapshot")
+
+# Bump when preprocessing changes so snapshots of the old output are rebuilt
+SNAPSHOT_VERSION = 2
+
+
+def snapshot_path(file_path: str, sheet_name: str) -> str:
+    return os.path.join(derived_dir(file_id_from_path(file_path)), f"snapshot_{safe_sheet_name(sheet_name)}.parquet")
+
+
+def _meta_path(file_path: str, sheet_name: str) -> str:
+    return os.path.join(derived_dir(file_id_from_path(file_path)), f"snapshot_{safe_sheet_name(sheet_name)}.json")
+
+
+def snapshot_is_current(file_path: str, sheet_name: str) -> bool:
+    """Whether the stored snapshot of a sheet was built from the current file content"""
+    meta_path = _meta_path(file_path, sheet_name)
+    if not os.path.exists(meta_path) or not os.path.exists(snapshot_path(file_path, sheet_name)):
+        return False
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return (meta.get("sourceHash") == file_content_hash(file_path) and meta.get("version") == SNAPSHOT_VERSION
+                and meta.get("sheetName") == sheet_name)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable snapshot metadata of '{sheet_name}' in {os.path.basename(file_path)}: {e}")
+        return False
+
+
+def load_snapshot(file_path: str, sheet_name: str) -> Optional[pd.DataFrame]:
+    """Return the stored preprocessed sheet if it matches the current file content"""
+    if not snapshot_is_current(file_path, sheet_name):
+        return None
+    try:
+        return pd.read_parquet(snapshot_path(file_path, sheet_name))
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable snapshot of '{sheet_name}' in {os.path.basename(file_path)}: {e}")
+        return None
+
+
+def write_snapshot(file_path: str, sheet_name: str, df: pd.DataFrame) -> bool:
+    """Store a preprocessed sheet as Parquet next to the other derived data of the file"""
+    path = snapshot_path(file_path, sheet_name)
+    meta_path = _meta_path(file_path, sheet_name)
+    try:
+        if any(not isinstance(c, str) for c in df.columns):
+            raise ValueError("column names must be strings")
+        tmp_path = f"{path}.tmp"
+        df.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+        tmp_meta = f"{meta_path}.tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({"sourceHash": file_content_hash(file_path), "version": SNAPSHOT_VERSION, "sheetName": sheet_name,
+                       "rows": len(df)}, f, ensure_ascii=False)
+        os.replace(tmp_meta, meta_path)
+        return True
+    except Exception as e:
+        # Mixed-type object columns cannot always be written; the sheet is then re-parsed next time
+        logger.info(f"Could not snapshot '{sheet_name}' of {os.path.basename(file_path)}: {e}")
+        return False
+
+
+def write_snapshot_chunks(file_path: str, sheet_name: str, chunks: Iterable[pd.DataFrame]) -> int:
+    """Store a preprocessed sheet given as chunks of rows sharing one schema; returns the rows written.
+
+    Only one chunk is held at a time. Unlike :func:`write_snapshot`, failures
+    are raised: there is no whole frame to fall back on.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = snapshot_path(file_path, sheet_name)
+    meta_path = _meta_path(file_path, sheet_name)
+    tmp_path = f"{path}.tmp"
+    writer = None
+    rows = 0
+    try:
+        for chunk in chunks:
+            if writer is None:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+            else:
+                table = pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+            writer.write_table(table)
+            rows += len(chunk)
+        writer.close()
+    except BaseException:
+        if writer is not None:
+            writer.close()
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    tmp_meta = f"{meta_path}.tmp"
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump({"sourceHash": file_content_hash(file_path), "version": SNAPSHOT_VERSION, "sheetName": sheet_name,
+                   "rows": rows}, f, ensure_ascii=False)
+    os.replace(tmp_meta, meta_path)
+    return rows
+
+
+def load_preprocessed_sheet(file_path: str, sheet_name: str) -> pd.DataFrame:
+    """Preprocessed sheet from its snapshot, or parsed from the workbook (and snapshotted)"""
+    if settings.sheet_snapshot_enabled:
+        df = load_snapshot(file_path, sheet_name)
+        if df is not None:
+            return df
+    df = read_and_preprocess_sheet(file_path, sheet_name)
+    if settings.sheet_snapshot_enabled:
+        write_snapshot(file_path, sheet_name, df)
+    return df
@@ -0,0 +1,196 @@
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import duckdb
+import pandas as pd
+from langchain_core.tools import StructuredTool
+from pydantic import BaseModel, Field
+
+from app.core.config import settings
+from app.services.plan_cache import format_result
+from app.services.preprocess import iter_preprocessed_sheet_chunks
+from app.services.sheet_profile import estimate_tokens
+from app.services.snapshot import snapshot_is_current, snapshot_path, write_snapshot_chunks
+from app.services.storage import derived_dir, file_content_hash, file_id_from_path
+
+logger = logging.getLogger("app.services.sql_engine")
+
+# Name of the view over the sheet in every query
+TABLE_NAME = "sheet"
+# Rows of a query result brought into memory and shown to the agent
+RESULT_MAX_ROWS = 200
+
+_prepare_locks: Dict[str, threading.Lock] = {}
+_prepare_locks_guard = threading.Lock()
+
+
+class SheetTooLargeError(Exception):
+    """A large file whose format cannot be read without loading it whole"""
+
+
+def is_large_file(file_path: str) -> bool:
+    """Whether questions on this file go to the out-of-core SQL engine instead of pandas"""
+    if not settings.out_of_core_enabled:
+        return False
+    try:
+        return os.path.getsize(file_path) >= settings.out_of_core_threshold_mb * 1024 * 1024
+    except OSError:
+        return False
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _csv_parquet_path(file_path: str) -> str:
+    return os.path.join(derived_dir(file_id_from_path(file_path)), "columnar_csv.parquet")
+
+
+def _convert_csv(file_path: str) -> str:
+    """Stream a CSV into a Parquet file next to the other derived data, without loading it into pandas"""
+    path = _csv_parquet_path(file_path)
+    meta_path = f"{path}.json"
+    source_hash = file_content_hash(file_path)
+    if os.path.exists(meta_path) and os.path.exists(path):
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                if json.load(f).get("sourceHash") == source_hash:
+                    return path
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable metadata {meta_path}: {e}")
+
+    tmp_path = f"{path}.tmp"
+    with duckdb.connect() as con:
+        con.execute(f"SET memory_limit={_quote(str(settings.out_of_core_memory_limit_mb) + 'MB')}")
+        con.execute(f"COPY (SELECT * FROM read_csv_auto({_quote(file_path)})) TO {_quote(tmp_path)} (FORMAT PARQUET)")
+    os.replace(tmp_path, path)
+    with open(f"{meta_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump({"sourceHash": source_hash}, f)
+    os.replace(f"{meta_path}.tmp", meta_path)
+    logger.info(f"Converted {os.path.basename(file_path)} to Parquet for out-of-core queries")
+    return path
+
+
+def prepare_source(file_path: str, sheet_name: str) -> str:
+    """Parquet file holding the sheet, created on first use.
+
+    CSV files are converted by DuckDB in a streaming pass. .xlsx sheets are
+    streamed into their preprocessed snapshot a chunk of rows at a time, so
+    the sheet is never held in pandas whole. Other Excel formats have no
+    streaming reader and raise :class:`SheetTooLargeError`.
+    """
+    with _prepare_locks_guard:
+        lock = _prepare_locks.setdefault(f"{file_path}\x1f{sheet_name}", threading.Lock())
+    with lock:
+        if file_path.lower().endswith(".csv"):
+            return _convert_csv(file_path)
+        if not snapshot_is_current(file_path, sheet_name):
+            if not file_path.lower().endswith((".xlsx", ".xlsm")):
+                raise SheetTooLargeError(
+                    f"{os.path.basename(file_path)} is over {settings.out_of_core_threshold_mb:g} MB and its format "
+                    "cannot be read in chunks; save it as .xlsx or .csv to analyse it")
+            rows = write_snapshot_chunks(file_path, sheet_name, iter_preprocessed_sheet_chunks(file_path, sheet_name))
+            logger.info(f"Streamed {rows} rows of '{sheet_name}' in {os.path.basename(file_path)} to Parquet")
+        return snapshot_path(file_path, sheet_name)
+
+
+class SqlEngine:
+    """Runs DuckDB SQL over one Parquet file exposed as the view ``sheet``.
+
+    DuckDB scans the file lazily and column by column, pushing filters and
+    column selection down into the Parquet reader, so memory use depends on
+    the query rather than on the sheet size. Only the first
+    ``RESULT_MAX_ROWS`` rows of a result are fetched into pandas. Each query
+    gets its own connection with file access limited to that one file.
+    """
+
+    def __init__(self, parquet_path: str):
+        self.parquet_path = parquet_path
+
+    def _connect(self) -> "duckdb.DuckDBPyConnection":
+        con = duckdb.connect()
+        con.execute(f"SET memory_limit={_quote(str(settings.out_of_core_memory_limit_mb) + 'MB')}")
+        con.execute(f"SET threads={max(1, settings.out_of_core_threads)}")
+        con.execute(f"CREATE VIEW {TABLE_NAME} AS SELECT * FROM read_parquet({_quote(self.parquet_path)})")
+        con.execute(f"SET allowed_paths=[{_quote(self.parquet_path)}]")
+        con.execute("SET enable_external_access=false")
+        return con
+
+    def query(self, sql: str, max_rows: int = RESULT_MAX_ROWS) -> Tuple[pd.DataFrame, bool]:
+        """Run a query; returns the first ``max_rows`` rows and whether there were more"""
+        with self._connect() as con:
+            relation = con.sql(sql)
+            if relation is None:
+                return pd.DataFrame(), False
+            result = relation.limit(max_rows + 1).df()
+        return result.head(max_rows), len(result) > max_rows
+
+    def schema(self) -> List[Tuple[str, str]]:
+        with self._connect() as con:
+            return [(str(name), str(dtype)) for name, dtype, *_ in con.sql(f"DESCRIBE {TABLE_NAME}").fetchall()]
+
+    def row_count(self) -> int:
+        # Answered from the Parquet footers, not by scanning
+        with self._connect() as con:
+            return int(con.sql(f"SELECT count(*) FROM {TABLE_NAME}").fetchone()[0])
+
+
+def render_sql_prompt(engine: SqlEngine, max_tokens: int) -> str:
+    """Table schema for the SQL agent, cutting the column list to ``max_tokens``"""
+    header = (
+        f"The sheet is the DuckDB table {TABLE_NAME} with {engine.row_count()} rows, too large to load into memory. "
+        "Columns (name: type):"
+    )
+    lines = [header]
+    used = estimate_tokens(header)
+    schema = engine.schema()
+    for i, (name, dtype) in enumerate(schema):
+        line = f'- "{name}": {dtype}'
+        if used + estimate_tokens(line) > max_tokens:
+            lines.append(f"- … {len(schema) - i} more columns (DESCRIBE {TABLE_NAME} lists them)")
+            break
+        lines.append(line)
+        used += estimate_tokens(line)
+    return "\n".join(lines)
+
+
+SQL_HINT = (
+    f"Answer with the sql_query tool. Write DuckDB SQL against the table {TABLE_NAME}, quote column names with "
+    "double quotes, and aggregate, filter and LIMIT in SQL: at most "
+    f"{RESULT_MAX_ROWS} result rows are returned."
+)
+
+
+class _SqlInput(BaseModel):
+    sql: str = Field(description=f"DuckDB SQL query over the table {TABLE_NAME}")
+
+
+def build_sql_tool(engine: SqlEngine) -> StructuredTool:
+    """Agent tool running SQL through the out-of-core engine"""
+
+    def _run(sql: str) -> str:
+        try:
+            result, truncated = engine.query(sql)
+        except Exception as e:
+            return f"{type(e).__name__}: {e}"
+        text = format_result(result, max_rows=RESULT_MAX_ROWS)
+        if truncated:
+            text += "\n\n… more rows not shown; aggregate or add LIMIT/WHERE to narrow the result"
+        return text
+
+    return StructuredTool.from_function(
+        func=_run,
+        name="sql_query",
+        description=f"Run a read-only DuckDB SQL query over the table {TABLE_NAME} and return the result rows.",
+        args_schema=_SqlInput,
+    )
+
+
+def get_sql_engine(file_path: str, sheet_name: str) -> Optional[SqlEngine]:
+    """Engine for a large file's sheet, or None when the file is analysed in memory"""
+    if not is_large_file(file_path):
+        return None
+    return SqlEngine(prepare_source(file_path, sheet_name))
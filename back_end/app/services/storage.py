@@ -1,11 +1,24 @@
 import os
+import hashlib
 import logging
-from typing import Optional, List, Dict, Any
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, Tuple
 
 from app.core.config import settings
 
 logger = logging.getLogger("app.services.storage")
 
+# Session IDs are UUIDs; anything else must never reach a path (".." would name a parent directory)
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+# (path, mtime, size) -> sha256 hex digest, so repeated lookups don't re-read big workbooks; least recently used
+# digests are dropped beyond _MAX_CONTENT_HASHES, and a deleted file's with forget_content_hash
+_content_hash_cache: "OrderedDict[Tuple[str, float, int], str]" = OrderedDict()
+_content_hash_lock = threading.Lock()
+_MAX_CONTENT_HASHES = 1024
+
 
 def list_storage_files() -> list[str]:
     try:
@@ -50,6 +63,64 @@ def find_file_by_id(file_id: str) -> Optional[str]:
     return None
 
 
+def file_id_from_path(file_path: str) -> str:
+    """Extract the file ID from a stored path of the form <fileId>_<original name>"""
+    return os.path.basename(file_path).split("_", 1)[0]
+
+
+def derived_dir(file_id: str) -> str:
+    """Directory for data derived from an uploaded file (profiles, snapshots, indexes)"""
+    path = os.path.join(settings.storage_dir, "derived", file_id)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def is_session_id(value: object) -> bool:
+    """Whether ``value`` is usable as a session ID, and so as a directory name under storage"""
+    return isinstance(value, str) and bool(_SESSION_ID.match(value))
+
+
+def safe_sheet_name(sheet_name: str) -> str:
+    """Sheet name usable as part of a file name, distinct for every distinct sheet name.
+
+    The readable slug alone would map "Q1 2024" and "Q1-2024" to the same
+    name, so a short hash of the exact name is appended.
+    """
+    slug = "".join(ch if ch.isalnum() else "_" for ch in sheet_name)
+    return f"{slug}_{hashlib.sha1(sheet_name.encode('utf-8')).hexdigest()[:8]}"
+
+
+def file_content_hash(file_path: str) -> str:
+    """Return the SHA-256 of a file's bytes, memoised by path, mtime and size"""
+    stat = os.stat(file_path)
+    key = (file_path, stat.st_mtime, stat.st_size)
+    with _content_hash_lock:
+        cached = _content_hash_cache.get(key)
+        if cached:
+            _content_hash_cache.move_to_end(key)
+    if cached:
+        return cached
+
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    value = digest.hexdigest()
+
+    with _content_hash_lock:
+        _content_hash_cache[key] = value
+        while len(_content_hash_cache) > _MAX_CONTENT_HASHES:
+            _content_hash_cache.popitem(last=False)
+    return value
+
+
+def forget_content_hash(file_path: str) -> None:
+    """Drop the memoised digests of a file, e.g. once it is deleted"""
+    with _content_hash_lock:
+        for key in [k for k in _content_hash_cache if k[0] == file_path]:
+            del _content_hash_cache[key]
+
+
 def list_uploaded_files() -> List[Dict[str, Any]]:
     """List only Excel files for pandas agent"""
     files = []
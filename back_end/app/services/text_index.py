@@ -0,0 +1,329 @@
+import difflib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from langchain_core.tools import StructuredTool
+from pydantic import BaseModel, Field
+
+from app.core.config import settings
+from app.services.id_index import looks_like_id_name
+from app.services.plan_cache import format_result
+from app.services.prompt_builder import tokenize
+from app.services.storage import derived_dir, file_content_hash, file_id_from_path, safe_sheet_name
+
+logger = logging.getLogger("app.services.text_index")
+
+# Bump when tokenisation or the stored layout changes so stored indexes are rebuilt
+TEXT_INDEX_VERSION = 1
+EMBEDDING_MODEL = "models/gemini-embedding-001"
+# BM25 parameters
+_K1 = 1.2
+_B = 0.75
+# Query words missing from the vocabulary are matched to close spellings, weighted down
+FUZZY_MATCHES = 3
+FUZZY_CUTOFF = 0.8
+FUZZY_WEIGHT = 0.7
+# Rank fusion constant for combining lexical and embedding rankings
+_RRF_K = 60
+# Candidate rows shown in the text_search tool output
+PREVIEW_ROWS = 20
+# Characters of a row embedded when embeddings are enabled
+_EMBED_MAX_CHARS = 500
+
+
+def detect_text_columns(df: pd.DataFrame, max_columns: int, sample_rows: int = 1000) -> List[str]:
+    """Free-text columns (notes, descriptions, addresses): long and mostly distinct values"""
+    result = []
+    for c in df.columns:
+        if len(result) >= max_columns:
+            break
+        if not isinstance(c, str) or looks_like_id_name(c):
+            continue
+        s = df[c]
+        if not (s.dtype == object or str(s.dtype) == "string"):
+            continue
+        sample = s.dropna().head(sample_rows).astype(str)
+        if len(sample) < 2:
+            continue
+        if sample.str.len().mean() >= 15 and sample.nunique() / len(sample) >= 0.2:
+            result.append(c)
+    return result
+
+
+def _row_texts(df: pd.DataFrame, columns: List[str]) -> pd.Series:
+    text = pd.Series("", index=range(len(df)), dtype=object)
+    for c in columns:
+        values = df[c].reset_index(drop=True)
+        text = text + " " + values.astype(object).where(values.notna(), "").astype(str)
+    return text.str.strip()
+
+
+class TextIndex:
+    """Inverted index over the free-text columns of a sheet, with optional row embeddings.
+
+    Postings are kept in CSR form: the sorted vocabulary, and for each term a
+    slice of ``rows`` / ``tf`` arrays, so a query only touches the rows that
+    contain its words. Words are accent-folded, so "khieu nai" finds
+    "khiếu nại"; words not in the vocabulary fall back to close spellings.
+    Rows are ranked with BM25, fused with embedding similarity when present.
+    """
+
+    def __init__(self, columns: List[str], vocab: np.ndarray, offsets: np.ndarray, rows: np.ndarray,
+                 tf: np.ndarray, doc_len: np.ndarray, vectors: Optional[np.ndarray] = None):
+        self.columns = columns
+        self.vocab = vocab
+        self.offsets = offsets
+        self.rows = rows
+        self.tf = tf
+        self.doc_len = doc_len
+        self.vectors = vectors
+        self._avg_len = float(doc_len.mean()) if len(doc_len) else 0.0
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, columns: List[str], embeddings: Any = None) -> "TextIndex":
+        texts = _row_texts(df, columns)
+        tokens = texts.map(tokenize)
+        doc_len = tokens.map(len).to_numpy(dtype=np.int32)
+        exploded = tokens.explode().dropna()
+        if exploded.empty:
+            empty = np.empty(0, dtype=np.int32)
+            return cls(columns, np.empty(0, dtype=str), np.zeros(1, dtype=np.int64), empty, empty, doc_len)
+        pairs = exploded.groupby([exploded.to_numpy(dtype=str), exploded.index.to_numpy()]).size()
+        terms = pairs.index.get_level_values(0).to_numpy(dtype=str)
+        vocab, starts = np.unique(terms, return_index=True)
+        offsets = np.append(starts, len(terms)).astype(np.int64)
+        vectors = None
+        if embeddings is not None:
+            try:
+                vectors = _normalize(np.asarray(
+                    embeddings.embed_documents([t[:_EMBED_MAX_CHARS] for t in texts.tolist()]), dtype=np.float32))
+            except Exception as e:
+                # Quota or API errors leave the sheet with the lexical index rather than failing the question
+                logger.warning(f"Embedding rows failed, indexing {columns} without embeddings: {e}")
+        return cls(columns, vocab, offsets, pairs.index.get_level_values(1).to_numpy(dtype=np.int32),
+                   pairs.to_numpy(dtype=np.int32), doc_len, vectors)
+
+    def _term_ids(self, word: str) -> List[Tuple[int, float]]:
+        i = int(np.searchsorted(self.vocab, word))
+        if i < len(self.vocab) and self.vocab[i] == word:
+            return [(i, 1.0)]
+        # Only spellings with the same first letter are compared, which keeps the candidate list short
+        lo = int(np.searchsorted(self.vocab, word[0]))
+        hi = int(np.searchsorted(self.vocab, chr(ord(word[0]) + 1)))
+        candidates = self.vocab[lo:hi].tolist()
+        close = difflib.get_close_matches(word, candidates, n=FUZZY_MATCHES, cutoff=FUZZY_CUTOFF)
+        return [(lo + candidates.index(t), FUZZY_WEIGHT) for t in close]
+
+    def lexical_scores(self, query: str) -> Dict[int, float]:
+        n = len(self.doc_len)
+        scores: Dict[int, float] = {}
+        for word in dict.fromkeys(tokenize(query)):
+            for term_id, weight in self._term_ids(word):
+                start, end = self.offsets[term_id], self.offsets[term_id + 1]
+                rows, tf = self.rows[start:end], self.tf[start:end].astype(np.float64)
+                idf = np.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+                norm = tf + _K1 * (1 - _B + _B * self.doc_len[rows] / max(self._avg_len, 1e-9))
+                for row, value in zip(rows.tolist(), (weight * idf * tf * (_K1 + 1) / norm).tolist()):
+                    scores[row] = scores.get(row, 0.0) + value
+        return scores
+
+    def search(self, query: str, limit: int = 200, embeddings: Any = None) -> List[int]:
+        """Row positions of the best candidates for ``query``, best first"""
+        lexical = self.lexical_scores(query)
+        ranked = sorted(lexical, key=lambda r: -lexical[r])[:limit]
+        if self.vectors is None or embeddings is None:
+            return ranked
+        try:
+            query_vector = _normalize(np.asarray([embeddings.embed_query(query)], dtype=np.float32))[0]
+        except Exception as e:
+            logger.warning(f"Embedding the query failed, ranking by words only: {e}")
+            return ranked
+        similarity = self.vectors @ query_vector
+        semantic = np.argsort(-similarity)[:limit].tolist()
+        fused: Dict[int, float] = {}
+        for ranking in (ranked, semantic):
+            for rank, row in enumerate(ranking):
+                fused[row] = fused.get(row, 0.0) + 1.0 / (_RRF_K + rank)
+        return sorted(fused, key=lambda r: -fused[r])[:limit]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def text_index_path(file_path: str, sheet_name: str) -> str:
+    return os.path.join(derived_dir(file_id_from_path(file_path)), f"textindex_{safe_sheet_name(sheet_name)}.npz")
+
+
+def _meta_path(file_path: str, sheet_name: str) -> str:
+    return os.path.join(derived_dir(file_id_from_path(file_path)), f"textindex_{safe_sheet_name(sheet_name)}.json")
+
+
+def _columns_setting() -> Dict[str, Any]:
+    """The settings that choose the indexed columns; a stored index built under others is stale"""
+    return {"configured": list(settings.text_index_columns), "maxColumns": settings.text_index_max_columns}
+
+
+def load_text_index(file_path: str, sheet_name: str, rows: int) -> Optional[TextIndex]:
+    """Return the stored text index of a sheet if it was built from the current file content and settings"""
+    meta_path = _meta_path(file_path, sheet_name)
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if (meta.get("sourceHash") != file_content_hash(file_path) or meta.get("version") != TEXT_INDEX_VERSION
+                or meta.get("sheetName") != sheet_name or meta.get("rows") != rows
+                or meta.get("embeddings") != settings.text_index_embeddings_enabled
+                or meta.get("columnsSetting") != _columns_setting()):
+            return None
+        with np.load(text_index_path(file_path, sheet_name), allow_pickle=False) as data:
+            vectors = data["vectors"] if "vectors" in data.files else None
+            return TextIndex(meta["columns"], data["vocab"], data["offsets"], data["rows"], data["tf"],
+                             data["doc_len"], vectors)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable text index of '{sheet_name}' in {os.path.basename(file_path)}: {e}")
+        return None
+
+
+def write_text_index(file_path: str, sheet_name: str, index: TextIndex) -> bool:
+    """Store a text index next to the sheet's snapshot"""
+    path = text_index_path(file_path, sheet_name)
+    meta_path = _meta_path(file_path, sheet_name)
+    try:
+        arrays = {"vocab": index.vocab, "offsets": index.offsets, "rows": index.rows, "tf": index.tf,
+                  "doc_len": index.doc_len}
+        if index.vectors is not None:
+            arrays["vectors"] = index.vectors
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+        tmp_meta = f"{meta_path}.tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({"sourceHash": file_content_hash(file_path), "version": TEXT_INDEX_VERSION,
+                       "sheetName": sheet_name, "rows": len(index.doc_len), "columns": index.columns,
+                       "columnsSetting": _columns_setting(), "embeddings": index.vectors is not None}, f, ensure_ascii=False)
+        os.replace(tmp_meta, meta_path)
+        return True
+    except Exception as e:
+        logger.info(f"Could not store text index of '{sheet_name}' of {os.path.basename(file_path)}: {e}")
+        return False
+
+
+def _embeddings() -> Any:
+    if not settings.text_index_embeddings_enabled:
+        return None
+    from app.services.key_pool import create_embeddings
+
+    return create_embeddings(EMBEDDING_MODEL)
+
+
+def _configured_columns(df: pd.DataFrame) -> List[str]:
+    if settings.text_index_columns:
+        return [c for c in settings.text_index_columns if c in df.columns]
+    return detect_text_columns(df, settings.text_index_max_columns)
+
+
+_text_indexes: "OrderedDict[Tuple, TextIndex]" = OrderedDict()
+_text_indexes_lock = threading.Lock()
+_MAX_CACHED_TEXT_INDEXES = 8
+
+
+def get_text_index(file_path: str, sheet_name: str, df: pd.DataFrame) -> Optional[TextIndex]:
+    """Text index of a preprocessed sheet: from memory, from storage, or built and stored.
+
+    Returns None when indexing is disabled or the sheet has no free-text columns.
+    """
+    if not settings.text_index_enabled:
+        return None
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    key = (file_path, sheet_name, stat.st_mtime, stat.st_size, len(df))
+    with _text_indexes_lock:
+        index = _text_indexes.get(key)
+        if index is not None:
+            _text_indexes.move_to_end(key)
+            return index if index.columns else None
+
+    index = load_text_index(file_path, sheet_name, len(df))
+    if index is None:
+        columns = _configured_columns(df)
+        # Embedding every row of a big sheet is too slow and costly; those sheets get the lexical index only
+        embeddings = _embeddings() if columns and len(df) <= settings.text_index_embedding_max_rows else None
+        index = TextIndex.build(df, columns, embeddings)
+        # An index whose embedding failed stays in memory only, so a later load tries the embedding again
+        if embeddings is None or index.vectors is not None:
+            write_text_index(file_path, sheet_name, index)
+        logger.info(f"Text index of '{sheet_name}' over {columns}: {len(index.vocab)} terms")
+
+    with _text_indexes_lock:
+        _text_indexes[key] = index
+        while len(_text_indexes) > _MAX_CACHED_TEXT_INDEXES:
+            _text_indexes.popitem(last=False)
+    return index if index.columns else None
+
+
+def drop_cached_text_indexes(file_path: str) -> None:
+    """Forget every cached text index of a file"""
+    with _text_indexes_lock:
+        for key in [k for k in _text_indexes if k[0] == file_path]:
+            del _text_indexes[key]
+
+
+def render_text_index_prompt(index: Optional[TextIndex]) -> str:
+    if index is None:
+        return ""
+    columns = ", ".join(f"'{c}'" for c in index.columns)
+    return (
+        f"Free-text columns {columns} are indexed. To find rows mentioning something (fuzzy, accent-insensitive), "
+        "use the text_search tool or search_rows(query, limit) in Python to get candidate rows first, then filter "
+        "those with pandas instead of running str.contains over every row."
+    )
+
+
+class _TextSearchInput(BaseModel):
+    query: str = Field(description="Words to look for in the free-text columns")
+    limit: int = Field(default=50, description="Maximum number of candidate rows")
+
+
+def build_text_search_tool(df: pd.DataFrame, index: TextIndex) -> StructuredTool:
+    """Agent tool returning the candidate rows of ``df`` for a fuzzy text query"""
+
+    def _search(query: str, limit: int = 50) -> str:
+        positions = index.search(query, limit, _embeddings() if index.vectors is not None else None)
+        if not positions:
+            return f"No rows match '{query}'"
+        preview = df.iloc[positions[:PREVIEW_ROWS]]
+        return (
+            f"{len(positions)} candidate rows, best first. Row ids (df index): {df.index[positions].tolist()}\n"
+            + format_result(preview, max_rows=PREVIEW_ROWS)
+        )
+
+    return StructuredTool.from_function(
+        func=_search,
+        name="text_search",
+        description=(
+            "Fuzzy, accent-insensitive search of the free-text columns through a prebuilt index; returns the ids "
+            f"of the best matching rows and a preview. Indexed columns: {index.columns}."
+        ),
+        args_schema=_TextSearchInput,
+    )
+
+
+def text_index_functions(df: pd.DataFrame, index: TextIndex) -> Dict[str, Any]:
+    """The text search as a function for the agent's Python namespace"""
+
+    def search_rows(query: str, limit: int = 200) -> pd.DataFrame:
+        """Candidate rows of df for a fuzzy text query, best first"""
+        return df.iloc[index.search(query, limit, _embeddings() if index.vectors is not None else None)]
+
+    return {"search_rows": search_rows}
@@ -0,0 +1,73 @@
+import gzip
+import logging
+import os
+import re
+import shutil
+import uuid
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.storage import is_session_id
+
+logger = logging.getLogger("app.services.traces")
+
+_TRACE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _traces_dir(session_id: str) -> str:
+    if not is_session_id(session_id):
+        raise ValueError(f"Invalid session ID: {session_id!r}")
+    return os.path.join(settings.storage_dir, "traces", session_id)
+
+
+def _trace_path(session_id: str, trace_id: str) -> str:
+    return os.path.join(_traces_dir(session_id), f"{trace_id}.txt.gz")
+
+
+def save_trace(session_id: str, text: str) -> str:
+    """Store the trace of one message gzip-compressed next to its session and return its ID.
+
+    Unlike artifacts, traces belong to their session and are removed with it.
+    """
+    trace_id = uuid.uuid4().hex
+    path = _trace_path(session_id, trace_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wb", compresslevel=6) as f:
+        f.write(text.encode("utf-8"))
+    os.replace(tmp_path, path)
+    return trace_id
+
+
+def load_trace(session_id: str, trace_id: str) -> Optional[str]:
+    """Return the text of a trace, or None if the ID is unknown or malformed"""
+    if not _TRACE_ID.match(trace_id) or not is_session_id(session_id):
+        return None
+    path = _trace_path(session_id, trace_id)
+    if not os.path.exists(path):
+        return None
+    with gzip.open(path, "rb") as f:
+        return f.read().decode("utf-8")
+
+
+def delete_trace(session_id: str, trace_id: str) -> None:
+    if _TRACE_ID.match(trace_id):
+        try:
+            os.remove(_trace_path(session_id, trace_id))
+        except FileNotFoundError:
+            pass
+
+
+def delete_traces(session_id: str) -> None:
+    shutil.rmtree(_traces_dir(session_id), ignore_errors=True)
+
+
+def externalize_traces(session_id: str, messages: List[Dict[str, Any]]) -> int:
+    """Move traces stored inline in messages (the format before trace blobs) into blobs; returns how many moved"""
+    moved = 0
+    for message in messages:
+        trace = message.pop("trace", None)
+        if trace:
+            message["traceId"] = save_trace(session_id, trace)
+            moved += 1
+    return moved
@@ -0,0 +1,123 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.services.id_index import get_sheet_index
+from app.services.rollups import get_rollup_cube
+from app.services.text_index import get_text_index
+from app.services.sheet_cache import get_sheet_cache
+from app.services.sheet_profile import get_sheet_profile
+from app.services.sql_engine import is_large_file, prepare_source
+from app.services.workbook import get_workbook_schema
+
+logger = logging.getLogger("app.services.warmup")
+
+# Status values reported for a warm-up
+PENDING = "pending"
+RUNNING = "running"
+READY = "ready"
+FAILED = "failed"
+NOT_STARTED = "not_started"
+
+
+class WarmupManager:
+    """Loads sheets into the sheet cache in the background before the first question.
+
+    A small dedicated thread pool caps how many warm-ups run at once, so they
+    do not compete with live queries for CPU and memory. A warm-up that is
+    already queued, running or done for the same sheet is not scheduled again.
+    """
+
+    def __init__(self, max_concurrency: int):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="warmup")
+        self._lock = threading.Lock()
+        self._status: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    def schedule(self, file_path: str, sheet_name: str, workbook: bool = False,
+                 model_name: Optional[str] = None) -> Dict[str, Any]:
+        key = (file_path, sheet_name)
+        with self._lock:
+            current = self._status.get(key)
+            if current and current["status"] in (PENDING, RUNNING):
+                return dict(current)
+            if current and current["status"] == READY and get_sheet_cache().contains(file_path, sheet_name):
+                return dict(current)
+            status = {"status": PENDING, "scheduledAt": time.time(), "durationSeconds": None, "error": None}
+            self._status[key] = status
+        self._executor.submit(self._run, key, workbook, model_name)
+        return dict(status)
+
+    def _run(self, key: Tuple[str, str], workbook: bool, model_name: Optional[str]) -> None:
+        file_path, sheet_name = key
+        with self._lock:
+            self._status[key]["status"] = RUNNING
+        start = time.monotonic()
+        try:
+            if is_large_file(file_path):
+                # Never loaded into memory: only its Parquet source for the SQL engine is prepared
+                prepare_source(file_path, sheet_name)
+            else:
+                df = get_sheet_cache().get(file_path, sheet_name)
+                if settings.sheet_profile_enabled:
+                    get_sheet_profile(file_path, sheet_name, df)
+                get_sheet_index(file_path, sheet_name, df)
+                get_rollup_cube(file_path, sheet_name, df)
+                get_text_index(file_path, sheet_name, df)
+                if workbook:
+                    get_workbook_schema(file_path)
+            if model_name:
+                _warm_chat_clients(model_name)
+            outcome = {"status": READY}
+        except Exception as e:
+            logger.warning(f"Warm-up of '{sheet_name}' failed: {e}")
+            outcome = {"status": FAILED, "error": str(e)}
+        duration = round(time.monotonic() - start, 3)
+        with self._lock:
+            self._status[key].update(outcome, durationSeconds=duration)
+        logger.info(f"Warm-up of '{sheet_name}' finished in {duration}s: {outcome['status']}")
+
+    def status(self, file_path: str, sheet_name: str) -> Dict[str, Any]:
+        with self._lock:
+            current = self._status.get((file_path, sheet_name))
+            if current:
+                return dict(current)
+        # Nothing scheduled in this process, but the sheet may already be cached by a question
+        if get_sheet_cache().contains(file_path, sheet_name):
+            return {"status": READY, "scheduledAt": None, "durationSeconds": None, "error": None}
+        return {"status": NOT_STARTED, "scheduledAt": None, "durationSeconds": None, "error": None}
+
+    def wait(self, timeout: float = 10.0) -> None:
+        """Block until queued warm-ups finish (used by tests)"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if not any(s["status"] in (PENDING, RUNNING) for s in self._status.values()):
+                    return
+            time.sleep(0.02)
+
+
+def _warm_chat_clients(model_name: str) -> None:
+    """Create the per-key Gemini clients so the first question does not pay for it"""
+    from app.services.key_pool import get_key_pool
+
+    pool = get_key_pool()
+    if pool is None:
+        return
+    for key in pool.keys:
+        pool.chat_model(key, model_name)
+
+
+_warmup_manager: Optional[WarmupManager] = None
+_warmup_manager_lock = threading.Lock()
+
+
+def get_warmup_manager() -> WarmupManager:
+    """Get the process-wide warm-up manager"""
+    global _warmup_manager
+    with _warmup_manager_lock:
+        if _warmup_manager is None:
+            _warmup_manager = WarmupManager(settings.warmup_max_concurrency)
+        return _warmup_manager
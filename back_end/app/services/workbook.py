@@ -0,0 +1,110 @@
+import json
+import os
+import logging
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+
+from app.services.preprocess import infer_and_clean_dataframe
+from app.services.sheet_cache import get_sheet_cache
+from app.services.storage import derived_dir, file_content_hash, file_id_from_path
+
+logger = logging.getLogger("app.services.workbook")
+
+# Rows read per sheet to infer the up-front schema without loading whole sheets
+SCHEMA_SAMPLE_ROWS = 200
+# Bump when preprocessing changes the inferred dtypes so cached schemas are rebuilt
+SCHEMA_VERSION = 2
+
+
+def list_sheet_names(file_path: str) -> List[str]:
+    if file_path.lower().endswith(".csv"):
+        return ["Sheet1"]
+    with pd.ExcelFile(file_path) as xls:
+        return list(xls.sheet_names)
+
+
+def get_workbook_schema(file_path: str) -> Dict[str, List[List[str]]]:
+    """Column names and inferred dtypes of every sheet, cached next to other derived data"""
+    path = os.path.join(derived_dir(file_id_from_path(file_path)), "workbook_schema.json")
+    content_hash = file_content_hash(file_path)
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("sourceHash") == content_hash and cached.get("version") == SCHEMA_VERSION:
+                return cached["sheets"]
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable workbook schema {path}: {e}")
+
+    sheets: Dict[str, List[List[str]]] = {}
+    for name in list_sheet_names(file_path):
+        try:
+            if file_path.lower().endswith(".csv"):
+                sample = pd.read_csv(file_path, nrows=SCHEMA_SAMPLE_ROWS)
+            else:
+                sample = pd.read_excel(file_path, sheet_name=name, nrows=SCHEMA_SAMPLE_ROWS)
+            sample = infer_and_clean_dataframe(sample)
+            sheets[name] = [[str(c), str(t)] for c, t in sample.dtypes.items()]
+        except Exception as e:
+            logger.warning(f"Could not read schema of sheet '{name}': {e}")
+            sheets[name] = []
+
+    try:
+        # Written aside and renamed, so a concurrent reader never sees a partial file
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"sourceHash": content_hash, "version": SCHEMA_VERSION, "sheets": sheets}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logger.warning(f"Could not store workbook schema {path}: {e}")
+    return sheets
+
+
+class LazyWorkbook(Mapping):
+    """Read-only mapping of sheet name -> preprocessed DataFrame for the agent's namespace.
+
+    Sheets are loaded and cleaned on first access through the shared sheet
+    cache, which evicts the least recently used sheets when its memory budget
+    is exceeded.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._names = list_sheet_names(file_path)
+
+    def __getitem__(self, sheet_name: str) -> pd.DataFrame:
+        if sheet_name not in self._names:
+            raise KeyError(f"No sheet named {sheet_name!r}. Available sheets: {self._names}")
+        return get_sheet_cache().get(self.file_path, sheet_name)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __repr__(self) -> str:
+        cache = get_sheet_cache()
+        loaded = [n for n in self._names if cache.contains(self.file_path, n)]
+        return f"LazyWorkbook(sheets={self._names}, loaded={loaded})"
+
+
+def render_workbook_prompt(file_path: str, primary_sheet: str, max_columns: Optional[int] = 40) -> str:
+    """Prompt text describing the other sheets available through `sheets`"""
+    schema = get_workbook_schema(file_path)
+    lines = [
+        "",
+        "This is a multi-sheet workbook. Besides df (sheet "
+        f"'{primary_sheet}'), a dict-like object `sheets` maps every sheet name to its DataFrame, "
+        "e.g. sheets['<name>']. Sheets are loaded on first access, so only touch the ones you need.",
+        "Sheets and their columns:",
+    ]
+    for name, columns in schema.items():
+        shown = columns if max_columns is None else columns[:max_columns]
+        cols = ", ".join(f"{c} ({t})" for c, t in shown)
+        if max_columns is not None and len(columns) > max_columns:
+            cols += f", … ({len(columns) - max_columns} more)"
+        lines.append(f"- '{name}': {cols}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,216 @@
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from app.core.config import settings
+from app.services.sheet_cache import private_copy
+from app.services.storage import is_session_id
+
+logger = logging.getLogger("app.services.workspace")
+
+WORKSPACE_PROMPT_MAX_COLUMNS = 12
+_NAME = re.compile(r"^[A-Za-z][A-Za-z0-9_]{0,63}$")
+# Names the agent namespace already uses; never persisted or overwritten
+RESERVED_NAMES = {"df", "sheets", "pd", "np"}
+
+
+def _workspace_dir(session_id: str) -> str:
+    if not is_session_id(session_id):
+        raise ValueError(f"Invalid session ID: {session_id!r}")
+    return os.path.join(settings.storage_dir, "workspaces", session_id)
+
+
+class _FrameCache:
+    """Process-wide LRU of workspace frames read from disk, bounded by DataFrame memory usage"""
+
+    def __init__(self):
+        self._entries: "OrderedDict[Tuple, Tuple[pd.DataFrame, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[pd.DataFrame]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: Tuple, df: pd.DataFrame) -> None:
+        size = int(df.memory_usage(deep=True).sum())
+        max_bytes = settings.workspace_cache_max_mb * 1024 * 1024
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (df, size)
+            self._bytes += size
+            while self._bytes > max_bytes and self._entries:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def drop_session(self, session_id: str) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == session_id]:
+                self._bytes -= self._entries.pop(key)[1]
+
+
+_frame_cache = _FrameCache()
+
+
+class SessionWorkspace:
+    """Named intermediate DataFrames of a pandas session, kept across questions.
+
+    Frames are stored as Parquet files under ``storage/workspaces/{sessionId}``
+    with a ``manifest.json`` describing them; recently used frames are also
+    kept in memory. After each question, DataFrames the agent bound to a name
+    are saved, and they are loaded into the next question's REPL namespace.
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.path = _workspace_dir(session_id)
+        self._manifest_path = os.path.join(self.path, "manifest.json")
+
+    def manifest(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self._manifest_path):
+            return {}
+        try:
+            with open(self._manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("frames", {})
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable workspace manifest {self._manifest_path}: {e}")
+            return {}
+
+    def _write_manifest(self, frames: Dict[str, Dict[str, Any]]) -> None:
+        tmp_path = self._manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"frames": frames}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self._manifest_path)
+
+    def _frame_path(self, name: str) -> str:
+        return os.path.join(self.path, f"{name}.parquet")
+
+    def load(self, name: str) -> Optional[pd.DataFrame]:
+        path = self._frame_path(name)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        key = (self.session_id, name, mtime)
+        df = _frame_cache.get(key)
+        if df is None:
+            df = pd.read_parquet(path)
+            _frame_cache.put(key, df)
+        # The agent may change it without touching the cached frame
+        return private_copy(df)
+
+    def load_into(self, namespace: Dict[str, Any]) -> Dict[str, int]:
+        """Bind every stored frame into ``namespace``; returns name -> id() of the bound objects"""
+        loaded: Dict[str, int] = {}
+        for name in self.manifest():
+            if name in namespace:
+                continue
+            try:
+                df = self.load(name)
+            except Exception as e:
+                logger.warning(f"Could not load workspace frame '{name}' of session {self.session_id}: {e}")
+                continue
+            if df is not None:
+                namespace[name] = df
+                loaded[name] = id(df)
+        return loaded
+
+    def save_from(self, namespace: Dict[str, Any], loaded: Dict[str, int], question: str) -> List[str]:
+        """Persist DataFrames the agent created or rebound during a question; returns the saved names"""
+        frames = self.manifest()
+        saved: List[str] = []
+        for name, value in namespace.items():
+            if name in RESERVED_NAMES or not _NAME.match(name):
+                continue
+            if isinstance(value, pd.Series):
+                value = value.to_frame()
+            if not isinstance(value, pd.DataFrame) or id(namespace[name]) == loaded.get(name):
+                continue
+            if value.empty or int(value.memory_usage(deep=True).sum()) > settings.workspace_max_frame_mb * 1024 * 1024:
+                continue
+            try:
+                columns = self._save_frame(name, value)
+            except Exception as e:
+                logger.info(f"Skipping workspace frame '{name}': {e}")
+                continue
+            frames[name] = {
+                "rows": int(len(value)),
+                "columns": columns,
+                "question": question,
+                "savedAt": time.time(),
+            }
+            saved.append(name)
+
+        if not saved:
+            return saved
+        # Keep only the most recent frames of the session
+        stale = sorted(frames, key=lambda n: frames[n]["savedAt"])[:-settings.workspace_max_frames or None]
+        for name in stale:
+            frames.pop(name, None)
+            try:
+                os.remove(self._frame_path(name))
+            except OSError:
+                pass
+        self._write_manifest(frames)
+        logger.info(f"Saved workspace frames {saved} for session {self.session_id}")
+        return [n for n in saved if n in frames]
+
+    def _save_frame(self, name: str, df: pd.DataFrame) -> List[str]:
+        os.makedirs(self.path, exist_ok=True)
+        out = df.copy(deep=False)
+        # Parquet needs string column names; keep a meaningful index as regular columns
+        if not isinstance(out.index, pd.RangeIndex):
+            out = out.reset_index()
+        out.columns = [str(c) for c in out.columns]
+        path = self._frame_path(name)
+        tmp_path = path + ".tmp"
+        out.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        return list(out.columns)
+
+    def render_prompt(self) -> str:
+        """Prompt text listing the frames already loaded into the namespace"""
+        frames = self.manifest()
+        if not frames:
+            return ""
+        lines = [
+            "",
+            "Results from earlier questions in this session are already loaded as variables. "
+            "Reuse them instead of recomputing:",
+        ]
+        for name, meta in sorted(frames.items(), key=lambda item: item[1]["savedAt"]):
+            columns = meta["columns"][:WORKSPACE_PROMPT_MAX_COLUMNS]
+            more = len(meta["columns"]) - len(columns)
+            cols = ", ".join(columns) + (f", … ({more} more)" if more > 0 else "")
+            lines.append(f"- {name} ({meta['rows']} rows; columns: {cols}) from question: {meta['question']!r}")
+        return "\n".join(lines) + "\n"
+
+    def signature(self) -> str:
+        """Changes whenever the set of stored frames changes"""
+        frames = self.manifest()
+        return ",".join(f"{n}@{frames[n]['savedAt']}" for n in sorted(frames))
+
+
+WORKSPACE_HINT = (
+    "\nAssign intermediate results you may need for follow-up questions to descriptive variable names "
+    "(for example orders_by_region = ...); they are kept for the rest of the session.\n"
+)
+
+
+def delete_workspace(session_id: str) -> None:
+    _frame_cache.drop_session(session_id)
+    shutil.rmtree(_workspace_dir(session_id), ignore_errors=True)
@@ -0,0 +1,27 @@
+"""
+Session archiving utility
+Moves sessions idle for a number of days into compressed archive segments (file session backend)
+"""
+import argparse
+
+from app.core.config import settings
+from app.services.session_archive import SessionArchiver
+
+
+def archive_sessions(days: float):
+    """Archive the sessions of the storage directory without a message in the last ``days`` days"""
+    print(f"📦 Archiving sessions of {settings.storage_dir} idle for more than {days:g} days...")
+    report = SessionArchiver(max_idle_seconds=days * 86400, interval_seconds=0).run_once()
+    if "skipped" in report:
+        print(f"   ℹ️  Nothing to do for the {settings.session_backend} backend")
+        return
+    print(f"🎉 Archived {report['sessionsArchived']} sessions ({report['bytesBefore']} → {report['bytesAfter']} bytes), "
+          f"removed {report['segmentsRemoved']} empty segments, reclaimed {report['bytesReclaimed']} bytes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Session archiving utility")
+    parser.add_argument("--days", type=float, default=settings.session_archive_after_days or 90,
+                        help="archive sessions without a message for this many days (default: SESSION_ARCHIVE_AFTER_DAYS or 90)")
+    args = parser.parse_args()
+    archive_sessions(args.days)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark: average agent tool calls per question with and without the sheet profile.
+
+Runs every question twice through build_agent_for_file (profile disabled, then
+enabled) and reports the tool-call counts captured by TranscriptCallbackHandler.
+Requires GOOGLE_API_KEY.
+
+Usage:
+    python benchmark_sheet_profile.py
+    python benchmark_sheet_profile.py --file ../back_end_test/data/data.xlsx --sheet "Đơn hàng vận chuyển"
+"""
+
+import argparse
+import os
+import time
+
+from app.core.config import settings
+from app.api.routes.analyze import build_agent_for_file
+from app.services.callbacks import TranscriptCallbackHandler
+
+DEFAULT_FILE = os.path.join(os.path.dirname(__file__), "..", "back_end_test", "data", "data.xlsx")
+DEFAULT_SHEET = "Đơn hàng vận chuyển"
+DEFAULT_QUESTIONS = [
+    "Top 5 nhà vận tải có số chuyến vận chuyển xuất bán nhiều nhất?",
+    "Số lượng hàng vận chuyển xuất bán trong tháng 6 là bao nhiêu?",
+    "Tổng số chuyến theo tháng?",
+    "Các kho xuất hàng bán chủ yếu trong tháng 6 là các kho nào?",
+    "Tỉnh giao nào có tổng tấn thực giao lớn nhất?",
+]
+
+
+def run_questions(file_path: str, sheet_name: str, questions: list[str], use_profile: bool) -> list[int]:
+    settings.sheet_profile_enabled = use_profile
+    counts = []
+    for question in questions:
+        agent = build_agent_for_file(file_path, sheet_name)
+        tracer = TranscriptCallbackHandler()
+        start = time.time()
+        try:
+            agent.invoke(question, config={"callbacks": [tracer]})
+        except Exception as e:
+            print(f"   ⚠️  {question}: {e}")
+        counts.append(tracer.tool_calls)
+        print(f"   {'profile' if use_profile else 'baseline'} | {tracer.tool_calls} tool calls | {time.time() - start:.1f}s | {question}")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", default=DEFAULT_FILE)
+    parser.add_argument("--sheet", default=DEFAULT_SHEET)
+    parser.add_argument("--question", action="append", help="Question to ask (repeatable)")
+    args = parser.parse_args()
+
+    questions = args.question or DEFAULT_QUESTIONS
+    print("📊 Sheet profile benchmark")
+    print("=" * 60)
+    baseline = run_questions(args.file, args.sheet, questions, use_profile=False)
+    profiled = run_questions(args.file, args.sheet, questions, use_profile=True)
+
+    avg_baseline = sum(baseline) / len(baseline)
+    avg_profiled = sum(profiled) / len(profiled)
+    print("=" * 60)
+    print(f"Average tool calls without profile: {avg_baseline:.2f}")
+    print(f"Average tool calls with profile:    {avg_profiled:.2f}")
+    if avg_baseline:
+        print(f"Reduction: {(1 - avg_profiled / avg_baseline) * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -54,15 +54,21 @@ def cleanup_test_files():
                         print(f"   ⚠️  Could not remove RAG data {rag_folder.name}: {e}")
     
     # Clean test session files
-    session_files = list(storage_dir.glob("session_*.json"))
+    session_files = list(storage_dir.glob("session_*.json")) + list(storage_dir.glob("session_*.jsonl"))
+    removed_sessions = False
     for session_file in session_files:
         try:
             # Only remove if older than 10 minutes
             if time.time() - session_file.stat().st_mtime > 600:
                 session_file.unlink()
+                removed_sessions = True
                 print(f"   ✅ Removed old session: {session_file.name}")
         except Exception as e:
             print(f"   ⚠️  Could not remove {session_file.name}: {e}")
+    # The session listing index is rebuilt from the remaining session files on next use
+    session_index = storage_dir / "sessions_index.jsonl"
+    if removed_sessions and session_index.exists():
+        session_index.unlink()
     
     print("🎉 Cleanup completed!")
 
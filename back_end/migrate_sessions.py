@@ -0,0 +1,49 @@
+"""
+Session migration utility
+Copies the session files of the storage directory into the SQLite session store (SESSION_BACKEND=sqlite),
+or with --traces moves traces stored inline in messages into compressed trace blobs
+"""
+import argparse
+
+from app.core.config import settings
+from app.services.session_sqlite import SqliteSessionBackend, import_file_sessions, session_db_path
+from app.services.session_store import get_session_backend
+from app.services.traces import externalize_traces
+
+
+def migrate_sessions():
+    """Import every session_*.json / session_*.jsonl file into storage/sessions.sqlite3"""
+    print(f"📦 Importing session files from {settings.storage_dir}...")
+    imported = import_file_sessions(SqliteSessionBackend(session_db_path()))
+    print(f"🎉 Imported {imported} sessions into {session_db_path()}")
+    print("   ℹ️  Set SESSION_BACKEND=sqlite to use them; the session files were left in place")
+
+
+def migrate_traces():
+    """Rewrite every session of the configured backend whose messages still carry their traces inline.
+
+    Run it while the server is stopped: a message appended during the rewrite of its session would be lost.
+    """
+    backend = get_session_backend()
+    print(f"📦 Moving inline traces of {settings.session_backend} sessions to trace blobs...")
+    sessions = moved = 0
+    for summary in backend.list():
+        record = backend.get(summary["sessionId"])
+        if record is None:
+            continue
+        count = externalize_traces(summary["sessionId"], record.get("messages", []))
+        if count:
+            backend.put(record)
+            sessions += 1
+            moved += count
+    print(f"🎉 Moved {moved} traces out of {sessions} sessions")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Session migration utility")
+    parser.add_argument("--traces", action="store_true", help="move inline message traces into trace blobs")
+    args = parser.parse_args()
+    if args.traces:
+        migrate_traces()
+    else:
+        migrate_sessions()
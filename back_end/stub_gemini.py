@@ -0,0 +1,80 @@
+"""
+Stub Gemini models shared by the offline test scripts
+"""
+
+import tempfile
+from contextlib import contextmanager
+from typing import Any, List
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import BaseChatModel
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from app.core.config import settings
+from app.services.key_pool import ApiKeyPool, set_key_pool
+
+
+class StubScript:
+    """Responses and call log shared by the stub models of every key; a response that is an exception is raised"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls: List[str] = []
+
+    def next_response(self, key):
+        self.calls.append(key)
+        if key == "exhausted":
+            raise RuntimeError("429 ResourceExhausted: quota exceeded")
+        response = self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class StubChatModel(BaseChatModel):
+    """Local stand-in for ChatGoogleGenerativeAI; a key named 'exhausted' always returns 429"""
+
+    api_key: str
+    script: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        return ChatResult(generations=[ChatGeneration(message=self.script.next_response(self.api_key))])
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[getattr(t, "name", str(t)) for t in tools], **kwargs)
+
+
+def make_pool(keys, script):
+    return ApiKeyPool(
+        keys,
+        chat_model_factory=lambda key, model_name: StubChatModel(api_key=key, script=script),
+        embeddings_factory=lambda key, model_name: DeterministicFakeEmbedding(size=8),
+        requests_per_minute=600,
+        cooldown_seconds=60,
+    )
+
+
+@contextmanager
+def stubbed_gemini(responses, keys=("k1",), **overrides):
+    """Run against a temporary storage directory with Gemini answered from ``responses``; yields (directory, script).
+
+    ``overrides`` are further settings changed for the duration. Every setting
+    and the key pool are restored afterwards.
+    """
+    script = StubScript(responses)
+    with tempfile.TemporaryDirectory() as tmp:
+        changes = {"storage_dir": tmp, "google_api_keys": list(keys), **overrides}
+        original = {name: getattr(settings, name) for name in changes}
+        for name, value in changes.items():
+            setattr(settings, name, value)
+        set_key_pool(make_pool(list(keys), script))
+        try:
+            yield tmp, script
+        finally:
+            for name, value in original.items():
+                setattr(settings, name, value)
+            set_key_pool(None)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Test script for the question/answer cache (runs offline, no server needed)
+"""
+
+import json
+import os
+import tempfile
+import time
+
+from app.services.answer_cache import AnswerCache, make_cache_key, normalize_question
+
+
+def test_normalize_question():
+    print("🧪 Testing question normalisation")
+    assert normalize_question("  Tổng số chuyến   theo tháng? ") == "tổng số chuyến theo tháng"
+    assert normalize_question("TỔNG SỐ CHUYẾN THEO THÁNG") == normalize_question("tổng số chuyến theo tháng")
+    key_a = make_cache_key("hash", "Sheet1", "Tổng số chuyến theo tháng?", "gemini-2.5-flash", "1")
+    key_b = make_cache_key("hash", "Sheet1", "tổng số chuyến  theo tháng", "gemini-2.5-flash", "1")
+    key_c = make_cache_key("hash", "Sheet1", "tổng số chuyến theo tháng", "gemini-2.5-flash", "2")
+    assert key_a == key_b
+    assert key_a != key_c
+    print("✅ Normalisation OK")
+
+
+def test_cache_ttl_size_and_persistence():
+    print("🧪 Testing TTL, size limit and persistence")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "answer_cache.jsonl")
+        cache = AnswerCache(path, ttl_seconds=60, max_entries=2)
+        cache.put("a", "answer a", "trace a")
+        cache.put("b", "answer b")
+        cache.get("a")  # "a" becomes most recently used
+        cache.put("c", "answer c")
+        assert cache.get("b") is None, "least recently used entry should be evicted"
+        assert cache.get("a")["output"] == "answer a"
+
+        reloaded = AnswerCache(path, ttl_seconds=60, max_entries=2)
+        assert reloaded.get("c")["output"] == "answer c"
+        assert reloaded.get("a")["trace"] == "trace a"
+
+        expired = AnswerCache(path, ttl_seconds=0, max_entries=2)
+        time.sleep(0.01)
+        assert expired.get("a") is None
+    print("✅ TTL, size limit and persistence OK")
+
+
+def test_puts_append_to_the_log():
+    print("🧪 Testing incremental persistence of the answer cache")
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = os.path.join(tmp, "answer_cache.json")
+        with open(legacy, "w", encoding="utf-8") as f:
+            json.dump({"entries": [["old", {"output": "old answer", "trace": "t" * 1000, "storedAt": time.time()}]]}, f)
+        path = os.path.join(tmp, "answer_cache.jsonl")
+        cache = AnswerCache(path, ttl_seconds=60, max_entries=1000)
+        assert not os.path.exists(legacy) and cache.get("old")["output"] == "old answer"
+
+        # Storing an answer appends it: the file is neither replaced nor rewritten with the other traces
+        inode, size = os.stat(path).st_ino, os.path.getsize(path)
+        cache.put("new", "new answer", "short trace")
+        assert os.stat(path).st_ino == inode
+        with open(path, "rb") as f:
+            f.seek(size)
+            assert json.loads(f.read())["key"] == "new"
+
+        # The log is compacted once it is mostly superseded lines
+        for i in range(600):
+            cache.put("new", f"answer {i}")
+        with open(path, "rb") as f:
+            assert len(f.read().splitlines()) < 600
+        reloaded = AnswerCache(path, ttl_seconds=60, max_entries=1000)
+        assert reloaded.get("new")["output"] == "answer 599" and reloaded.get("old")["trace"] == "t" * 1000
+    print("✅ One appended line per answer, old cache file converted")
+
+
+if __name__ == "__main__":
+    test_normalize_question()
+    test_cache_ttl_size_and_persistence()
+    test_puts_append_to_the_log()
+    print("🎯 Answer cache tests completed!")
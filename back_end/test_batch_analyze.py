@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Test script for batch questions streamed as NDJSON (runs offline, no network needed)
+"""
+
+import json
+import os
+import time
+
+import pandas as pd
+from langchain_core.messages import AIMessage
+
+from app.api.routes.analyze import _stream_batch, get_chat_model
+from app.services.sheet_cache import get_sheet_cache
+from stub_gemini import stubbed_gemini
+
+
+def _repl(query: str, call_id: str) -> AIMessage:
+    return AIMessage(content="", tool_calls=[{"name": "python_repl_ast", "args": {"query": query}, "id": call_id}])
+
+
+def _write_trips(tmp: str) -> str:
+    path = os.path.join(tmp, "trips_report.xlsx")
+    pd.DataFrame({"Mã chuyến": ["A", "B", "C"], "Trạng thái": ["Trễ", "Đúng giờ", "Trễ"]}).to_excel(path, index=False)
+    return path
+
+
+def test_batch_streams_results_and_errors():
+    print("🧪 Testing the NDJSON stream of a batch, with a failing question")
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    # One question at a time, so the stub answers them in order
+    with stubbed_gemini([
+        _repl("df.loc[0, 'Trạng thái'] = 'Đã xử lý'\nint((df['Trạng thái'] == 'Trễ').sum())", "call-1"),
+        AIMessage(content="1 trip was late."),
+        RuntimeError("model unavailable"),
+        _repl("df['Trạng thái'].tolist()", "call-2"),
+        AIMessage(content="The statuses are listed."),
+    ], batch_max_concurrency=1, warmup_enabled=False) as (tmp, script):
+        path = _write_trips(tmp)
+        res = TestClient(app).post("/api/analyze/batch", json={
+            "fileId": "trips", "sheetName": "Sheet1", "useCache": False,
+            "questions": ["Edit and count late trips", "Anything", "List the statuses"]})
+        assert res.status_code == 200, res.text
+        assert res.headers["content-type"].startswith("application/x-ndjson")
+        results = sorted((json.loads(line) for line in res.text.splitlines()), key=lambda r: r["index"])
+        assert [r["status"] for r in results] == [200, 500, 200]
+        assert results[0]["output"] == "1 trip was late."
+        assert results[1]["output"] is None and "model unavailable" in results[1]["error"]
+        # The first question's edit reached neither the third question's frame nor the cached sheet
+        assert "'Trễ', 'Đúng giờ', 'Trễ'" in results[2]["trace"] and "Đã xử lý" not in results[2]["trace"]
+        assert get_sheet_cache().get(path, "Sheet1")["Trạng thái"].tolist() == ["Trễ", "Đúng giờ", "Trễ"]
+        assert len(script.calls) == 5
+    print("✅ Each result is one NDJSON line; a failing question is reported in its own line")
+
+
+def test_closing_the_stream_cancels_pending_questions():
+    print("🧪 Testing a batch whose client disconnects")
+    with stubbed_gemini([AIMessage(content="Answered.")], batch_max_concurrency=1) as (tmp, script):
+        path = _write_trips(tmp)
+        lines = _stream_batch(get_chat_model(), get_sheet_cache().get(path, "Sheet1"), path, "Sheet1",
+                              [f"Question {i}" for i in range(10)], False)
+        assert json.loads(next(lines))["status"] == 200
+        lines.close()
+        # At most the question already running when the stream closed still gets answered
+        time.sleep(0.5)
+        assert len(script.calls) <= 2, script.calls
+    print("✅ Questions not started yet are cancelled with the stream")
+
+
+if __name__ == "__main__":
+    test_batch_streams_results_and_errors()
+    test_closing_the_stream_cancels_pending_questions()
+    print("🎯 Batch analyze tests completed!")
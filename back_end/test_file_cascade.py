@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Test script for deleting a file together with everything attached to it (runs offline, no network needed)
+"""
+
+import multiprocessing
+import os
+import tempfile
+
+import pandas as pd
+
+from app.core.config import settings
+from app.services import session_index, storage
+from app.services.answer_cache import AnswerCache, get_answer_cache
+from app.services.file_cleanup import purge_file_data
+from app.services.session_store import (
+    FileSessionBackend, append_message, create_session, create_session_record, get_session_backend, list_sessions,
+    session_path,
+)
+from app.services.sheet_cache import get_sheet_cache
+
+
+def _check_cascade(client, tmp: str, reads: list) -> None:
+    excel = os.path.join(tmp, "f1_trips.xlsx")
+    pd.DataFrame({"Tuyến": ["A", "B"], "Số chuyến": [3, 4]}).to_excel(excel, index=False)
+    with open(os.path.join(tmp, "r1_notes.txt"), "w", encoding="utf-8") as f:
+        f.write("Ghi chú vận hành")
+    os.makedirs(os.path.join(tmp, "rag_data", "r1"))
+
+    for i in range(3):
+        create_session_record(f"f1-{i}", "f1", "Sheet1", "2024-01-01T00:00:00")
+    append_message("f1-0", "assistant", "7 chuyến", "2024-01-01T00:00:01", trace="steps " * 200)
+    create_session_record("f2-0", "f2", "Sheet1", "2024-01-01T00:00:00")
+    rag_id = create_session("r1", "Notes", "2024-01-01T00:00:00", session_type="rag")
+    os.makedirs(os.path.join(tmp, "workspaces", "f1-1"))
+    get_sheet_cache().get(excel, "Sheet1")
+    get_answer_cache().put("f1-answer", "7 chuyến", "trace", file_id="f1")
+    get_answer_cache().put("f2-answer", "2 chuyến", file_id="f2")
+    assert os.path.isdir(os.path.join(tmp, "derived", "f1"))
+    assert sorted(get_session_backend().session_ids("f1")) == ["f1-0", "f1-1", "f1-2"]
+
+    reads.clear()
+    res = client.delete("/api/files/f1")
+    assert res.status_code == 200, res.text
+    assert res.json()["deletedSessions"] == 3
+    assert sorted(s["sessionId"] for s in list_sessions()) == sorted([rag_id, "f2-0"])
+    for leftover in ("derived/f1", "traces/f1-0", "workspaces/f1-1"):
+        assert not os.path.exists(os.path.join(tmp, leftover)), leftover
+    assert not get_sheet_cache().contains(excel, "Sheet1")
+    assert not any(key[0] == excel for key in storage._content_hash_cache)
+    # The file's cached answers are dropped, in this process and in the log other processes load
+    for cache in (get_answer_cache(), AnswerCache(get_answer_cache().path, ttl_seconds=60, max_entries=100)):
+        assert cache.get("f1-answer") is None and cache.get("f2-answer")["output"] == "2 chuyến"
+
+    res = client.delete("/api/rag/file/r1")
+    assert res.status_code == 200, res.text
+    assert res.json()["deletedSessions"] == 1
+    assert not os.path.exists(os.path.join(tmp, "rag_data", "r1"))
+    assert [s["sessionId"] for s in list_sessions()] == ["f2-0"]
+    # Sessions are found through the fileId index, never by reading session files
+    assert reads == [], reads
+
+
+def test_deleting_a_file_cascades():
+    print("🧪 Testing cascading file deletes")
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    original = (settings.storage_dir, settings.session_backend, settings.warmup_enabled)
+    original_read = FileSessionBackend.__dict__["read_file"]
+    client = TestClient(app)
+    for backend in ("file", "sqlite"):
+        with tempfile.TemporaryDirectory() as tmp:
+            settings.storage_dir = tmp
+            settings.session_backend = backend
+            settings.warmup_enabled = False
+            reads = []
+
+            def counting_read(path):
+                reads.append(path)
+                return original_read.__func__(path)
+
+            FileSessionBackend.read_file = staticmethod(counting_read)
+            try:
+                _check_cascade(client, tmp, reads)
+            finally:
+                FileSessionBackend.read_file = original_read
+                settings.storage_dir, settings.session_backend, settings.warmup_enabled = original
+                session_index._indexes.pop(tmp, None)
+    print("✅ Sessions, traces, workspaces, derived data, vector data, cached answers and caches are removed with the file")
+
+
+def _write_from_process(storage_dir: str) -> None:
+    # Enough messages to compact the summary index, then one more session of the file
+    backend = FileSessionBackend(storage_dir)
+    for i in range(1100):
+        backend.append("f1-0", {"role": "user", "content": str(i), "timestamp": f"2024-01-02T00:{i // 60 % 60:02d}:{i % 60:02d}"})
+    backend.put({"sessionId": "f1-late", "fileId": "f1", "sheetName": "Sheet1", "createdAt": "2024-01-03T00:00:00",
+                 "sessionType": "pandas", "messages": []})
+
+
+def test_cascade_after_compaction():
+    print("🧪 Testing cascading deletes once another process compacted the session index")
+    original = (settings.storage_dir, settings.session_backend)
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.storage_dir = tmp
+        settings.session_backend = "file"
+        try:
+            for i in range(3):
+                create_session_record(f"f1-{i}", "f1", "Sheet1", "2024-01-01T00:00:00")
+            create_session_record("f2-0", "f2", "Sheet1", "2024-01-01T00:00:00")
+            assert len(get_session_backend().session_ids("f1")) == 3
+
+            process = multiprocessing.get_context("fork").Process(target=_write_from_process, args=(tmp,))
+            process.start()
+            process.join()
+            assert process.exitcode == 0
+            with open(os.path.join(tmp, session_index.INDEX_FILE), "rb") as f:
+                assert len(f.read().splitlines()) < 1100
+
+            # This process had read the journal before it was replaced
+            assert purge_file_data("f1")["deletedSessions"] == 4
+            assert [s["sessionId"] for s in list_sessions()] == ["f2-0"]
+            assert all(session_path(s) is None for s in ("f1-0", "f1-1", "f1-2", "f1-late"))
+            session_index._indexes.pop(tmp, None)
+            assert [s["sessionId"] for s in list_sessions()] == ["f2-0"]
+        finally:
+            settings.storage_dir, settings.session_backend = original
+            get_session_backend()
+            session_index._indexes.pop(tmp, None)
+    print("✅ The fileId index still finds every session of the file after a compaction")
+
+
+if __name__ == "__main__":
+    test_deleting_a_file_cascades()
+    test_cascade_after_compaction()
+    print("🎯 File cascade tests completed!")
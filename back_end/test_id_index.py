@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Test script for identifier indexes and the id_lookup agent tool (runs offline, no network needed)
+"""
+
+import os
+import tempfile
+
+import pandas as pd
+from langchain_core.messages import AIMessage
+
+from app.core.config import settings
+from app.services import id_index
+from app.services.id_index import SheetIndex, detect_id_columns, get_sheet_index
+from stub_gemini import stubbed_gemini
+
+
+def _trips() -> pd.DataFrame:
+    return pd.DataFrame({
+        "Mã chuyến": ["CH1", "CH2", "CH1", "CH3", None],
+        "Mã đơn hàng": ["O1", "O2", "O3", "O4", "O5"],
+        "Trạng thái": ["Trễ", "Đúng giờ", "Trễ", "Trễ", "Đúng giờ"],
+    })
+
+
+def test_lookup_and_join():
+    print("🧪 Testing indexed lookups and joins")
+    df = _trips()
+    assert detect_id_columns(df, 6) == ["Mã chuyến", "Mã đơn hàng"]
+    index = SheetIndex.build(df, 6)
+
+    rows = index.lookup(df, "Mã chuyến", "CH1 ")
+    assert rows["Mã đơn hàng"].tolist() == ["O1", "O3"]
+    assert index.lookup(df, "Mã đơn hàng", ["O4", "O2", "missing"])["Mã chuyến"].tolist() == ["CH2", "CH3"]
+    assert index.lookup(df, "Mã chuyến", ["nope"]).empty
+
+    orders = pd.DataFrame({"order": ["O3", "O5", "O9"], "kg": [1.5, 2.0, 3.0]})
+    joined = index.join(df, "Mã đơn hàng", orders, "order")
+    assert joined[["order", "Trạng thái"]].values.tolist() == [["O3", "Trễ"], ["O5", "Đúng giờ"]]
+
+    try:
+        index.lookup(df, "Trạng thái", ["Trễ"])
+        raise AssertionError("non-indexed column must be rejected")
+    except KeyError:
+        pass
+    print("✅ Lookups return exactly the matching rows")
+
+
+def test_index_stored_next_to_snapshot():
+    print("🧪 Testing index persistence")
+    original_dir = settings.storage_dir
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.storage_dir = tmp
+        try:
+            path = os.path.join(tmp, "idx_trips.xlsx")
+            _trips().to_excel(path, index=False)
+            df = _trips()
+            first = get_sheet_index(path, "Sheet1", df)
+            assert os.path.exists(id_index.index_path(path, "Sheet1"))
+
+            # A fresh process reads the stored index instead of rebuilding it
+            id_index._indexes.clear()
+            original_build = SheetIndex.build
+            SheetIndex.build = classmethod(lambda cls, *args: (_ for _ in ()).throw(AssertionError("rebuilt")))
+            try:
+                second = get_sheet_index(path, "Sheet1", df)
+            finally:
+                SheetIndex.build = original_build
+            assert list(second.columns) == list(first.columns)
+            assert second.lookup(df, "Mã chuyến", ["CH1"]).equals(first.lookup(df, "Mã chuyến", ["CH1"]))
+        finally:
+            settings.storage_dir = original_dir
+            id_index._indexes.clear()
+    print("✅ Index reloaded from storage")
+
+
+def test_agent_uses_lookup_tool():
+    print("🧪 Testing the id_lookup agent tool")
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with stubbed_gemini([
+        AIMessage(content="", tool_calls=[{"name": "id_lookup", "args": {"column": "Mã chuyến", "values": ["CH3"]}, "id": "call-1"}]),
+        AIMessage(content="CH3 is late."),
+    ]) as (tmp, script):
+        try:
+            _trips().to_excel(os.path.join(tmp, "tool_trips.xlsx"), index=False)
+            client = TestClient(app)
+            res = client.post("/api/analyze", json={"fileId": "tool", "sheetName": "Sheet1", "question": "Trạng thái của Mã chuyến CH3?"})
+            assert res.status_code == 200, res.text
+            trace = res.json()["trace"]
+            assert "Invoking: `id_lookup`" in trace and "1 matching rows" in trace and "O4" in trace
+        finally:
+            id_index._indexes.clear()
+    print("✅ Agent answered a point lookup through the index")
+
+
+def test_agent_edits_do_not_reach_the_loaded_sheet():
+    print("🧪 Testing in-place edits made by agent code")
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.services.sheet_cache import get_sheet_cache
+
+    edit = ("df.loc[df['Trạng thái'] == 'Trễ', 'Trạng thái'] = 'Đã xử lý'\n"
+            "df.fillna({'Mã chuyến': 'CH0'}, inplace=True)\n"
+            "df.sort_values('Mã đơn hàng', ascending=False, inplace=True)\n"
+            "int((df['Trạng thái'] == 'Trễ').sum())")
+    with stubbed_gemini([
+        AIMessage(content="", tool_calls=[{"name": "python_repl_ast", "args": {"query": edit}, "id": "call-1"}]),
+        AIMessage(content="", tool_calls=[{"name": "id_lookup", "args": {"column": "Mã chuyến", "values": ["CH1"]}, "id": "call-2"}]),
+        AIMessage(content="Done."),
+    ]) as (tmp, script):
+        try:
+            path = os.path.join(tmp, "edit_trips.xlsx")
+            _trips().to_excel(path, index=False)
+            client = TestClient(app)
+            res = client.post("/api/analyze", json={"fileId": "edit", "sheetName": "Sheet1", "question": "Mark late trips handled",
+                                                    "useCache": False})
+            assert res.status_code == 200, res.text
+            trace = res.json()["trace"]
+            # The lookup still reads the sheet as loaded, not the agent's edited frame
+            rows = trace[trace.index("2 matching rows"):][:400]
+            assert "Trễ" in rows and "Đã xử lý" not in rows, rows
+            cached = get_sheet_cache().get(path, "Sheet1")
+            assert cached["Trạng thái"].tolist() == _trips()["Trạng thái"].tolist()
+            assert cached["Mã đơn hàng"].tolist() == ["O1", "O2", "O3", "O4", "O5"] and cached["Mã chuyến"].isna().sum() == 1
+        finally:
+            id_index._indexes.clear()
+    print("✅ The cached sheet is unchanged after the agent edited its frame")
+
+
+def test_copy_on_write_changes_for_agent_code():
+    print("🧪 Testing agent code under the process-wide copy-on-write mode, and without it")
+    from fastapi.testclient import TestClient
+    from app.api.routes.analyze import COPY_ON_WRITE_HINT, build_prefix
+    from app.main import app
+    from app.services.sheet_cache import SheetCache
+
+    # Chained assignment does not write to df, and NumPy arrays from .values are read-only
+    chained = "df['Trạng thái'][0] = 'Đã xử lý'\ndf['Trạng thái'].iloc[0] + ' (unchanged)'"
+    with stubbed_gemini([
+        AIMessage(content="", tool_calls=[{"name": "python_repl_ast", "args": {"query": chained}, "id": "call-1"}]),
+        AIMessage(content="", tool_calls=[{"name": "python_repl_ast", "args": {"query": "df['Ngày giao'].values[0] = df['Ngày giao'].values[1]"},
+                                           "id": "call-2"}]),
+        AIMessage(content="Done."),
+    ], warmup_enabled=False) as (tmp, script):
+        try:
+            path = os.path.join(tmp, "cow_trips.xlsx")
+            _trips().assign(**{"Ngày giao": pd.date_range("2024-03-01", periods=5)}).to_excel(path, index=False)
+            res = TestClient(app).post("/api/analyze", json={"fileId": "cow", "sheetName": "Sheet1",
+                                                             "question": "Mark the first trip handled", "useCache": False})
+            assert res.status_code == 200, res.text
+            trace = res.json()["trace"]
+            assert "Trễ (unchanged)" in trace and "assignment destination is read-only" in trace, trace
+
+            df = SheetCache(max_bytes=10**8).get(path, "Sheet1")
+            assert COPY_ON_WRITE_HINT in build_prefix(path, "Sheet1", df, "Trạng thái")
+            # Without copy-on-write the cache hands out full copies, and the prompt does not mention it
+            with pd.option_context("mode.copy_on_write", False):
+                cache = SheetCache(max_bytes=10**8)
+                edited = cache.get(path, "Sheet1")
+                edited.loc[0, "Trạng thái"] = "Đã xử lý"
+                edited["Ngày giao"].values[1] = edited["Ngày giao"].values[0]
+                assert cache.get(path, "Sheet1")["Trạng thái"].iloc[0] == "Trễ"
+                assert cache.get(path, "Sheet1")["Ngày giao"].iloc[1] == pd.Timestamp("2024-03-02")
+                assert COPY_ON_WRITE_HINT not in build_prefix(path, "Sheet1", df, "Trạng thái")
+        finally:
+            id_index._indexes.clear()
+    print("✅ Agent code sees copy-on-write semantics; without them sheets are copied in full")
+
+
+if __name__ == "__main__":
+    test_lookup_and_join()
+    test_index_stored_next_to_snapshot()
+    test_agent_uses_lookup_tool()
+    test_agent_edits_do_not_reach_the_loaded_sheet()
+    test_copy_on_write_changes_for_agent_code()
+    print("🎯 ID index tests completed!")
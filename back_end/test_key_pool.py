@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test script for the Gemini API key pool (runs offline with stub models, no network needed)
+"""
+
+import os
+
+import pandas as pd
+from langchain_core.messages import AIMessage
+
+from app.services.key_pool import PooledChatModel, PooledEmbeddings
+from stub_gemini import StubScript, make_pool, stubbed_gemini
+
+
+def test_round_robin_and_usage():
+    print("🧪 Testing round-robin key selection")
+    script = StubScript([AIMessage(content="ok")])
+    pool = make_pool(["k1", "k2", "k3"], script)
+    model = PooledChatModel(pool=pool, model_name="stub")
+    for _ in range(6):
+        assert model.invoke("hi").content == "ok"
+    assert script.calls == ["k1", "k2", "k3", "k1", "k2", "k3"], script.calls
+    usage = {u["key"]: u for u in pool.get_usage()}
+    assert all(u["requests"] == 2 for u in usage.values())
+    print("✅ Requests spread evenly across keys")
+
+
+def test_exhausted_key_cools_down():
+    print("🧪 Testing 429 cooldown")
+    script = StubScript([AIMessage(content="ok")])
+    pool = make_pool(["exhausted", "k2"], script)
+    model = PooledChatModel(pool=pool, model_name="stub")
+    for _ in range(3):
+        assert model.invoke("hi").content == "ok"
+    # The exhausted key is tried once, then skipped while cooling down
+    assert script.calls == ["exhausted", "k2", "k2", "k2"], script.calls
+    usage = pool.get_usage()
+    assert usage[0]["quotaErrors"] == 1 and usage[0]["coolingDownForSeconds"] > 0
+    print("✅ Exhausted key cooled down, traffic moved to healthy key")
+
+
+def test_embeddings_share_pool():
+    print("🧪 Testing pooled embeddings")
+    pool = make_pool(["k1", "k2"], StubScript([]))
+    embeddings = PooledEmbeddings(pool, "stub-embedding")
+    assert len(embeddings.embed_documents(["a", "b"])) == 2
+    assert len(embeddings.embed_query("a")) == 8
+    assert [u["requests"] for u in pool.get_usage()] == [1, 1]
+    print("✅ Embeddings rotate through the same pool")
+
+
+def test_pandas_agent_end_to_end():
+    print("🧪 Testing /api/analyze with a stub tool-calling model")
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with stubbed_gemini([
+        AIMessage(content="", tool_calls=[{"name": "python_repl_ast", "args": {"query": "len(df)"}, "id": "call-1"}]),
+        AIMessage(content="The sheet has 3 rows."),
+    ], keys=["k1", "k2"]) as (tmp, script):
+        pd.DataFrame({"Mã chuyến": ["A", "B", "C"]}).to_excel(os.path.join(tmp, "stubfile_trips.xlsx"), index=False)
+        client = TestClient(app)
+        res = client.post("/api/analyze", json={"fileId": "stubfile", "sheetName": "Sheet1", "question": "How many rows?", "useCache": False})
+        assert res.status_code == 200, res.text
+        assert res.json()["output"] == "The sheet has 3 rows."
+        assert "len(df)" in res.json()["trace"]
+        assert script.calls == ["k1", "k2"], script.calls
+        metrics = client.get("/api/metrics").json()
+        assert [k["requests"] for k in metrics["apiKeys"]] == [1, 1]
+    print("✅ Agent LLM calls drew from the key pool")
+
+
+if __name__ == "__main__":
+    test_round_robin_and_usage()
+    test_exhausted_key_cools_down()
+    test_embeddings_share_pool()
+    test_pandas_agent_end_to_end()
+    print("🎯 Key pool tests completed!")
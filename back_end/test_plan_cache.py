@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test script for the generated-code plan cache (runs offline, no network needed)
+"""
+
+import json
+import os
+import tempfile
+
+import pandas as pd
+from langchain_core.messages import AIMessage
+
+from app.services.plan_cache import PlanCache, build_plan, get_plan_cache, replay_plan
+from stub_gemini import stubbed_gemini
+
+
+def test_plan_validation_and_shape_check():
+    print("🧪 Testing plan validation")
+    df = pd.DataFrame({"region": ["N", "S", "N"], "kg": [1.0, 2.0, 3.0]})
+    steps = ["by_region = df.groupby('region')['kg'].sum().reset_index()", "by_region"]
+    expected = str(df.groupby("region")["kg"].sum().reset_index())
+    pending = build_plan(steps, expected)
+    assert pending and "shape" not in pending
+    ok, _, plan = replay_plan(df, pending)
+    assert ok and plan["shape"] == {"type": "DataFrame", "columns": ["region", "kg"]}
+
+    # Code relying on randomness or on state outside df fails its first replay and is dropped
+    for steps in (["import random", "random.random()"], ["undefined_name + 1"]):
+        ok, _, checked = replay_plan(df, build_plan(steps, "0.5"))
+        assert not ok and checked is None
+    assert build_plan([], "3") is None
+
+    # On other data, a pending plan is validated by running it twice
+    next_week = pd.DataFrame({"region": ["N", "E"], "kg": [5.0, 7.0]})
+    ok, value, validated = replay_plan(next_week, pending)
+    assert ok and validated == plan and value.set_index("region")["kg"].to_dict() == {"E": 7.0, "N": 5.0}
+    ok, _, kept = replay_plan(next_week, plan)
+    assert ok and kept is plan
+
+    changed = {**plan, "shape": {"type": "number"}}
+    assert not replay_plan(next_week, changed)[0]
+    # Replays never write to the frame they are given
+    replay_plan(df, build_plan(["df.loc[0, 'kg'] = 100.0", "df['kg'].sum()"], "105.0"))
+    assert df["kg"].tolist() == [1.0, 2.0, 3.0]
+    print("✅ Plans validated on first replay and shape-checked afterwards")
+
+
+def test_new_upload_replays_without_llm():
+    print("🧪 Testing replay on next week's export")
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with stubbed_gemini([
+        AIMessage(content="", tool_calls=[{"name": "python_repl_ast", "args": {"query": "int((df['Trạng thái'] == 'Trễ').sum())"}, "id": "call-1"}]),
+        AIMessage(content="2 trips were late."),
+    ]) as (tmp, script):
+        pd.DataFrame({"Mã chuyến": ["A", "B", "C"], "Trạng thái": ["Trễ", "Đúng giờ", "Trễ"]}).to_excel(os.path.join(tmp, "week1_report.xlsx"), index=False)
+        pd.DataFrame({"Mã chuyến": ["D", "E", "F", "G"], "Trạng thái": ["Trễ", "Trễ", "Trễ", "Đúng giờ"]}).to_excel(os.path.join(tmp, "week2_report.xlsx"), index=False)
+        client = TestClient(app)
+
+        res = client.post("/api/analyze", json={"fileId": "week1", "sheetName": "Sheet1", "question": "How many trips were late?"})
+        assert res.status_code == 200, res.text
+        assert res.json()["replayed"] is False
+        assert len(script.calls) == 2
+        # Answering records the plan without running its code again
+        plans = list(get_plan_cache()._entries.values())
+        assert len(plans) == 1 and "shape" not in plans[0]
+
+        res = client.post("/api/analyze", json={"fileId": "week2", "sheetName": "Sheet1", "question": "how many trips were  late"})
+        assert res.status_code == 200, res.text
+        assert res.json()["replayed"] is True
+        assert res.json()["output"] == "3"
+        assert len(script.calls) == 2, "replay must not call the model"
+        assert client.get("/api/metrics").json()["planCache"]["replays"] == 1
+        assert list(get_plan_cache()._entries.values())[0]["shape"] == {"type": "number"}
+    print("✅ Same-schema upload answered from the cached plan")
+
+
+def test_plan_changes_append_to_the_log():
+    print("🧪 Testing incremental persistence of the plan cache")
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = os.path.join(tmp, "plan_cache.json")
+        with open(legacy, "w", encoding="utf-8") as f:
+            json.dump({"entries": [["old", {"steps": ["df['kg'].sum()"], "shape": {"type": "number"}}]]}, f)
+        path = os.path.join(tmp, "plan_cache.jsonl")
+        cache = PlanCache(path, max_entries=1000)
+        assert not os.path.exists(legacy) and cache.get("old")["steps"] == ["df['kg'].sum()"]
+
+        # Storing and dropping plans appends to the log instead of rewriting it
+        inode = os.stat(path).st_ino
+        cache.put("new", {"steps": ["len(df)"], "expected": "3"})
+        cache.put("gone", {"steps": ["df.shape"], "expected": "(3, 2)"})
+        cache.discard("gone")
+        assert os.stat(path).st_ino == inode
+        with open(path, "rb") as f:
+            assert json.loads(f.read().splitlines()[-1]) == {"key": "gone", "drop": True}
+        reloaded = PlanCache(path, max_entries=2)
+        assert list(reloaded._entries) == ["old", "new"]
+
+        # The log is compacted once it is mostly superseded lines
+        for i in range(600):
+            cache.put("new", {"steps": ["len(df)"], "expected": str(i)})
+        with open(path, "rb") as f:
+            assert len(f.read().splitlines()) < 600
+        assert PlanCache(path, max_entries=1000).get("new")["expected"] == "599"
+    print("✅ One appended line per plan change, old cache file converted")
+
+
+if __name__ == "__main__":
+    test_plan_validation_and_shape_check()
+    test_new_upload_replays_without_llm()
+    test_plan_changes_append_to_the_log()
+    print("🎯 Plan cache tests completed!")
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Test script for token-budgeted agent prompts on wide sheets (runs offline, no network needed)
+"""
+
+import pandas as pd
+
+from app.services.prompt_builder import build_agent_prefix, description_map, rank_columns
+from app.services.sheet_profile import compute_sheet_profile, estimate_tokens
+
+
+def _wide_sheet(n_columns: int = 150) -> pd.DataFrame:
+    data = {f"Chỉ tiêu phụ {i}": [f"giá trị {i}-{r}" for r in range(20)] for i in range(n_columns - 2)}
+    data["Mã chuyến"] = [f"CH{r:03d}" for r in range(20)]
+    data["Trạng thái giao hàng"] = ["Trễ" if r % 3 == 0 else "Đúng giờ" for r in range(20)]
+    return pd.DataFrame(data)
+
+
+def test_rank_columns_is_accent_insensitive():
+    print("🧪 Testing column ranking")
+    columns = ["Mã chuyến", "Mã kho", "Trạng thái giao hàng", "Ngày tạo"]
+    ranked = rank_columns(columns, "có bao nhiêu chuyến trễ theo trang thai?")
+    assert ranked[:2] == ["Mã chuyến", "Trạng thái giao hàng"] or ranked[:2] == ["Trạng thái giao hàng", "Mã chuyến"]
+    assert "Ngày tạo" not in ranked
+    assert rank_columns(columns, "") == []
+    print("✅ Columns matching the question ranked first")
+
+
+def test_wide_sheet_prompt_stays_within_budget():
+    print("🧪 Testing prompt budget on a 150-column sheet")
+    df = _wide_sheet()
+    profile = compute_sheet_profile(df)
+    desc_df = pd.DataFrame({
+        "Tên trường": list(df.columns),
+        "Mô tả": ["Mô tả rất dài   của trường này, " * 20] * len(df.columns),
+    })
+    builder = build_agent_prefix(
+        df, "Có bao nhiêu chuyến có trạng thái giao hàng trễ?",
+        base="You are a data analyst.\n", max_tokens=2500,
+        profile=profile, profile_max_tokens=1500,
+        desc_df=desc_df, description_max_tokens=500,
+        head_max_tokens=300, head_max_columns=4,
+    )
+    text = builder.build()
+    assert estimate_tokens(text) <= 2500 + 10, builder.sections
+    assert builder.sections["descriptions"] <= 500
+    # Every column is still named, the relevant ones come with sample rows
+    assert all(c in text for c in df.columns)
+    head = text[text.index("First 3 rows of selected columns"):]
+    assert "Trạng thái giao hàng" in head and "Mã chuyến" in head
+    assert "Chỉ tiêu phụ 7 " not in head
+    # Long descriptions are compressed and the rest of the fields summarised
+    assert all(len(v) <= 100 for v in description_map(desc_df).values())
+    assert "more fields not shown" in text
+    print(f"✅ Prompt of {builder.used} tokens: {builder.sections}")
+
+
+if __name__ == "__main__":
+    test_rank_columns_is_accent_insensitive()
+    test_wide_sheet_prompt_stays_within_budget()
+    print("🎯 Prompt builder tests completed!")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test script for the shared Gemini rate limiter (runs offline, no server needed)
+"""
+
+import threading
+import time
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from app.services.rate_limiter import (
+    BATCH,
+    INGESTION,
+    INTERACTIVE,
+    GeminiRateLimiter,
+    QuotaExceededError,
+    run_with_quota_retry,
+)
+
+
+def test_interactive_served_before_batch():
+    print("🧪 Testing priority order")
+    # 600 requests/minute = one every 0.1s once the burst is used up
+    limiter = GeminiRateLimiter(requests_per_minute=600, tokens_per_minute=10_000_000)
+    limiter._requests.tokens = 0
+    order = []
+
+    def worker(name, priority):
+        limiter.acquire(tokens=1, priority=priority)
+        order.append(name)
+
+    threads = [threading.Thread(target=worker, args=(f"ingest{i}", INGESTION)) for i in range(2)]
+    threads += [threading.Thread(target=worker, args=(f"batch{i}", BATCH)) for i in range(2)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    late = threading.Thread(target=worker, args=("interactive", INTERACTIVE))
+    late.start()
+    for t in threads + [late]:
+        t.join()
+
+    assert order.index("interactive") <= 1, order
+    assert max(order.index("batch0"), order.index("batch1")) < min(order.index("ingest0"), order.index("ingest1")), order
+    metrics = limiter.get_metrics()
+    assert metrics["waits"]["batch"]["acquired"] == 2
+    assert metrics["queueDepth"] == 0
+    print(f"✅ Served in order: {order}")
+
+
+def test_tokens_per_minute_budget():
+    print("🧪 Testing tokens-per-minute budget")
+    limiter = GeminiRateLimiter(requests_per_minute=1000, tokens_per_minute=6000)  # 100 tokens/s
+    assert limiter.acquire(tokens=6000)
+    assert not limiter.acquire(tokens=50, blocking=False)
+    start = time.monotonic()
+    limiter.acquire(tokens=50)
+    assert time.monotonic() - start >= 0.3
+    print("✅ Token budget enforced")
+
+
+def test_chat_model_uses_limiter():
+    print("🧪 Testing LangChain rate_limiter hook")
+    limiter = GeminiRateLimiter(requests_per_minute=600, tokens_per_minute=10_000_000)
+    model = FakeListChatModel(responses=["a", "b", "c"], rate_limiter=limiter)
+    for _ in range(3):
+        model.invoke("hello")
+    assert limiter.get_metrics()["waits"]["interactive"]["acquired"] == 3
+    print("✅ Chat model calls go through the limiter")
+
+
+def test_quota_retry_gives_up():
+    print("🧪 Testing quota retry")
+    calls = []
+
+    def always_quota():
+        calls.append(1)
+        raise RuntimeError("429 ResourceExhausted: quota")
+
+    from app.core.config import settings
+    original_backoff = settings.gemini_quota_backoff_seconds
+    settings.gemini_quota_backoff_seconds = 0.01
+    try:
+        run_with_quota_retry(always_quota, max_retries=3)
+        assert False, "should raise"
+    except QuotaExceededError:
+        pass
+    finally:
+        settings.gemini_quota_backoff_seconds = original_backoff
+    assert len(calls) == 3
+    print("✅ Quota retry raises QuotaExceededError after retries")
+
+
+if __name__ == "__main__":
+    test_interactive_served_before_batch()
+    test_tokens_per_minute_budget()
+    test_chat_model_uses_limiter()
+    test_quota_retry_gives_up()
+    print("🎯 Rate limiter tests completed!")
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test script for precomputed rollups and the rollup_query agent tool (runs offline, no network needed)
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+from langchain_core.messages import AIMessage
+
+from app.services import rollups
+from app.services.rollups import RollupCube, get_rollup_cube
+from stub_gemini import stubbed_gemini
+
+
+def _shipments(n: int = 2000) -> pd.DataFrame:
+    rng = np.random.default_rng(7)
+    dates = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 120, n), unit="D")
+    tons = rng.uniform(0.5, 20, n).round(2)
+    tons[::17] = np.nan
+    return pd.DataFrame({
+        "Mã chuyến": [f"CH{i:04d}" for i in range(n)],
+        "Ngày giao": dates,
+        "Số tấn": tons,
+        "Số khối": rng.integers(1, 40, n).astype(float),
+        "Điểm lấy": rng.choice(["Kho A", "Kho B", "Kho C"], n),
+    })
+
+
+def test_cube_matches_full_scan():
+    print("🧪 Testing rollups against groupby on the full sheet")
+    df = _shipments()
+    cube = RollupCube.build(df, max_dimensions=6, max_cardinality=50)
+    assert cube.columns == {"timeColumns": ["Ngày giao"], "measures": ["Số tấn", "Số khối"], "dimensions": ["Điểm lấy"]}
+    assert len(cube.table) < len(df)
+
+    month = df["Ngày giao"].dt.to_period("M").dt.start_time
+    expected = df.groupby([month, "Điểm lấy"])["Số tấn"].sum()
+    result = cube.query(["Số tấn"], grain="month", by="Điểm lấy").set_index(["month", "Điểm lấy"])["Số tấn"]
+    assert np.allclose(result.sort_index().values, expected.sort_index().values)
+
+    week = cube.query("Số khối", grain="week")
+    assert week["Số khối"].sum() == df["Số khối"].sum()
+    assert (week["week"].dt.dayofweek == 0).all()
+
+    mean = cube.query(["Số tấn"], grain="all", agg="mean")["Số tấn"].iloc[0]
+    assert np.isclose(mean, df["Số tấn"].mean())
+    assert cube.query(["Số tấn"], grain="all", agg="count")["Số tấn"].iloc[0] == df["Số tấn"].notna().sum()
+
+    for bad in [dict(measures=["Mã chuyến"]), dict(measures=["Số tấn"], by="Mã chuyến"), dict(measures=["Số tấn"], grain="year")]:
+        try:
+            cube.query(**bad)
+            raise AssertionError(f"query {bad} must be rejected")
+        except (KeyError, ValueError):
+            pass
+    print("✅ Rollup answers equal full-sheet aggregates")
+
+
+def test_rollups_stored_and_used_by_agent():
+    print("🧪 Testing stored rollups and the rollup_query tool")
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with stubbed_gemini([
+        AIMessage(content="", tool_calls=[{"name": "rollup_query", "args": {"measures": ["Số tấn"], "grain": "month", "by": "Điểm lấy"}, "id": "call-1"}]),
+        AIMessage(content="Tons per month and pickup point listed above."),
+    ]) as (tmp, script):
+        try:
+            path = os.path.join(tmp, "cube_shipments.xlsx")
+            _shipments().to_excel(path, index=False)
+            client = TestClient(app)
+            res = client.post("/api/analyze", json={"fileId": "cube", "sheetName": "Sheet1", "question": "Tổng số tấn theo tháng và theo điểm lấy?"})
+            assert res.status_code == 200, res.text
+            trace = res.json()["trace"]
+            assert "Invoking: `rollup_query`" in trace and "Kho B" in trace and "2024-03-01" in trace
+            assert os.path.exists(rollups.rollup_path(path, "Sheet1"))
+
+            # A fresh process reads the stored rollups instead of rebuilding them
+            rollups._cubes.clear()
+            original_build = RollupCube.build
+            RollupCube.build = classmethod(lambda cls, *args: (_ for _ in ()).throw(AssertionError("rebuilt")))
+            try:
+                cube = get_rollup_cube(path, "Sheet1", pd.DataFrame())
+            finally:
+                RollupCube.build = original_build
+            assert cube.measures == ["Số tấn", "Số khối"]
+        finally:
+            rollups._cubes.clear()
+    print("✅ Aggregate question answered from the stored cube")
+
+
+if __name__ == "__main__":
+    test_cube_matches_full_scan()
+    test_rollups_stored_and_used_by_agent()
+    print("🎯 Rollup tests completed!")
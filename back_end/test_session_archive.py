@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Test script for archiving idle sessions into compressed segments (runs offline, no network needed)
+"""
+
+import os
+import tempfile
+
+from app.core.config import settings
+from app.services import session_index
+from app.services.session_archive import archive_dir, archive_idle_sessions, segments
+from app.services.session_store import (
+    FileSessionBackend, append_message, create_session_record, delete_session, get_session_backend,
+    get_session_record, list_sessions, session_path,
+)
+
+DAY = 86400
+
+
+def _make_sessions() -> None:
+    for i in range(5):
+        create_session_record(f"old{i}", "f1", "Sheet1", "2023-01-01T00:00:00")
+        for j in range(20):
+            append_message(f"old{i}", "user", f"Tổng doanh thu tháng {j} của chi nhánh {i} là bao nhiêu?",
+                           f"2023-01-0{i + 1}T00:00:{j:02d}")
+    create_session_record("new", "f1", "Sheet1", "2024-06-01T00:00:00")
+    append_message("new", "user", "Hi", "2024-06-01T00:00:01")
+
+
+def test_idle_sessions_are_archived_and_restored():
+    print("🧪 Testing archiving and rehydration of idle sessions")
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    original = (settings.storage_dir, settings.warmup_enabled)
+    client = TestClient(app)
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.storage_dir = tmp
+        settings.warmup_enabled = False
+        try:
+            _make_sessions()
+            backend = get_session_backend()
+            now = 1718000000  # 2024-06-10
+            report = archive_idle_sessions(backend, 30 * DAY, now=now)
+            assert report["sessionsArchived"] == 5, report
+            assert report["bytesReclaimed"] > 0 and report["bytesAfter"] < report["bytesBefore"]
+            assert sorted(n for n in os.listdir(tmp) if n.startswith("session_")) == ["session_new.jsonl"]
+            assert len(segments(tmp)) == 1
+
+            # Archived sessions stay listed with their summaries
+            listed = {s["sessionId"]: s for s in list_sessions(file_id="f1")}
+            assert len(listed) == 6 and listed["old3"]["archived"] is True and listed["old3"]["messagesCount"] == 20
+            assert "archived" not in listed["new"]
+            api = {s["sessionId"]: s for s in client.get("/api/sessions").json()}
+            assert api["old0"]["archived"] and not api["new"]["archived"]
+
+            # Opening an archived session restores it
+            history = client.get("/api/session/old0").json()["messages"]
+            assert len(history) == 20 and history[0]["content"].startswith("Tổng doanh thu tháng 0")
+            assert session_path("old0") is not None
+            assert "archived" not in {s["sessionId"]: s for s in list_sessions()}["old0"]
+            append_message("old1", "assistant", "12 tỷ", "2024-06-10T00:00:00")
+            assert get_session_record("old1")["messages"][-1]["content"] == "12 tỷ"
+
+            # Deleted archived sessions do not come back when the index is rebuilt from the files and catalogs
+            assert delete_session("old2")
+            os.remove(os.path.join(tmp, session_index.INDEX_FILE))
+            session_index._indexes.pop(tmp, None)
+            listed = {s["sessionId"]: s for s in list_sessions()}
+            assert sorted(listed) == ["new", "old0", "old1", "old3", "old4"]
+            assert listed["old3"].get("archived") and listed["old4"].get("archived")
+            assert get_session_record("old4")["messages"][-1]["timestamp"] == "2023-01-05T00:00:19"
+
+            # Once every session of a segment is restored, the segment is removed; restored idle sessions are archived again
+            assert get_session_record("old3") is not None
+            report = archive_idle_sessions(backend, 30 * DAY, now=now)
+            assert report["segmentsRemoved"] == 1 and report["sessionsArchived"] == 3, report
+            assert len(segments(tmp)) == 1
+        finally:
+            settings.storage_dir, settings.warmup_enabled = original
+            session_index._indexes.pop(tmp, None)
+    print("✅ Idle sessions are archived, listed and restored on open")
+
+
+def test_session_written_during_archiving_keeps_its_file():
+    print("🧪 Testing a write racing with the archiver")
+
+    class RacingBackend(FileSessionBackend):
+        def log_bytes(self, session_id):
+            data = super().log_bytes(session_id)
+            self.append(session_id, {"role": "user", "content": "late", "timestamp": "2024-06-10T00:00:00"})
+            return data
+
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            backend = RacingBackend(tmp)
+            backend.put({"sessionId": "s", "fileId": "f1", "sheetName": "Sheet1", "createdAt": "2023-01-01T00:00:00",
+                         "sessionType": "pandas", "messages": []})
+            report = archive_idle_sessions(backend, 30 * DAY, now=1718000000)
+            assert report["sessionsArchived"] == 0
+            assert backend.get("s")["messages"][-1]["content"] == "late"
+            # The unused segment is cleaned up right away
+            assert segments(tmp) == [] and not [n for n in os.listdir(archive_dir(tmp)) if n.endswith(".gz")]
+        finally:
+            session_index._indexes.pop(tmp, None)
+    print("✅ Sessions changed while archiving are left in place")
+
+
+if __name__ == "__main__":
+    test_idle_sessions_are_archived_and_restored()
+    test_session_written_during_archiving_keeps_its_file()
+    print("🎯 Session archive tests completed!")
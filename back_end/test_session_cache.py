@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Test script for the session record cache (runs offline, no network needed)
+"""
+
+import tempfile
+
+from app.core.config import settings
+from app.services import session_index
+from app.services.session_sqlite import SqliteSessionBackend, session_db_path
+from app.services.session_store import (
+    FileSessionBackend, append_message, create_session_record, delete_session, get_messages_page,
+    get_session_cache, get_session_header, get_session_record,
+)
+
+
+def _other_worker():
+    """A second backend instance on the same storage, as another worker process would have"""
+    if settings.session_backend == "sqlite":
+        return SqliteSessionBackend(session_db_path())
+    return FileSessionBackend(settings.storage_dir)
+
+
+def _check_cache() -> None:
+    create_session_record("s1", "f1", "Sheet1", "2024-01-01T00:00:00")
+    append_message("s1", "user", "Hi", "2024-01-01T00:00:01")
+    cache = get_session_cache()
+
+    assert get_session_record("s1")["messages"][0]["content"] == "Hi"
+    assert (cache.hits, cache.misses) == (0, 1)
+    # Repeated reads within a request are served from memory, header and pages included
+    rec = get_session_record("s1")
+    assert get_session_header("s1")["fileId"] == "f1"
+    assert get_messages_page("s1", None, 10)[0][0]["content"] == "Hi"
+    assert (cache.hits, cache.misses) == (3, 1)
+
+    # Callers get copies: changing them does not change the cached record
+    rec["messages"].append({"role": "user", "content": "local", "timestamp": "x"})
+    rec["sheetName"] = "changed"
+    assert len(get_session_record("s1")["messages"]) == 1
+    assert get_session_record("s1")["sheetName"] == "Sheet1"
+
+    # A write by another worker is seen on the next read
+    _other_worker().append("s1", {"role": "assistant", "content": "Hello", "timestamp": "2024-01-01T00:00:02"})
+    misses = cache.misses
+    assert [m["content"] for m in get_session_record("s1")["messages"]] == ["Hi", "Hello"]
+    assert cache.misses == misses + 1
+
+    append_message("s1", "user", "Again", "2024-01-01T00:00:03")
+    assert get_session_record("s1")["messages"][-1]["content"] == "Again"
+
+    # Least recently used records are evicted beyond the bound
+    for i in range(cache.max_entries + 1):
+        create_session_record(f"e{i}", "f1", "Sheet1", "2024-01-01T00:00:00")
+        get_session_record(f"e{i}")
+    assert cache.get_metrics()["records"] == cache.max_entries
+    assert cache.evictions >= 1
+
+    assert delete_session("s1")
+    assert get_session_record("s1") is None
+
+
+def test_cache_on_both_backends():
+    print("🧪 Testing the session record cache")
+    original = (settings.storage_dir, settings.session_backend, settings.session_cache_max_entries)
+    for backend in ("file", "sqlite"):
+        with tempfile.TemporaryDirectory() as tmp:
+            settings.storage_dir = tmp
+            settings.session_backend = backend
+            settings.session_cache_max_entries = 3
+            try:
+                _check_cache()
+            finally:
+                settings.storage_dir, settings.session_backend, settings.session_cache_max_entries = original
+                session_index._indexes.pop(tmp, None)
+    print("✅ Records are parsed once and revalidated on every read")
+
+
+def test_request_parses_session_once():
+    print("🧪 Testing that repeated requests reuse the parsed session")
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    original = (settings.storage_dir, settings.warmup_enabled)
+    original_read = FileSessionBackend.__dict__["read_file"]
+    reads = []
+
+    def counting_read(path):
+        reads.append(path)
+        return original_read.__func__(path)
+
+    client = TestClient(app)
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.storage_dir = tmp
+        settings.warmup_enabled = False
+        FileSessionBackend.read_file = staticmethod(counting_read)
+        try:
+            create_session_record("s1", "f1", "Sheet1", "2024-01-01T00:00:00")
+            append_message("s1", "user", "Hi", "2024-01-01T00:00:01")
+            assert get_session_record("s1") is not None
+            before = len(reads)
+            for _ in range(3):
+                res = client.get("/api/session/s1")
+                assert res.status_code == 200, res.text
+                assert res.json()["messages"][0]["content"] == "Hi"
+            assert len(reads) == before, "a cached, unchanged session must not be parsed again"
+            metrics = client.get("/api/metrics").json()["sessions"]["cache"]
+            assert metrics["hits"] >= 6 and metrics["records"] == 1
+        finally:
+            FileSessionBackend.read_file = original_read
+            settings.storage_dir, settings.warmup_enabled = original
+            session_index._indexes.pop(tmp, None)
+    print("✅ Unchanged sessions are served from memory")
+
+
+if __name__ == "__main__":
+    test_cache_on_both_backends()
+    test_request_parses_session_once()
+    print("🎯 Session cache tests completed!")
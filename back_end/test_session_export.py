@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Test script for exporting and importing sessions as compressed NDJSON (runs offline, no network needed)
+"""
+
+import gzip
+import json
+import os
+import tempfile
+
+from app.core.config import settings
+from app.services import session_index
+from app.services.session_archive import archive_idle_sessions
+from app.services.session_export import SessionImporter, import_chunks, iter_export
+from app.services.session_store import (
+    append_message, create_session_record, get_session_backend, get_session_record, list_sessions, session_path,
+)
+from app.services.traces import delete_traces
+from app.services.workspace import delete_workspace
+
+
+def _make_sessions() -> None:
+    create_session_record("old", "f1", "Sheet1", "2023-03-01T00:00:00")
+    append_message("old", "user", "Tổng số chuyến năm 2022?", "2023-03-01T00:00:01")
+    for i in range(3):
+        create_session_record(f"s{i}", "f1" if i < 2 else "f2", "Sheet1", "2024-01-01T00:00:00")
+        append_message(f"s{i}", "user", f"Câu hỏi {i}", f"2024-01-0{i + 2}T00:00:00")
+        append_message(f"s{i}", "assistant", f"Trả lời {i}", f"2024-01-0{i + 2}T00:00:01", trace=f"bước {i} " * 100)
+    create_session_record("rag", "r1", "Notes", "2024-02-01T00:00:00", session_type="rag")
+
+
+def _exported(client, query: str = "") -> list:
+    res = client.get(f"/api/sessions/export{query}")
+    assert res.status_code == 200, res.text
+    assert res.headers["content-type"] == "application/gzip" and ".ndjson.gz" in res.headers["content-disposition"]
+    return [json.loads(line) for line in gzip.decompress(res.content).decode("utf-8").splitlines()]
+
+
+def _session_ids(lines: list) -> list:
+    return [line["session"]["sessionId"] for line in lines if line["kind"] == "session"]
+
+
+def _check_round_trip(client, backend: str) -> None:
+    with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as target:
+        settings.storage_dir = source
+        settings.session_backend = backend
+        _make_sessions()
+        if backend == "file":
+            archive_idle_sessions(get_session_backend(), 180 * 86400, now=1718000000)
+            assert session_path("old") is None
+
+        lines = _exported(client)
+        assert lines[0]["kind"] == "export" and lines[0]["version"] == 1
+        assert _session_ids(lines) == ["rag", "s2", "s1", "s0", "old"]
+        message = next(line for line in lines if line["kind"] == "message" and line["sessionId"] == "s1"
+                       and line["message"]["role"] == "assistant")["message"]
+        assert message["trace"].startswith("bước 1") and "traceId" not in message
+        if backend == "file":
+            # Exporting reads archived sessions from their segment without restoring them
+            assert session_path("old") is None
+
+        assert _session_ids(_exported(client, "?fileId=f1")) == ["s1", "s0", "old"]
+        assert _session_ids(_exported(client, "?type=rag")) == ["rag"]
+        assert _session_ids(_exported(client, "?since=2024-01-03&until=2024-01-04")) == ["s2", "s1"]
+        assert _session_ids(_exported(client, "?until=2023-12-31")) == ["old"]
+        assert client.get("/api/sessions/export?since=yesterday").status_code == 400
+
+        body = client.get("/api/sessions/export").content
+        settings.storage_dir = target
+        res = client.post("/api/sessions/import", content=body)
+        assert res.status_code == 200, res.text
+        assert res.json() == {"imported": 5, "skipped": 0}
+        assert sorted(s["sessionId"] for s in list_sessions()) == ["old", "rag", "s0", "s1", "s2"]
+        imported = get_session_record("s1")
+        assert [m["content"] for m in imported["messages"]] == ["Câu hỏi 1", "Trả lời 1"]
+        trace_id = imported["messages"][1]["traceId"]
+        trace = client.get(f"/api/session/s1/trace/{trace_id}")
+        assert trace.status_code == 200 and trace.text.startswith("bước 1")
+
+        # Existing sessions are skipped, or replaced with overwrite
+        append_message("s0", "user", "Thêm", "2024-05-01T00:00:00")
+        assert client.post("/api/sessions/import", content=body).json() == {"imported": 0, "skipped": 5}
+        assert len(get_session_record("s0")["messages"]) == 3
+        res = client.post("/api/sessions/import?overwrite=true", content=body)
+        assert res.json() == {"imported": 5, "skipped": 0}
+        assert len(get_session_record("s0")["messages"]) == 2
+        session_index._indexes.pop(source, None)
+        session_index._indexes.pop(target, None)
+
+
+def test_sessions_round_trip():
+    print("🧪 Testing session export and import on both backends")
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    original = (settings.storage_dir, settings.session_backend, settings.warmup_enabled)
+    client = TestClient(app)
+    settings.warmup_enabled = False
+    try:
+        for backend in ("file", "sqlite"):
+            _check_round_trip(client, backend)
+    finally:
+        settings.storage_dir, settings.session_backend, settings.warmup_enabled = original
+    print("✅ Sessions, messages and traces survive export and import, filters apply")
+
+
+def test_import_reads_any_chunking():
+    print("🧪 Testing imports fed byte by byte, plain or compressed, and malformed input")
+    original = settings.storage_dir
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.storage_dir = tmp
+        try:
+            _make_sessions()
+            compressed = b"".join(iter_export(file_id="f1"))
+            plain = gzip.decompress(compressed)
+            for data in (compressed, plain):
+                importer = SessionImporter()
+                records = [r for i in range(len(data)) for r in importer.feed(data[i:i + 1])] + importer.finish()
+                assert [r["sessionId"] for r in records] == ["s1", "s0", "old"]
+                assert len(records[0]["messages"]) == 2
+
+            for bad in (compressed[:len(compressed) // 2], b'{"kind": "message", "sessionId": "x", "message": {}}\n',
+                        b'{"kind": "session", "session": {"sessionId": "../x"}}\n', b"not json\n",
+                        b'{"kind": "session", "session": {"sessionId": "."}}\n',
+                        b'{"kind": "session", "session": {"sessionId": ".."}}\n'):
+                try:
+                    import_chunks([bad], overwrite=True)
+                except ValueError:
+                    pass
+                else:
+                    raise AssertionError(f"accepted {bad[:40]!r}")
+
+            # Session IDs that name a parent or the storage directory itself never reach a path
+            for session_id in (".", "..", "a/b", ""):
+                for remove in (delete_traces, delete_workspace):
+                    try:
+                        remove(session_id)
+                    except ValueError:
+                        pass
+                    else:
+                        raise AssertionError(f"{remove.__name__} accepted {session_id!r}")
+            assert os.path.isdir(os.path.join(tmp, "traces", "s0")) and os.path.exists(session_path("s0"))
+        finally:
+            settings.storage_dir = original
+            session_index._indexes.pop(tmp, None)
+    print("✅ Chunk boundaries do not matter; truncated or malformed exports are rejected")
+
+
+if __name__ == "__main__":
+    test_sessions_round_trip()
+    test_import_reads_any_chunking()
+    print("🎯 Session export tests completed!")
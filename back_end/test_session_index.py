@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test script for the session summary index behind session listings (runs offline, no network needed)
+"""
+
+import multiprocessing
+import os
+import tempfile
+
+from app.services import session_index
+from app.services.session_index import INDEX_FILE, SessionSummaryIndex
+from app.services.session_store import FileSessionBackend
+
+
+def _record(session_id: str, file_id: str, session_type: str, created_at: str) -> dict:
+    return {"sessionId": session_id, "fileId": file_id, "sheetName": "Sheet1", "createdAt": created_at,
+            "sessionType": session_type, "messages": []}
+
+
+def test_listing_reads_no_session_file():
+    print("🧪 Testing listings served from the summary index")
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            backend = FileSessionBackend(tmp)
+            for i in range(30):
+                backend.put(_record(f"s{i:02d}", f"f{i % 3}", "rag" if i % 2 else "pandas", f"2024-01-{i + 1:02d}T00:00:00"))
+            backend.append("s03", {"role": "user", "content": "Hi", "timestamp": "2024-02-01T00:00:00"})
+            backend.delete("s06")
+
+            original_read = FileSessionBackend.__dict__["read_file"]
+            FileSessionBackend.read_file = staticmethod(lambda path: (_ for _ in ()).throw(AssertionError(f"opened {path}")))
+            try:
+                sessions = backend.list(file_id="f0", session_type="rag")
+            finally:
+                FileSessionBackend.read_file = original_read
+            assert [s["sessionId"] for s in sessions] == ["s03", "s27", "s21", "s15", "s09"]
+            assert sessions[0]["messagesCount"] == 1 and sessions[0]["lastMessageAt"] == "2024-02-01T00:00:00"
+            assert len(backend.list()) == 29
+
+            # Another process sees the changes through the shared journal
+            other = SessionSummaryIndex(tmp, backend.scan_summaries)
+            backend.append("s00", {"role": "user", "content": "Hello", "timestamp": "2024-03-01T00:00:00"})
+            assert other.list()[0]["sessionId"] == "s00" and len(other.list()) == 29
+        finally:
+            session_index._indexes.pop(tmp, None)
+    print("✅ Filters visit only the matching sessions")
+
+
+def _walk(backend: FileSessionBackend, file_id=None, session_type=None, limit=4) -> list:
+    pages, after = [], None
+    while True:
+        page, after = backend.list_page(file_id, session_type, after, limit)
+        pages.append([s["sessionId"] for s in page])
+        if after is None:
+            return pages
+
+
+def test_pages_follow_listing_keys():
+    print("🧪 Testing keyset pages of the summary index")
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            backend = FileSessionBackend(tmp)
+            for i in range(10):
+                backend.put(_record(f"s{i:02d}", f"f{i % 2}", "pandas", f"2024-01-{i + 1:02d}T00:00:00"))
+            backend.append("s02", {"role": "user", "content": "Hi", "timestamp": "2024-02-01T00:00:00"})
+
+            pages = _walk(backend)
+            assert [s for page in pages for s in page] == [s["sessionId"] for s in backend.list()]
+            assert [len(page) for page in pages] == [4, 4, 2]
+            assert _walk(backend, file_id="f0") == [["s02", "s08", "s06", "s04"], ["s00"]]
+            assert _walk(backend, file_id="f1", session_type="rag") == [[]]
+
+            # Keys stay sorted as entries arrive, per fileId and sessionType too: no page re-sorts or skips
+            first, after = backend.list_page(None, None, None, 3)
+            assert backend.list_page(None, None, after, 3)[0][0]["sessionId"] == "s07"
+            backend.append("s00", {"role": "user", "content": "Hi", "timestamp": "2024-03-01T00:00:00"})
+            backend.delete("s09")
+            assert backend.list_page(None, None, None, 1)[0][0]["sessionId"] == "s00"
+            index = backend.index
+            assert index._order == sorted(index._order) and len(index._order) == 9
+            assert [key[1] for key in index._by_file["f0"]] == ["s04", "s06", "s08", "s02", "s00"]
+            assert [key[1] for key in index._by_file_type[("f1", "pandas")]] == ["s01", "s03", "s05", "s07"]
+            assert _walk(backend, file_id="f1", session_type="pandas", limit=3) == [["s07", "s05", "s03"], ["s01"]]
+        finally:
+            session_index._indexes.pop(tmp, None)
+    print("✅ Pages match the full listing, with filters, from keys kept sorted per filter")
+
+
+def test_index_rebuilt_and_compacted():
+    print("🧪 Testing rebuild and compaction of the summary index")
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            backend = FileSessionBackend(tmp)
+            backend.put(_record("a", "f1", "pandas", "2024-01-01T00:00:00"))
+            for i in range(1100):
+                backend.append("a", {"role": "user", "content": str(i), "timestamp": f"2024-01-02T00:{i // 60 % 60:02d}:{i % 60:02d}"})
+            # Compaction keeps the journal short while the totals stay right
+            with open(os.path.join(tmp, INDEX_FILE), "rb") as f:
+                assert len(f.read().splitlines()) < 200
+            assert backend.list()[0]["messagesCount"] == 1100
+
+            os.remove(os.path.join(tmp, INDEX_FILE))
+            session_index._indexes.pop(tmp, None)
+            rebuilt = FileSessionBackend(tmp).list()
+            assert rebuilt[0]["messagesCount"] == 1100 and rebuilt[0]["lastMessageAt"] == "2024-01-02T00:18:19"
+        finally:
+            session_index._indexes.pop(tmp, None)
+    print("✅ Index rebuilt from the session files when missing")
+
+
+def _count_from_process(storage_dir: str, worker: int) -> None:
+    index = SessionSummaryIndex(storage_dir, lambda: [])
+    for i in range(600):
+        index.messages(f"w{worker}", [f"2024-01-01T00:{i // 60:02d}:{i % 60:02d}"])
+
+
+def test_compaction_keeps_other_processes_entries():
+    print("🧪 Testing compactions while several processes append to the index")
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SessionSummaryIndex(tmp, lambda: [])
+        for w in range(4):
+            index.put(_record(f"w{w}", "f1", "pandas", "2024-01-01T00:00:00"))
+        processes = [multiprocessing.get_context("fork").Process(target=_count_from_process, args=(tmp, w)) for w in range(4)]
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join()
+            assert p.exitcode == 0
+        # 2400 entries cross the compaction threshold several times; a fresh reader replays the result
+        with open(os.path.join(tmp, INDEX_FILE), "rb") as f:
+            assert len(f.read().splitlines()) < 2400
+        counts = {s["sessionId"]: s["messagesCount"] for s in SessionSummaryIndex(tmp, lambda: []).list()}
+        assert counts == {f"w{w}": 600 for w in range(4)}, counts
+    print("✅ No process's entries are lost to another's compaction")
+
+
+if __name__ == "__main__":
+    test_listing_reads_no_session_file()
+    test_pages_follow_listing_keys()
+    test_index_rebuilt_and_compacted()
+    test_compaction_keeps_other_processes_entries()
+    print("🎯 Session index tests completed!")
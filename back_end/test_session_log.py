@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Test script for the append-only session message log (runs offline, no network needed)
+"""
+
+import json
+import os
+import tempfile
+
+from app.core.config import settings
+from app.services import session_store
+from app.services.session_store import (
+    append_message,
+    compact_session,
+    create_session_record,
+    delete_session,
+    get_session_record,
+    list_sessions,
+)
+
+
+def test_append_writes_only_the_message():
+    print("🧪 Testing append-only message writes")
+    original_dir = settings.storage_dir
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.storage_dir = tmp
+        try:
+            create_session_record("s1", "f1", "Sheet1", "2024-01-01T00:00:00")
+            path = session_store.session_path("s1")
+            assert path.endswith(".jsonl")
+            append_message("s1", "user", "x" * 5000, "2024-01-01T00:00:01", trace="t" * 5000)
+            size = os.path.getsize(path)
+            append_message("s1", "assistant", "Có 12 chuyến trễ.", "2024-01-01T00:00:02", cached=True)
+            # The second write adds one short line instead of rewriting the 10 kB already stored
+            assert os.path.getsize(path) - size < 200
+
+            rec = get_session_record("s1")
+            assert [m["role"] for m in rec["messages"]] == ["user", "assistant"]
+            assert rec["messages"][1] == {"role": "assistant", "content": "Có 12 chuyến trễ.", "timestamp": "2024-01-01T00:00:02", "cached": True}
+            assert list_sessions(file_id="f1")[0]["lastMessageAt"] == "2024-01-01T00:00:02"
+
+            # A write cut short by a crash costs only the partial line
+            with open(path, "ab") as f:
+                f.write(b'{"role": "user", "cont')
+            append_message("s1", "user", "next", "2024-01-01T00:00:03")
+            assert [m["content"] for m in get_session_record("s1")["messages"]][-1] == "next"
+            assert len(get_session_record("s1")["messages"]) == 3
+
+            assert delete_session("s1") and get_session_record("s1") is None
+            append_message("s1", "user", "late", "2024-01-01T00:00:04")
+            assert session_store.session_path("s1") is None, "appending must not recreate a deleted session"
+        finally:
+            settings.storage_dir = original_dir
+    print("✅ Appends cost the size of the message")
+
+
+def test_legacy_sessions_are_read_and_compacted():
+    print("🧪 Testing sessions stored in the old JSON format")
+    original_dir = settings.storage_dir
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.storage_dir = tmp
+        try:
+            legacy = {
+                "sessionId": "old", "fileId": "f1", "sheetName": "Sheet1", "createdAt": "2023-05-01T00:00:00",
+                "sessionType": "pandas", "messages": [{"role": "user", "content": "Hi", "timestamp": "2023-05-01T00:00:01"}],
+            }
+            with open(os.path.join(tmp, "session_old.json"), "w", encoding="utf-8") as f:
+                json.dump(legacy, f, ensure_ascii=False, indent=2)
+            assert get_session_record("old") == legacy
+            assert list_sessions()[0]["messagesCount"] == 1
+
+            append_message("old", "assistant", "Hello", "2023-05-01T00:00:02")
+            assert not os.path.exists(os.path.join(tmp, "session_old.json"))
+            rec = get_session_record("old")
+            assert rec["messages"][0] == legacy["messages"][0] and rec["messages"][1]["content"] == "Hello"
+            assert len(list_sessions()) == 1
+
+            with open(session_store.session_path("old"), "ab") as f:
+                f.write(b'{"role": "user", "cont')
+            assert compact_session("old")
+            with open(session_store.session_path("old"), "r", encoding="utf-8") as f:
+                assert len(f.read().splitlines()) == 3
+        finally:
+            settings.storage_dir = original_dir
+    print("✅ Old session files keep working and are converted on write")
+
+
+if __name__ == "__main__":
+    test_append_writes_only_the_message()
+    test_legacy_sessions_are_read_and_compacted()
+    print("🎯 Session log tests completed!")
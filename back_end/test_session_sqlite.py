@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Test script for the SQLite session backend and the session file importer (runs offline, no network needed)
+"""
+
+import os
+import sqlite3
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.config import settings
+from app.services.session_sqlite import SqliteSessionBackend, import_file_sessions, session_db_path
+from app.services.session_store import FileSessionBackend, get_session_backend
+
+
+def _record(session_id: str, file_id: str, session_type: str, created_at: str) -> dict:
+    return {"sessionId": session_id, "fileId": file_id, "sheetName": "Sheet1", "createdAt": created_at,
+            "sessionType": session_type, "messages": []}
+
+
+def _check_backend(backend) -> None:
+    backend.put(_record("a", "f1", "pandas", "2024-01-01T00:00:00"))
+    backend.put(_record("b", "f1", "rag", "2024-01-02T00:00:00"))
+    backend.put(_record("c", "f2", "pandas", "2024-01-03T00:00:00"))
+    assert backend.append("a", {"role": "user", "content": "Tổng số tấn?", "timestamp": "2024-01-04T00:00:00"})
+    assert not backend.append("missing", {"role": "user", "content": "x", "timestamp": "2024-01-04T00:00:00"})
+
+    assert [s["sessionId"] for s in backend.list()] == ["a", "c", "b"]
+    assert [s["sessionId"] for s in backend.list(file_id="f1", session_type="pandas")] == ["a"]
+    assert backend.list(session_type="rag")[0] == {
+        "sessionId": "b", "fileId": "f1", "sheetName": "Sheet1", "createdAt": "2024-01-02T00:00:00",
+        "sessionType": "rag", "messagesCount": 0, "lastMessageAt": "2024-01-02T00:00:00",
+    }
+    assert backend.get("a")["messages"][0]["content"] == "Tổng số tấn?"
+    assert backend.delete("a") and not backend.delete("a") and backend.get("a") is None
+
+
+def test_backends_behave_the_same():
+    print("🧪 Testing file and SQLite session backends")
+    with tempfile.TemporaryDirectory() as tmp:
+        _check_backend(FileSessionBackend(tmp))
+        db = os.path.join(tmp, "sessions.sqlite3")
+        _check_backend(SqliteSessionBackend(db))
+        with sqlite3.connect(db) as con:
+            assert con.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            plan = " ".join(str(row) for row in con.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM sessions WHERE file_id = ? ORDER BY last_message_at DESC", ("f1",)))
+            assert "sessions_by_file" in plan, plan
+    print("✅ Same results from both backends, listing served by an index")
+
+
+def test_concurrent_appends_keep_every_message():
+    print("🧪 Testing concurrent appends to one SQLite session")
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = SqliteSessionBackend(os.path.join(tmp, "sessions.sqlite3"))
+        backend.put(_record("s", "f1", "pandas", "2024-01-01T00:00:00"))
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda i: backend.append("s", {"role": "user", "content": str(i), "timestamp": f"t{i:03d}"}), range(200)))
+        messages = backend.get("s")["messages"]
+        assert sorted(int(m["content"]) for m in messages) == list(range(200))
+        assert backend.list()[0]["messagesCount"] == 200
+    print("✅ No message lost under concurrent appends")
+
+
+def test_import_and_api_on_sqlite():
+    print("🧪 Testing the session file importer and the API on SQLite")
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    original = (settings.storage_dir, settings.session_backend, settings.warmup_enabled)
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.storage_dir = tmp
+        # No background warm-up writing into the directory while it is removed
+        settings.warmup_enabled = False
+        try:
+            files = FileSessionBackend(tmp)
+            files.put(_record("old", "f1", "pandas", "2024-01-01T00:00:00"))
+            files.append("old", {"role": "user", "content": "Hi", "timestamp": "2024-01-01T00:00:01"})
+            assert import_file_sessions(SqliteSessionBackend(session_db_path())) == 1
+
+            with open(os.path.join(tmp, "f2_trips.csv"), "w", encoding="utf-8") as f:
+                f.write("Mã chuyến,Số tấn\nCH1,2.5\n")
+            settings.session_backend = "sqlite"
+            assert isinstance(get_session_backend(), SqliteSessionBackend)
+            client = TestClient(app)
+            assert client.get("/api/session/old").json()["messages"][0]["content"] == "Hi"
+            session_id = client.post("/api/session", json={"fileId": "f2", "sheetName": "Sheet1"}).json()["sessionId"]
+            assert {s["sessionId"] for s in client.get("/api/sessions").json()} == {"old", session_id}
+            assert client.delete(f"/api/session/{session_id}").status_code == 200
+            assert [s["sessionId"] for s in client.get("/api/sessions").json()] == ["old"]
+        finally:
+            settings.storage_dir, settings.session_backend, settings.warmup_enabled = original
+    print("✅ Imported sessions served from SQLite")
+
+
+if __name__ == "__main__":
+    test_backends_behave_the_same()
+    test_concurrent_appends_keep_every_message()
+    test_import_and_api_on_sqlite()
+    print("🎯 SQLite session store tests completed!")
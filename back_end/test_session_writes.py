@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Stress test for concurrent session writes: no message may be lost (runs offline, no network needed)
+"""
+
+import multiprocessing
+import tempfile
+import threading
+
+from app.core.config import settings
+from app.services import session_index
+from app.services.session_store import FileSessionBackend, append_message, create_session_record, get_session_backend, get_session_record, list_sessions
+from app.services.session_writer import WriteBehindSessionBackend
+from app.services.traces import load_trace, save_trace
+
+WRITERS = 16
+MESSAGES_PER_WRITER = 40
+SESSIONS = 4
+
+
+def _hammer(compact) -> None:
+    """Many threads append to a few sessions while ``compact`` rewrites them"""
+    for s in range(SESSIONS):
+        create_session_record(f"s{s}", "f1", "Sheet1", "2024-01-01T00:00:00")
+    stop = threading.Event()
+
+    def writer(w: int) -> None:
+        for i in range(MESSAGES_PER_WRITER):
+            append_message(f"s{(w + i) % SESSIONS}", "user", f"{w}:{i}", f"2024-01-01T01:{w:02d}:{i:02d}")
+
+    def compactor() -> None:
+        while not stop.is_set():
+            for s in range(SESSIONS):
+                compact(f"s{s}")
+
+    compacting = threading.Thread(target=compactor)
+    compacting.start()
+    threads = [threading.Thread(target=writer, args=(w,)) for w in range(WRITERS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stop.set()
+    compacting.join()
+
+    seen = []
+    for s in range(SESSIONS):
+        contents = [m["content"] for m in get_session_record(f"s{s}")["messages"]]
+        # Each writer's messages keep their order within a session
+        for w in range(WRITERS):
+            mine = [int(c.split(":")[1]) for c in contents if c.startswith(f"{w}:")]
+            assert mine == sorted(mine), (s, w, mine)
+        seen.extend(contents)
+    assert sorted(seen) == sorted(f"{w}:{i}" for w in range(WRITERS) for i in range(MESSAGES_PER_WRITER))
+    assert sum(s["messagesCount"] for s in list_sessions()) == WRITERS * MESSAGES_PER_WRITER
+
+
+def test_concurrent_threads_lose_nothing():
+    print("🧪 Testing concurrent appends and compactions from many threads")
+    original = (settings.storage_dir, settings.session_write_behind_ms)
+    for window_ms in (0, 5):
+        with tempfile.TemporaryDirectory() as tmp:
+            settings.storage_dir = tmp
+            settings.session_write_behind_ms = window_ms
+            try:
+                backend = get_session_backend()
+                compact = backend.inner.compact if window_ms else backend.compact
+                _hammer(compact)
+                if window_ms:
+                    metrics = backend.get_metrics()
+                    assert metrics["messagesWritten"] == WRITERS * MESSAGES_PER_WRITER
+                    assert metrics["batches"] < metrics["messagesWritten"], "messages should be committed in groups"
+            finally:
+                settings.storage_dir, settings.session_write_behind_ms = original
+                get_session_backend()
+                session_index._indexes.pop(tmp, None)
+    print("✅ Every message stored, in order, with and without write-behind")
+
+
+# Enough appends to cross the summary index's compaction threshold (_COMPACT_SLACK) while others append
+PROCESS_APPENDS = 300
+
+
+def _append_from_process(storage_dir: str, worker: int) -> None:
+    backend = FileSessionBackend(storage_dir)
+    for i in range(PROCESS_APPENDS):
+        backend.append("shared", {"role": "user", "content": f"{worker}:{i}",
+                                  "timestamp": f"2024-01-01T{worker:02d}:{i // 60:02d}:{i % 60:02d}"})
+
+
+def test_concurrent_processes_lose_nothing():
+    print("🧪 Testing appends from several processes during compaction")
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            backend = FileSessionBackend(tmp)
+            backend.put({"sessionId": "shared", "fileId": "f1", "sheetName": "Sheet1", "createdAt": "2024-01-01T00:00:00",
+                         "sessionType": "pandas", "messages": []})
+            processes = [multiprocessing.get_context("fork").Process(target=_append_from_process, args=(tmp, w)) for w in range(4)]
+            for p in processes:
+                p.start()
+            while any(p.is_alive() for p in processes):
+                backend.compact("shared")
+            for p in processes:
+                p.join()
+                assert p.exitcode == 0
+            contents = [m["content"] for m in backend.get("shared")["messages"]]
+            assert sorted(contents) == sorted(f"{w}:{i}" for w in range(4) for i in range(PROCESS_APPENDS))
+            assert backend.list()[0]["messagesCount"] == 4 * PROCESS_APPENDS
+            # A fresh process replays the compacted journal to the same count
+            assert session_index._COMPACT_SLACK < 4 * PROCESS_APPENDS
+            session_index._indexes.pop(tmp, None)
+            assert FileSessionBackend(tmp).list()[0]["messagesCount"] == 4 * PROCESS_APPENDS
+        finally:
+            session_index._indexes.pop(tmp, None)
+    print("✅ Rewrites never drop another process's appends")
+
+
+def test_reads_see_queued_messages():
+    print("🧪 Testing reads while messages are queued")
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            backend = WriteBehindSessionBackend(FileSessionBackend(tmp), window_seconds=10)
+            backend.put({"sessionId": "s", "fileId": "f1", "sheetName": "Sheet1", "createdAt": "2024-01-01T00:00:00",
+                         "sessionType": "pandas", "messages": []})
+            backend.append("s", {"role": "user", "content": "Hi", "timestamp": "2024-01-01T00:00:01"})
+            # The read does not wait for the 10 s window: it asks the writer to commit now
+            assert backend.messages_page("s", None, 10)[0][0]["content"] == "Hi"
+            backend.append("s", {"role": "assistant", "content": "Hello", "timestamp": "2024-01-01T00:00:02"})
+            backend.close()
+            assert len(FileSessionBackend(tmp).get("s")["messages"]) == 2
+        finally:
+            session_index._indexes.pop(tmp, None)
+    print("✅ Queued messages are visible to reads and written on close")
+
+
+def test_dropped_messages_leave_no_trace_blob():
+    print("🧪 Testing queued messages whose session is deleted before they are written")
+    original = settings.storage_dir
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.storage_dir = tmp
+        try:
+            backend = WriteBehindSessionBackend(FileSessionBackend(tmp), window_seconds=10)
+            backend.put({"sessionId": "s", "fileId": "f1", "sheetName": "Sheet1", "createdAt": "2024-01-01T00:00:00",
+                         "sessionType": "pandas", "messages": []})
+            kept, lost = save_trace("s", "kept trace"), save_trace("gone", "lost trace")
+            assert backend.append("s", {"role": "assistant", "content": "A", "timestamp": "t1", "traceId": kept})
+            # Queued: the session's absence only shows when the batch is written
+            assert backend.append("gone", {"role": "assistant", "content": "B", "timestamp": "t2", "traceId": lost})
+            backend.flush()
+            assert load_trace("s", kept) == "kept trace" and load_trace("gone", lost) is None
+            metrics = backend.get_metrics()
+            assert metrics["messagesDropped"] == 1 and metrics["messagesWritten"] == 1
+            backend.close()
+        finally:
+            settings.storage_dir = original
+            session_index._indexes.pop(tmp, None)
+    print("✅ Dropped messages are counted and their trace blobs deleted")
+
+
+if __name__ == "__main__":
+    test_concurrent_threads_lose_nothing()
+    test_concurrent_processes_lose_nothing()
+    test_reads_see_queued_messages()
+    test_dropped_messages_leave_no_trace_blob()
+    print("🎯 Session write stress tests completed!")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test script for the out-of-core SQL engine used for large sheets (runs offline, no network needed)
+"""
+
+import os
+import tempfile
+from unittest import mock
+
+import pandas as pd
+from langchain_core.messages import AIMessage
+
+from app.core.config import settings
+from app.services.sheet_cache import get_sheet_cache
+from app.services.preprocess import iter_preprocessed_sheet_chunks
+from app.services.sql_engine import RESULT_MAX_ROWS, SqlEngine, prepare_source
+from stub_gemini import stubbed_gemini
+
+
+def _write_trips(path: str, n: int = 1000) -> None:
+    pd.DataFrame({
+        "Mã chuyến": [f"CH{i:05d}" for i in range(n)],
+        "Điểm lấy": [["Kho A", "Kho B"][i % 2] for i in range(n)],
+        "Số tấn": [float(i % 10) for i in range(n)],
+    }).to_csv(path, index=False)
+
+
+def test_engine_limits_results_and_file_access():
+    print("🧪 Testing SQL engine over Parquet")
+    original_dir = settings.storage_dir
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.storage_dir = tmp
+        try:
+            path = os.path.join(tmp, "sql_trips.csv")
+            _write_trips(path)
+            engine = SqlEngine(prepare_source(path, "Sheet1"))
+            assert engine.row_count() == 1000
+
+            totals, truncated = engine.query('SELECT "Điểm lấy", sum("Số tấn") AS tons FROM sheet GROUP BY 1 ORDER BY 1')
+            assert not truncated and totals["tons"].tolist() == [2000.0, 2500.0]
+
+            rows, truncated = engine.query("SELECT * FROM sheet")
+            assert truncated and len(rows) == RESULT_MAX_ROWS
+
+            try:
+                engine.query(f"SELECT * FROM read_csv_auto('{path}')")
+            except Exception as e:
+                assert "disabled" in str(e), e
+            else:
+                raise AssertionError("queries must not read other files")
+        finally:
+            settings.storage_dir = original_dir
+    print("✅ Aggregates computed in DuckDB, results capped")
+
+
+def test_excel_sheets_are_streamed_to_parquet():
+    print("🧪 Testing large .xlsx sheets converted in chunks")
+    original_dir = settings.storage_dir
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.storage_dir = tmp
+        try:
+            path = os.path.join(tmp, "sql_trips.xlsx")
+            n = 250
+            pd.DataFrame({
+                " Mã chuyến ": [f"CH{i:05d}" for i in range(n)],
+                "Ngày": [f"{i % 28 + 1:02d}/03/2024" for i in range(n)],
+                "Số tấn": [str(i % 10) if i != 220 else "không rõ" for i in range(n)],
+                "Lạnh": ["yes" if i % 3 == 0 else "no" for i in range(n)],
+                None: [i for i in range(n)],
+            }).rename(columns={None: ""}).to_excel(path, index=False, sheet_name="Chuyến")
+
+            chunks = list(iter_preprocessed_sheet_chunks(path, "Chuyến", chunk_rows=100))
+            assert [len(c) for c in chunks] == [100, 100, 50]
+            assert all(c.dtypes.equals(chunks[0].dtypes) for c in chunks)
+            assert list(chunks[0].columns) == ["Mã chuyến", "Ngày", "Số tấn", "Lạnh", "Unnamed: 4"]
+            assert pd.api.types.is_datetime64_any_dtype(chunks[0]["Ngày"]) and str(chunks[0]["Lạnh"].dtype) == "boolean"
+            # A value that does not fit the type inferred from the first rows becomes missing
+            assert pd.isna(chunks[2]["Số tấn"].iloc[20]) and chunks[2]["Số tấn"].iloc[21] == 1
+
+            with mock.patch("pandas.read_excel", side_effect=AssertionError("sheet read whole")):
+                engine = SqlEngine(prepare_source(path, "Chuyến"))
+                assert engine.row_count() == n
+                totals, _ = engine.query('SELECT "Lạnh", count(*) AS trips FROM sheet GROUP BY 1 ORDER BY 1')
+                assert totals["trips"].tolist() == [166, 84]
+                # The snapshot is current: a second call does not convert again
+                with mock.patch("app.services.sql_engine.write_snapshot_chunks", side_effect=AssertionError("rebuilt")):
+                    assert prepare_source(path, "Chuyến") == engine.parquet_path
+        finally:
+            settings.storage_dir = original_dir
+    print("✅ Sheet converted chunk by chunk with consistent column types")
+
+
+def test_session_switches_to_sql_above_threshold():
+    print("🧪 Testing automatic out-of-core mode for sessions")
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with stubbed_gemini([
+        AIMessage(content="", tool_calls=[{"name": "sql_query", "args": {"sql": 'SELECT "Điểm lấy", sum("Số tấn") AS tons FROM sheet GROUP BY 1 ORDER BY 1'}, "id": "call-1"}]),
+        AIMessage(content="Kho A: 2000 tấn, Kho B: 2500 tấn."),
+    ], out_of_core_threshold_mb=0.001, warmup_enabled=False) as (tmp, script):
+        path = os.path.join(tmp, "big_trips.csv")
+        _write_trips(path)
+        client = TestClient(app)
+        session_id = client.post("/api/session", json={"fileId": "big", "sheetName": "Sheet1"}).json()["sessionId"]
+        res = client.post(f"/api/session/{session_id}/ask", json={"question": "Tổng tấn theo điểm lấy?", "useCache": False})
+        assert res.status_code == 200, res.text
+        trace = res.json()["trace"]
+        assert "Invoking: `sql_query`" in trace and "2500" in trace
+        assert not get_sheet_cache().contains(path, "Sheet1"), "large sheets must not be loaded into pandas"
+
+        # Large .xls files have no streaming reader: they are refused rather than loaded whole
+        with open(os.path.join(tmp, "old_trips.xls"), "wb") as f:
+            f.write(b"\0" * 4096)
+        session_id = client.post("/api/session", json={"fileId": "old", "sheetName": "Sheet1"}).json()["sessionId"]
+        res = client.post(f"/api/session/{session_id}/ask", json={"question": "Tổng tấn?", "useCache": False})
+        assert res.status_code == 413 and ".xlsx or .csv" in res.json()["detail"], res.text
+    print("✅ Large file answered through SQL without loading it")
+
+
+if __name__ == "__main__":
+    test_engine_limits_results_and_file_access()
+    test_excel_sheets_are_streamed_to_parquet()
+    test_session_switches_to_sql_above_threshold()
+    print("🎯 SQL engine tests completed!")
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Test script for the free-text row index and the text_search agent tool (runs offline, no network needed)
+"""
+
+import os
+import tempfile
+
+import pandas as pd
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.messages import AIMessage
+
+from app.core.config import settings
+from app.services import text_index
+from app.services.text_index import TextIndex, detect_text_columns, get_text_index, load_text_index
+from stub_gemini import stubbed_gemini
+
+NOTES = [
+    "Xe bị kẹt xe trên quốc lộ 1A, giao trễ 2 giờ",
+    "Khách hàng khiếu nại hàng bị ướt do mưa",
+    "Giao đúng giờ, khách hàng hài lòng",
+    "Tài xế báo hỏng lốp, thay lốp tại trạm dừng",
+    "Kẹt xe ở cảng Cát Lái, chờ bốc hàng lâu",
+]
+
+
+def _trips(n: int = 500) -> pd.DataFrame:
+    return pd.DataFrame({
+        "Mã chuyến": [f"CH{i:04d}" for i in range(n)],
+        "Điểm lấy": [["Kho A", "Kho B"][i % 2] for i in range(n)],
+        "Ghi chú": [f"{NOTES[i % len(NOTES)]} (chuyến {i})" for i in range(n)],
+        "Số tấn": [float(i % 10) for i in range(n)],
+    })
+
+
+def test_search_is_fuzzy_and_accent_insensitive():
+    print("🧪 Testing text index search")
+    df = _trips()
+    assert detect_text_columns(df, max_columns=4) == ["Ghi chú"]
+
+    index = TextIndex.build(df, ["Ghi chú"])
+    expected = set(df.index[df["Ghi chú"].str.contains("khiếu nại")])
+    assert set(index.search("khieu nai", limit=1000)) == expected
+    # A misspelt word still finds its rows
+    assert set(index.search("khieuu nai", limit=1000)) == expected
+
+    # Rows matching every word rank before rows matching one of them
+    best = index.search("kẹt xe cát lái", limit=5)
+    assert all("Cát Lái" in df.at[row, "Ghi chú"] for row in best)
+    assert index.search("qwerty zxcv") == []
+    print("✅ Accent-free and misspelt queries find the right rows")
+
+
+def test_embeddings_are_fused_with_word_ranking():
+    print("🧪 Testing text index with embeddings")
+    df = _trips(50)
+    embeddings = DeterministicFakeEmbedding(size=8)
+    index = TextIndex.build(df, ["Ghi chú"], embeddings)
+    assert index.vectors.shape == (50, 8)
+    rows = index.search("hỏng lốp", limit=10, embeddings=embeddings)
+    assert len(rows) == 10 and "lốp" in df.at[rows[0], "Ghi chú"]
+    print("✅ Embedding similarity combined with BM25")
+
+
+class _FailingEmbeddings:
+    def embed_documents(self, texts):
+        raise RuntimeError("429 ResourceExhausted: quota exceeded")
+
+    def embed_query(self, text):
+        raise RuntimeError("429 ResourceExhausted: quota exceeded")
+
+
+def test_embedding_errors_fall_back_to_words():
+    print("🧪 Testing text index when the embedding API fails")
+    df = _trips(50)
+    index = TextIndex.build(df, ["Ghi chú"], _FailingEmbeddings())
+    assert index.vectors is None and index.search("hỏng lốp", limit=5)
+    with_vectors = TextIndex.build(df, ["Ghi chú"], DeterministicFakeEmbedding(size=8))
+    assert with_vectors.search("hỏng lốp", limit=10, embeddings=_FailingEmbeddings()) == with_vectors.search("hỏng lốp", limit=10)
+
+    original = (settings.storage_dir, settings.text_index_embeddings_enabled, text_index._embeddings)
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.storage_dir = tmp
+        settings.text_index_embeddings_enabled = True
+        text_index._embeddings = lambda: _FailingEmbeddings()
+        try:
+            path = os.path.join(tmp, "notes_trips.xlsx")
+            df.to_excel(path, index=False)
+            index = get_text_index(path, "Sheet1", df)
+            assert index.columns == ["Ghi chú"] and index.vectors is None
+            # Not stored: the next load tries the embedding again
+            assert not os.path.exists(text_index.text_index_path(path, "Sheet1"))
+        finally:
+            settings.storage_dir, settings.text_index_embeddings_enabled, text_index._embeddings = original
+            text_index._text_indexes.clear()
+    print("✅ Quota errors leave the lexical index instead of failing the question")
+
+
+def test_index_stored_and_used_by_agent():
+    print("🧪 Testing stored text index and the text_search tool")
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with stubbed_gemini([
+        AIMessage(content="", tool_calls=[{"name": "text_search", "args": {"query": "khach hang khieu nai", "limit": 5}, "id": "call-1"}]),
+        AIMessage(content="Các chuyến có khiếu nại được liệt kê ở trên."),
+    ]) as (tmp, script):
+        try:
+            path = os.path.join(tmp, "notes_trips.xlsx")
+            _trips().to_excel(path, index=False)
+            client = TestClient(app)
+            res = client.post("/api/analyze", json={"fileId": "notes", "sheetName": "Sheet1", "question": "Chuyến nào bị khách hàng khiếu nại?"})
+            assert res.status_code == 200, res.text
+            trace = res.json()["trace"]
+            assert "Invoking: `text_search`" in trace and "5 candidate rows" in trace and "ướt do mưa" in trace
+            assert os.path.exists(text_index.text_index_path(path, "Sheet1"))
+
+            # A fresh process reads the stored index instead of rebuilding it
+            text_index._text_indexes.clear()
+            original_build = TextIndex.build
+            TextIndex.build = classmethod(lambda cls, *args: (_ for _ in ()).throw(AssertionError("rebuilt")))
+            try:
+                index = get_text_index(path, "Sheet1", _trips())
+            finally:
+                TextIndex.build = original_build
+            assert index.columns == ["Ghi chú"]
+
+            # Configuring other columns makes the stored index stale
+            original_columns = settings.text_index_columns
+            settings.text_index_columns = ["Điểm lấy"]
+            try:
+                assert load_text_index(path, "Sheet1", 500) is None
+                text_index._text_indexes.clear()
+                assert get_text_index(path, "Sheet1", _trips()).columns == ["Điểm lấy"]
+            finally:
+                settings.text_index_columns = original_columns
+        finally:
+            text_index._text_indexes.clear()
+    print("✅ Fuzzy question narrowed through the stored index")
+
+
+if __name__ == "__main__":
+    test_search_is_fuzzy_and_accent_insensitive()
+    test_embeddings_are_fused_with_word_ranking()
+    test_embedding_errors_fall_back_to_words()
+    test_index_stored_and_used_by_agent()
+    print("🎯 Text index tests completed!")
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Test script for message traces stored as compressed blobs outside the session (runs offline, no network needed)
+"""
+
+import os
+import tempfile
+
+from app.core.config import settings
+from app.services import session_index
+from app.services.session_store import (
+    append_message, compact_session, create_session_record, delete_session, get_session_backend,
+    get_session_record, session_path,
+)
+
+
+def test_traces_are_stored_outside_the_session():
+    print("🧪 Testing trace blobs and the trace endpoint")
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    original = (settings.storage_dir, settings.warmup_enabled)
+    client = TestClient(app)
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.storage_dir = tmp
+        settings.warmup_enabled = False
+        try:
+            trace = "\n".join(f"Step {i}: df.groupby('Tuyến').size() -> {i * 7}" for i in range(2000))
+            create_session_record("s1", "f1", "Sheet1", "2024-01-01T00:00:00")
+            append_message("s1", "user", "How many trips per route?", "2024-01-01T00:00:01")
+            stored = append_message("s1", "assistant", "Route A has 12 trips.", "2024-01-01T00:00:02", trace=trace)
+
+            # The session keeps a reference; the trace itself is a compressed blob of the session
+            assert "trace" not in stored and stored["traceId"]
+            assert os.path.getsize(session_path("s1")) < 1000
+            assert "Step 1999" not in open(session_path("s1"), encoding="utf-8").read()
+            blob = os.path.join(tmp, "traces", "s1", f"{stored['traceId']}.txt.gz")
+            assert os.path.getsize(blob) < len(trace) / 5
+
+            history = client.get("/api/session/s1").json()["messages"]
+            assert history[1]["traceId"] == stored["traceId"] and history[1]["trace"] is None
+            res = client.get(f"/api/session/s1/trace/{stored['traceId']}")
+            assert res.status_code == 200 and res.text == trace
+            full = client.get("/api/session/s1", params={"includeTrace": True}).json()["messages"]
+            assert full[1]["trace"] == trace
+            assert client.get(f"/api/session/s1/trace/{'0' * 32}").status_code == 404
+            assert client.get("/api/session/s1/trace/not-a-trace").status_code == 404
+            assert client.get(f"/api/session/missing/trace/{stored['traceId']}").status_code == 404
+
+            assert delete_session("s1")
+            assert not os.path.exists(os.path.join(tmp, "traces", "s1"))
+        finally:
+            settings.storage_dir, settings.warmup_enabled = original
+            session_index._indexes.pop(tmp, None)
+    print("✅ Sessions hold trace references and traces load on demand")
+
+
+def test_inline_traces_are_moved_out():
+    print("🧪 Testing sessions saved with inline traces")
+    from migrate_sessions import migrate_traces
+
+    original = (settings.storage_dir, settings.session_backend)
+    for backend in ("file", "sqlite"):
+        with tempfile.TemporaryDirectory() as tmp:
+            settings.storage_dir = tmp
+            settings.session_backend = backend
+            try:
+                get_session_backend().put({
+                    "sessionId": "old", "fileId": "f1", "sheetName": "Sheet1", "createdAt": "2024-01-01T00:00:00",
+                    "sessionType": "pandas",
+                    "messages": [{"role": "assistant", "content": "12", "timestamp": "2024-01-01T00:00:01", "trace": "t" * 5000}],
+                })
+                if backend == "file":
+                    assert compact_session("old")
+                else:
+                    migrate_traces()
+                message = get_session_record("old")["messages"][0]
+                assert "trace" not in message
+                with open(os.path.join(tmp, "traces", "old", f"{message['traceId']}.txt.gz"), "rb") as f:
+                    assert f.read(2) == b"\x1f\x8b"
+            finally:
+                settings.storage_dir, settings.session_backend = original
+                session_index._indexes.pop(tmp, None)
+    print("✅ Inline traces are moved to blobs by compaction and the migration")
+
+
+if __name__ == "__main__":
+    test_traces_are_stored_outside_the_session()
+    test_inline_traces_are_moved_out()
+    print("🎯 Trace storage tests completed!")
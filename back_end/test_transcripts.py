@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Test script for bounded agent transcripts and tool-output artifacts (runs offline, no network needed)
+"""
+
+import os
+import tempfile
+
+import pandas as pd
+from langchain_core.messages import AIMessage
+
+from app.core.config import settings
+from app.services.callbacks import TranscriptCallbackHandler
+from stub_gemini import stubbed_gemini
+
+
+def test_large_output_spills_to_artifact():
+    print("🧪 Testing transcript truncation")
+    original_dir = settings.storage_dir
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.storage_dir = tmp
+        try:
+            from fastapi.testclient import TestClient
+            from app.main import app
+
+            tracer = TranscriptCallbackHandler(max_inline_chars=100, max_chars=112)
+            tracer.on_tool_end("small output")
+            big = "x" * 10_000
+            tracer.on_tool_end(big)
+            tracer.on_tool_end(big + "y")
+            transcript = tracer.get_transcript()
+            assert len(transcript) < 600, len(transcript)
+            assert len(tracer.artifacts) == 2
+            assert f"/api/artifacts/{tracer.artifacts[0]}" in transcript
+            # Inline budget used up: the third output is a reference only
+            assert "showing 0 of 10001 chars" in transcript
+
+            client = TestClient(app)
+            res = client.get(f"/api/artifacts/{tracer.artifacts[0]}")
+            assert res.status_code == 200 and res.text == big
+            assert client.get("/api/artifacts/../../etc").status_code == 404
+            assert client.get("/api/artifacts/" + "0" * 32).status_code == 404
+            stored = os.path.join(tmp, "artifacts", f"{tracer.artifacts[0]}.txt.gz")
+            assert os.path.getsize(stored) < 1000
+        finally:
+            settings.storage_dir = original_dir
+    print("✅ Large outputs stored compressed and fetchable on demand")
+
+
+def test_session_file_stays_bounded():
+    print("🧪 Testing session growth with a print(df) tool call")
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with stubbed_gemini([
+        AIMessage(content="", tool_calls=[{"name": "python_repl_ast", "args": {"query": "print(df.to_string())"}, "id": "call-1"}]),
+        AIMessage(content="Printed the sheet."),
+    ]) as (tmp, script):
+        pd.DataFrame({"Mã chuyến": [f"T{i:05d}" for i in range(5000)]}).to_excel(os.path.join(tmp, "big_trips.xlsx"), index=False)
+        client = TestClient(app)
+        session_id = client.post("/api/session", json={"fileId": "big", "sheetName": "Sheet1"}).json()["sessionId"]
+        res = client.post(f"/api/session/{session_id}/ask", json={"question": "Show everything", "useCache": False})
+        assert res.status_code == 200, res.text
+        trace = res.json()["trace"]
+        assert len(trace) < settings.trace_max_chars + 2000, len(trace)
+        assert "/api/artifacts/" in trace
+        assert os.path.getsize(os.path.join(tmp, f"session_{session_id}.jsonl")) < 10_000
+    print("✅ Trace and session file stay small")
+
+
+if __name__ == "__main__":
+    test_large_output_spills_to_artifact()
+    test_session_file_stays_bounded()
+    print("🎯 Transcript tests completed!")
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Test script for sheet snapshots and background warm-up (runs offline, no network needed)
+"""
+
+import io
+import json
+import os
+import tempfile
+
+import pandas as pd
+
+from app.core.config import settings
+from app.services import snapshot
+from app.services.sheet_cache import SheetCache
+from app.services.sheet_profile import get_sheet_profile
+from app.services.storage import safe_sheet_name
+from app.services.warmup import get_warmup_manager
+
+
+def test_snapshot_avoids_reparsing():
+    print("🧪 Testing preprocessed sheet snapshots")
+    original_dir = settings.storage_dir
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.storage_dir = tmp
+        try:
+            path = os.path.join(tmp, "snap_orders.xlsx")
+            pd.DataFrame({"Mã đơn hàng": ["O1", "O2"], "Trạng thái": ["Trễ", None]}).to_excel(path, index=False)
+            first = SheetCache(max_bytes=10**8).get(path, "Sheet1")
+            assert os.path.exists(snapshot.snapshot_path(path, "Sheet1"))
+
+            # A new process-wide cache (e.g. after a restart) reads the snapshot, not the workbook
+            original_read = snapshot.read_and_preprocess_sheet
+            snapshot.read_and_preprocess_sheet = lambda *args: (_ for _ in ()).throw(AssertionError("re-parsed"))
+            try:
+                second = SheetCache(max_bytes=10**8).get(path, "Sheet1")
+            finally:
+                snapshot.read_and_preprocess_sheet = original_read
+            assert second.equals(first) and second.dtypes.equals(first.dtypes)
+        finally:
+            settings.storage_dir = original_dir
+    print("✅ Snapshot reused with identical dtypes")
+
+
+def test_sheets_differing_in_punctuation_keep_their_own_data():
+    print("🧪 Testing derived data of sheets whose names differ only in punctuation")
+    original_dir = settings.storage_dir
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.storage_dir = tmp
+        try:
+            path = os.path.join(tmp, "quarters_orders.xlsx")
+            with pd.ExcelWriter(path) as writer:
+                pd.DataFrame({"Mã đơn hàng": ["O1", "O2"]}).to_excel(writer, sheet_name="Q1 2024", index=False)
+                pd.DataFrame({"Mã đơn hàng": ["O3"]}).to_excel(writer, sheet_name="Q1-2024", index=False)
+            assert safe_sheet_name("Q1 2024") != safe_sheet_name("Q1-2024")
+            for cache in (SheetCache(max_bytes=10**8), SheetCache(max_bytes=10**8)):
+                # The second cache reads both sheets from their snapshots
+                assert cache.get(path, "Q1 2024")["Mã đơn hàng"].tolist() == ["O1", "O2"]
+                assert cache.get(path, "Q1-2024")["Mã đơn hàng"].tolist() == ["O3"]
+                assert get_sheet_profile(path, "Q1-2024", cache.get(path, "Q1-2024"))["rows"] == 1
+
+            # Metadata naming another sheet is rejected
+            meta_path = snapshot._meta_path(path, "Q1-2024")
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({**meta, "sheetName": "Q1 2024"}, f)
+            assert snapshot.load_snapshot(path, "Q1-2024") is None
+        finally:
+            settings.storage_dir = original_dir
+    print("✅ Each sheet gets its own snapshot and profile")
+
+
+def test_warmed_sheet_is_not_changed_by_questions():
+    print("🧪 Testing that one question's edits do not reach the next")
+    from app.api.routes.analyze import load_sheet_for_agent
+    from app.services.sheet_cache import get_sheet_cache
+
+    original_dir = settings.storage_dir
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.storage_dir = tmp
+        try:
+            path = os.path.join(tmp, "edit_orders.xlsx")
+            pd.DataFrame({"Mã đơn hàng": ["O1", "O2"], "Khối lượng": [1.5, None]}).to_excel(path, index=False)
+            df, _ = load_sheet_for_agent(path, "Sheet1")
+            # What agent code commonly does to its frame
+            df.loc[0, "Khối lượng"] = 100.0
+            df.fillna({"Khối lượng": 0}, inplace=True)
+            df.drop(index=1, inplace=True)
+            again, _ = load_sheet_for_agent(path, "Sheet1")
+            assert len(again) == 2 and again["Khối lượng"].iloc[0] == 1.5 and pd.isna(again["Khối lượng"].iloc[1])
+            assert get_sheet_cache().get_metrics()["hits"] >= 1
+        finally:
+            settings.storage_dir = original_dir
+            get_sheet_cache().drop_file(path)
+    print("✅ Every question starts from the sheet as loaded")
+
+
+def test_warmup_on_upload_and_session():
+    print("🧪 Testing warm-up endpoints")
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    original_dir = settings.storage_dir
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.storage_dir = tmp
+        try:
+            buffer = io.BytesIO()
+            with pd.ExcelWriter(buffer) as writer:
+                pd.DataFrame({"Trường": ["Mã chuyến"], "Mô tả": ["Trip ID"]}).to_excel(writer, sheet_name="Mô tả trường thông tin", index=False)
+                pd.DataFrame({"Mã chuyến": ["T1", "T2"]}).to_excel(writer, sheet_name="Trips", index=False)
+                pd.DataFrame({"Mã đơn hàng": ["O1"]}).to_excel(writer, sheet_name="Orders", index=False)
+            client = TestClient(app)
+            res = client.post("/api/upload", files={"file": ("tms.xlsx", buffer.getvalue())})
+            assert res.status_code == 200, res.text
+            file_id = res.json()["fileId"]
+            get_warmup_manager().wait()
+            assert os.path.exists(os.path.join(tmp, "derived", file_id, f"snapshot_{safe_sheet_name('Trips')}.parquet"))
+            assert os.path.exists(os.path.join(tmp, "derived", file_id, f"profile_{safe_sheet_name('Trips')}.json"))
+
+            session_id = client.post("/api/session", json={"fileId": file_id, "sheetName": "Orders"}).json()["sessionId"]
+            get_warmup_manager().wait()
+            status = client.get(f"/api/session/{session_id}/warmup").json()
+            assert status["status"] == "ready", status
+            assert status["sheetName"] == "Orders"
+            assert client.get("/api/session/unknown/warmup").status_code == 404
+        finally:
+            settings.storage_dir = original_dir
+    print("✅ Sheets warmed after upload and session creation")
+
+
+if __name__ == "__main__":
+    test_snapshot_avoids_reparsing()
+    test_sheets_differing_in_punctuation_keep_their_own_data()
+    test_warmed_sheet_is_not_changed_by_questions()
+    test_warmup_on_upload_and_session()
+    print("🎯 Warm-up tests completed!")
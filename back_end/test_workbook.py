@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Test script for workbook-mode sessions and the lazy sheet cache (runs offline, no network needed)
+"""
+
+import os
+import tempfile
+
+import pandas as pd
+from langchain_core.messages import AIMessage
+
+from app.core.config import settings
+from app.services.sheet_cache import SheetCache
+from app.services.workbook import LazyWorkbook, get_workbook_schema
+from stub_gemini import stubbed_gemini
+
+
+def write_workbook(path):
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({"Mã chuyến": ["T1", "T2"], "Tài xế": ["An", "Bình"]}).to_excel(writer, sheet_name="Trips", index=False)
+        pd.DataFrame({"Mã đơn hàng": ["O1", "O2", "O3"], "Mã chuyến": ["T1", "T1", "T2"], "Khối lượng": [1.5, 2.0, 3.0]}).to_excel(writer, sheet_name="Orders", index=False)
+
+
+def test_schema_and_lazy_loading():
+    print("🧪 Testing lazy workbook")
+    original_dir = settings.storage_dir
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.storage_dir = tmp
+        try:
+            path = os.path.join(tmp, "wb1_tms.xlsx")
+            write_workbook(path)
+            schema = get_workbook_schema(path)
+            assert list(schema) == ["Trips", "Orders"]
+            assert ["Mã đơn hàng", "string"] in schema["Orders"]
+            assert os.listdir(os.path.join(tmp, "derived", "wb1")) == ["workbook_schema.json"]
+
+            workbook = LazyWorkbook(path)
+            assert "loaded=[]" in repr(workbook)
+            assert len(workbook["Orders"]) == 3
+            assert "loaded=['Orders']" in repr(workbook)
+            try:
+                workbook["Missing"]
+                assert False, "should raise"
+            except KeyError:
+                pass
+        finally:
+            settings.storage_dir = original_dir
+    print("✅ Sheets are loaded on first access only")
+
+
+def test_cache_evicts_least_recently_used():
+    print("🧪 Testing sheet cache memory budget")
+    original_dir = settings.storage_dir
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.storage_dir = tmp
+        try:
+            path = os.path.join(tmp, "wb2_tms.xlsx")
+            write_workbook(path)
+            cache = SheetCache(max_bytes=1)
+            cache.get(path, "Trips")
+            cache.get(path, "Orders")
+            assert not cache.contains(path, "Trips") and cache.contains(path, "Orders")
+            metrics = cache.get_metrics()
+            assert metrics["sheets"] == 1 and metrics["evictions"] == 1
+            # Columns added by a caller do not leak into the cached frame
+            df = cache.get(path, "Orders")
+            df["extra"] = 1
+            assert "extra" not in cache.get(path, "Orders").columns
+            # Neither do in-place writes to the shared values
+            df = cache.get(path, "Orders")
+            df.loc[0, "Khối lượng"] = 99.0
+            df["Mã chuyến"] = df["Mã chuyến"].str.lower()
+            df.sort_values("Khối lượng", inplace=True)
+            df.fillna({"Khối lượng": 0}, inplace=True)
+            try:
+                df["Khối lượng"].values[1] = 42.0
+            except ValueError:
+                pass
+            cached = cache.get(path, "Orders")
+            assert cached["Khối lượng"].tolist() == [1.5, 2.0, 3.0] and cached["Mã chuyến"].tolist() == ["T1", "T1", "T2"]
+        finally:
+            settings.storage_dir = original_dir
+    print("✅ Unused sheets evicted, cached frames isolated")
+
+
+def test_workbook_session_end_to_end():
+    print("🧪 Testing workbook session with a stub tool-calling model")
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with stubbed_gemini([
+        AIMessage(content="", tool_calls=[{"name": "python_repl_ast", "args": {"query": "len(df.merge(sheets['Orders'], on='Mã chuyến'))"}, "id": "call-1"}]),
+        AIMessage(content="There are 3 orders across 2 trips."),
+    ]) as (tmp, script):
+        write_workbook(os.path.join(tmp, "wb3_tms.xlsx"))
+        client = TestClient(app)
+        res = client.post("/api/session", json={"fileId": "wb3", "sheetName": "Trips", "mode": "workbook"})
+        assert res.status_code == 200, res.text
+        session_id = res.json()["sessionId"]
+        assert res.json()["mode"] == "workbook"
+
+        res = client.post(f"/api/session/{session_id}/ask", json={"question": "How many orders per trip?", "useCache": False})
+        assert res.status_code == 200, res.text
+        assert "sheets['Orders']" in res.json()["trace"]
+        assert "3" in res.json()["trace"].split("sheets['Orders']", 1)[1]
+        assert client.get(f"/api/session/{session_id}").json()["mode"] == "workbook"
+    print("✅ Agent joined two sheets through `sheets`")
+
+
+if __name__ == "__main__":
+    test_schema_and_lazy_loading()
+    test_cache_evicts_least_recently_used()
+    test_workbook_session_end_to_end()
+    print("🎯 Workbook tests completed!")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Test script for the per-session workspace of intermediate DataFrames (runs offline, no network needed)
+"""
+
+import os
+import tempfile
+
+import pandas as pd
+from langchain_core.messages import AIMessage
+
+from app.core.config import settings
+from app.services.workspace import SessionWorkspace
+from stub_gemini import stubbed_gemini
+
+
+def test_save_and_reload_frames():
+    print("🧪 Testing workspace persistence")
+    original_dir = settings.storage_dir
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.storage_dir = tmp
+        try:
+            workspace = SessionWorkspace("s1")
+            df = pd.DataFrame({"region": ["N", "S", "N"], "kg": [1.0, 2.0, 3.0]})
+            namespace = {"df": df, "by_region": df.groupby("region")["kg"].sum(), "_tmp": df, "n": 3}
+            saved = workspace.save_from(namespace, {}, "Weight by region")
+            assert saved == ["by_region"], saved
+            assert os.path.exists(os.path.join(tmp, "workspaces", "s1", "by_region.parquet"))
+
+            fresh = {"df": df}
+            loaded = workspace.load_into(fresh)
+            assert list(loaded) == ["by_region"]
+            assert fresh["by_region"].set_index("region")["kg"].to_dict() == {"N": 4.0, "S": 2.0}
+            assert "by_region (2 rows; columns: region, kg)" in workspace.render_prompt()
+
+            # Unchanged frames are not rewritten
+            assert workspace.save_from(fresh, loaded, "again") == []
+        finally:
+            settings.storage_dir = original_dir
+    print("✅ Frames saved as Parquet and reloaded")
+
+
+def test_follow_up_question_reuses_result():
+    print("🧪 Testing follow-up question in a session")
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with stubbed_gemini([
+        AIMessage(content="", tool_calls=[{"name": "python_repl_ast", "args": {"query": "late_trips = df[df['Trễ'] == 'Có']\nlen(late_trips)"}, "id": "call-1"}]),
+        AIMessage(content="2 trips were late."),
+        AIMessage(content="", tool_calls=[{"name": "python_repl_ast", "args": {"query": "late_trips['Vùng'].value_counts().to_dict()"}, "id": "call-2"}]),
+        AIMessage(content="Both late trips were in the north."),
+    ]) as (tmp, script):
+        pd.DataFrame({"Trễ": ["Có", "Không", "Có"], "Vùng": ["Bắc", "Nam", "Bắc"]}).to_excel(os.path.join(tmp, "ws_trips.xlsx"), index=False)
+        client = TestClient(app)
+        session_id = client.post("/api/session", json={"fileId": "ws", "sheetName": "Sheet1"}).json()["sessionId"]
+        res = client.post(f"/api/session/{session_id}/ask", json={"question": "How many trips were late?"})
+        assert res.status_code == 200, res.text
+        assert "late_trips" in SessionWorkspace(session_id).manifest()
+
+        res = client.post(f"/api/session/{session_id}/ask", json={"question": "Break that down by region"})
+        assert res.status_code == 200, res.text
+        assert "{'Bắc': 2}" in res.json()["trace"], res.json()["trace"]
+
+        client.delete(f"/api/session/{session_id}")
+        assert not os.path.exists(os.path.join(tmp, "workspaces", session_id))
+    print("✅ Follow-up question used the stored intermediate result")
+
+
+if __name__ == "__main__":
+    test_save_and_reload_frames()
+    test_follow_up_question_reuses_result()
+    print("🎯 Workspace tests completed!")
@@ -0,0 +1,63 @@
+"""
+Session transfer utility
+Exports the sessions of the configured backend, with their messages and traces, as gzip-compressed NDJSON,
+or imports such an export, e.g. to move sessions between hosts or keep a backup
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timezone
+
+from app.core.config import settings
+from app.services.session_export import import_chunks, iter_export
+
+_READ_CHUNK = 1 << 16
+
+
+def export_sessions(output: str, file_id=None, session_type=None, since=None, until=None):
+    """Write the sessions matching the filters to ``output`` ("-" for stdout)"""
+    print(f"📦 Exporting {settings.session_backend} sessions of {settings.storage_dir}...", file=sys.stderr)
+    written = 0
+    out = sys.stdout.buffer if output == "-" else open(output, "wb")
+    try:
+        for chunk in iter_export(file_id, session_type, since, until):
+            out.write(chunk)
+            written += len(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    print(f"🎉 Wrote {written} compressed bytes to {output}", file=sys.stderr)
+
+
+def import_sessions(path: str, overwrite: bool = False):
+    """Read an export (compressed or not) from ``path`` ("-" for stdin) into the configured backend"""
+    print(f"📦 Importing sessions from {path} into the {settings.session_backend} backend...")
+    source = sys.stdin.buffer if path == "-" else open(path, "rb")
+    try:
+        report = import_chunks(iter(lambda: source.read(_READ_CHUNK), b""), overwrite=overwrite)
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+    print(f"🎉 Imported {report['imported']} sessions, skipped {report['skipped']} that already existed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Session transfer utility")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="write sessions as gzip-compressed NDJSON")
+    export_parser.add_argument("-o", "--output", default=f"sessions-{datetime.now(timezone.utc):%Y%m%d}.ndjson.gz",
+                               help='output file, "-" for stdout (default: sessions-<date>.ndjson.gz)')
+    export_parser.add_argument("--file-id", help="only the sessions of this file")
+    export_parser.add_argument("--type", choices=["pandas", "rag"], help="only sessions of this type")
+    export_parser.add_argument("--since", help="only sessions active on or after this ISO date or timestamp")
+    export_parser.add_argument("--until", help="only sessions last active on or before this ISO date or timestamp")
+    import_parser = commands.add_parser("import", help="read sessions from an export")
+    import_parser.add_argument("path", help='export file, "-" for stdin')
+    import_parser.add_argument("--overwrite", action="store_true", help="replace sessions that already exist")
+    args = parser.parse_args()
+    if args.command == "export":
+        export_sessions(args.output, args.file_id, args.type, args.since, args.until)
+    elif not os.path.exists(args.path) and args.path != "-":
+        parser.error(f"{args.path} does not exist")
+    else:
+        import_sessions(args.path, args.overwrite)
@@ -1,5 +1,6 @@
-import React from 'react'
+import React, { useState } from 'react'
 import type { Message } from '../../shared/types'
+import { getTrace } from '../../shared/api'
 
 interface ChatWindowProps {
   fileId: string | null
@@ -8,6 +9,9 @@ interface ChatWindowProps {
   setSelectedSheet: (sheet: string) => void
   sessionId: string | null
   messages: Message[]
+  // Only the latest messages are loaded at first; earlier ones are fetched a page at a time
+  hasEarlierMessages: boolean
+  onLoadEarlier: () => void
   question: string
   setQuestion: (question: string) => void
   loading: boolean
@@ -18,6 +22,26 @@ interface ChatWindowProps {
   canSend: boolean
 }
 
+// Agent steps of an answer; stored traces are only downloaded when the user opens them
+const TraceDetails: React.FC<{ sessionId: string; message: Message }> = ({ sessionId, message }) => {
+  const [trace, setTrace] = useState<string | null>(message.trace ?? null)
+  const [error, setError] = useState<string | null>(null)
+
+  const handleToggle = (e: React.SyntheticEvent<HTMLDetailsElement>) => {
+    if (!e.currentTarget.open || trace !== null || !message.traceId) return
+    getTrace(sessionId, message.traceId)
+      .then(setTrace)
+      .catch((err) => setError(String(err)))
+  }
+
+  return (
+    <details style={{ marginTop: 8 }} onToggle={handleToggle}>
+      <summary style={{ cursor: 'pointer', fontSize: 12, color: 'var(--muted)' }}>Show steps</summary>
+      <pre style={{ whiteSpace: 'pre-wrap', fontSize: 12, marginTop: 6 }}>{trace ?? error ?? 'Loading…'}</pre>
+    </details>
+  )
+}
+
 export const ChatWindow: React.FC<ChatWindowProps> = ({
   fileId,
   sheets,
@@ -25,6 +49,8 @@ export const ChatWindow: React.FC<ChatWindowProps> = ({
   setSelectedSheet,
   sessionId,
   messages,
+  hasEarlierMessages,
+  onLoadEarlier,
   question,
   setQuestion,
   loading,
@@ -94,15 +120,18 @@ export const ChatWindow: React.FC<ChatWindowProps> = ({
       <div className="chatArea">
         {sessionId ? (
           <div className="chat">
-            {messages.map((m, idx) => (
-              <div key={idx} className={`messageRow ${m.role}`}>
+            {hasEarlierMessages && (
+              <button className="btn" onClick={onLoadEarlier} style={{ alignSelf: 'center', fontSize: 12 }}>
+                Load earlier messages
+              </button>
+            )}
+            {messages.map((m) => (
+              // Earlier pages are prepended and shift positions, so messages are keyed by their own fields
+              <div key={`${m.timestamp}:${m.role}`} className={`messageRow ${m.role}`}>
                 <div className={`bubble ${m.role}`}>
                   {m.content}
-                  {m.role === 'assistant' && m.trace && (
-                    <details style={{ marginTop: 8 }}>
-                      <summary style={{ cursor: 'pointer', fontSize: 12, color: 'var(--muted)' }}>Show steps</summary>
-                      <pre style={{ whiteSpace: 'pre-wrap', fontSize: 12, marginTop: 6 }}>{m.trace}</pre>
-                    </details>
+                  {m.role === 'assistant' && (m.trace || m.traceId) && (
+                    <TraceDetails sessionId={sessionId} message={m} />
                   )}
                 </div>
               </div>
@@ -1,11 +1,15 @@
 import React, { useEffect, useState } from 'react'
-import { listSessions, uploadFile, deleteSession, getFileInfo } from '../../shared/api'
+import { uploadFile, deleteSession, getFileInfo } from '../../shared/api'
 import { FilePicker } from '../../shared/components/FilePicker'
 import type { SessionSummary, FileInfo } from '../../shared/types'
 
 interface SidebarProps {
   sessions: SessionSummary[]
   setSessions: (sessions: SessionSummary[]) => void
+  // Shows the first page of the listing, of one file or of all; later pages are appended on demand
+  showSessions: (fileId?: string | null) => Promise<void>
+  hasMoreSessions: boolean
+  onLoadMoreSessions: () => void
   currentSessionId: string | null
   onLoadSession: (sessionId: string) => void
   onNewSession: () => void
@@ -20,6 +24,9 @@ interface SidebarProps {
 export const Sidebar: React.FC<SidebarProps> = ({
   sessions,
   setSessions,
+  showSessions,
+  hasMoreSessions,
+  onLoadMoreSessions,
   currentSessionId,
   onLoadSession,
   onNewSession,
@@ -33,8 +40,8 @@ export const Sidebar: React.FC<SidebarProps> = ({
   const [uploadMode, setUploadMode] = useState<'upload' | 'select'>('upload')
 
   useEffect(() => {
-    listSessions().then(setSessions).catch(() => {})
-  }, [setSessions])
+    showSessions().catch(() => {})
+  }, [showSessions])
 
   const handleUpload = async (e: React.ChangeEvent<HTMLInputElement>) => {
     if (!e.target.files || e.target.files.length === 0) return
@@ -44,8 +51,7 @@ export const Sidebar: React.FC<SidebarProps> = ({
       setFileId(res.fileId)
       setSheets(res.sheetNames)
       setSelectedSheet(res.sheetNames[0] || '')
-      const s = await listSessions(res.fileId)
-      setSessions(s)
+      await showSessions(res.fileId)
     } catch (err: any) {
       setError(err?.message || 'Upload failed')
     }
@@ -53,8 +59,7 @@ export const Sidebar: React.FC<SidebarProps> = ({
 
   const refreshSessions = async (forCurrentFile: boolean = false) => {
     try {
-      const s = await listSessions(forCurrentFile ? fileId : undefined)
-      setSessions(s)
+      await showSessions(forCurrentFile ? fileId : undefined)
     } catch (err) {
       setError('Failed to load sessions')
     }
@@ -67,8 +72,7 @@ export const Sidebar: React.FC<SidebarProps> = ({
       setFileId(res.fileId)
       setSheets(res.sheetNames)
       setSelectedSheet(res.sheetNames[0] || '')
-      const s = await listSessions(res.fileId)
-      setSessions(s)
+      await showSessions(res.fileId)
     } catch (err: any) {
       setError(err?.message || 'Failed to load file info')
     }
@@ -172,6 +176,11 @@ export const Sidebar: React.FC<SidebarProps> = ({
             </div>
           </div>
         ))}
+        {hasMoreSessions && (
+          <button className="btn" onClick={onLoadMoreSessions} style={{ width: '100%', fontSize: '11px', padding: '4px 8px' }}>
+            Load more
+          </button>
+        )}
         {sessions.length === 0 && (
           <div style={{ padding: 16, textAlign: 'center', color: 'var(--muted)', fontSize: '13px' }}>
             No sessions found.<br />Upload a file to start.
@@ -1,5 +1,5 @@
 import type { 
-  UploadResponse, CreateSessionResponse, HistoryResponse, SessionSummary, Message, FileInfo,
+  UploadResponse, CreateSessionResponse, HistoryResponse, HistoryPage, Page, SessionSummary, Message, FileInfo,
   RAGUploadResponse, RAGSessionRequest, RAGSessionResponse, RAGQueryRequest, RAGQueryResponse, RAGAskRequest, RAGFileInfo
 } from './types'
 
@@ -17,6 +17,21 @@ const createHeaders = (additionalHeaders: Record<string, string> = {}) => {
   return headers
 }
 
+// Paginated endpoints return the cursor of the next page in this header
+const NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+function withCursor(url: string, cursor: string | null): string {
+  if (!cursor) return url
+  return `${url}${url.includes('?') ? '&' : '?'}cursor=${encodeURIComponent(cursor)}`
+}
+
+// Only one page is fetched per call: callers load the following ones when the user asks for more
+async function fetchPage<T>(url: string, cursor: string | null): Promise<{ body: T; next: string | null }> {
+  const res = await fetch(withCursor(url, cursor), { headers: createHeaders() })
+  if (!res.ok) throw new Error(await res.text())
+  return { body: await res.json(), next: res.headers.get(NEXT_CURSOR_HEADER) }
+}
+
 export async function uploadFile(file: File): Promise<UploadResponse> {
   const form = new FormData()
   form.append('file', file)
@@ -47,12 +62,19 @@ export async function createSession(fileId: string, sheetName: string): Promise<
   return res.json()
 }
 
-export async function getHistory(sessionId: string): Promise<HistoryResponse> {
-  const res = await fetch(`${API_BASE}/session/${sessionId}`, {
+// Histories page backwards: without a cursor this is the latest page, and next points to the messages before it.
+// Traces are not part of the history; each one is fetched with getTrace when it is opened
+export async function getHistory(sessionId: string, cursor: string | null = null): Promise<HistoryPage> {
+  const { body, next } = await fetchPage<HistoryResponse>(`${API_BASE}/session/${sessionId}`, cursor)
+  return { ...body, next }
+}
+
+export async function getTrace(sessionId: string, traceId: string): Promise<string> {
+  const res = await fetch(`${API_BASE}/session/${sessionId}/trace/${traceId}`, {
     headers: createHeaders()
   })
   if (!res.ok) throw new Error(await res.text())
-  return res.json()
+  return res.text()
 }
 
 export async function ask(sessionId: string, question: string): Promise<Message> {
@@ -65,13 +87,11 @@ export async function ask(sessionId: string, question: string): Promise<Message>
   return res.json()
 }
 
-export async function listSessions(fileId?: string | null): Promise<SessionSummary[]> {
+// Most recently active first; next points to older sessions
+export async function listSessions(fileId?: string | null, cursor: string | null = null): Promise<Page<SessionSummary>> {
   const url = fileId ? `${API_BASE}/sessions?fileId=${encodeURIComponent(fileId)}` : `${API_BASE}/sessions`
-  const res = await fetch(url, {
-    headers: createHeaders()
-  })
-  if (!res.ok) throw new Error(await res.text())
-  return res.json()
+  const { body, next } = await fetchPage<SessionSummary[]>(url, cursor)
+  return { items: body, next }
 }
 
 export async function deleteSession(sessionId: string): Promise<void> {
@@ -121,12 +141,9 @@ export async function createRAGSession(req: RAGSessionRequest): Promise<RAGSessi
   return res.json()
 }
 
-export async function listRAGSessions(): Promise<RAGSessionResponse[]> {
-  const res = await fetch(`${API_BASE}/rag/sessions`, {
-    headers: createHeaders()
-  })
-  if (!res.ok) throw new Error(await res.text())
-  return res.json()
+export async function listRAGSessions(cursor: string | null = null): Promise<Page<RAGSessionResponse>> {
+  const { body, next } = await fetchPage<RAGSessionResponse[]>(`${API_BASE}/rag/sessions`, cursor)
+  return { items: body, next }
 }
 
 export async function getRAGSession(sessionId: string): Promise<RAGSessionResponse> {
@@ -137,12 +154,10 @@ export async function getRAGSession(sessionId: string): Promise<RAGSessionRespon
   return res.json()
 }
 
-export async function getRAGSessionMessages(sessionId: string): Promise<Message[]> {
-  const res = await fetch(`${API_BASE}/rag/session/${sessionId}/messages`, {
-    headers: createHeaders()
-  })
-  if (!res.ok) throw new Error(await res.text())
-  return res.json()
+// Like getHistory: the latest messages first, next points to the earlier ones
+export async function getRAGSessionMessages(sessionId: string, cursor: string | null = null): Promise<Page<Message>> {
+  const { body, next } = await fetchPage<Message[]>(`${API_BASE}/rag/session/${sessionId}/messages`, cursor)
+  return { items: body, next }
 }
 
 export async function askRAGDocument(sessionId: string, req: RAGAskRequest): Promise<Message> {
@@ -1,7 +1,10 @@
 export type UploadResponse = { fileId: string; filename: string; sheetNames: string[] }
-export type CreateSessionResponse = { sessionId: string; fileId: string; sheetName: string; createdAt: string }
-export type Message = { role: 'user' | 'assistant'; content: string; timestamp: string; trace?: string }
-export type HistoryResponse = { sessionId: string; fileId: string; sheetName: string; messages: Message[] }
+export type CreateSessionResponse = { sessionId: string; fileId: string; sheetName: string; createdAt: string; mode?: 'sheet' | 'workbook' }
+export type Message = { role: 'user' | 'assistant'; content: string; timestamp: string; trace?: string; traceId?: string; cached?: boolean; replayed?: boolean }
+export type HistoryResponse = { sessionId: string; fileId: string; sheetName: string; messages: Message[]; mode?: 'sheet' | 'workbook' }
+// One page of a paginated endpoint; next is the cursor of the following page, null on the last one
+export type Page<T> = { items: T[]; next: string | null }
+export type HistoryPage = HistoryResponse & { next: string | null }
 export type SessionSummary = { sessionId: string; fileId: string; sheetName: string; createdAt: string; messagesCount: number; lastMessageAt: string; sessionType?: string }
 export type FileInfo = { fileId: string; filename: string; size: number; uploadedAt: number }
 
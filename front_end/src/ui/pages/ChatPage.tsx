@@ -1,4 +1,4 @@
-import React, { useMemo, useState } from 'react'
+import React, { useCallback, useMemo, useState } from 'react'
 import { ask, createSession, getHistory, listSessions } from '../../shared/api'
 import type { Message, SessionSummary } from '../../shared/types'
 import { Sidebar } from '../../features/chat/Sidebar'
@@ -12,12 +12,45 @@ export const ChatPage: React.FC = () => {
   const [messages, setMessages] = useState<Message[]>([])
   const [question, setQuestion] = useState<string>('')
   const [sessions, setSessions] = useState<SessionSummary[]>([])
+  // Cursors of the next listing page (and the file it is filtered by) and of the earlier messages
+  const [sessionsNext, setSessionsNext] = useState<string | null>(null)
+  const [sessionsFileId, setSessionsFileId] = useState<string | null>(null)
+  const [historyNext, setHistoryNext] = useState<string | null>(null)
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState('')
 
   const canStart = useMemo(() => !!fileId && !!selectedSheet, [fileId, selectedSheet])
   const canSend = useMemo(() => !!sessionId && !!question.trim(), [sessionId, question])
 
+  const showSessions = useCallback(async (forFileId?: string | null) => {
+    const page = await listSessions(forFileId)
+    setSessions(page.items)
+    setSessionsNext(page.next)
+    setSessionsFileId(forFileId ?? null)
+  }, [])
+
+  const handleLoadMoreSessions = async () => {
+    if (!sessionsNext) return
+    try {
+      const page = await listSessions(sessionsFileId, sessionsNext)
+      setSessions((s) => [...s, ...page.items])
+      setSessionsNext(page.next)
+    } catch (err: any) {
+      setError(err?.message || 'Failed to load sessions')
+    }
+  }
+
+  const handleLoadEarlier = async () => {
+    if (!sessionId || !historyNext) return
+    try {
+      const h = await getHistory(sessionId, historyNext)
+      setMessages((m) => [...h.messages, ...m])
+      setHistoryNext(h.next)
+    } catch (err: any) {
+      setError(err?.message || 'Failed to load earlier messages')
+    }
+  }
+
   const handleStartSession = async () => {
     if (!canStart) return
     setLoading(true)
@@ -28,7 +61,8 @@ export const ChatPage: React.FC = () => {
       setSessionId(s.sessionId)
       const h = await getHistory(s.sessionId)
       setMessages(h.messages || [])
-      setSessions(await listSessions(s.fileId))
+      setHistoryNext(h.next)
+      await showSessions(s.fileId)
     } catch (err: any) {
       setError(err?.message || 'Start session failed')
     } finally { 
@@ -46,7 +80,7 @@ export const ChatPage: React.FC = () => {
     try {
       const msg = await ask(sessionId, q)
       setMessages((m) => [...m, msg])
-      setSessions(await listSessions(fileId || undefined))
+      await showSessions(fileId || undefined)
     } catch (err: any) {
       setError(err?.message || 'Send failed')
     } finally { 
@@ -63,6 +97,7 @@ export const ChatPage: React.FC = () => {
       setFileId(h.fileId)
       setSelectedSheet(h.sheetName)
       setMessages(h.messages || [])
+      setHistoryNext(h.next)
     } catch (err: any) {
       setError(err?.message || 'Load session failed')
     } finally { 
@@ -73,6 +108,7 @@ export const ChatPage: React.FC = () => {
   const handleNewSession = () => {
     setSessionId(null)
     setMessages([])
+    setHistoryNext(null)
     setQuestion('')
     setError('')
   }
@@ -89,6 +125,7 @@ export const ChatPage: React.FC = () => {
     setSelectedSheet('')
     setSessionId(null)
     setMessages([])
+    setHistoryNext(null)
     setError('')
     setQuestion('')
   }
@@ -99,6 +136,9 @@ export const ChatPage: React.FC = () => {
         <Sidebar
           sessions={sessions}
           setSessions={setSessions}
+          showSessions={showSessions}
+          hasMoreSessions={!!sessionsNext}
+          onLoadMoreSessions={handleLoadMoreSessions}
           currentSessionId={sessionId}
           onLoadSession={handleLoadSession}
           onNewSession={handleNewSession}
@@ -116,6 +156,8 @@ export const ChatPage: React.FC = () => {
           setSelectedSheet={setSelectedSheet}
           sessionId={sessionId}
           messages={messages}
+          hasEarlierMessages={!!historyNext}
+          onLoadEarlier={handleLoadEarlier}
           question={question}
           setQuestion={setQuestion}
           loading={loading}
@@ -1,13 +1,17 @@
 import React, { useState, useEffect, useRef } from 'react'
 import { useSearchParams, Link } from 'react-router-dom'
 import { 
-  createRAGSession, askRAGDocument, getRAGSessionMessages, listRAGSessions, listRAGFiles, deleteRAGFile
+  createRAGSession, askRAGDocument, getRAGSession, getRAGSessionMessages, listRAGSessions, listRAGFiles, deleteRAGFile
 } from '../../shared/api'
 import type { RAGSessionResponse, Message, RAGFileInfo } from '../../shared/types'
 
 export const RAGChatPage: React.FC = () => {
   const [searchParams] = useSearchParams()
   const [sessions, setSessions] = useState<RAGSessionResponse[]>([])
+  const [sessionsLoaded, setSessionsLoaded] = useState(false)
+  // Cursors of the next page of sessions and of the messages before the loaded ones
+  const [sessionsNext, setSessionsNext] = useState<string | null>(null)
+  const [messagesNext, setMessagesNext] = useState<string | null>(null)
   const [selectedSession, setSelectedSession] = useState<RAGSessionResponse | null>(null)
   const [messages, setMessages] = useState<Message[]>([])
   const [inputMessage, setInputMessage] = useState('')
@@ -20,6 +24,10 @@ export const RAGChatPage: React.FC = () => {
   const [loadingFiles, setLoadingFiles] = useState(false)
   const [deletingFileId, setDeletingFileId] = useState<string | null>(null)
   const messagesEndRef = useRef<HTMLDivElement>(null)
+  // Earlier messages go above the ones shown: no scrolling to the bottom for those
+  const prependingRef = useRef(false)
+  // The session named in the URL is selected once, not again whenever more sessions are listed
+  const urlSessionSelectedRef = useRef(false)
 
   const fileId = searchParams.get('fileId')
   const filename = searchParams.get('filename')
@@ -33,16 +41,25 @@ export const RAGChatPage: React.FC = () => {
   }, [])
 
   useEffect(() => {
-    // If sessionId is provided in URL, select that session
-    if (sessionId && sessions.length > 0) {
-      const session = sessions.find(s => s.sessionId === sessionId)
-      if (session) {
-        setSelectedSession(session)
-      }
+    // If sessionId is provided in URL, select that session, fetching it if it is not on the loaded pages
+    if (!sessionId || !sessionsLoaded || urlSessionSelectedRef.current) return
+    urlSessionSelectedRef.current = true
+    const session = sessions.find(s => s.sessionId === sessionId)
+    if (session) {
+      setSelectedSession(session)
+    } else {
+      getRAGSession(sessionId)
+        .then(({ sessionId, sessionName, fileId, filename, createdAt }) =>
+          setSelectedSession({ sessionId, sessionName, fileId, filename, createdAt }))
+        .catch(() => setError('Failed to load session'))
     }
-  }, [sessionId, sessions])
+  }, [sessionId, sessions, sessionsLoaded])
 
   useEffect(() => {
+    if (prependingRef.current) {
+      prependingRef.current = false
+      return
+    }
     scrollToBottom()
   }, [messages])
 
@@ -58,8 +75,22 @@ export const RAGChatPage: React.FC = () => {
 
   const loadSessions = async () => {
     try {
-      const sessionList = await listRAGSessions()
-      setSessions(sessionList)
+      const page = await listRAGSessions()
+      setSessions(page.items)
+      setSessionsNext(page.next)
+    } catch (err) {
+      setError('Failed to load sessions')
+    } finally {
+      setSessionsLoaded(true)
+    }
+  }
+
+  const loadMoreSessions = async () => {
+    if (!sessionsNext) return
+    try {
+      const page = await listRAGSessions(sessionsNext)
+      setSessions(prev => [...prev, ...page.items])
+      setSessionsNext(page.next)
     } catch (err) {
       setError('Failed to load sessions')
     }
@@ -79,8 +110,21 @@ export const RAGChatPage: React.FC = () => {
 
   const loadMessages = async (sessionId: string) => {
     try {
-      const messageList = await getRAGSessionMessages(sessionId)
-      setMessages(messageList)
+      const page = await getRAGSessionMessages(sessionId)
+      setMessages(page.items)
+      setMessagesNext(page.next)
+    } catch (err) {
+      setError('Failed to load messages')
+    }
+  }
+
+  const loadEarlierMessages = async () => {
+    if (!selectedSession || !messagesNext) return
+    try {
+      const page = await getRAGSessionMessages(selectedSession.sessionId, messagesNext)
+      prependingRef.current = true
+      setMessages(prev => [...page.items, ...prev])
+      setMessagesNext(page.next)
     } catch (err) {
       setError('Failed to load messages')
     }
@@ -101,6 +145,7 @@ export const RAGChatPage: React.FC = () => {
       setSessions(prev => [session, ...prev])
       setSelectedSession(session)
       setMessages([])
+      setMessagesNext(null)
       setNewSessionName('')
       setShowNewSessionForm(false)
     } catch (err) {
@@ -250,6 +295,11 @@ export const RAGChatPage: React.FC = () => {
                 </div>
               </div>
             ))}
+            {sessionsNext && (
+              <button className="btn small" onClick={loadMoreSessions}>
+                Load more
+              </button>
+            )}
           </div>
 
           {!fileId && !selectedSession && (
@@ -317,8 +367,13 @@ export const RAGChatPage: React.FC = () => {
               </div>
 
               <div className="messages-container">
-                {messages.map((message, index) => (
-                  <div key={index} className={`message ${message.role}`}>
+                {messagesNext && (
+                  <button className="btn small" onClick={loadEarlierMessages}>
+                    Load earlier messages
+                  </button>
+                )}
+                {messages.map((message) => (
+                  <div key={`${message.timestamp}:${message.role}`} className={`message ${message.role}`}>
                     <div className="message-content">
                       {message.content}
                     </div>
@@ -5,6 +5,8 @@ import type { RAGSessionResponse } from '../../shared/types'
 
 export const RAGSessionsPage: React.FC = () => {
   const [sessions, setSessions] = useState<RAGSessionResponse[]>([])
+  const [sessionsNext, setSessionsNext] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState<string | null>(null)
   const [deletingId, setDeletingId] = useState<string | null>(null)
@@ -17,8 +19,9 @@ export const RAGSessionsPage: React.FC = () => {
   const loadSessions = async () => {
     try {
       setLoading(true)
-      const sessionList = await listRAGSessions()
-      setSessions(sessionList)
+      const page = await listRAGSessions()
+      setSessions(page.items)
+      setSessionsNext(page.next)
     } catch (err) {
       setError(err instanceof Error ? err.message : 'Failed to load sessions')
     } finally {
@@ -26,6 +29,20 @@ export const RAGSessionsPage: React.FC = () => {
     }
   }
 
+  const loadMoreSessions = async () => {
+    if (!sessionsNext) return
+    try {
+      setLoadingMore(true)
+      const page = await listRAGSessions(sessionsNext)
+      setSessions(prev => [...prev, ...page.items])
+      setSessionsNext(page.next)
+    } catch (err) {
+      setError(err instanceof Error ? err.message : 'Failed to load sessions')
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const handleDeleteSession = async (sessionId: string) => {
     if (!confirm('Are you sure you want to delete this session? This action cannot be undone.')) {
       return
@@ -160,9 +177,18 @@ export const RAGSessionsPage: React.FC = () => {
           </div>
         )}
 
+        {sessionsNext && (
+          <div className="header-actions">
+            <button onClick={loadMoreSessions} disabled={loadingMore} className="btn">
+              {loadingMore ? 'Loading...' : 'Load More Sessions'}
+            </button>
+          </div>
+        )}
+
         <div className="sessions-stats">
           <div className="stat-item">
-            <div className="stat-number">{sessions.length}</div>
+            {/* Counts cover the sessions loaded so far */}
+            <div className="stat-number">{sessions.length}{sessionsNext ? '+' : ''}</div>
             <div className="stat-label">Total Sessions</div>
           </div>
           <div className="stat-item">
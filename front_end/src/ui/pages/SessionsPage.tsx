@@ -1,16 +1,33 @@
 import React, { useEffect, useState } from 'react'
 import { listSessions, getHistory } from '../../shared/api'
-import type { SessionSummary, HistoryResponse } from '../../shared/types'
+import type { SessionSummary, HistoryPage } from '../../shared/types'
 
 export const SessionsPage: React.FC = () => {
   const [sessions, setSessions] = useState<SessionSummary[]>([])
-  const [selected, setSelected] = useState<HistoryResponse | null>(null)
+  const [sessionsNext, setSessionsNext] = useState<string | null>(null)
+  const [selected, setSelected] = useState<HistoryPage | null>(null)
   const [error, setError] = useState('')
 
   useEffect(() => {
-    listSessions().then(setSessions).catch((e) => setError(e.message))
+    listSessions()
+      .then((page) => {
+        setSessions(page.items)
+        setSessionsNext(page.next)
+      })
+      .catch((e) => setError(e.message))
   }, [])
 
+  const handleLoadMore = async () => {
+    if (!sessionsNext) return
+    try {
+      const page = await listSessions(null, sessionsNext)
+      setSessions((s) => [...s, ...page.items])
+      setSessionsNext(page.next)
+    } catch (e: any) {
+      setError(e?.message || 'Load failed')
+    }
+  }
+
   const handleLoad = async (sid: string) => {
     setError('')
     try {
@@ -20,6 +37,16 @@ export const SessionsPage: React.FC = () => {
     }
   }
 
+  const handleLoadEarlier = async () => {
+    if (!selected?.next) return
+    try {
+      const h = await getHistory(selected.sessionId, selected.next)
+      setSelected({ ...selected, messages: [...h.messages, ...selected.messages], next: h.next })
+    } catch (e: any) {
+      setError(e?.message || 'Load failed')
+    }
+  }
+
   return (
     <div className="grid">
       <div className="card">
@@ -36,6 +63,7 @@ export const SessionsPage: React.FC = () => {
               </div>
             </div>
           ))}
+          {sessionsNext && <button className="btn" onClick={handleLoadMore}>Load more</button>}
         </div>
       </div>
 
@@ -43,8 +71,11 @@ export const SessionsPage: React.FC = () => {
         <div className="card">
           <div className="sectionTitle">History</div>
           <div className="chat">
-            {selected.messages.map((m, idx) => (
-              <div key={idx} className={`messageRow ${m.role}`}>
+            {selected.next && (
+              <button className="btn" onClick={handleLoadEarlier} style={{ alignSelf: 'center' }}>Load earlier messages</button>
+            )}
+            {selected.messages.map((m) => (
+              <div key={`${m.timestamp}:${m.role}`} className={`messageRow ${m.role}`}>
                 <div className={`bubble ${m.role}`}>{m.content}</div>
               </div>
             ))}